@@ -0,0 +1,152 @@
+/**
+ * Lambda コールドスタートベンチマーク
+ * ハンドラーとリクエストの組み合わせごとに新しい Node.js プロセスを起動し（コールドスタート）、
+ * lambda.js の読み込み時間（init）・最初の呼び出しの処理時間・RSS（MB）と、
+ * 読み込まれた重い依存（Playwright・Gemini SDK・googleapis・sqlite3）をJSONで標準出力に書き出す
+ * --eager を指定すると全サービスを先に読み込み、遅延読み込み前の状態と比較できる
+ *
+ * 使い方: node benchmarks/bench_coldstart.js [--runs 5] [--eager]
+ */
+
+const { fork } = require('child_process');
+const path = require('path');
+
+const LAMBDA_PATH = path.join(__dirname, '../src/lambda.js');
+const SERVICES_DIR = path.join(__dirname, '../src/services');
+
+// 計測するハンドラーとリクエスト
+const SCENARIOS = [
+  { handler: 'readHandler', method: 'GET', path: '/api/health' },
+  { handler: 'readHandler', method: 'GET', path: '/api/result/missing' },
+  { handler: 'browserHandler', method: 'GET', path: '/api/health' },
+  { handler: 'browserHandler', method: 'GET', path: '/api/jobs' },
+  { handler: 'browserHandler', method: 'GET', path: '/api/stats' }
+];
+
+// 読み込まれたかを報告する依存
+const HEAVY_MODULES = ['playwright', 'playwright-core', '@sparticuz/chromium', '@google/generative-ai', 'googleapis', 'sqlite3'];
+
+function parseArgs(argv) {
+  const args = { runs: 5, eager: false };
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === '--runs') args.runs = parseInt(argv[++i]);
+    if (argv[i] === '--eager') args.eager = true;
+  }
+  return args;
+}
+
+function median(samples) {
+  const ordered = [...samples].sort((a, b) => a - b);
+  return ordered[Math.floor(ordered.length / 2)];
+}
+
+function rssMB() {
+  return Math.round(process.memoryUsage().rss / 1024 / 1024 * 10) / 10;
+}
+
+/**
+ * 子プロセス側: lambda.js を読み込んで1回呼び出し、計測結果を親に送る
+ * @param {object} scenario - { handler, method, path, eager }
+ */
+async function runChild(scenario) {
+  const startedAt = process.hrtime.bigint();
+  const elapsedMs = () => Number(process.hrtime.bigint() - startedAt) / 1e6;
+
+  if (scenario.eager) {
+    // 遅延読み込み前の状態（server.js が全サービスを読み込み、各サービスが依存を読み込む）
+    for (const name of ['PageAnalyzer', 'CodeGenerator', 'ScraperExecutor', 'SheetIntegration', 'JobQueue']) {
+      require(path.join(SERVICES_DIR, name));
+    }
+    require('@sparticuz/chromium');
+    require('playwright-core');
+    require('@google/generative-ai');
+    require('googleapis');
+    require('sqlite3');
+  }
+
+  const lambda = require(LAMBDA_PATH);
+  const handler = lambda[scenario.handler];
+  const initMs = elapsedMs();
+  const initRssMB = rssMB();
+
+  const event = {
+    httpMethod: scenario.method,
+    path: scenario.path,
+    headers: {},
+    multiValueHeaders: {},
+    queryStringParameters: null,
+    multiValueQueryStringParameters: null,
+    body: null,
+    isBase64Encoded: false,
+    requestContext: { stage: 'prod' }
+  };
+  const response = await handler(event, { callbackWaitsForEmptyEventLoop: false });
+  const invokeMs = elapsedMs() - initMs;
+
+  const loaded = HEAVY_MODULES.filter(name =>
+    Object.keys(require.cache).some(file => file.includes(`${path.sep}node_modules${path.sep}${name}${path.sep}`))
+  );
+
+  process.send({
+    initMs,
+    invokeMs,
+    totalMs: initMs + invokeMs,
+    initRssMB,
+    rssMB: rssMB(),
+    statusCode: response.statusCode,
+    loaded
+  });
+}
+
+/**
+ * 親プロセス側: シナリオごとに runs 回のコールドスタートを計測
+ */
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+  const results = [];
+
+  for (const scenario of SCENARIOS) {
+    const samples = [];
+    for (let i = 0; i < args.runs; i++) {
+      samples.push(await new Promise((resolve, reject) => {
+        const child = fork(__filename, ['--child', JSON.stringify({ ...scenario, eager: args.eager })], {
+          env: { ...process.env, AWS_LAMBDA_FUNCTION_NAME: 'bench-coldstart' },
+          stdio: ['ignore', 'ignore', 'inherit', 'ipc']
+        });
+        let sample = null;
+        child.on('message', message => {
+          sample = message;
+          child.kill();
+        });
+        child.on('exit', () => (sample ? resolve(sample) : reject(new Error(`Child failed: ${scenario.handler} ${scenario.path}`))));
+      }));
+    }
+
+    results.push({
+      handler: scenario.handler,
+      request: `${scenario.method} ${scenario.path}`,
+      statusCode: samples[0].statusCode,
+      initMs: Math.round(median(samples.map(sample => sample.initMs)) * 10) / 10,
+      invokeMs: Math.round(median(samples.map(sample => sample.invokeMs)) * 10) / 10,
+      totalMs: Math.round(median(samples.map(sample => sample.totalMs)) * 10) / 10,
+      initRssMB: median(samples.map(sample => sample.initRssMB)),
+      rssMB: median(samples.map(sample => sample.rssMB)),
+      loaded: samples[0].loaded
+    });
+  }
+
+  console.log(JSON.stringify({ runs: args.runs, eager: args.eager, results }, null, 2));
+}
+
+const childIndex = process.argv.indexOf('--child');
+if (childIndex !== -1) {
+  runChild(JSON.parse(process.argv[childIndex + 1])).catch(error => {
+    console.error(error);
+    process.exit(1);
+  });
+} else {
+  main().catch(error => {
+    console.error(error);
+    process.exit(1);
+  });
+}
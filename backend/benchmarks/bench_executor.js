@@ -0,0 +1,103 @@
+/**
+ * ScraperExecutor ベンチマーク
+ * フィクスチャページ（listings_<件数>.html）に対して extractData と convertToCSV を計測し、
+ * フェーズごとの p50/p95（ミリ秒）とスループット（行/秒）をJSONで標準出力に書き出す
+ *
+ * 使い方: node benchmarks/bench_executor.js --fixtures <dir> [--repeat 10]
+ */
+
+const fs = require('fs');
+const path = require('path');
+const { chromium } = require('playwright');
+const scraperExecutor = require('../src/services/ScraperExecutor');
+
+// ee-ties の求人一覧と同じセレクター
+const TARGETS = [
+  { label: 'title', selector: 'article.list_item h3.list_heading', dataType: 'text' },
+  { label: 'company', selector: 'article.list_item p.list_maker_name', dataType: 'text' },
+  { label: 'description', selector: 'article.list_item div.list_detail.description', dataType: 'text' }
+];
+
+function parseArgs(argv) {
+  const args = { fixtures: null, repeat: 10 };
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === '--fixtures') args.fixtures = argv[++i];
+    if (argv[i] === '--repeat') args.repeat = parseInt(argv[++i]);
+  }
+  if (!args.fixtures) {
+    throw new Error('--fixtures <dir> is required');
+  }
+  return args;
+}
+
+function percentile(samples, pct) {
+  const ordered = [...samples].sort((a, b) => a - b);
+  const index = Math.min(ordered.length - 1, Math.max(0, Math.round(pct / 100 * ordered.length + 0.5) - 1));
+  return ordered[index];
+}
+
+function summarize(phase, listings, samples) {
+  const p50 = percentile(samples, 50);
+  return {
+    phase,
+    listings,
+    runs: samples.length,
+    p50_ms: Number(p50.toFixed(3)),
+    p95_ms: Number(percentile(samples, 95).toFixed(3)),
+    rows_per_sec: p50 > 0 ? Number((listings / (p50 / 1000)).toFixed(1)) : null
+  };
+}
+
+async function measure(repeat, fn) {
+  await fn(); // ウォームアップ
+  const samples = [];
+  for (let i = 0; i < repeat; i++) {
+    const start = process.hrtime.bigint();
+    await fn();
+    samples.push(Number(process.hrtime.bigint() - start) / 1e6);
+  }
+  return samples;
+}
+
+async function main() {
+  const { fixtures, repeat } = parseArgs(process.argv.slice(2));
+  const files = fs.readdirSync(fixtures)
+    .map(name => ({ name, match: name.match(/^listings_(\d+)\.html$/) }))
+    .filter(f => f.match)
+    .map(f => ({ file: path.join(fixtures, f.name), listings: parseInt(f.match[1]) }))
+    .sort((a, b) => a.listings - b.listings);
+
+  // ログ出力で計測がぶれないようにする（標準出力のJSONも汚さない）
+  require('../src/services/AntiBotService').logger.transports
+    .forEach(transport => { transport.silent = true; });
+
+  const results = [];
+  const browser = await chromium.launch({ headless: true });
+  try {
+    const page = await browser.newPage();
+
+    for (const { file, listings } of files) {
+      await page.setContent(fs.readFileSync(file, 'utf-8'));
+
+      let data = null;
+      const extractSamples = await measure(repeat, async () => {
+        data = await scraperExecutor.extractData(page, TARGETS);
+      });
+      results.push(summarize('backend:extractData', listings, extractSamples));
+
+      const csvSamples = await measure(repeat, async () => {
+        scraperExecutor.convertToCSV(data);
+      });
+      results.push(summarize('backend:convertToCSV', listings, csvSamples));
+    }
+  } finally {
+    await browser.close();
+  }
+
+  console.log(JSON.stringify(results));
+}
+
+main().catch(error => {
+  console.error(error);
+  process.exit(1);
+});
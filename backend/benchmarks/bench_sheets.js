@@ -0,0 +1,121 @@
+/**
+ * SheetIntegration 書き込みベンチマーク
+ * ローカルのフェイク Sheets サーバーを起動し、同時に届いたジョブの結果書き込み（writeRow）を
+ * 何回の API 呼び出しで送れたかと、書き込み完了までの p50/p95（ミリ秒）をJSONで標準出力に書き出す
+ * --quota-every を指定すると N 回に1回 429（Retry-After 付き）を返し、バックオフの動作も確認できる
+ *
+ * 使い方: node benchmarks/bench_sheets.js [--rows 100] [--latency 50] [--quota-every 0]
+ */
+
+const http = require('http');
+
+function parseArgs(argv) {
+  const args = { rows: 100, latency: 50, quotaEvery: 0 };
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === '--rows') args.rows = parseInt(argv[++i]);
+    if (argv[i] === '--latency') args.latency = parseInt(argv[++i]);
+    if (argv[i] === '--quota-every') args.quotaEvery = parseInt(argv[++i]);
+  }
+  return args;
+}
+
+function percentile(samples, pct) {
+  const ordered = [...samples].sort((a, b) => a - b);
+  const index = Math.min(ordered.length - 1, Math.max(0, Math.round(pct / 100 * ordered.length + 0.5) - 1));
+  return ordered[index];
+}
+
+/**
+ * values:batchUpdate と batchUpdate だけを受け付けるフェイクサーバー
+ * 受け取った値・書式はメモリに記録する
+ */
+function startFakeSheets({ latency, quotaEvery }) {
+  const state = { requests: 0, valueCalls: 0, formatCalls: 0, throttled: 0, cells: new Map(), formattedRows: new Set() };
+
+  const server = http.createServer((req, res) => {
+    let body = '';
+    req.on('data', chunk => { body += chunk; });
+    req.on('end', () => setTimeout(() => {
+      state.requests++;
+
+      if (quotaEvery > 0 && state.requests % quotaEvery === 0) {
+        state.throttled++;
+        res.writeHead(429, { 'Content-Type': 'application/json', 'Retry-After': '1' });
+        res.end(JSON.stringify({ error: { code: 429, status: 'RESOURCE_EXHAUSTED', message: 'Quota exceeded' } }));
+        return;
+      }
+
+      const payload = body ? JSON.parse(body) : {};
+      if (/\/values:batchUpdate$/.test(req.url)) {
+        state.valueCalls++;
+        for (const { range, values } of payload.data || []) {
+          state.cells.set(range, values);
+        }
+      } else if (/:batchUpdate$/.test(req.url)) {
+        state.formatCalls++;
+        for (const request of payload.requests || []) {
+          const { startRowIndex, endRowIndex } = request.repeatCell.range;
+          for (let row = startRowIndex + 1; row <= endRowIndex; row++) {
+            state.formattedRows.add(row);
+          }
+        }
+      } else {
+        res.writeHead(404);
+        res.end();
+        return;
+      }
+
+      res.writeHead(200, { 'Content-Type': 'application/json' });
+      res.end('{}');
+    }, latency));
+  });
+
+  return new Promise(resolve => {
+    server.listen(0, '127.0.0.1', () => resolve({ server, state, port: server.address().port }));
+  });
+}
+
+async function main() {
+  const { rows, latency, quotaEvery } = parseArgs(process.argv.slice(2));
+  const { server, state, port } = await startFakeSheets({ latency, quotaEvery });
+
+  // フェイクサーバーに向けてから読み込む（設定は読み込み時に確定するため）
+  process.env.SHEETS_API_ROOT = `http://127.0.0.1:${port}/`;
+  const sheetIntegration = require('../src/services/SheetIntegration');
+
+  try {
+    const samples = await Promise.all(Array.from({ length: rows }, async (_, index) => {
+      const start = process.hrtime.bigint();
+      await sheetIntegration.writeRow('bench-spreadsheet', index + 2, {
+        status: '完了',
+        dataCount: index,
+        screenshotUrl: '',
+        dataUrl: '',
+        scraperId: `scraper_${index}`
+      }, 'green');
+      return Number(process.hrtime.bigint() - start) / 1e6;
+    }));
+
+    console.log(JSON.stringify({
+      rows,
+      latency_ms: latency,
+      api_calls: state.requests,
+      value_calls: state.valueCalls,
+      format_calls: state.formatCalls,
+      throttled: state.throttled,
+      cells_written: state.cells.size,
+      rows_formatted: state.formattedRows.size,
+      p50_ms: Number(percentile(samples, 50).toFixed(3)),
+      p95_ms: Number(percentile(samples, 95).toFixed(3)),
+      stats: sheetIntegration.getStats()
+    }));
+  } finally {
+    await sheetIntegration.close();
+    server.close();
+  }
+}
+
+main().catch(error => {
+  console.error(error);
+  process.exit(1);
+});
@@ -23,6 +23,20 @@ module.exports = {
       maxDelay: 30000
     },
 
+    // ホスト単位の自動スロットリング（AutoThrottle）
+    // 観測したレスポンス時間と429/503の発生率からリクエスト間隔を自動調整
+    autoThrottle: {
+      enabled: process.env.AUTO_THROTTLE !== 'false',
+      startDelay: 3000,
+      minDelay: parseInt(process.env.MIN_DELAY) || 1000,
+      maxDelay: 60000,
+      // ホストあたりの目標同時リクエスト数（間隔 = レスポンス時間 / 目標同時数）
+      targetConcurrency: 1,
+      // 混雑を示すステータス（間隔をbackoffFactor倍に広げる）
+      backoffStatuses: [429, 503],
+      backoffFactor: 2
+    },
+
     // 時間帯による調整（オプション）
     timeBasedBehavior: {
       enabled: false,
@@ -65,13 +79,25 @@ module.exports = {
     maxFailures: 3, // 失敗回数の閾値
     cooldownPeriod: 300000, // 除外後の待機時間 (5分)
 
-    // 同一IPからのリクエスト頻度制御
+    // 同一IPからのリクエスト頻度制御（ホスト・プロキシごとに適用。判定はスライディングウィンドウ）
     rateLimit: {
       requestsPerMinute: 10,
       requestsPerHour: 100
     }
   },
 
+  // レート制限・訪問済みURL・プロキシ失敗回数の保存先
+  // 'memory': プロセス内のみ / 'sqlite': 共有ボリューム上のファイルで複数インスタンスが上限を共有
+  state: {
+    backend: process.env.STATE_BACKEND || 'memory',
+    sqlitePath: process.env.STATE_DB || null, // 未指定時は data/antibot_state.sqlite3
+    busyTimeoutMs: 5000,
+
+    // 訪問済みURLの有効期限と、メモリ上に保持する件数の上限
+    visitedTtlMs: parseInt(process.env.VISITED_TTL_MS) || 7 * 24 * 60 * 60 * 1000,
+    maxVisitedEntries: 100000
+  },
+
   // 4. エラーハンドリング
   errorHandling: {
     maxRetries: parseInt(process.env.MAX_RETRIES) || 3,
@@ -141,6 +167,31 @@ module.exports = {
       scrollSpeed: { min: 100, max: 500 }
     },
 
+    // 不要なサブリソースの遮断（context.route）
+    resourceBlocking: {
+      enabled: process.env.BLOCK_RESOURCES !== 'false',
+      // trueの場合は遮断せず、遮断した場合に削減できた転送量を計測のみ行う
+      dryRun: process.env.BLOCK_RESOURCES_DRY_RUN === 'true',
+      // 遮断するリソース種別（request.resourceType()）
+      blockResourceTypes: ['image', 'font', 'media'],
+      // 遮断するURLパターン（解析ビーコン等）
+      blockUrlPatterns: [
+        'google-analytics.com',
+        'googletagmanager.com',
+        'doubleclick.net',
+        'connect.facebook.net',
+        'hotjar.com',
+        'clarity.ms'
+      ],
+      // 遮断対象でも通過させるURLパターン（ページの動作に必要なもの）
+      allowUrlPatterns: [],
+      // スクリーンショット撮影時は遮断しない（画像を含めて正しく描画するため）
+      bypassForScreenshots: true,
+      // サイト（ホスト）単位の上書き設定
+      // 例: 'www.example.com': { blockResourceTypes: ['media'], allowUrlPatterns: ['/captcha/'] }
+      sites: {}
+    },
+
     // WebDriver検知回避スクリプト
     stealthScripts: [
       // navigator.webdriver を削除
@@ -174,9 +225,22 @@ module.exports = {
     // 並行リクエスト数
     maxConcurrent: 3,
 
-    // リクエストプールの設定
+    // リクエストプールの設定（起動したまま保持するブラウザ数の上限。maxConcurrent を超える分は使われない）
     poolSize: 5,
 
+    // ブラウザプール（BrowserPool）
+    browserPool: {
+      // サーバー起動時に事前起動するブラウザ数
+      warmBrowsers: parseInt(process.env.BROWSER_POOL_WARM || '1', 10),
+      // このページ数を処理したブラウザは入れ替える
+      maxPagesPerBrowser: parseInt(process.env.BROWSER_POOL_MAX_PAGES || '200', 10),
+      // 常駐メモリがこれを超えたブラウザは入れ替える（MB、0で無効。Linuxのみ計測）
+      maxMemoryMB: parseInt(process.env.BROWSER_POOL_MAX_MEMORY_MB || '1024', 10),
+      // ヘルスチェックの間隔とタイムアウト（ミリ秒）
+      healthCheckInterval: 30000,
+      healthCheckTimeout: 5000
+    },
+
     // 段階的スケールアップ
     rampUp: {
       enabled: true,
@@ -194,6 +258,159 @@ module.exports = {
     errorLogFile: './logs/error.log'
   },
 
+  // 計測設定（フェーズ別の処理時間）
+  metrics: {
+    enabled: process.env.METRICS !== 'false',
+
+    // 実行ごとのトレース（JSON）を保存するか
+    persistTraces: process.env.PERSIST_TRACES !== 'false',
+
+    // トレースの保存先（未指定時は data/traces）
+    traceDir: process.env.TRACE_DIR || null,
+
+    // ヒストグラムのバケット境界（秒）
+    buckets: [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+  },
+
+  // アーティファクト（スクリーンショット等）設定
+  artifacts: {
+    // 保存先（未指定時は data/artifacts）
+    dir: process.env.ARTIFACT_DIR || null,
+
+    // 縮小版（ブラウザで直接エンコード: 'webp' または 'jpeg'）
+    thumbnail: {
+      format: 'webp',
+      quality: 60,
+      scale: 0.25 // 1920x1080 → 480x270
+    },
+
+    // 配信時のキャッシュ期間（内容のハッシュがIDのため変更されない）
+    cacheMaxAgeMs: 365 * 24 * 60 * 60 * 1000
+  },
+
+  // 解析・コード生成キャッシュ（URLテンプレートとDOM構造のハッシュをキーに AI の結果を再利用）
+  cache: {
+    enabled: process.env.ANALYSIS_CACHE !== 'false',
+
+    // 保存先（未指定時は data/cache）
+    dir: process.env.CACHE_DIR || null,
+
+    // メモリ上に保持するエントリ数
+    memoryEntries: 500,
+
+    // 有効期限
+    ttl: {
+      analysis: parseInt(process.env.ANALYSIS_CACHE_TTL_MS) || 24 * 60 * 60 * 1000, // 1日
+      code: parseInt(process.env.CODE_CACHE_TTL_MS) || 7 * 24 * 60 * 60 * 1000, // 7日
+      plan: 7 * 24 * 60 * 60 * 1000 // 抽出プラン（レコード要素が見つからない場合は自動で作り直す）
+    }
+  },
+
+  // 実行結果・生成コードをメモリに保持する上限（バイト数。超えた分は data/outputs に退避し、参照時に読み戻す）
+  storage: {
+    resultMemoryBytes: (parseInt(process.env.RESULT_CACHE_MB) || 256) * 1024 * 1024,
+    codeMemoryBytes: (parseInt(process.env.CODE_CACHE_MB) || 16) * 1024 * 1024
+  },
+
+  // Google Sheets への書き込み（結果・背景色をまとめて batchUpdate で送る）
+  sheets: {
+    // API のルートURL（ローカルのフェイクサーバーで検証する場合に指定。例: http://localhost:8089/）
+    apiRoot: process.env.SHEETS_API_ROOT || null,
+
+    // 書き込みバッファ（無効時は書き込みごとにすぐ送信する）
+    batch: {
+      enabled: process.env.SHEETS_BATCH !== 'false',
+      // 最初の書き込みから送信までの待ち時間
+      windowMs: parseInt(process.env.SHEETS_BATCH_WINDOW_MS) || 2000,
+      // 溜まった行数がこれに達したら待たずに送信
+      maxRows: parseInt(process.env.SHEETS_BATCH_MAX_ROWS) || 50
+    },
+
+    // クォータ超過（429）・503 の再試行（Retry-After がない場合は指数バックオフ）
+    retry: {
+      maxRetries: 5,
+      baseDelay: 1000,
+      maxDelay: 64000
+    }
+  },
+
+  // ページネーション実行（検出したページ送りに従って複数ページを取得）
+  pagination: {
+    // 1回の実行で取得する最大ページ数（リクエストの maxPages で上書き可）
+    maxPages: parseInt(process.env.PAGINATION_MAX_PAGES) || 10,
+
+    // 現在のページの抽出中に次ページを2つ目のタブで読み込む
+    prefetch: process.env.PAGINATION_PREFETCH !== 'false',
+
+    // 「次へ」ボタンのクリック後に表示の更新を待つ時間
+    clickWaitMs: 10000
+  },
+
+  // 生成コードの実行ワーカー（Playwright の読み込みとブラウザの起動を済ませたプロセスを使い回す）
+  workers: {
+    // /api/execute の engine を省略した場合の実行方法（'direct': targets を直接抽出 / 'worker': 生成コードを実行）
+    defaultEngine: process.env.EXECUTION_ENGINE || 'direct',
+
+    // 言語ごとのワーカー数の上限と、起動時に事前起動する数
+    javascript: {
+      size: parseInt(process.env.JS_WORKERS) || 2,
+      warm: parseInt(process.env.JS_WORKERS_WARM ?? '1')
+    },
+    python: {
+      size: parseInt(process.env.PY_WORKERS) || 1,
+      warm: parseInt(process.env.PY_WORKERS_WARM ?? '0'),
+      command: process.env.PYTHON_PATH || 'python3'
+    },
+
+    // 1ワーカーで実行するジョブ数（超えたら作り直してメモリリークを持ち越さない）
+    maxJobsPerWorker: 50,
+
+    // 1ジョブの上限（超えたワーカーはブラウザごと強制終了して作り直す）
+    timeoutMs: parseInt(process.env.WORKER_TIMEOUT_MS) || 120000,
+    maxCpuMs: parseInt(process.env.WORKER_MAX_CPU_MS) || 60000, // ワーカーとブラウザの CPU 時間の合計
+    maxMemoryMB: parseInt(process.env.WORKER_MAX_MEMORY_MB) || 1536, // ワーカーとブラウザの RSS の合計
+    heapMB: 512, // Node.js ワーカーのヒープ上限
+    monitorInterval: 1000,
+
+    // 読み取る出力ファイルの合計サイズの上限
+    maxOutputBytes: 20 * 1024 * 1024,
+
+    // ジョブごとに保持するログの行数
+    maxLogLines: 200,
+
+    // ジョブの作業ディレクトリ（省略時は data/worker_jobs）
+    jobDir: process.env.WORKER_JOB_DIR || null
+  },
+
+  // バックグラウンドジョブ設定
+  jobs: {
+    // 終了したジョブの状態・結果を保持する期間
+    retentionMs: parseInt(process.env.JOB_RETENTION_MS) || 3600000, // 1時間
+
+    // 保持するジョブ数の上限（超えた分は古い終了済みジョブから削除）
+    maxJobs: 500,
+
+    // SSE のキープアライブ間隔
+    sseHeartbeatMs: 15000
+  },
+
+  // 自動スクレイピングのジョブキュー（SQLiteに永続化。同時実行数は concurrency.maxConcurrent / rampUp に従う）
+  queue: {
+    // 保存先（未指定時は data/job_queue.sqlite3）
+    dbPath: process.env.QUEUE_DB || null,
+
+    // 同一ホストで同時に実行するジョブ数の上限
+    maxPerHost: parseInt(process.env.QUEUE_MAX_PER_HOST || '1', 10),
+
+    // 失敗時のリトライ（指数バックオフ。上限に達したジョブはデッドレターに移す）
+    maxAttempts: parseInt(process.env.QUEUE_MAX_ATTEMPTS || '3', 10),
+    retryBaseDelay: 30000,
+    retryMaxDelay: 600000,
+
+    // リトライ待ちのジョブを確認する間隔
+    pollInterval: 1000
+  },
+
   // その他の設定
   misc: {
     // 収集済みURL記録（重複回避）
@@ -1,15 +1,71 @@
 /**
  * AWS Lambda Handler
  * Serverless Framework用のエントリーポイント
+ *
+ * handler        : すべてのエンドポイント
+ * browserHandler : handler と同じ（解析・生成・実行など、readHandler に振り分けない残りのエンドポイント用）
+ * readHandler    : ブラウザを使わない読み取り系エンドポイントのみ（少ないメモリの関数で運用する）
+ *
+ * サービスは server.js で初回使用時に読み込むため、ブラウザを使わない呼び出しのコールドスタートでは
+ * Playwright・Chromium・Gemini SDK・googleapis を読み込まない
+ * 結果・ジョブは関数のインスタンス内（メモリ / data/）に保持されるため、
+ * /api/result などを readHandler に振り分けるのは data/ を共有ストレージ（EFS 等）に置く場合のみ
  */
 
 const serverless = require('serverless-http');
 const app = require('./server');
 
-// Lambda関数ハンドラー
-module.exports.handler = serverless(app, {
+// readHandler で受け付けるエンドポイント（GET のみ）
+const READ_ROUTES = [
+  /^\/$/,
+  /^\/api\/health$/,
+  /^\/api\/config$/,
+  /^\/api\/metrics$/,
+  /^\/api\/result\/[^/]+$/,
+  /^\/api\/code\/[^/]+$/,
+  /^\/api\/jobs(\/[^/]+(\/events)?)?$/,
+  /^\/api\/artifacts\/[^/]+$/
+];
+
+const options = {
   // リクエストとレスポンスのサイズ制限を拡大
   request: {
     basePath: '/prod'
   }
-});
+};
+
+/**
+ * 読み取り系エンドポイントか
+ * @param {IncomingMessage} req
+ * @returns {boolean}
+ */
+function isReadRoute(req) {
+  const { pathname } = new URL(req.url, 'http://localhost');
+  return (req.method === 'GET' || req.method === 'HEAD') && READ_ROUTES.some(route => route.test(pathname));
+}
+
+/**
+ * 受け付けるエンドポイント以外を 404 にするハンドラーを作成
+ * 誤って振り分けられたリクエストで、メモリの少ない関数がブラウザを起動しないようにする
+ * @param {function} accepts - (req) => boolean
+ * @returns {function}
+ */
+function restrict(accepts) {
+  return (req, res) => {
+    if (accepts(req)) {
+      app(req, res);
+      return;
+    }
+    res.statusCode = 404;
+    res.setHeader('Content-Type', 'application/json');
+    res.end(JSON.stringify({
+      success: false,
+      error: `Endpoint not served by this function: ${req.method} ${req.url}`
+    }));
+  };
+}
+
+// Lambda関数ハンドラー
+module.exports.handler = serverless(app, options);
+module.exports.readHandler = serverless(restrict(isReadRoute), options);
+module.exports.browserHandler = module.exports.handler;
@@ -6,11 +6,22 @@ const path = require('path');
 require('dotenv').config({ path: path.join(__dirname, '../../.env') });
 const express = require('express');
 const cors = require('cors');
-const pageAnalyzer = require('./services/PageAnalyzer');
-const codeGenerator = require('./services/CodeGenerator');
-const scraperExecutor = require('./services/ScraperExecutor');
 const antiBotService = require('./services/AntiBotService');
-const sheetIntegration = require('./services/SheetIntegration');
+const config = require('./config/antibot.config');
+
+// ロガー以外のサービスは初回使用時に読み込む（Lambda のコールドスタートで使わないサービスを読み込まない）
+const LAZY_LOADED = Symbol('lazyLoaded');
+const pageAnalyzer = lazyService(() => require('./services/PageAnalyzer'));
+const codeGenerator = lazyService(() => require('./services/CodeGenerator'));
+const scraperExecutor = lazyService(() => require('./services/ScraperExecutor'));
+const sheetIntegration = lazyService(() => require('./services/SheetIntegration'));
+const metricsService = lazyService(() => require('./services/MetricsService'));
+const jobManager = lazyService(() => require('./services/JobManager'));
+const artifactStore = lazyService(() => require('./services/ArtifactStore'));
+const browserPool = lazyService(() => require('./services/BrowserPool'));
+const workerPool = lazyService(() => require('./services/WorkerPool'));
+const jobQueue = lazyService(() => require('./services/JobQueue'), registerQueueHandlers);
+const analysisCache = lazyService(() => require('./services/AnalysisCache'));
 
 const app = express();
 const PORT = process.env.PORT || 3000;
@@ -43,6 +54,10 @@ app.get('/', (req, res) => {
       generate: 'POST /api/generate',
       execute: 'POST /api/execute',
       autoScrape: 'POST /api/auto-scrape',
+      jobs: 'GET /api/jobs/:jobId',
+      jobEvents: 'GET /api/jobs/:jobId/events',
+      deadLetters: 'GET /api/queue/dead-letters',
+      artifacts: 'GET /api/artifacts/:artifactId',
       webhook: 'POST /api/webhook/sheet'
     },
     timestamp: new Date().toISOString()
@@ -63,11 +78,12 @@ app.get('/api/health', (req, res) => {
 /**
  * ページ解析
  * POST /api/analyze
- * Body: { url: string }
+ * Body: { url: string, screenshot?: boolean, fullPageScreenshot?: boolean, refresh?: boolean, async?: boolean }
+ * async: true の場合はジョブとして登録し、202 で jobId を返す（結果は GET /api/jobs/:jobId）
  */
 app.post('/api/analyze', async (req, res) => {
   try {
-    const { url } = req.body;
+    const { url, screenshot, fullPageScreenshot, refresh } = req.body;
 
     if (!url) {
       return res.status(400).json({
@@ -78,7 +94,14 @@ app.post('/api/analyze', async (req, res) => {
 
     antiBotService.logger.info(`Analyzing page: ${url}`);
 
-    const result = await pageAnalyzer.analyzePage(url);
+    if (req.body.async) {
+      return submitJob(res, 'analyze', async (progress) => {
+        progress(1, 'Analyzing page...');
+        return await pageAnalyzer.analyzePage(url, { screenshot, fullPageScreenshot, refresh });
+      });
+    }
+
+    const result = await pageAnalyzer.analyzePage(url, { screenshot, fullPageScreenshot, refresh });
 
     res.json(result);
 
@@ -128,7 +151,9 @@ app.post('/api/test-selector', async (req, res) => {
  *   targets: array,
  *   pagination: boolean,
  *   loginRequired: boolean,
- *   outputFormat: string
+ *   outputFormat: string,
+ *   refresh?: boolean,
+ *   async?: boolean
  * }
  */
 app.post('/api/generate', async (req, res) => {
@@ -144,6 +169,13 @@ app.post('/api/generate', async (req, res) => {
 
     antiBotService.logger.info(`Generating scraper code for: ${params.url}`);
 
+    if (params.async) {
+      return submitJob(res, 'generate', async (progress) => {
+        progress(1, 'Generating code...');
+        return await codeGenerator.generateScraperCode(params);
+      });
+    }
+
     const result = await codeGenerator.generateScraperCode(params);
 
     res.json(result);
@@ -217,7 +249,12 @@ app.post('/api/generate-login', async (req, res) => {
  *   url: string,
  *   targets: array,
  *   saveOutput: boolean,
- *   outputFormat: string
+ *   outputFormat: string,
+ *   pagination?: boolean | object,  true または /api/analyze の pagination（検出したページ送りに従って複数ページを取得）
+ *   maxPages?: number,              取得する最大ページ数（既定 PAGINATION_MAX_PAGES）
+ *   engine?: 'direct' | 'worker',   'worker' の場合は code をワーカープールで実行し、書き出された JSON / CSV を結果にする（既定 EXECUTION_ENGINE）
+ *   language?: 'javascript' | 'python',  engine: 'worker' で実行するコードの言語
+ *   async?: boolean                 true の場合、ワーカーの実行ログを SSE の progress として配信
  * }
  */
 app.post('/api/execute', async (req, res) => {
@@ -231,8 +268,23 @@ app.post('/api/execute', async (req, res) => {
       });
     }
 
+    const engine = params.engine || config.workers.defaultEngine;
+    if (engine === 'worker' && !params.code) {
+      return res.status(400).json({
+        success: false,
+        error: 'code is required for the worker engine'
+      });
+    }
+
     antiBotService.logger.info(`Executing scraper for: ${params.url}`);
 
+    if (params.async) {
+      return submitJob(res, 'execute', async (progress) => {
+        progress(1, 'Executing scraper...');
+        return await scraperExecutor.executeScraper({ ...params, onLog: line => progress(1, line) });
+      });
+    }
+
     const result = await scraperExecutor.executeScraper(params);
 
     res.json(result);
@@ -249,12 +301,19 @@ app.post('/api/execute', async (req, res) => {
 /**
  * 実行結果取得
  * GET /api/result/:scraperId
+ * Query: {
+ *   offset?: number,    開始行（既定 0）
+ *   limit?: number,     行数（省略時は最後まで）
+ *   columns?: string,   取得する列（カンマ区切り、省略時はすべて）
+ *   format?: string     'json'（既定）| 'arrow'（Arrow IPC ストリーム）| 'csv'
+ * }
  */
-app.get('/api/result/:scraperId', (req, res) => {
+app.get('/api/result/:scraperId', async (req, res) => {
   try {
     const { scraperId } = req.params;
+    const { format = 'json' } = req.query;
 
-    const result = scraperExecutor.getResult(scraperId);
+    const result = await scraperExecutor.getResult(scraperId);
 
     if (!result) {
       return res.status(404).json({
@@ -263,9 +322,47 @@ app.get('/api/result/:scraperId', (req, res) => {
       });
     }
 
+    const offset = Math.max(0, parseInt(req.query.offset) || 0);
+    const limit = req.query.limit === undefined ? null : Math.max(0, parseInt(req.query.limit) || 0);
+    const columns = req.query.columns ? req.query.columns.split(',').filter(Boolean) : null;
+    const page = scraperExecutor.sliceData(result.data, { offset, limit, columns });
+
+    // ページ情報はヘッダーでも返す（Arrow / CSV のレスポンス用）
+    res.set({
+      'X-Total-Rows': String(page.totalRows),
+      'X-Offset': String(offset),
+      'X-Columns': encodeURIComponent(page.columns.join(','))
+    });
+
+    if (format === 'arrow') {
+      // apache-arrow 未インストールの環境では 501（クライアントは format=json で取り直す）
+      if (!scraperExecutor.supportsArrow()) {
+        return res.status(501).json({
+          success: false,
+          error: 'Arrow output requires apache-arrow. Install it with: npm install apache-arrow'
+        });
+      }
+      return res
+        .type('application/vnd.apache.arrow.stream')
+        .send(scraperExecutor.convertToArrow(page.data));
+    }
+
+    if (format === 'csv') {
+      return res
+        .type('text/csv; charset=utf-8')
+        .attachment(`result_${scraperId}.csv`)
+        .send(scraperExecutor.convertToCSV(page.data));
+    }
+
     res.json({
       success: true,
-      result
+      result: { ...result, data: page.data },
+      page: {
+        offset,
+        limit,
+        totalRows: page.totalRows,
+        columns: page.columns
+      }
     });
 
   } catch (error) {
@@ -280,11 +377,11 @@ app.get('/api/result/:scraperId', (req, res) => {
  * 生成されたコード取得
  * GET /api/code/:scraperId
  */
-app.get('/api/code/:scraperId', (req, res) => {
+app.get('/api/code/:scraperId', async (req, res) => {
   try {
     const { scraperId } = req.params;
 
-    const code = scraperExecutor.getCode(scraperId);
+    const code = await scraperExecutor.getCode(scraperId);
 
     if (!code) {
       return res.status(404).json({
@@ -311,9 +408,14 @@ app.get('/api/code/:scraperId', (req, res) => {
  * 統計情報取得
  * GET /api/stats
  */
-app.get('/api/stats', (req, res) => {
+app.get('/api/stats', async (req, res) => {
   try {
-    const stats = scraperExecutor.getStats();
+    const stats = {
+      ...(await scraperExecutor.getStats()),
+      queue: await jobQueue.getStats(),
+      cache: analysisCache.getStats(),
+      sheets: sheetIntegration.getStats()
+    };
 
     res.json({
       success: true,
@@ -328,6 +430,189 @@ app.get('/api/stats', (req, res) => {
   }
 });
 
+/**
+ * ジョブ一覧（結果は含めない）
+ * GET /api/jobs
+ */
+app.get('/api/jobs', (req, res) => {
+  res.json({
+    success: true,
+    jobs: jobManager.listJobs()
+  });
+});
+
+/**
+ * ジョブの状態・進捗・結果
+ * GET /api/jobs/:jobId
+ * ジョブ管理から破棄されたジョブは、ジョブキューに永続化された行（結果を含む）から返す
+ */
+app.get('/api/jobs/:jobId', async (req, res) => {
+  try {
+    const job = jobManager.getJob(req.params.jobId) || await jobQueue.getJob(req.params.jobId);
+
+    if (!job) {
+      return res.status(404).json({
+        success: false,
+        error: 'Job not found'
+      });
+    }
+
+    res.json({
+      success: true,
+      job
+    });
+
+  } catch (error) {
+    res.status(500).json({
+      success: false,
+      error: error.message
+    });
+  }
+});
+
+/**
+ * ジョブの進捗をSSEで配信（終了時に結果を含めて送信し、ストリームを閉じる）
+ * GET /api/jobs/:jobId/events
+ * GET /api/jobs/:jobId と同様に、ジョブ管理から破棄されたジョブはジョブキューの行から返す
+ */
+app.get('/api/jobs/:jobId/events', async (req, res) => {
+  const { jobId } = req.params;
+  let job;
+
+  try {
+    job = jobManager.getJob(jobId) || await jobQueue.getJob(jobId);
+  } catch (error) {
+    return res.status(500).json({
+      success: false,
+      error: error.message
+    });
+  }
+
+  if (!job) {
+    return res.status(404).json({
+      success: false,
+      error: 'Job not found'
+    });
+  }
+
+  res.set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive'
+  });
+  res.flushHeaders();
+
+  const send = (current) => {
+    const finished = jobManager.isFinished(current);
+    res.write(`event: ${finished ? 'done' : 'progress'}\n`);
+    res.write(`data: ${JSON.stringify(jobManager.toPublic(current, finished))}\n\n`);
+    return finished;
+  };
+
+  if (send(job)) {
+    return res.end();
+  }
+
+  const heartbeat = setInterval(() => res.write(': keep-alive\n\n'), config.jobs.sseHeartbeatMs);
+  const unsubscribe = jobManager.subscribe(jobId, (current) => {
+    if (send(current)) {
+      cleanup();
+      res.end();
+    }
+  });
+  const cleanup = () => {
+    clearInterval(heartbeat);
+    unsubscribe();
+  };
+
+  req.on('close', cleanup);
+});
+
+/**
+ * リトライ上限に達したジョブ（デッドレター）の一覧
+ * GET /api/queue/dead-letters
+ */
+app.get('/api/queue/dead-letters', async (req, res) => {
+  try {
+    res.json({
+      success: true,
+      jobs: await jobQueue.listDeadLetters()
+    });
+
+  } catch (error) {
+    res.status(500).json({
+      success: false,
+      error: error.message
+    });
+  }
+});
+
+/**
+ * デッドレターのジョブを再投入
+ * POST /api/queue/dead-letters/:jobId/retry
+ */
+app.post('/api/queue/dead-letters/:jobId/retry', async (req, res) => {
+  try {
+    const requeued = await jobQueue.retryDeadLetter(req.params.jobId);
+
+    if (!requeued) {
+      return res.status(404).json({
+        success: false,
+        error: 'Dead-lettered job not found'
+      });
+    }
+
+    res.json({
+      success: true,
+      jobId: req.params.jobId,
+      statusUrl: `/api/jobs/${req.params.jobId}`
+    });
+
+  } catch (error) {
+    res.status(500).json({
+      success: false,
+      error: error.message
+    });
+  }
+});
+
+/**
+ * アーティファクト（スクリーンショット等）の取得
+ * GET /api/artifacts/:artifactId
+ * IDは内容のハッシュのため、レスポンスは無期限にキャッシュできる
+ */
+app.get('/api/artifacts/:artifactId', async (req, res) => {
+  try {
+    const artifact = await artifactStore.locate(req.params.artifactId);
+
+    if (!artifact) {
+      return res.status(404).json({
+        success: false,
+        error: 'Artifact not found'
+      });
+    }
+
+    res.type(artifact.contentType).sendFile(artifact.filePath, {
+      maxAge: config.artifacts.cacheMaxAgeMs,
+      immutable: true
+    });
+
+  } catch (error) {
+    res.status(500).json({
+      success: false,
+      error: error.message
+    });
+  }
+});
+
+/**
+ * フェーズ別の処理時間（Prometheus テキスト形式）
+ * GET /api/metrics
+ */
+app.get('/api/metrics', (req, res) => {
+  res.type('text/plain; version=0.0.4').send(metricsService.renderPrometheus());
+});
+
 /**
  * 実行中のスクレイパー一覧
  * GET /api/scrapers
@@ -354,8 +639,6 @@ app.get('/api/scrapers', (req, res) => {
  * GET /api/config
  */
 app.get('/api/config', (req, res) => {
-  const config = require('./config/antibot.config');
-
   res.json({
     success: true,
     config: {
@@ -396,20 +679,24 @@ app.post('/api/webhook/sheet', async (req, res) => {
 
     antiBotService.logger.info(`Webhook received for request #${requestNo}: ${targetUrl}`);
 
-    // 非同期で処理を開始（即座にレスポンスを返す）
+    // キューに登録してから応答する（処理は同時実行数の上限内で順に行われる）
+    const job = await jobQueue.enqueue('auto-scrape', {
+      url: targetUrl,
+      spreadsheetId,
+      rowNumber,
+      purpose,
+      requestNo
+    }, { priority: parseInt(req.body.priority, 10) || 0 });
+
     res.json({
       success: true,
-      message: 'Processing started',
+      message: 'Processing queued',
       requestNo,
-      status: 'processing'
+      jobId: job.id,
+      status: job.status,
+      statusUrl: `/api/jobs/${job.id}`
     });
 
-    // バックグラウンドで自動実行
-    processWebhookRequest(spreadsheetId, rowNumber, targetUrl, purpose, requestNo)
-      .catch(error => {
-        antiBotService.logger.error(`Webhook processing failed: ${error.message}`);
-      });
-
   } catch (error) {
     antiBotService.logger.error(`Webhook error: ${error.message}`);
     res.status(500).json({
@@ -430,7 +717,7 @@ app.post('/api/webhook/sheet', async (req, res) => {
  */
 app.post('/api/auto-scrape', async (req, res) => {
   try {
-    const { url, spreadsheetId, rowNumber } = req.body;
+    const { url, spreadsheetId, rowNumber, priority } = req.body;
 
     if (!url) {
       return res.status(400).json({
@@ -439,25 +726,23 @@ app.post('/api/auto-scrape', async (req, res) => {
       });
     }
 
-    // ジョブIDを生成
-    const jobId = `job_${Date.now()}_${Math.random().toString(36).substring(7)}`;
+    // キューに登録（進捗は GET /api/jobs/:jobId または /events で参照）
+    const job = await jobQueue.enqueue('auto-scrape', { url, spreadsheetId, rowNumber }, {
+      priority: parseInt(priority, 10) || 0
+    });
+    const jobId = job.id;
 
     antiBotService.logger.info(`Auto-scraping job ${jobId} queued for: ${url}`);
 
-    // 即座にレスポンスを返す
     res.json({
       success: true,
-      message: 'Processing started',
+      message: 'Processing queued',
       jobId,
-      status: 'processing'
+      status: job.status,
+      statusUrl: `/api/jobs/${jobId}`,
+      eventsUrl: `/api/jobs/${jobId}/events`
     });
 
-    // バックグラウンドで処理を実行
-    processAutoScrape(jobId, url, spreadsheetId, rowNumber)
-      .catch(error => {
-        antiBotService.logger.error(`Job ${jobId} failed: ${error.message}`);
-      });
-
   } catch (error) {
     antiBotService.logger.error(`Auto-scrape request failed: ${error.message}`);
     res.status(500).json({
@@ -467,23 +752,67 @@ app.post('/api/auto-scrape', async (req, res) => {
   }
 });
 
+/**
+ * ジョブとして登録し、202 で jobId を返す
+ * @param {Response} res
+ * @param {string} type
+ * @param {function} fn - (progress) => Promise<result>
+ */
+function submitJob(res, type, fn) {
+  const job = jobManager.createJob(type);
+
+  res.status(202).json({
+    success: true,
+    jobId: job.id,
+    status: job.status,
+    statusUrl: `/api/jobs/${job.id}`,
+    eventsUrl: `/api/jobs/${job.id}/events`
+  });
+
+  jobManager.runJob(job.id, fn);
+}
+
+// 自動スクレイピングのステップ数（解析・生成・実行・スクリーンショット・シート書き込み）
+const AUTO_SCRAPE_STEPS = 5;
+
+/**
+ * ジョブキューの処理を登録（JobQueue の読み込み時に1回呼ばれる）
+ * 自動スクレイピングはジョブキュー経由で実行する（失敗時はキューがリトライする）
+ * @param {JobQueue} queue
+ */
+function registerQueueHandlers(queue) {
+  queue.registerHandler('auto-scrape', (payload, { jobId, progress, isFinalAttempt }) =>
+    processAutoScrape(jobId, payload.url, payload.spreadsheetId, payload.rowNumber, progress, isFinalAttempt),
+  AUTO_SCRAPE_STEPS);
+}
+
 /**
  * バックグラウンド処理: 完全自動スクレイピングパイプライン
+ * @param {function} progress - (step, message) で進捗を報告
+ * @param {boolean} isFinalAttempt - 最後の試行か（リトライが残っている場合はシートにエラーを書き込まない）
+ * @returns {object} スクレイパーIDと取得件数
  */
-async function processAutoScrape(jobId, url, spreadsheetId, rowNumber) {
+async function processAutoScrape(jobId, url, spreadsheetId, rowNumber, progress = () => {}, isFinalAttempt = true) {
   try {
     antiBotService.logger.info(`[${jobId}] Starting auto-scrape for: ${url}`);
 
     // ステップ1: ページ解析
     antiBotService.logger.info(`[${jobId}] Step 1: Analyzing page...`);
+    progress(1, 'Analyzing page...');
     const analysisResult = await pageAnalyzer.analyzePage(url);
 
     if (!analysisResult.success) {
       throw new Error('Page analysis failed');
     }
 
+    // 解析済みのテンプレートでは AI を呼ばずにキャッシュの提案・コードを使う
+    if (analysisResult.cache?.hit) {
+      antiBotService.logger.info(`[${jobId}] Warm template ${analysisResult.cache.template}, skipping AI analysis`);
+    }
+
     // ステップ2: コード生成
     antiBotService.logger.info(`[${jobId}] Step 2: Generating code...`);
+    progress(2, 'Generating code...');
     const codeGenParams = {
       url,
       targets: analysisResult.suggestions || [],
@@ -498,13 +827,19 @@ async function processAutoScrape(jobId, url, spreadsheetId, rowNumber) {
     if (!generatedCode.success) {
       throw new Error('Code generation failed');
     }
+    if (generatedCode.cached) {
+      antiBotService.logger.info(`[${jobId}] Reused cached scraper code`);
+    }
 
     // ステップ3: スクレイパー実行
     antiBotService.logger.info(`[${jobId}] Step 3: Executing scraper...`);
+    progress(3, 'Executing scraper...');
     const executionParams = {
       code: generatedCode.code,
       url,
       targets: codeGenParams.targets,
+      // ページネーションを検出した場合は全ページ（最大 PAGINATION_MAX_PAGES）を取得
+      pagination: analysisResult.pagination?.detected ? analysisResult.pagination : null,
       saveOutput: true,
       outputFormat: 'json'
     };
@@ -517,83 +852,61 @@ async function processAutoScrape(jobId, url, spreadsheetId, rowNumber) {
 
     // ステップ4: スクリーンショット保存
     antiBotService.logger.info(`[${jobId}] Step 4: Saving screenshot...`);
+    progress(4, 'Saving screenshot...');
     const screenshot = analysisResult.screenshot;
     let screenshotUrl = '';
 
     if (screenshot) {
-      const screenshotBuffer = Buffer.from(screenshot, 'base64');
       const fileName = `screenshot_${Date.now()}.png`;
-      screenshotUrl = await sheetIntegration.uploadScreenshot(screenshotBuffer, fileName);
+      screenshotUrl = await sheetIntegration.uploadArtifact(screenshot.id, fileName);
     }
 
     // ステップ5: スプレッドシートに結果を書き込む
+    // 取得件数（列はレコード単位に揃っているため、行数を件数とする）
+    const data = executionResult.data?.data || {};
+    const dataCount = Math.max(0, ...Object.values(data).map(values => values.length));
+
     if (spreadsheetId && rowNumber) {
       antiBotService.logger.info(`[${jobId}] Step 5: Writing results to spreadsheet...`);
-      const data = executionResult.data?.data || {};
-      const dataCount = Object.values(data).reduce((sum, arr) => sum + arr.length, 0);
+      progress(5, 'Writing results to spreadsheet...');
 
-      await sheetIntegration.writeResult(spreadsheetId, rowNumber, {
+      // 結果と背景色は他のジョブの書き込みとまとめて送信される
+      await sheetIntegration.writeRow(spreadsheetId, rowNumber, {
         status: '完了',
         dataCount,
         screenshotUrl,
         dataUrl: executionResult.outputFile || '',
         scraperId: executionResult.scraperId
-      });
-
-      await sheetIntegration.updateRowColor(spreadsheetId, rowNumber, 'green');
+      }, 'green');
     }
 
     antiBotService.logger.info(`[${jobId}] ✅ Auto-scrape completed successfully!`);
 
+    return {
+      scraperId: executionResult.scraperId,
+      dataCount,
+      screenshotUrl
+    };
+
   } catch (error) {
     antiBotService.logger.error(`[${jobId}] ❌ Auto-scrape failed: ${error.message}`);
 
     // エラーをスプレッドシートに記録
-    if (spreadsheetId && rowNumber) {
+    if (spreadsheetId && rowNumber && isFinalAttempt) {
       try {
-        await sheetIntegration.writeResult(spreadsheetId, rowNumber, {
+        await sheetIntegration.writeRow(spreadsheetId, rowNumber, {
           status: 'エラー',
           dataCount: 0,
           screenshotUrl: '',
           dataUrl: `Error: ${error.message}`,
           scraperId: jobId
-        });
-        await sheetIntegration.updateRowColor(spreadsheetId, rowNumber, 'red');
+        }, 'red');
       } catch (writeError) {
         antiBotService.logger.error(`[${jobId}] Failed to write error to sheet: ${writeError.message}`);
       }
     }
-  }
-}
 
-/**
- * Webhook処理用の内部関数
- */
-async function processWebhookRequest(spreadsheetId, rowNumber, targetUrl, purpose, requestNo) {
-  try {
-    antiBotService.logger.info(`Processing request #${requestNo}...`);
-
-    // 自動スクレイピング実行
-    const response = await fetch('http://localhost:3000/api/auto-scrape', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        url: targetUrl,
-        spreadsheetId,
-        rowNumber
-      })
-    });
-
-    const result = await response.json();
-
-    if (result.success) {
-      antiBotService.logger.info(`Request #${requestNo} completed successfully`);
-    } else {
-      antiBotService.logger.error(`Request #${requestNo} failed: ${result.error}`);
-    }
-
-  } catch (error) {
-    antiBotService.logger.error(`Webhook processing error for #${requestNo}: ${error.message}`);
+    throw error;
   }
 }
 
@@ -614,9 +927,34 @@ app.use((req, res) => {
   });
 });
 
-// サーバー起動
-app.listen(PORT, () => {
-  console.log(`
+/**
+ * サービスを初回使用時に読み込むプロキシ
+ * proxy[LAZY_LOADED] で読み込み済みかを確認できる（確認だけでは読み込まない）
+ * @param {function} load - サービスを返す関数（require）
+ * @param {function|null} onLoad - 読み込み直後に1回だけ呼ぶ処理
+ * @returns {Proxy}
+ */
+function lazyService(load, onLoad = null) {
+  let service = null;
+  const resolve = () => {
+    if (!service) {
+      service = load();
+      if (onLoad) onLoad(service);
+    }
+    return service;
+  };
+
+  return new Proxy({}, {
+    get: (target, prop) => (prop === LAZY_LOADED ? service !== null : Reflect.get(resolve(), prop)),
+    set: (target, prop, value) => Reflect.set(resolve(), prop, value),
+    has: (target, prop) => Reflect.has(resolve(), prop)
+  });
+}
+
+// サーバー起動（Lambda では lambda.js から読み込むため起動しない）
+if (require.main === module) {
+  app.listen(PORT, () => {
+    console.log(`
 ╔═══════════════════════════════════════════╗
 ║   AI Scraper Builder - Server Running    ║
 ╠═══════════════════════════════════════════╣
@@ -626,20 +964,35 @@ app.listen(PORT, () => {
 ╚═══════════════════════════════════════════╝
   `);
 
-  antiBotService.logger.info(`Server started on port ${PORT}`);
-});
+    antiBotService.logger.info(`Server started on port ${PORT}`);
 
-// Graceful shutdown
-process.on('SIGINT', async () => {
-  console.log('\nShutting down gracefully...');
-  await pageAnalyzer.closeBrowser();
-  process.exit(0);
-});
+    // 前回の未完了ジョブを再開
+    jobQueue.start().catch(error =>
+      antiBotService.logger.error(`Job queue start failed: ${error.message}`)
+    );
 
-process.on('SIGTERM', async () => {
-  console.log('\nShutting down gracefully...');
-  await pageAnalyzer.closeBrowser();
-  process.exit(0);
-});
+    // 最初のリクエストでブラウザ起動を待たないよう事前に起動
+    browserPool.warmUp().catch(error =>
+      antiBotService.logger.warn(`Browser pool warm-up failed: ${error.message}`)
+    );
+
+    // 生成コードの実行ワーカーを事前起動
+    workerPool.warmUp();
+  });
+
+  // Graceful shutdown（読み込み済みのサービスのみ閉じ、未使用のサービスを終了時に起動しない）
+  const shutdown = async () => {
+    console.log('\nShutting down gracefully...');
+    for (const service of [jobQueue, sheetIntegration, workerPool, browserPool]) {
+      if (service[LAZY_LOADED]) {
+        await service.close();
+      }
+    }
+    process.exit(0);
+  };
+
+  process.on('SIGINT', shutdown);
+  process.on('SIGTERM', shutdown);
+}
 
 module.exports = app;
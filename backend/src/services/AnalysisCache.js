@@ -0,0 +1,195 @@
+/**
+ * 解析・コード生成キャッシュ
+ * 同じサイトテンプレート（クエリやページ番号だけが異なるURL）の AI 解析結果と生成コードを再利用する
+ * メモリ上の LRU と data/cache 以下のファイルの2段構成で、再起動後も有効期限まで利用できる
+ */
+
+const crypto = require('crypto');
+const fs = require('fs').promises;
+const path = require('path');
+const antiBotService = require('./AntiBotService');
+const config = require('../config/antibot.config');
+
+// 数値・UUID・長い16進数のパスセグメントはテンプレート上の変数として扱う
+const VARIABLE_SEGMENTS = [
+  [/^\d+$/, '{n}'],
+  [/^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i, '{uuid}'],
+  [/^[0-9a-f]{16,}$/i, '{id}']
+];
+
+class AnalysisCache {
+  constructor() {
+    this.dir = config.cache.dir || path.join(__dirname, '../../../data/cache');
+    this.memory = new Map(); // `${namespace}:${key}` → { value, expiresAt }（挿入順 = LRU順）
+    this.stats = {};
+  }
+
+  /**
+   * URLをテンプレートに正規化（クエリは値を除いたキー名のみ、フラグメントは除去）
+   * 例: https://example.com/items/123?page=2&q=abc → https://example.com/items/{n}?page&q
+   * @param {string} url
+   * @returns {string}
+   */
+  getUrlTemplate(url) {
+    try {
+      const parsed = new URL(url);
+      const segments = parsed.pathname.split('/').filter(Boolean).map(segment => {
+        const variable = VARIABLE_SEGMENTS.find(([pattern]) => pattern.test(segment));
+        return variable ? variable[1] : segment.toLowerCase();
+      });
+      const queryKeys = Array.from(new Set(parsed.searchParams.keys())).sort();
+
+      return `${parsed.protocol}//${parsed.host.toLowerCase()}/${segments.join('/')}` +
+        (queryKeys.length > 0 ? `?${queryKeys.join('&')}` : '');
+    } catch (error) {
+      return url;
+    }
+  }
+
+  /**
+   * DOM構造のハッシュ（テキストや属性値は除き、タグ・クラス・セレクター候補のみから計算）
+   * @param {object} domStructure - PageAnalyzer.extractDOMStructure の結果
+   * @returns {string}
+   */
+  getDomHash(domStructure) {
+    const shape = (domStructure.elements || []).map(element => [
+      element.tag,
+      element.classes || [],
+      element.selectors || []
+    ]);
+    return this.hash(shape).substring(0, 16);
+  }
+
+  /**
+   * キャッシュから取得（メモリ → ファイルの順に参照し、ファイルで見つかった場合はメモリに載せる）
+   * @param {string} namespace - 'analysis' または 'code'
+   * @param {string} key
+   * @returns {any|null}
+   */
+  async get(namespace, key) {
+    if (!config.cache.enabled) return null;
+
+    const stats = this.getNamespaceStats(namespace);
+    const memoryKey = `${namespace}:${key}`;
+    const now = Date.now();
+
+    const entry = this.memory.get(memoryKey);
+    if (entry) {
+      this.memory.delete(memoryKey);
+      if (entry.expiresAt > now) {
+        this.memory.set(memoryKey, entry);
+        stats.memoryHits++;
+        return entry.value;
+      }
+    }
+
+    const filePath = this.getFilePath(namespace, key);
+    try {
+      const stored = JSON.parse(await fs.readFile(filePath, 'utf-8'));
+      if (stored.key === key && stored.expiresAt > now) {
+        this.remember(memoryKey, { value: stored.value, expiresAt: stored.expiresAt });
+        stats.diskHits++;
+        return stored.value;
+      }
+      await fs.unlink(filePath).catch(() => {});
+    } catch (error) {
+      // 未保存または読み込めないファイルはミスとして扱う
+    }
+
+    stats.misses++;
+    return null;
+  }
+
+  /**
+   * キャッシュに保存
+   * @param {string} namespace
+   * @param {string} key
+   * @param {any} value - JSONに変換できる値
+   */
+  async set(namespace, key, value) {
+    if (!config.cache.enabled) return;
+
+    const expiresAt = Date.now() + config.cache.ttl[namespace];
+    this.remember(`${namespace}:${key}`, { value, expiresAt });
+    this.getNamespaceStats(namespace).writes++;
+
+    const filePath = this.getFilePath(namespace, key);
+    try {
+      await fs.mkdir(path.dirname(filePath), { recursive: true });
+      const tmpPath = `${filePath}.${process.pid}.tmp`;
+      await fs.writeFile(tmpPath, JSON.stringify({ key, value, storedAt: Date.now(), expiresAt }), 'utf-8');
+      await fs.rename(tmpPath, filePath);
+    } catch (error) {
+      antiBotService.logger.warn(`Failed to persist ${namespace} cache entry: ${error.message}`);
+    }
+  }
+
+  /**
+   * メモリに保存し、上限を超えた古いエントリを削除
+   * @param {string} memoryKey
+   * @param {object} entry
+   */
+  remember(memoryKey, entry) {
+    this.memory.delete(memoryKey);
+    this.memory.set(memoryKey, entry);
+
+    while (this.memory.size > config.cache.memoryEntries) {
+      this.memory.delete(this.memory.keys().next().value);
+    }
+  }
+
+  /**
+   * 保存先ファイル（キーのハッシュをファイル名にする）
+   * @param {string} namespace
+   * @param {string} key
+   * @returns {string}
+   */
+  getFilePath(namespace, key) {
+    return path.join(this.dir, namespace, `${this.hash(key)}.json`);
+  }
+
+  /**
+   * 値の SHA-256
+   * @param {any} value
+   * @returns {string}
+   */
+  hash(value) {
+    return crypto.createHash('sha256')
+      .update(typeof value === 'string' ? value : JSON.stringify(value))
+      .digest('hex');
+  }
+
+  /**
+   * 名前空間ごとの統計（初回参照時に作成）
+   * @param {string} namespace
+   * @returns {object}
+   */
+  getNamespaceStats(namespace) {
+    if (!this.stats[namespace]) {
+      this.stats[namespace] = { memoryHits: 0, diskHits: 0, misses: 0, writes: 0 };
+    }
+    return this.stats[namespace];
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  getStats() {
+    const namespaces = Object.fromEntries(Object.entries(this.stats).map(([namespace, stats]) => {
+      const lookups = stats.memoryHits + stats.diskHits + stats.misses;
+      return [namespace, {
+        ...stats,
+        hitRate: lookups > 0 ? Math.round((stats.memoryHits + stats.diskHits) / lookups * 100) / 100 : null
+      }];
+    }));
+
+    return {
+      enabled: config.cache.enabled,
+      memoryEntries: this.memory.size,
+      ...namespaces
+    };
+  }
+}
+
+module.exports = new AnalysisCache();
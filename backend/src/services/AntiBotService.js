@@ -5,13 +5,14 @@
 
 const config = require('../config/antibot.config');
 const winston = require('winston');
+const stateStore = require('./StateStore');
 
 class AntiBotService {
   constructor() {
-    this.proxyFailures = new Map(); // プロキシの失敗回数記録
+    this.stateStore = stateStore; // レート制限・訪問済みURL・プロキシ失敗回数（config.state.backend）
     this.currentProxyIndex = 0;
-    this.requestTimestamps = new Map(); // IP別のリクエスト履歴
-    this.visitedUrls = new Set(); // 訪問済みURL
+    this.routeStats = new WeakMap(); // ページ別のリソース遮断統計
+    this.hostThrottle = new Map(); // ホスト別のリクエスト間隔（AutoThrottle）
 
     // ロガー設定
     this.logger = winston.createLogger({
@@ -45,8 +46,15 @@ class AntiBotService {
    * @returns {number}
    */
   getTimeAdjustedDelay() {
-    let baseDelay = this.getRandomDelay();
+    return this.applyTimeBasedBehavior(this.getRandomDelay());
+  }
 
+  /**
+   * 待機時間に時間帯による倍率を適用
+   * @param {number} baseDelay - 待機時間（ミリ秒）
+   * @returns {number}
+   */
+  applyTimeBasedBehavior(baseDelay) {
     if (!config.timing.timeBasedBehavior.enabled) {
       return baseDelay;
     }
@@ -69,6 +77,97 @@ class AntiBotService {
     return Math.floor(baseDelay);
   }
 
+  /**
+   * ホストのスロットリング状態を取得（未登録なら初期化）
+   * @param {string} host
+   * @returns {object}
+   */
+  getThrottleState(host) {
+    if (!this.hostThrottle.has(host)) {
+      const { startDelay, minDelay, maxDelay } = config.timing.autoThrottle;
+      this.hostThrottle.set(host, {
+        delay: Math.min(Math.max(startDelay, minDelay), maxDelay),
+        latency: null,
+        nextSlotAt: 0,
+        responses: 0,
+        backoffs: 0
+      });
+    }
+    return this.hostThrottle.get(host);
+  }
+
+  /**
+   * 同一ホストへの次のリクエスト枠まで待機（AutoThrottle）
+   * 同時に呼ばれた場合も枠を先に予約するため、間隔は呼び出し順に確保される
+   * @param {string} url
+   */
+  async waitForThrottle(url) {
+    if (!config.timing.autoThrottle.enabled) {
+      await this.sleep(this.getTimeAdjustedDelay());
+      return;
+    }
+
+    const state = this.getThrottleState(new URL(url).hostname);
+    // 人間らしさのため 0.5〜1.5倍のゆらぎを加える
+    const interval = this.applyTimeBasedBehavior(state.delay * (0.5 + Math.random()));
+    const now = Date.now();
+    const startAt = Math.max(now, state.nextSlotAt);
+    state.nextSlotAt = startAt + interval;
+
+    if (startAt > now) {
+      this.logger.debug(`AutoThrottle: waiting ${startAt - now}ms for ${url}`);
+      await this.sleep(startAt - now);
+    }
+  }
+
+  /**
+   * レスポンス時間とステータスを記録し、ホストのリクエスト間隔を調整
+   * 成功時はレスポンス時間/目標同時数へ平滑化して近づけ、エラー応答で間隔を縮めることはない
+   * @param {string} url
+   * @param {number} latency - レスポンス時間（ミリ秒）
+   * @param {number} statusCode
+   */
+  recordResponse(url, latency, statusCode = 200) {
+    const throttle = config.timing.autoThrottle;
+    const host = new URL(url).hostname;
+    const state = this.getThrottleState(host);
+
+    state.responses++;
+    state.latency = state.latency === null ? latency : (state.latency + latency) / 2;
+
+    if (throttle.backoffStatuses.includes(statusCode)) {
+      this.recordThrottleError(url, statusCode);
+      return;
+    }
+
+    const targetDelay = latency / throttle.targetConcurrency;
+    const newDelay = Math.min(
+      Math.max(targetDelay, (state.delay + targetDelay) / 2, throttle.minDelay),
+      throttle.maxDelay
+    );
+
+    if (statusCode >= 400 && newDelay <= state.delay) return;
+
+    this.logger.debug(`AutoThrottle ${host}: latency ${latency}ms, status ${statusCode}, delay ${Math.round(state.delay)}ms -> ${Math.round(newDelay)}ms`);
+    state.delay = newDelay;
+  }
+
+  /**
+   * 混雑・通信エラー時にホストのリクエスト間隔を広げる
+   * @param {string} url
+   * @param {number|null} statusCode
+   */
+  recordThrottleError(url, statusCode = null) {
+    const throttle = config.timing.autoThrottle;
+    const host = new URL(url).hostname;
+    const state = this.getThrottleState(host);
+
+    state.backoffs++;
+    const newDelay = Math.min(state.delay * throttle.backoffFactor, throttle.maxDelay);
+    this.logger.info(`AutoThrottle ${host}: backing off (${statusCode || 'error'}), delay ${Math.round(state.delay)}ms -> ${Math.round(newDelay)}ms`);
+    state.delay = newDelay;
+  }
+
   /**
    * 待機処理
    * @param {number} ms - 待機時間（ミリ秒）
@@ -108,19 +207,20 @@ class AntiBotService {
    * 次のプロキシを取得（ローテーション）
    * @returns {string|null}
    */
-  getNextProxy() {
+  async getNextProxy() {
     if (!config.proxy.enabled || config.proxy.list.length === 0) {
       return null;
     }
 
+    const failureCounts = await this.stateStore.getFailureCounts();
     const availableProxies = config.proxy.list.filter(proxy => {
-      const failures = this.proxyFailures.get(proxy) || 0;
+      const failures = failureCounts.get(proxy) || 0;
       return failures < config.proxy.maxFailures;
     });
 
     if (availableProxies.length === 0) {
       this.logger.warn('All proxies have failed. Resetting failure counts.');
-      this.proxyFailures.clear();
+      await this.stateStore.resetFailures();
       return config.proxy.list[0];
     }
 
@@ -133,54 +233,53 @@ class AntiBotService {
   }
 
   /**
-   * プロキシの失敗を記録
+   * プロキシの失敗を記録（最後の失敗から cooldownPeriod 経過すると回数はリセットされる）
    * @param {string} proxy
    */
-  recordProxyFailure(proxy) {
-    const failures = (this.proxyFailures.get(proxy) || 0) + 1;
-    this.proxyFailures.set(proxy, failures);
+  async recordProxyFailure(proxy) {
+    const failures = await this.stateStore.recordFailure(proxy, config.proxy.cooldownPeriod);
 
     if (failures >= config.proxy.maxFailures) {
       this.logger.warn(`Proxy ${proxy} exceeded max failures (${failures}). Temporarily disabled.`);
-
-      // クールダウン後にリセット
-      setTimeout(() => {
-        this.proxyFailures.delete(proxy);
-        this.logger.info(`Proxy ${proxy} re-enabled after cooldown.`);
-      }, config.proxy.cooldownPeriod);
     }
   }
 
   /**
-   * レート制限チェック
-   * @param {string} identifier - IP or Proxy identifier
+   * レート制限チェック（上限内なら1件として記録する）
+   * @param {string} identifier - 'host:<ホスト>' や 'proxy:<プロキシ>' などのキー
    * @returns {boolean}
    */
-  checkRateLimit(identifier) {
-    const now = Date.now();
-    const timestamps = this.requestTimestamps.get(identifier) || [];
-
-    // 古いタイムスタンプを削除（1時間以上前）
-    const recentTimestamps = timestamps.filter(ts => now - ts < 3600000);
-
-    // 1分間のリクエスト数チェック
-    const lastMinute = recentTimestamps.filter(ts => now - ts < 60000);
-    if (lastMinute.length >= config.proxy.rateLimit.requestsPerMinute) {
-      this.logger.warn(`Rate limit exceeded for ${identifier} (per minute)`);
-      return false;
+  async checkRateLimit(identifier) {
+    const { requestsPerMinute, requestsPerHour } = config.proxy.rateLimit;
+    const result = await this.stateStore.consume(identifier, [
+      { windowMs: 60000, max: requestsPerMinute },
+      { windowMs: 3600000, max: requestsPerHour }
+    ]);
+
+    if (!result.allowed) {
+      const period = result.windowMs === 60000 ? 'per minute' : 'per hour';
+      this.logger.warn(`Rate limit exceeded for ${identifier} (${period}, retry in ${Math.ceil(result.retryAfterMs / 1000)}s)`);
     }
 
-    // 1時間のリクエスト数チェック
-    if (recentTimestamps.length >= config.proxy.rateLimit.requestsPerHour) {
-      this.logger.warn(`Rate limit exceeded for ${identifier} (per hour)`);
-      return false;
-    }
+    return result.allowed;
+  }
 
-    // タイムスタンプを記録
-    recentTimestamps.push(now);
-    this.requestTimestamps.set(identifier, recentTimestamps);
+  /**
+   * 接続先ホストと送信元（プロキシ、未使用時は 'local'）の両方のレート制限をチェック
+   * @param {string} url
+   * @param {string|null} proxy
+   * @returns {boolean}
+   */
+  async checkRequestRateLimit(url, proxy = null) {
+    let host;
+    try {
+      host = new URL(url).host;
+    } catch (error) {
+      host = url;
+    }
 
-    return true;
+    return await this.checkRateLimit(`host:${host}`) &&
+      await this.checkRateLimit(`proxy:${proxy || 'local'}`);
   }
 
   /**
@@ -248,6 +347,122 @@ class AntiBotService {
     this.logger.debug('Stealth scripts injected successfully');
   }
 
+  /**
+   * サイト単位の上書きを反映したリソース遮断ポリシーを取得
+   * @param {string|null} site - ホスト名
+   * @param {object} overrides - 実行単位の上書き設定
+   * @returns {object}
+   */
+  resolveRoutePolicy(site = null, overrides = {}) {
+    const { sites = {}, ...base } = config.browser.resourceBlocking;
+    return {
+      ...base,
+      ...overrides,
+      ...(site && sites[site] ? sites[site] : {})
+    };
+  }
+
+  /**
+   * リクエストを遮断すべきか判定（ドキュメント本体は常に通過）
+   * @param {string} url
+   * @param {string} resourceType
+   * @param {object} policy
+   * @returns {boolean}
+   */
+  shouldBlockRequest(url, resourceType, policy) {
+    if (!policy.enabled || resourceType === 'document') return false;
+    if (policy.allowUrlPatterns.some(pattern => url.includes(pattern))) return false;
+    return policy.blockResourceTypes.includes(resourceType) ||
+      policy.blockUrlPatterns.some(pattern => url.includes(pattern));
+  }
+
+  /**
+   * コンテキストにリソース遮断ポリシーを適用（context.route）
+   * 統計とサイト判定はページ単位で、beginRouteStats() で開始する
+   * @param {BrowserContext} context
+   * @param {object} overrides - 実行単位の上書き設定
+   */
+  async applyRoutePolicy(context, overrides = {}) {
+    if (!this.resolveRoutePolicy(null, overrides).enabled) return;
+
+    const pageOf = (request) => {
+      try {
+        return request.frame().page();
+      } catch (error) {
+        return null; // Service Worker からのリクエスト
+      }
+    };
+
+    await context.route('**/*', async (route) => {
+      const request = route.request();
+      const stats = this.routeStats.get(pageOf(request));
+      const policy = stats ? stats.policy : this.resolveRoutePolicy(null, overrides);
+
+      if (!stats?.bypass && this.shouldBlockRequest(request.url(), request.resourceType(), policy)) {
+        if (stats) {
+          stats.blockedRequests++;
+          stats.blockedByType[request.resourceType()] = (stats.blockedByType[request.resourceType()] || 0) + 1;
+        }
+        if (!policy.dryRun) {
+          return route.abort('blockedbyclient');
+        }
+      }
+      return route.continue();
+    });
+
+    context.on('requestfinished', async (request) => {
+      const stats = this.routeStats.get(pageOf(request));
+      if (!stats) return;
+
+      try {
+        const sizes = await request.sizes();
+        const size = sizes.responseBodySize + sizes.responseHeadersSize;
+        if (stats.policy.dryRun && !stats.bypass &&
+            this.shouldBlockRequest(request.url(), request.resourceType(), stats.policy)) {
+          stats.savedBytes += size;
+        } else {
+          stats.loadedRequests++;
+          stats.loadedBytes += size;
+        }
+      } catch (error) {
+        this.logger.debug(`Could not read request sizes: ${error.message}`);
+      }
+    });
+  }
+
+  /**
+   * ページ単位のリソース遮断統計を開始
+   * @param {Page} page
+   * @param {string} url - 対象URL（サイト単位設定の判定に使用）
+   * @param {object} options - { bypass: 遮断しない, overrides: 実行単位の上書き設定 }
+   */
+  beginRouteStats(page, url, { bypass = false, overrides = {} } = {}) {
+    const site = new URL(url).hostname;
+    this.routeStats.set(page, {
+      site,
+      bypass,
+      policy: this.resolveRoutePolicy(site, overrides),
+      blockedRequests: 0,
+      blockedByType: {},
+      savedBytes: 0,
+      loadedRequests: 0,
+      loadedBytes: 0
+    });
+  }
+
+  /**
+   * ページ単位のリソース遮断統計を取得
+   * @param {Page} page
+   * @returns {object|null}
+   */
+  getRouteStats(page) {
+    const stats = this.routeStats.get(page);
+    if (!stats) return null;
+
+    const { policy, ...summary } = stats;
+    return { ...summary, dryRun: !!policy.dryRun, enabled: !!policy.enabled };
+  }
+
   /**
    * 人間らしいマウス移動を実行
    * @param {Page} page
@@ -307,18 +522,18 @@ class AntiBotService {
    * @param {string} url
    * @returns {boolean}
    */
-  isUrlVisited(url) {
+  async isUrlVisited(url) {
     if (!config.misc.trackVisitedUrls) return false;
-    return this.visitedUrls.has(url);
+    return await this.stateStore.isVisited(url);
   }
 
   /**
    * URLを訪問済みとしてマーク
    * @param {string} url
    */
-  markUrlVisited(url) {
+  async markUrlVisited(url) {
     if (config.misc.trackVisitedUrls) {
-      this.visitedUrls.add(url);
+      await this.stateStore.markVisited(url);
     }
   }
 
@@ -338,12 +553,25 @@ class AntiBotService {
    * 統計情報を取得
    * @returns {object}
    */
-  getStats() {
+  async getStats() {
+    const { backend, visitedUrls, rateLimitWindows, proxyFailures } = await this.stateStore.getStats();
+    const disabledProxies = proxyFailures.filter(([, count]) => count >= config.proxy.maxFailures).length;
+
     return {
-      visitedUrls: this.visitedUrls.size,
-      activeProxies: config.proxy.list.length - this.proxyFailures.size,
+      visitedUrls,
+      activeProxies: config.proxy.list.length - disabledProxies,
       totalProxies: config.proxy.list.length,
-      proxyFailures: Array.from(this.proxyFailures.entries())
+      proxyFailures,
+      stateBackend: backend,
+      rateLimitWindows,
+      throttle: Object.fromEntries(
+        Array.from(this.hostThrottle.entries()).map(([host, state]) => [host, {
+          delay: Math.round(state.delay),
+          latency: state.latency === null ? null : Math.round(state.latency),
+          responses: state.responses,
+          backoffs: state.backoffs
+        }])
+      )
     };
   }
 }
@@ -0,0 +1,101 @@
+/**
+ * アーティファクトストア
+ * スクリーンショットなどのバイナリを内容のハッシュ（SHA-256）をIDとしてファイルに保存する
+ * 同じ内容は同じIDになるため、重複して保存されず、配信時は無期限にキャッシュできる
+ */
+
+const crypto = require('crypto');
+const fs = require('fs').promises;
+const path = require('path');
+const antiBotService = require('./AntiBotService');
+const config = require('../config/antibot.config');
+
+const EXTENSIONS = {
+  'image/png': 'png',
+  'image/webp': 'webp',
+  'image/jpeg': 'jpg'
+};
+
+class ArtifactStore {
+  constructor() {
+    this.dir = config.artifacts.dir || path.join(__dirname, '../../../data/artifacts');
+    this.contentTypes = new Map(); // アーティファクトID → Content-Type
+  }
+
+  /**
+   * バイナリを保存してIDを返す（同じ内容が保存済みの場合は書き込まない）
+   * @param {Buffer} buffer
+   * @param {string} contentType - 'image/png', 'image/webp', 'image/jpeg'
+   * @returns {object} { id, contentType, bytes, url }
+   */
+  async put(buffer, contentType) {
+    const extension = EXTENSIONS[contentType];
+    if (!extension) {
+      throw new Error(`Unsupported artifact type: ${contentType}`);
+    }
+
+    const id = crypto.createHash('sha256').update(buffer).digest('hex');
+    const filePath = path.join(this.dir, `${id}.${extension}`);
+
+    try {
+      await fs.access(filePath);
+    } catch (error) {
+      await fs.mkdir(this.dir, { recursive: true });
+      // 書き込み途中のファイルを配信しないよう、一時ファイルに書いてから置き換える
+      const tmpPath = `${filePath}.${process.pid}.tmp`;
+      await fs.writeFile(tmpPath, buffer);
+      await fs.rename(tmpPath, filePath);
+      antiBotService.logger.debug(`Artifact stored: ${id}.${extension} (${buffer.length} bytes)`);
+    }
+
+    this.contentTypes.set(id, contentType);
+    return { id, contentType, bytes: buffer.length, url: `/api/artifacts/${id}` };
+  }
+
+  /**
+   * スクリーンショットと縮小版を保存
+   * @param {Buffer} screenshot - PNG
+   * @param {Buffer|null} thumbnail - 縮小版（config.artifacts.thumbnail.format）
+   * @returns {object} { id, url, bytes, thumbnailId, thumbnailUrl, thumbnailBytes }
+   */
+  async putScreenshot(screenshot, thumbnail = null) {
+    const original = await this.put(screenshot, 'image/png');
+    const result = { id: original.id, url: original.url, bytes: original.bytes };
+
+    if (thumbnail) {
+      const small = await this.put(thumbnail, `image/${config.artifacts.thumbnail.format}`);
+      Object.assign(result, { thumbnailId: small.id, thumbnailUrl: small.url, thumbnailBytes: small.bytes });
+    }
+
+    return result;
+  }
+
+  /**
+   * 保存済みアーティファクトのファイルパスと Content-Type を取得
+   * @param {string} id
+   * @returns {object|null} { filePath, contentType }
+   */
+  async locate(id) {
+    if (!/^[a-f0-9]{64}$/.test(id)) {
+      return null;
+    }
+
+    const known = this.contentTypes.get(id);
+    const candidates = known ? [known] : Object.keys(EXTENSIONS);
+
+    for (const contentType of candidates) {
+      const filePath = path.join(this.dir, `${id}.${EXTENSIONS[contentType]}`);
+      try {
+        await fs.access(filePath);
+        this.contentTypes.set(id, contentType);
+        return { filePath, contentType };
+      } catch (error) {
+        // 次の拡張子を試す
+      }
+    }
+
+    return null;
+  }
+}
+
+module.exports = new ArtifactStore();
@@ -0,0 +1,411 @@
+/**
+ * ブラウザプールサービス
+ * 起動済みのブラウザを保持し、ジョブごとに新しいコンテキストを貸し出す
+ * （ジョブのたびに Chromium を起動する 1〜2 秒を省く）
+ * 一定ページ数の処理後やメモリ増加時にブラウザを入れ替え、定期的に応答を確認する
+ */
+
+const fs = require('fs');
+const antiBotService = require('./AntiBotService');
+const metricsService = require('./MetricsService');
+const config = require('../config/antibot.config');
+
+// Lambda環境判定
+const isLambda = !!process.env.AWS_LAMBDA_FUNCTION_NAME || !!process.env.AWS_EXECUTION_ENV;
+
+// Playwright / Chromium は最初の起動時に読み込む（ブラウザを使わない Lambda 呼び出しのコールドスタートで読み込まない）
+let chromium, playwright;
+function loadBrowserRuntime() {
+  if (playwright) return;
+
+  if (isLambda) {
+    // Lambda環境: 軽量版Chromiumを使用
+    chromium = require('@sparticuz/chromium');
+    playwright = require('playwright-core');
+  } else {
+    // ローカル環境: 通常のPlaywright
+    const pw = require('playwright');
+    chromium = pw.chromium;
+    playwright = pw;
+  }
+}
+
+class BrowserPool {
+  constructor() {
+    const { poolSize, maxConcurrent, browserPool } = config.concurrency;
+    this.maxConcurrent = maxConcurrent; // 同時に貸し出すコンテキスト数の上限
+    this.maxBrowsers = Math.max(1, Math.min(poolSize, maxConcurrent)); // 同時実行数を超えるブラウザは使われない
+    this.options = browserPool;
+
+    this.browsers = []; // { id, browser, launching, activeContexts, pagesServed, rssMB, retiring, launchedAt }
+    this.activeContexts = 0;
+    this.waiters = []; // 空き待ちの resolve（FIFO）
+    this.nextBrowserId = 1;
+    this.healthTimer = null;
+    this.counters = { launched: 0, recycled: 0, unhealthy: 0, leases: 0 };
+  }
+
+  /**
+   * 新しいコンテキストを借りる（同時実行数の上限に達している場合は空くまで待つ）
+   * 使用後は必ず release() で返却する
+   * @returns {object} { context, browserId, release }
+   */
+  async acquire() {
+    await this.waitForSlot();
+
+    let entry = null;
+    try {
+      entry = await this.pickBrowser();
+      entry.activeContexts++;
+
+      const context = await entry.browser.newContext({
+        ...config.browser.contextOptions,
+        extraHTTPHeaders: antiBotService.generateHeaders()
+      });
+      context.on('page', () => { entry.pagesServed++; });
+
+      // 不要なサブリソース（画像・フォント・解析ビーコン等）を遮断
+      await antiBotService.applyRoutePolicy(context);
+
+      this.counters.leases++;
+      let released = false;
+      return {
+        context,
+        browserId: entry.id,
+        release: async () => {
+          if (released) return;
+          released = true;
+          await this.release(entry, context);
+        }
+      };
+    } catch (error) {
+      if (entry) {
+        entry.activeContexts--;
+        if (!entry.browser || !entry.browser.isConnected()) {
+          await this.retire(entry, 'unhealthy');
+        }
+      }
+      this.releaseSlot();
+      throw error;
+    }
+  }
+
+  /**
+   * コンテキストを閉じて返却し、入れ替え条件を満たしたブラウザを閉じる
+   * @param {object} entry
+   * @param {BrowserContext} context
+   */
+  async release(entry, context) {
+    try {
+      await context.close();
+    } catch (error) {
+      antiBotService.logger.warn(`Failed to close browser context: ${error.message}`);
+    }
+
+    entry.activeContexts--;
+    this.releaseSlot();
+
+    if (!entry.retiring) {
+      const { maxPagesPerBrowser, maxMemoryMB } = this.options;
+      if (entry.pagesServed >= maxPagesPerBrowser) {
+        entry.retiring = 'pages';
+      } else if (maxMemoryMB && await this.measureMemory(entry) > maxMemoryMB) {
+        entry.retiring = 'memory';
+      }
+    }
+
+    if (entry.retiring && entry.activeContexts === 0) {
+      await this.retire(entry, entry.retiring);
+    }
+  }
+
+  /**
+   * 貸出枠が空くまで待機
+   */
+  async waitForSlot() {
+    if (this.activeContexts < this.maxConcurrent) {
+      this.activeContexts++;
+      return;
+    }
+    // 枠は返却側で引き継がれるため、ここではカウントしない
+    await new Promise(resolve => this.waiters.push(resolve));
+  }
+
+  /**
+   * 貸出枠を返却（待機中のジョブがあれば枠をそのまま引き継ぐ）
+   */
+  releaseSlot() {
+    const next = this.waiters.shift();
+    if (next) {
+      next();
+    } else {
+      this.activeContexts--;
+    }
+  }
+
+  /**
+   * 貸し出すブラウザを選択（稼働中のコンテキストが最も少ないもの。上限までは新たに起動する）
+   * @returns {object} entry
+   */
+  async pickBrowser() {
+    const available = this.browsers.filter(entry => !entry.retiring);
+    const idle = available.find(entry => entry.activeContexts === 0);
+
+    if (!idle && this.browsers.length < this.maxBrowsers) {
+      return await this.launch();
+    }
+
+    const entry = idle || available.reduce((best, candidate) =>
+      (!best || candidate.activeContexts < best.activeContexts ? candidate : best), null);
+
+    if (!entry) {
+      // すべて入れ替え待ちで上限に達している場合は、上限を一時的に超えて起動する
+      return await this.launch();
+    }
+
+    await entry.launching;
+    return entry;
+  }
+
+  /**
+   * ブラウザを起動してプールに追加
+   * @returns {object} entry
+   */
+  async launch() {
+    const entry = {
+      id: this.nextBrowserId++,
+      browser: null,
+      launching: null,
+      activeContexts: 0,
+      pagesServed: 0,
+      rssMB: null,
+      retiring: null,
+      launchedAt: null
+    };
+    this.browsers.push(entry);
+
+    entry.launching = metricsService.span('browser_pool', 'browser_launch', () => this.launchBrowser())
+      .then(browser => {
+        entry.browser = browser;
+        entry.launchedAt = Date.now();
+        browser.on('disconnected', () => {
+          if (!entry.retiring) {
+            antiBotService.logger.warn(`Pooled browser #${entry.id} disconnected`);
+            this.counters.unhealthy++;
+          }
+          this.remove(entry);
+        });
+      });
+
+    try {
+      await entry.launching;
+    } catch (error) {
+      this.remove(entry);
+      throw error;
+    }
+
+    this.counters.launched++;
+    this.startHealthChecks();
+    antiBotService.logger.info(`Pooled browser #${entry.id} launched (${this.browsers.length}/${this.maxBrowsers})`);
+    return entry;
+  }
+
+  /**
+   * Chromium を起動
+   * @returns {Browser}
+   */
+  async launchBrowser() {
+    loadBrowserRuntime();
+
+    if (isLambda) {
+      // Lambda環境
+      return await playwright.chromium.launch({
+        args: chromium.args,
+        executablePath: await chromium.executablePath(),
+        headless: chromium.headless
+      });
+    }
+
+    // ローカル環境（Docker/ECS含む）
+    const launchOptions = {
+      headless: config.browser.headless,
+      ...config.browser.launchOptions
+    };
+
+    // システムChromiumを使用（Docker/ECS環境対応）
+    const systemChromiumPath = '/usr/bin/chromium';
+    if (fs.existsSync(systemChromiumPath)) {
+      launchOptions.executablePath = systemChromiumPath;
+      antiBotService.logger.info(`Using system Chromium at ${systemChromiumPath}`);
+    }
+
+    return await chromium.launch(launchOptions);
+  }
+
+  /**
+   * ブラウザをプールから外して閉じる
+   * @param {object} entry
+   * @param {string} reason - 'pages', 'memory', 'unhealthy', 'shutdown'
+   */
+  async retire(entry, reason) {
+    entry.retiring = entry.retiring || reason;
+    this.remove(entry);
+
+    if (reason === 'pages' || reason === 'memory') {
+      this.counters.recycled++;
+    }
+    antiBotService.logger.info(`Recycling pooled browser #${entry.id} (${reason}, ${entry.pagesServed} pages)`);
+
+    try {
+      if (entry.browser) {
+        await entry.browser.close();
+      }
+    } catch (error) {
+      antiBotService.logger.warn(`Failed to close pooled browser #${entry.id}: ${error.message}`);
+    }
+  }
+
+  /**
+   * プールの一覧から削除
+   * @param {object} entry
+   */
+  remove(entry) {
+    const index = this.browsers.indexOf(entry);
+    if (index !== -1) {
+      this.browsers.splice(index, 1);
+    }
+  }
+
+  /**
+   * ブラウザ（全プロセス）の常駐メモリを計測（MB）
+   * CDP でプロセスIDを取得し /proc から合計するため、Linux 以外では null
+   * @param {object} entry
+   * @returns {number|null}
+   */
+  async measureMemory(entry) {
+    if (process.platform !== 'linux' || !entry.browser) {
+      return null;
+    }
+
+    let session = null;
+    try {
+      session = await entry.browser.newBrowserCDPSession();
+      const { processInfo } = await session.send('SystemInfo.getProcessInfo');
+
+      let rssKB = 0;
+      for (const { id } of processInfo) {
+        try {
+          const status = await fs.promises.readFile(`/proc/${id}/status`, 'utf8');
+          const match = status.match(/^VmRSS:\s+(\d+) kB/m);
+          if (match) rssKB += parseInt(match[1], 10);
+        } catch (error) {
+          // 計測中に終了したプロセスは無視
+        }
+      }
+
+      entry.rssMB = Math.round(rssKB / 1024);
+      return entry.rssMB;
+    } catch (error) {
+      antiBotService.logger.debug(`Browser memory measurement failed: ${error.message}`);
+      return null;
+    } finally {
+      if (session) {
+        await session.detach().catch(() => {});
+      }
+    }
+  }
+
+  /**
+   * 定期ヘルスチェックを開始（プロセス終了を妨げないよう unref する）
+   */
+  startHealthChecks() {
+    if (this.healthTimer || !this.options.healthCheckInterval) return;
+
+    this.healthTimer = setInterval(() => {
+      this.checkHealth().catch(error =>
+        antiBotService.logger.warn(`Browser pool health check failed: ${error.message}`)
+      );
+    }, this.options.healthCheckInterval);
+    this.healthTimer.unref();
+  }
+
+  /**
+   * 待機中のブラウザの応答とメモリを確認し、異常なものを入れ替える
+   */
+  async checkHealth() {
+    for (const entry of [...this.browsers]) {
+      if (!entry.browser || entry.retiring) continue;
+
+      let healthy = entry.browser.isConnected();
+      if (healthy) {
+        try {
+          await Promise.race([
+            entry.browser.newBrowserCDPSession().then(session => session.detach()),
+            new Promise((_, reject) => setTimeout(() => reject(new Error('timeout')), this.options.healthCheckTimeout))
+          ]);
+        } catch (error) {
+          healthy = false;
+        }
+      }
+
+      if (!healthy) {
+        this.counters.unhealthy++;
+        entry.retiring = 'unhealthy';
+      } else if (this.options.maxMemoryMB && await this.measureMemory(entry) > this.options.maxMemoryMB) {
+        entry.retiring = 'memory';
+      }
+
+      if (entry.retiring && entry.activeContexts === 0) {
+        await this.retire(entry, entry.retiring);
+      }
+    }
+  }
+
+  /**
+   * 指定数のブラウザを事前に起動
+   * @param {number} count
+   */
+  async warmUp(count = this.options.warmBrowsers) {
+    const target = Math.min(count, this.maxBrowsers);
+    while (this.browsers.length < target) {
+      await this.launch();
+    }
+  }
+
+  /**
+   * すべてのブラウザを閉じる
+   */
+  async close() {
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+      this.healthTimer = null;
+    }
+    await Promise.all([...this.browsers].map(entry => this.retire(entry, 'shutdown')));
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  getStats() {
+    return {
+      browsers: this.browsers.length,
+      maxBrowsers: this.maxBrowsers,
+      activeContexts: this.activeContexts,
+      maxConcurrent: this.maxConcurrent,
+      waiting: this.waiters.length,
+      utilization: Math.round(this.activeContexts / this.maxConcurrent * 100) / 100,
+      ...this.counters,
+      pool: this.browsers.map(entry => ({
+        id: entry.id,
+        activeContexts: entry.activeContexts,
+        pagesServed: entry.pagesServed,
+        rssMB: entry.rssMB,
+        retiring: entry.retiring,
+        uptimeSec: entry.launchedAt ? Math.round((Date.now() - entry.launchedAt) / 1000) : 0
+      }))
+    };
+  }
+}
+
+module.exports = new BrowserPool();
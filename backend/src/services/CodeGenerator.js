@@ -3,14 +3,25 @@
  * AIを使ってPlaywrightスクレイパーコードを自動生成
  */
 
-const { GoogleGenerativeAI } = require('@google/generative-ai');
 const antiBotService = require('./AntiBotService');
+const analysisCache = require('./AnalysisCache');
 const config = require('../config/antibot.config');
 
 class CodeGenerator {
   constructor() {
-    this.genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
-    this.model = this.genAI.getGenerativeModel({ model: 'gemini-2.5-flash' });
+    this.model = null; // 初回の使用時に作成（SDK の読み込みをコールドスタートから外す）
+  }
+
+  /**
+   * Gemini モデルを取得（初回のみ SDK を読み込んで作成）
+   * @returns {GenerativeModel}
+   */
+  getModel() {
+    if (!this.model) {
+      const { GoogleGenerativeAI } = require('@google/generative-ai');
+      this.model = new GoogleGenerativeAI(process.env.GEMINI_API_KEY).getGenerativeModel({ model: 'gemini-2.5-flash' });
+    }
+    return this.model;
   }
 
   /**
@@ -25,10 +36,28 @@ class CodeGenerator {
       pagination = false,
       loginRequired = false,
       outputFormat = 'json', // json, csv
-      language = 'javascript' // javascript, python
+      language = 'javascript', // javascript, python
+      refresh = false // キャッシュを使わずに生成し直すか
     } = params;
 
     try {
+      // 同じテンプレート・同じ条件で生成済みのコードがあれば、URLを差し替えて再利用する
+      const cacheKey = `${analysisCache.getUrlTemplate(url)}#${analysisCache.hash({ targets, pagination, loginRequired, outputFormat, language })}`;
+      const cached = refresh ? null : await analysisCache.get('code', cacheKey);
+
+      if (cached) {
+        antiBotService.logger.info(`Code cache hit: ${cacheKey}`);
+        return {
+          success: true,
+          code: cached.code.split(cached.url).join(url),
+          language: language,
+          framework: language === 'python' ? 'playwright-python' : 'playwright',
+          targets,
+          cached: true,
+          timestamp: new Date().toISOString()
+        };
+      }
+
       const prompt = language === 'python'
         ? this.buildPythonPrompt(url, targets, pagination, loginRequired, outputFormat)
         : this.buildPrompt(url, targets, pagination, loginRequired, outputFormat);
@@ -38,12 +67,15 @@ class CodeGenerator {
       const result = await this.callGeminiWithTimeout(prompt, timeout);
       const generatedCode = this.extractCode(result.response.text(), language);
 
+      await analysisCache.set('code', cacheKey, { url, code: generatedCode });
+
       return {
         success: true,
         code: generatedCode,
         language: language,
         framework: language === 'python' ? 'playwright-python' : 'playwright',
         targets,
+        cached: false,
         timestamp: new Date().toISOString()
       };
 
@@ -61,7 +93,7 @@ class CodeGenerator {
    */
   async callGeminiWithTimeout(prompt, timeout) {
     return Promise.race([
-      this.model.generateContent(prompt),
+      this.getModel().generateContent(prompt),
       new Promise((_, reject) =>
         setTimeout(() => reject(new Error(`Gemini API timeout after ${timeout}ms`)), timeout)
       )
@@ -0,0 +1,218 @@
+/**
+ * 抽出プランのコンパイラ
+ * 取得対象（targets）から繰り返しのレコード要素（商品カード等）を検出して抽出プランを作り、
+ * 1回の page.evaluate でレコード単位に揃った行を取得する（要素ハンドルを作らない）
+ * プランはスクレイパー（URLテンプレートと取得対象）ごとにキャッシュし、再実行時は検出を省略する
+ */
+
+const antiBotService = require('./AntiBotService');
+const analysisCache = require('./AnalysisCache');
+
+class ExtractionPlanner {
+  /**
+   * プランのキャッシュキー
+   * @param {string} url
+   * @param {array} targets
+   * @returns {string}
+   */
+  getPlanKey(url, targets) {
+    const fields = targets.map(({ label, selector, dataType }) => [label, selector, dataType]);
+    return `${analysisCache.getUrlTemplate(url)}#${analysisCache.hash(fields)}`;
+  }
+
+  /**
+   * 取得対象を列定義に変換
+   * @param {array} targets
+   * @returns {array} [{ name, selector, dataType }]
+   */
+  compileFields(targets) {
+    return targets.map(({ label, selector, dataType }) => ({
+      name: label.replace(/\s+/g, '_').toLowerCase(),
+      selector,
+      dataType: dataType || 'text'
+    }));
+  }
+
+  /**
+   * ページからレコード単位でデータを抽出
+   * @param {Page} page
+   * @param {string} url
+   * @param {array} targets
+   * @returns {object} { data: { 列名: 値の配列（行数は全列で同じ） }, plan, planCached }
+   */
+  async extract(page, url, targets) {
+    const fields = this.compileFields(targets);
+    if (fields.length === 0) {
+      return { data: {}, plan: null, planCached: false };
+    }
+
+    const planKey = this.getPlanKey(url, targets);
+    const cachedPlan = await analysisCache.get('plan', planKey);
+
+    const { plan, rows, errors, replanned } = await page.evaluate(runPlan, { fields, plan: cachedPlan });
+
+    for (const error of errors) {
+      antiBotService.logger.error(`Failed to extract ${error.name}: ${error.message}`);
+    }
+
+    // 新しく作った（または作り直した）プランを保存
+    if (!cachedPlan || replanned) {
+      await analysisCache.set('plan', planKey, plan);
+      antiBotService.logger.debug(`Extraction plan compiled: container=${plan.containerSelector || '(none)'}`);
+    }
+
+    const data = {};
+    fields.forEach((field, index) => {
+      data[field.name] = rows.map(row => row[index]);
+    });
+
+    antiBotService.logger.debug(`Extracted ${rows.length} records with ${fields.length} fields`);
+
+    return { data, plan, planCached: Boolean(cachedPlan) && !replanned };
+  }
+}
+
+/**
+ * ブラウザ内で実行: プラン（未指定または無効な場合は作成）に従ってレコードを抽出
+ * page.evaluate に渡すため、外部の変数・関数を参照しない
+ * @param {object} args - { fields, plan }
+ * @returns {object} { plan, rows, errors, replanned }
+ */
+function runPlan({ fields, plan }) {
+  const errors = [];
+
+  // 不正なセレクターの列は常に null とする
+  const valid = fields.map(field => {
+    try {
+      document.createDocumentFragment().querySelector(field.selector);
+      return true;
+    } catch (error) {
+      errors.push({ name: field.name, message: error.message });
+      return false;
+    }
+  });
+
+  const queryAll = (field, index) => (valid[index] ? Array.from(document.querySelectorAll(field.selector)) : []);
+
+  const readValue = (element, dataType) => {
+    if (!element) return null;
+
+    switch (dataType) {
+      case 'url':
+      case 'image': {
+        const value = element.getAttribute('href') || element.getAttribute('src');
+        return value ? value.trim() : null;
+      }
+      case 'number': {
+        const number = parseFloat((element.textContent || '').replace(/[^0-9.-]/g, ''));
+        return Number.isNaN(number) ? null : number;
+      }
+      default: {
+        const text = (element.textContent || '').trim();
+        return text || null;
+      }
+    }
+  };
+
+  // 最も多く一致する列の各要素について、その要素だけを含む最も外側の祖先をレコード要素とする
+  const compilePlan = () => {
+    const matches = fields.map(queryAll);
+    const anchorIndex = matches.reduce((best, list, index) => (list.length > matches[best].length ? index : best), 0);
+    const anchors = matches[anchorIndex];
+    const compiled = { containerSelector: null, scopes: fields.map(() => 'page') };
+
+    if (anchors.length < 2) {
+      return compiled;
+    }
+
+    const anchorCounts = new Map();
+    for (const anchor of anchors) {
+      for (let node = anchor; node && node !== document.body; node = node.parentElement) {
+        anchorCounts.set(node, (anchorCounts.get(node) || 0) + 1);
+      }
+    }
+
+    const containers = anchors.map(anchor => {
+      let node = anchor;
+      while (node.parentElement && node.parentElement !== document.body && anchorCounts.get(node.parentElement) === 1) {
+        node = node.parentElement;
+      }
+      return node;
+    });
+
+    // 最も多いタグ名と、そのタグのレコード要素に共通するクラスからセレクターを作る
+    const tagCounts = new Map();
+    containers.forEach(node => tagCounts.set(node.tagName, (tagCounts.get(node.tagName) || 0) + 1));
+    const tagName = Array.from(tagCounts.entries()).sort((a, b) => b[1] - a[1])[0][0];
+    const sameTag = containers.filter(node => node.tagName === tagName);
+
+    let commonClasses = Array.from(sameTag[0].classList);
+    for (const node of sameTag.slice(1)) {
+      commonClasses = commonClasses.filter(name => node.classList.contains(name));
+    }
+
+    let selector = tagName.toLowerCase() + commonClasses.map(name => `.${CSS.escape(name)}`).join('');
+    if (commonClasses.length === 0) {
+      // クラスがない場合は共通の親要素の直下に限定する
+      const parent = sameTag[0].parentElement;
+      if (parent && sameTag.every(node => node.parentElement === parent) && parent !== document.body) {
+        const parentSelector = parent.id
+          ? `#${CSS.escape(parent.id)}`
+          : parent.tagName.toLowerCase() + Array.from(parent.classList).map(name => `.${CSS.escape(name)}`).join('');
+        selector = `${parentSelector} > ${selector}`;
+      }
+    }
+
+    if (!containers.every(node => node.matches(selector))) {
+      return compiled;
+    }
+
+    compiled.containerSelector = selector;
+    compiled.scopes = matches.map(list =>
+      list.some(element => element.closest(selector)) ? 'record' : 'page'
+    );
+    return compiled;
+  };
+
+  let replanned = false;
+  if (plan && plan.containerSelector && document.querySelectorAll(plan.containerSelector).length === 0) {
+    // レイアウトが変わってレコード要素が見つからない場合は作り直す
+    plan = null;
+    replanned = true;
+  }
+  if (!plan) {
+    plan = compilePlan();
+  }
+
+  let rows = [];
+  if (plan.containerSelector) {
+    const pageValues = fields.map((field, index) =>
+      plan.scopes[index] === 'page' ? readValue(queryAll(field, index)[0], field.dataType) : null
+    );
+
+    for (const container of document.querySelectorAll(plan.containerSelector)) {
+      let found = false;
+      const row = fields.map((field, index) => {
+        if (plan.scopes[index] === 'page') return pageValues[index];
+        if (!valid[index]) return null;
+        const element = container.matches(field.selector) ? container : container.querySelector(field.selector);
+        const value = readValue(element, field.dataType);
+        if (value !== null) found = true;
+        return value;
+      });
+      // 取得対象を1つも含まないレコード要素（広告枠等）は除く
+      if (found) rows.push(row);
+    }
+  } else {
+    // レコード要素がない場合は出現順で揃える（足りない列は null）
+    const lists = fields.map(queryAll);
+    const rowCount = Math.max(...lists.map(list => list.length));
+    for (let i = 0; i < rowCount; i++) {
+      rows.push(fields.map((field, index) => readValue(lists[index][i], field.dataType)));
+    }
+  }
+
+  return { plan, rows, errors, replanned };
+}
+
+module.exports = new ExtractionPlanner();
@@ -0,0 +1,212 @@
+/**
+ * ジョブ管理サービス
+ * 解析・コード生成・実行・自動スクレイピングをバックグラウンドジョブとして実行し、
+ * 状態と進捗（ステップ単位）をポーリングまたはSSEで参照できるようにする
+ */
+
+const { EventEmitter } = require('events');
+const antiBotService = require('./AntiBotService');
+const config = require('../config/antibot.config');
+
+const FINISHED_STATUSES = ['completed', 'failed'];
+
+class JobManager {
+  constructor() {
+    this.jobs = new Map(); // ジョブID → ジョブ
+    this.events = new EventEmitter(); // ジョブIDごとの更新通知
+    this.events.setMaxListeners(0);
+  }
+
+  /**
+   * ジョブを作成（状態は queued）
+   * @param {string} type - 'analyze', 'generate', 'execute', 'auto-scrape'
+   * @param {number} totalSteps - 進捗の総ステップ数
+   * @returns {object} ジョブ
+   */
+  createJob(type, totalSteps = 1) {
+    this.pruneJobs();
+
+    const now = new Date().toISOString();
+    const job = {
+      id: `job_${Date.now()}_${Math.random().toString(36).substring(7)}`,
+      type,
+      status: 'queued',
+      progress: { step: 0, totalSteps, message: 'Queued', percent: 0 },
+      result: null,
+      error: null,
+      createdAt: now,
+      updatedAt: now
+    };
+
+    this.jobs.set(job.id, job);
+    return job;
+  }
+
+  /**
+   * ジョブを実行（完了を待たずに呼び出してよい。例外はジョブの failed として記録する）
+   * @param {string} jobId
+   * @param {function} fn - (progress) => Promise<result>。progress(step, message) で進捗を報告
+   * @returns {Promise<void>}
+   */
+  async runJob(jobId, fn) {
+    this.updateJob(jobId, { status: 'running' });
+
+    try {
+      const result = await fn((step, message) => this.reportProgress(jobId, step, message));
+      this.completeJob(jobId, result);
+    } catch (error) {
+      antiBotService.logger.error(`Job ${jobId} failed: ${error.message}`);
+      this.failJob(jobId, error.message);
+    }
+  }
+
+  /**
+   * ジョブを完了として記録
+   * @param {string} jobId
+   * @param {any} result
+   */
+  completeJob(jobId, result) {
+    const job = this.jobs.get(jobId);
+    if (!job) return;
+
+    this.updateJob(jobId, {
+      status: 'completed',
+      result,
+      error: null,
+      progress: { ...job.progress, step: job.progress.totalSteps, message: 'Completed', percent: 100 }
+    });
+  }
+
+  /**
+   * ジョブを失敗として記録
+   * @param {string} jobId
+   * @param {string} message
+   */
+  failJob(jobId, message) {
+    this.updateJob(jobId, { status: 'failed', error: message });
+  }
+
+  /**
+   * 永続化されたジョブを復元（再起動後もジョブIDで状態を参照できるようにする）
+   * @param {object} saved - { id, type, status, result, error, createdAt, updatedAt }
+   * @param {number} totalSteps
+   * @returns {object} ジョブ
+   */
+  restoreJob(saved, totalSteps = 1) {
+    const finished = FINISHED_STATUSES.includes(saved.status);
+    const job = {
+      id: saved.id,
+      type: saved.type,
+      status: saved.status,
+      progress: {
+        step: finished ? totalSteps : 0,
+        totalSteps,
+        message: finished ? (saved.status === 'completed' ? 'Completed' : 'Failed') : 'Queued',
+        percent: saved.status === 'completed' ? 100 : 0
+      },
+      result: saved.result ?? null,
+      error: saved.error ?? null,
+      createdAt: saved.createdAt,
+      updatedAt: saved.updatedAt
+    };
+
+    this.jobs.set(job.id, job);
+    return job;
+  }
+
+  /**
+   * 進捗を報告
+   * @param {string} jobId
+   * @param {number} step - 現在のステップ（1始まり）
+   * @param {string} message
+   */
+  reportProgress(jobId, step, message) {
+    const job = this.jobs.get(jobId);
+    if (!job) return;
+
+    // 開始したステップは未完了として数える
+    const percent = Math.round((step - 1) / job.progress.totalSteps * 100);
+    this.updateJob(jobId, { progress: { ...job.progress, step, message, percent } });
+  }
+
+  /**
+   * ジョブを更新して購読者に通知
+   * @param {string} jobId
+   * @param {object} changes
+   */
+  updateJob(jobId, changes) {
+    const job = this.jobs.get(jobId);
+    if (!job) return;
+
+    Object.assign(job, changes, { updatedAt: new Date().toISOString() });
+    this.events.emit(jobId, job);
+  }
+
+  /**
+   * ジョブの状態を取得
+   * @param {string} jobId
+   * @param {boolean} includeResult - 結果（大きい場合がある）を含めるか
+   * @returns {object|null}
+   */
+  getJob(jobId, includeResult = true) {
+    const job = this.jobs.get(jobId);
+    if (!job) return null;
+    return this.toPublic(job, includeResult);
+  }
+
+  /**
+   * ジョブ一覧を取得（結果は含めない）
+   * @returns {array}
+   */
+  listJobs() {
+    return Array.from(this.jobs.values()).map(job => this.toPublic(job, false));
+  }
+
+  /**
+   * ジョブの更新を購読
+   * @param {string} jobId
+   * @param {function} listener - (job) => void
+   * @returns {function} 購読解除
+   */
+  subscribe(jobId, listener) {
+    this.events.on(jobId, listener);
+    return () => this.events.off(jobId, listener);
+  }
+
+  /**
+   * ジョブが終了しているか
+   * @param {object} job
+   * @returns {boolean}
+   */
+  isFinished(job) {
+    return FINISHED_STATUSES.includes(job.status);
+  }
+
+  /**
+   * 保持期間を過ぎた終了済みジョブ、および上限を超えた古い終了済みジョブを削除
+   */
+  pruneJobs() {
+    const { retentionMs, maxJobs } = config.jobs;
+    const expiredBefore = Date.now() - retentionMs;
+    const finished = Array.from(this.jobs.values()).filter(job => this.isFinished(job));
+
+    for (const job of finished) {
+      if (Date.parse(job.updatedAt) < expiredBefore || this.jobs.size > maxJobs) {
+        this.jobs.delete(job.id);
+      }
+    }
+  }
+
+  /**
+   * 公開用の表現
+   * @param {object} job
+   * @param {boolean} includeResult
+   * @returns {object}
+   */
+  toPublic(job, includeResult) {
+    const { result, ...rest } = job;
+    return includeResult ? { ...rest, result } : rest;
+  }
+}
+
+module.exports = new JobManager();
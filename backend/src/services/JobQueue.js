@@ -0,0 +1,503 @@
+/**
+ * ジョブキューサービス
+ * 自動スクレイピングのジョブを SQLite に永続化し、上限付きの同時実行数で順に処理する
+ * - 同時実行数は config.concurrency.maxConcurrent と rampUp（段階的スケールアップ）に従う
+ * - 優先度の高いジョブから取り出し、同じ優先度ではホストごとに公平に割り当てる
+ * - 失敗したジョブは指数バックオフでリトライし、上限に達したらデッドレターに移す
+ * - 再起動時は実行中だったジョブを待機状態に戻して再開する
+ */
+
+const fs = require('fs');
+const path = require('path');
+const antiBotService = require('./AntiBotService');
+const jobManager = require('./JobManager');
+const config = require('../config/antibot.config');
+
+// 取り出し候補として読み込むジョブ数（ホストの公平性の判定に使う）
+const CANDIDATE_LIMIT = 100;
+
+class JobQueue {
+  constructor() {
+    this.db = null;
+    this.ready = null; // 初期化の Promise
+    this.handlers = new Map(); // ジョブ種別 → { handler, totalSteps }
+    this.running = new Map(); // ジョブID → ホスト
+    this.lastDispatchAt = new Map(); // ホスト → 最後に割り当てた時刻
+    this.rampStartedAt = null; // 段階的スケールアップの開始時刻（キューが空になるとリセット）
+    this.pumping = false;
+    this.pumpRequested = false;
+    this.timer = null;
+    this.counters = { enqueued: 0, completed: 0, retried: 0, deadLettered: 0 };
+  }
+
+  /**
+   * ジョブ種別の処理を登録
+   * @param {string} type
+   * @param {function} handler - (payload, { jobId, attempt, maxAttempts, isFinalAttempt, progress }) => Promise<result>
+   * @param {number} totalSteps - 進捗の総ステップ数
+   */
+  registerHandler(type, handler, totalSteps = 1) {
+    this.handlers.set(type, { handler, totalSteps });
+  }
+
+  /**
+   * データベースを開き、保存済みのジョブを復元して処理を開始
+   */
+  async start() {
+    await this.open();
+
+    if (!this.timer) {
+      // リトライ待ちのジョブが実行可能になったかを定期的に確認
+      this.timer = setInterval(() => this.pump(), config.queue.pollInterval);
+      this.timer.unref();
+    }
+    this.pump();
+  }
+
+  /**
+   * データベースを開く（ジョブの処理は開始しない）
+   */
+  async open() {
+    if (!this.ready) {
+      this.ready = this.initialize();
+    }
+    await this.ready;
+  }
+
+  /**
+   * データベースの初期化と復元
+   */
+  async initialize() {
+    const dbPath = config.queue.dbPath || path.join(__dirname, '../../../data/job_queue.sqlite3');
+    fs.mkdirSync(path.dirname(dbPath), { recursive: true });
+
+    const sqlite3 = require('sqlite3');
+    this.db = await new Promise((resolve, reject) => {
+      const db = new sqlite3.Database(dbPath, error => (error ? reject(error) : resolve(db)));
+    });
+
+    await this.run(`
+      CREATE TABLE IF NOT EXISTS queue_jobs (
+        id TEXT PRIMARY KEY,
+        type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        host TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        available_at INTEGER NOT NULL,
+        result TEXT,
+        last_error TEXT,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+      )
+    `);
+    await this.run('CREATE INDEX IF NOT EXISTS idx_queue_jobs_ready ON queue_jobs (status, priority DESC, created_at)');
+
+    // 前回のプロセスで実行中だったジョブは中断されたため、待機状態に戻す（試行回数は戻さない）
+    const interrupted = await this.run(
+      "UPDATE queue_jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+      [Date.now()]
+    );
+    if (interrupted.changes > 0) {
+      antiBotService.logger.warn(`Requeued ${interrupted.changes} interrupted job(s)`);
+    }
+
+    // 保持期間を過ぎた完了済みジョブを削除し、残りをジョブ管理に復元
+    await this.run(
+      "DELETE FROM queue_jobs WHERE status = 'completed' AND updated_at < ?",
+      [Date.now() - config.jobs.retentionMs]
+    );
+
+    const rows = await this.all('SELECT * FROM queue_jobs');
+    for (const row of rows) {
+      if (!jobManager.getJob(row.id, false)) {
+        jobManager.restoreJob(this.toJob(row), this.getTotalSteps(row.type));
+      }
+    }
+
+    const pending = rows.filter(row => row.status === 'queued').length;
+    antiBotService.logger.info(`Job queue opened: ${dbPath} (${pending} pending)`);
+  }
+
+  /**
+   * ジョブを登録（永続化してから返すため、応答後に再起動しても失われない）
+   * @param {string} type
+   * @param {object} payload - JSONに変換できる値（payload.url からホストを判定）
+   * @param {object} options
+   * @param {number} options.priority - 大きいほど先に処理
+   * @param {number} options.maxAttempts
+   * @returns {object} ジョブ
+   */
+  async enqueue(type, payload, { priority = 0, maxAttempts = config.queue.maxAttempts } = {}) {
+    await this.start();
+
+    if (!this.handlers.has(type)) {
+      throw new Error(`No handler registered for job type: ${type}`);
+    }
+
+    const job = jobManager.createJob(type, this.getTotalSteps(type));
+    const now = Date.now();
+
+    try {
+      await this.run(
+        `INSERT INTO queue_jobs (id, type, payload, priority, host, status, attempts, max_attempts, available_at, created_at, updated_at)
+         VALUES (?, ?, ?, ?, ?, 'queued', 0, ?, ?, ?, ?)`,
+        [job.id, type, JSON.stringify(payload), priority, this.getHost(payload.url), maxAttempts, now, now, now]
+      );
+    } catch (error) {
+      jobManager.failJob(job.id, `Failed to enqueue: ${error.message}`);
+      throw error;
+    }
+
+    this.counters.enqueued++;
+    this.pump();
+    return job;
+  }
+
+  /**
+   * 現在の同時実行数の上限（rampUp 有効時は時間とともに増やす）
+   * @returns {number}
+   */
+  getConcurrencyLimit() {
+    const { maxConcurrent, rampUp } = config.concurrency;
+    if (!rampUp.enabled) {
+      return maxConcurrent;
+    }
+
+    const elapsed = this.rampStartedAt === null ? 0 : Date.now() - this.rampStartedAt;
+    const ramped = rampUp.initialConcurrency + Math.floor(elapsed / rampUp.incrementInterval);
+    return Math.max(1, Math.min(ramped, rampUp.maxConcurrency, maxConcurrent));
+  }
+
+  /**
+   * 空きがある限りジョブを取り出して開始（同時に複数回呼ばれても1つずつ処理する）
+   */
+  async pump() {
+    if (!this.db) return;
+    if (this.pumping) {
+      this.pumpRequested = true;
+      return;
+    }
+
+    this.pumping = true;
+    try {
+      do {
+        this.pumpRequested = false;
+        while (this.running.size < this.getConcurrencyLimit()) {
+          const row = await this.claimNext();
+          if (!row) break;
+          this.execute(row);
+        }
+      } while (this.pumpRequested);
+    } catch (error) {
+      antiBotService.logger.error(`Job queue dispatch failed: ${error.message}`);
+    } finally {
+      this.pumping = false;
+    }
+  }
+
+  /**
+   * 次に実行するジョブを選んで実行中にする
+   * 優先度 → ホストの実行中ジョブ数 → ホストへの最終割り当て時刻 → 登録順 で選ぶ
+   * @returns {object|null} 行
+   */
+  async claimNext() {
+    const now = Date.now();
+    const candidates = await this.all(
+      `SELECT * FROM queue_jobs WHERE status = 'queued' AND available_at <= ?
+       ORDER BY priority DESC, created_at ASC LIMIT ?`,
+      [now, CANDIDATE_LIMIT]
+    );
+
+    if (candidates.length === 0) {
+      if (this.running.size === 0) {
+        this.rampStartedAt = null;
+      }
+      return null;
+    }
+
+    const runningByHost = new Map();
+    for (const host of this.running.values()) {
+      runningByHost.set(host, (runningByHost.get(host) || 0) + 1);
+    }
+
+    let best = null;
+    let bestKey = null;
+    for (const row of candidates) {
+      const hostRunning = runningByHost.get(row.host) || 0;
+      if (hostRunning >= config.queue.maxPerHost) continue;
+
+      const key = [-row.priority, hostRunning, this.lastDispatchAt.get(row.host) || 0, row.created_at];
+      if (!bestKey || this.compareKeys(key, bestKey) < 0) {
+        best = row;
+        bestKey = key;
+      }
+    }
+
+    if (!best) return null;
+
+    const claimed = await this.run(
+      "UPDATE queue_jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ? AND status = 'queued'",
+      [now, best.id]
+    );
+    if (claimed.changes === 0) return null;
+
+    if (this.rampStartedAt === null) {
+      this.rampStartedAt = now;
+    }
+    this.running.set(best.id, best.host);
+    this.lastDispatchAt.set(best.host, now);
+    return { ...best, attempts: best.attempts + 1 };
+  }
+
+  /**
+   * ジョブを実行し、結果に応じて完了・リトライ・デッドレターに振り分ける
+   * @param {object} row
+   */
+  async execute(row) {
+    const { handler } = this.handlers.get(row.type) || {};
+    const isFinalAttempt = row.attempts >= row.max_attempts;
+
+    if (!jobManager.getJob(row.id, false)) {
+      jobManager.restoreJob(this.toJob(row), this.getTotalSteps(row.type));
+    }
+    jobManager.updateJob(row.id, { status: 'running', error: null });
+
+    try {
+      if (!handler) {
+        throw new Error(`No handler registered for job type: ${row.type}`);
+      }
+
+      const result = await handler(JSON.parse(row.payload), {
+        jobId: row.id,
+        attempt: row.attempts,
+        maxAttempts: row.max_attempts,
+        isFinalAttempt,
+        progress: (step, message) => jobManager.reportProgress(row.id, step, message)
+      });
+
+      await this.run(
+        "UPDATE queue_jobs SET status = 'completed', result = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+        [JSON.stringify(result ?? null), Date.now(), row.id]
+      );
+      this.counters.completed++;
+      jobManager.completeJob(row.id, result);
+
+    } catch (error) {
+      await this.handleFailure(row, error, isFinalAttempt);
+    } finally {
+      this.running.delete(row.id);
+      this.pump();
+    }
+  }
+
+  /**
+   * 失敗したジョブをリトライ待ちに戻すか、デッドレターに移す
+   * @param {object} row
+   * @param {Error} error
+   * @param {boolean} isFinalAttempt
+   */
+  async handleFailure(row, error, isFinalAttempt) {
+    const now = Date.now();
+
+    try {
+      if (isFinalAttempt) {
+        await this.run(
+          "UPDATE queue_jobs SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+          [error.message, now, row.id]
+        );
+        this.counters.deadLettered++;
+        antiBotService.logger.error(`Job ${row.id} moved to dead letter after ${row.attempts} attempt(s): ${error.message}`);
+        jobManager.failJob(row.id, error.message);
+        return;
+      }
+
+      // 指数バックオフ（上限あり）に ±20% のゆらぎを加える
+      const { retryBaseDelay, retryMaxDelay } = config.queue;
+      const backoff = Math.min(retryBaseDelay * 2 ** (row.attempts - 1), retryMaxDelay);
+      const delay = Math.round(backoff * (0.8 + Math.random() * 0.4));
+
+      await this.run(
+        "UPDATE queue_jobs SET status = 'queued', available_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+        [now + delay, error.message, now, row.id]
+      );
+      this.counters.retried++;
+      antiBotService.logger.warn(`Job ${row.id} failed (attempt ${row.attempts}/${row.max_attempts}), retrying in ${Math.round(delay / 1000)}s: ${error.message}`);
+
+      const job = jobManager.getJob(row.id, false);
+      jobManager.updateJob(row.id, {
+        status: 'queued',
+        error: error.message,
+        progress: {
+          ...job.progress,
+          step: 0,
+          percent: 0,
+          message: `Retrying in ${Math.round(delay / 1000)}s (attempt ${row.attempts + 1}/${row.max_attempts})`
+        }
+      });
+    } catch (dbError) {
+      antiBotService.logger.error(`Failed to record job failure for ${row.id}: ${dbError.message}`);
+      jobManager.failJob(row.id, error.message);
+    }
+  }
+
+  /**
+   * 永続化されたジョブを取得（ジョブ管理の保持件数・期間を過ぎて破棄されたジョブの参照用）
+   * @param {string} jobId
+   * @returns {object|null} ジョブ（結果を含む）
+   */
+  async getJob(jobId) {
+    await this.open();
+    const row = await this.get('SELECT * FROM queue_jobs WHERE id = ?', [jobId]);
+    return row ? this.toJob(row) : null;
+  }
+
+  /**
+   * デッドレターのジョブ一覧
+   * @returns {array}
+   */
+  async listDeadLetters() {
+    await this.start();
+    const rows = await this.all("SELECT * FROM queue_jobs WHERE status = 'dead' ORDER BY updated_at DESC");
+    return rows.map(row => ({
+      ...this.toJob(row),
+      payload: JSON.parse(row.payload),
+      priority: row.priority,
+      attempts: row.attempts
+    }));
+  }
+
+  /**
+   * デッドレターのジョブを再投入（試行回数をリセット）
+   * @param {string} jobId
+   * @returns {boolean} 再投入したか
+   */
+  async retryDeadLetter(jobId) {
+    await this.start();
+    const now = Date.now();
+    const updated = await this.run(
+      "UPDATE queue_jobs SET status = 'queued', attempts = 0, available_at = ?, last_error = NULL, updated_at = ? WHERE id = ? AND status = 'dead'",
+      [now, now, jobId]
+    );
+    if (updated.changes === 0) {
+      return false;
+    }
+
+    const row = await this.get('SELECT * FROM queue_jobs WHERE id = ?', [jobId]);
+    jobManager.restoreJob(this.toJob(row), this.getTotalSteps(row.type));
+    this.pump();
+    return true;
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  async getStats() {
+    if (!this.db) {
+      return { started: false };
+    }
+
+    const rows = await this.all('SELECT status, COUNT(*) AS count FROM queue_jobs GROUP BY status');
+    return {
+      started: true,
+      running: this.running.size,
+      concurrencyLimit: this.getConcurrencyLimit(),
+      byStatus: Object.fromEntries(rows.map(row => [row.status, row.count])),
+      ...this.counters
+    };
+  }
+
+  /**
+   * キューを停止（実行中のジョブは次回起動時に再開される）
+   */
+  async close() {
+    if (this.timer) {
+      clearInterval(this.timer);
+      this.timer = null;
+    }
+    if (this.db) {
+      const db = this.db;
+      this.db = null;
+      this.ready = null;
+      await new Promise(resolve => db.close(() => resolve()));
+    }
+  }
+
+  /**
+   * 行をジョブ管理の形式に変換（デッドレターは failed として見せる）
+   * @param {object} row
+   * @returns {object}
+   */
+  toJob(row) {
+    return {
+      id: row.id,
+      type: row.type,
+      status: row.status === 'dead' ? 'failed' : row.status,
+      result: row.result ? JSON.parse(row.result) : null,
+      error: row.last_error,
+      createdAt: new Date(row.created_at).toISOString(),
+      updatedAt: new Date(row.updated_at).toISOString()
+    };
+  }
+
+  /**
+   * ジョブ種別の総ステップ数
+   * @param {string} type
+   * @returns {number}
+   */
+  getTotalSteps(type) {
+    return this.handlers.get(type)?.totalSteps || 1;
+  }
+
+  /**
+   * URLのホスト（不正なURLは 'unknown'）
+   * @param {string} url
+   * @returns {string}
+   */
+  getHost(url) {
+    try {
+      return new URL(url).host;
+    } catch (error) {
+      return 'unknown';
+    }
+  }
+
+  /**
+   * ソートキーの比較
+   * @param {array} a
+   * @param {array} b
+   * @returns {number}
+   */
+  compareKeys(a, b) {
+    for (let i = 0; i < a.length; i++) {
+      if (a[i] !== b[i]) return a[i] < b[i] ? -1 : 1;
+    }
+    return 0;
+  }
+
+  run(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.run(sql, params, function (error) {
+        if (error) reject(error);
+        else resolve({ changes: this.changes });
+      });
+    });
+  }
+
+  all(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.all(sql, params, (error, rows) => (error ? reject(error) : resolve(rows)));
+    });
+  }
+
+  get(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.get(sql, params, (error, row) => (error ? reject(error) : resolve(row)));
+    });
+  }
+}
+
+module.exports = new JobQueue();
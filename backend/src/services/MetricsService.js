@@ -0,0 +1,163 @@
+/**
+ * 計測サービス
+ * ブラウザ起動・ページ遷移・待機・抽出・出力などのフェーズ別の処理時間を計測し、
+ * 実行ごとのトレース（JSON）とPrometheus形式のヒストグラムを提供する
+ */
+
+const { AsyncLocalStorage } = require('async_hooks');
+const fs = require('fs').promises;
+const path = require('path');
+const antiBotService = require('./AntiBotService');
+const config = require('../config/antibot.config');
+
+const METRIC_NAME = 'scraper_phase_duration_seconds';
+
+class MetricsService {
+  constructor() {
+    this.histograms = new Map(); // 「サービス/フェーズ」別のヒストグラム
+    this.traceStorage = new AsyncLocalStorage(); // 実行中のトレース（非同期処理をまたいで引き継ぐ）
+    this.traceDir = config.metrics.traceDir || path.join(__dirname, '../../../data/traces');
+  }
+
+  /**
+   * 1回の実行（解析・スクレイパー実行など）をトレースとして計測
+   * fn の中で呼ばれた span() はこのトレースに記録され、終了時に <traceDir>/<種別>_<ID>.json に保存される
+   * @param {string} kind - 実行の種別（'analyze', 'execute' など）
+   * @param {string} id - 実行ID
+   * @param {function} fn
+   * @returns {Promise<*>} fn の戻り値
+   */
+  async runTrace(kind, id, fn) {
+    if (!config.metrics.enabled) {
+      return await fn();
+    }
+
+    const trace = { kind, id, startedAt: new Date().toISOString(), spans: [] };
+    const start = process.hrtime.bigint();
+
+    try {
+      return await this.traceStorage.run(trace, fn);
+    } finally {
+      trace.durationMs = Number(process.hrtime.bigint() - start) / 1e6;
+      if (config.metrics.persistTraces) {
+        this.saveTrace(trace).catch(error => {
+          antiBotService.logger.warn(`Failed to save trace ${kind}_${id}: ${error.message}`);
+        });
+      }
+    }
+  }
+
+  /**
+   * フェーズの処理時間を計測（例外時も error 付きで記録）
+   * @param {string} service - サービス名（'executor', 'analyzer'）
+   * @param {string} phase - フェーズ名（'goto', 'extraction' など）
+   * @param {function} fn
+   * @param {object} attributes - トレースに残す付加情報
+   * @returns {Promise<*>} fn の戻り値
+   */
+  async span(service, phase, fn, attributes = {}) {
+    if (!config.metrics.enabled) {
+      return await fn();
+    }
+
+    const startedAt = Date.now();
+    const start = process.hrtime.bigint();
+    let error = null;
+
+    try {
+      return await fn();
+    } catch (e) {
+      error = e.message;
+      throw e;
+    } finally {
+      const seconds = Number(process.hrtime.bigint() - start) / 1e9;
+      this.observe(service, phase, seconds);
+
+      const trace = this.traceStorage.getStore();
+      if (trace) {
+        trace.spans.push({
+          service,
+          phase,
+          startedAt,
+          durationMs: Number((seconds * 1000).toFixed(3)),
+          ...attributes,
+          ...(error ? { error } : {})
+        });
+      }
+    }
+  }
+
+  /**
+   * 計測値をヒストグラムに加算
+   * @param {string} service
+   * @param {string} phase
+   * @param {number} seconds
+   */
+  observe(service, phase, seconds) {
+    const key = `${service}/${phase}`;
+    let histogram = this.histograms.get(key);
+    if (!histogram) {
+      histogram = { service, phase, buckets: config.metrics.buckets.map(() => 0), count: 0, sum: 0 };
+      this.histograms.set(key, histogram);
+    }
+
+    histogram.count++;
+    histogram.sum += seconds;
+    config.metrics.buckets.forEach((bound, i) => {
+      if (seconds <= bound) histogram.buckets[i]++;
+    });
+  }
+
+  /**
+   * トレースをファイルに保存
+   * @param {object} trace
+   */
+  async saveTrace(trace) {
+    await fs.mkdir(this.traceDir, { recursive: true });
+    const fileName = `${trace.kind}_${trace.id}`.replace(/[^\w.-]/g, '_');
+    const filePath = path.join(this.traceDir, `${fileName}.json`);
+    await fs.writeFile(filePath, JSON.stringify(trace, null, 2), 'utf-8');
+    antiBotService.logger.debug(`Trace saved to ${filePath}`);
+  }
+
+  /**
+   * フェーズ別の集計（回数・合計・平均ミリ秒）を取得
+   * @returns {object}
+   */
+  getSummary() {
+    const summary = {};
+    for (const [key, histogram] of this.histograms) {
+      summary[key] = {
+        count: histogram.count,
+        totalMs: Math.round(histogram.sum * 1000),
+        meanMs: histogram.count ? Math.round(histogram.sum * 1000 / histogram.count) : 0
+      };
+    }
+    return summary;
+  }
+
+  /**
+   * ヒストグラムをPrometheusのテキスト形式で出力
+   * @returns {string}
+   */
+  renderPrometheus() {
+    const lines = [
+      `# HELP ${METRIC_NAME} Duration of scraper phases in seconds.`,
+      `# TYPE ${METRIC_NAME} histogram`
+    ];
+
+    for (const { service, phase, buckets, count, sum } of this.histograms.values()) {
+      const labels = `service="${service}",phase="${phase}"`;
+      config.metrics.buckets.forEach((bound, i) => {
+        lines.push(`${METRIC_NAME}_bucket{${labels},le="${bound}"} ${buckets[i]}`);
+      });
+      lines.push(`${METRIC_NAME}_bucket{${labels},le="+Inf"} ${count}`);
+      lines.push(`${METRIC_NAME}_sum{${labels}} ${sum.toFixed(6)}`);
+      lines.push(`${METRIC_NAME}_count{${labels}} ${count}`);
+    }
+
+    return lines.join('\n') + '\n';
+  }
+}
+
+module.exports = new MetricsService();
@@ -3,122 +3,108 @@
  * PlaywrightとAIを使ってWebページを解析し、取得可能なデータ要素を提案
  */
 
-// Lambda環境判定
-const isLambda = !!process.env.AWS_LAMBDA_FUNCTION_NAME || !!process.env.AWS_EXECUTION_ENV;
-
-let chromium, playwright;
-if (isLambda) {
-  // Lambda環境: 軽量版Chromiumを使用
-  chromium = require('@sparticuz/chromium');
-  playwright = require('playwright-core');
-} else {
-  // ローカル環境: 通常のPlaywright
-  const pw = require('playwright');
-  chromium = pw.chromium;
-  playwright = pw;
-}
-
-const { GoogleGenerativeAI } = require('@google/generative-ai');
 const antiBotService = require('./AntiBotService');
+const metricsService = require('./MetricsService');
+const browserPool = require('./BrowserPool');
+const artifactStore = require('./ArtifactStore');
+const analysisCache = require('./AnalysisCache');
 const config = require('../config/antibot.config');
 
 class PageAnalyzer {
   constructor() {
-    this.genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
-    this.model = this.genAI.getGenerativeModel({ model: 'gemini-2.5-flash' });
-    this.browser = null;
-    this.context = null;
+    this.model = null; // 初回の使用時に作成（SDK の読み込みをコールドスタートから外す）
   }
 
   /**
-   * ブラウザを起動
+   * Gemini モデルを取得（初回のみ SDK を読み込んで作成）
+   * @returns {GenerativeModel}
    */
-  async launchBrowser() {
-    if (this.browser) return;
-
-    antiBotService.logger.info('Launching browser...');
-
-    if (isLambda) {
-      // Lambda環境
-      this.browser = await playwright.chromium.launch({
-        args: chromium.args,
-        executablePath: await chromium.executablePath(),
-        headless: chromium.headless
-      });
-    } else {
-      // ローカル環境（Docker/ECS含む）
-      const launchOptions = {
-        headless: config.browser.headless,
-        ...config.browser.launchOptions
-      };
-
-      // システムChromiumを使用（Docker/ECS環境対応）
-      const systemChromiumPath = '/usr/bin/chromium';
-      const fs = require('fs');
-      if (fs.existsSync(systemChromiumPath)) {
-        launchOptions.executablePath = systemChromiumPath;
-        antiBotService.logger.info(`Using system Chromium at ${systemChromiumPath}`);
-      }
-
-      this.browser = await chromium.launch(launchOptions);
+  getModel() {
+    if (!this.model) {
+      const { GoogleGenerativeAI } = require('@google/generative-ai');
+      this.model = new GoogleGenerativeAI(process.env.GEMINI_API_KEY).getGenerativeModel({ model: 'gemini-2.5-flash' });
     }
-
-    this.context = await this.browser.newContext({
-      ...config.browser.contextOptions,
-      extraHTTPHeaders: antiBotService.generateHeaders()
-    });
-
-    antiBotService.logger.info('Browser launched successfully');
+    return this.model;
   }
 
   /**
-   * ブラウザを閉じる
+   * ブラウザを閉じる（プール全体を閉じる）
    */
   async closeBrowser() {
-    if (this.context) {
-      await this.context.close();
-      this.context = null;
-    }
-    if (this.browser) {
-      await this.browser.close();
-      this.browser = null;
-      antiBotService.logger.info('Browser closed');
-    }
+    await browserPool.close();
   }
 
   /**
    * URLを解析してデータ要素を提案
    * @param {string} url - 解析対象のURL
+   * @param {object} options
+   * @param {boolean} options.screenshot - スクリーンショットを撮影するか（撮影時はリソース遮断を無効化して描画）
+   * @param {boolean} options.fullPageScreenshot - ページ全体を撮影するか
+   * @param {object} options.routePolicy - リソース遮断ポリシーの上書き
+   * @param {boolean} options.refresh - キャッシュを使わずに AI で解析し直すか
    * @returns {object} 解析結果
    */
-  async analyzePage(url) {
+  async analyzePage(url, options = {}) {
+    // フェーズ別の処理時間を data/traces/analyze_<ID>.json に記録
+    const analysisId = `${Date.now()}_${Math.random().toString(36).substring(2, 8)}`;
+    return await metricsService.runTrace('analyze', analysisId, () => this.runAnalysis(url, options));
+  }
+
+  /**
+   * analyzePage の本体（オプションは analyzePage と同じ）
+   * @param {string} url
+   * @param {object} options
+   * @returns {object} 解析結果
+   */
+  async runAnalysis(url, options) {
+    const {
+      screenshot = true,
+      fullPageScreenshot = false,
+      routePolicy = {},
+      refresh = false
+    } = options;
+
+    let lease = null;
+
     try {
       // 訪問済みチェック
-      if (antiBotService.isUrlVisited(url)) {
+      if (await antiBotService.isUrlVisited(url)) {
         antiBotService.logger.warn(`URL already visited: ${url}`);
       }
 
-      await this.launchBrowser();
+      // プールから新しいコンテキストを借りる（ブラウザ未起動時は起動を含む）
+      lease = await metricsService.span('analyzer', 'context_create', () => browserPool.acquire());
+      const page = await lease.context.newPage();
 
-      const page = await this.context.newPage();
+      // スクリーンショットを撮る場合は画像等を読み込ませる
+      antiBotService.beginRouteStats(page, url, {
+        bypass: screenshot && config.browser.resourceBlocking.bypassForScreenshots,
+        overrides: routePolicy
+      });
 
       // ステルススクリプト注入
       await antiBotService.injectStealthScripts(page);
 
-      // 人間らしい待機時間
-      const delay = antiBotService.getTimeAdjustedDelay();
-      antiBotService.logger.info(`Waiting ${delay}ms before navigation...`);
-      await antiBotService.sleep(delay);
+      // ホスト単位の自動スロットリング（人間らしい待機時間）
+      await metricsService.span('analyzer', 'throttle_wait', () => antiBotService.waitForThrottle(url));
 
       // ページにアクセス
       antiBotService.logger.info(`Navigating to ${url}`);
-      const response = await page.goto(url, {
-        waitUntil: 'domcontentloaded', // networkidle より緩い条件に変更
-        timeout: config.errorHandling.timeout
-      });
+      const navigationStart = Date.now();
+      let response;
+      try {
+        response = await metricsService.span('analyzer', 'goto', () => page.goto(url, {
+          waitUntil: 'domcontentloaded', // networkidle より緩い条件に変更
+          timeout: config.errorHandling.timeout
+        }), { url });
+      } catch (error) {
+        antiBotService.recordThrottleError(url);
+        throw error;
+      }
 
       // ステータスコードチェック
       const statusCode = response.status();
+      antiBotService.recordResponse(url, Date.now() - navigationStart, statusCode);
       if (statusCode !== 200) {
         antiBotService.logger.warn(`Non-200 status code: ${statusCode}`);
         const result = await antiBotService.handleStatusCode(statusCode, 0);
@@ -127,39 +113,64 @@ class PageAnalyzer {
         }
       }
 
-      // ページ読み込み後の待機
-      const pageLoadDelay = antiBotService.getRandomDelay(
-        config.timing.pageLoadDelay.min,
-        config.timing.pageLoadDelay.max
+      // ページ読み込み完了を待機（速いページは即座に進む、最大 pageLoadDelay.max）
+      await metricsService.span('analyzer', 'load_wait', () =>
+        page.waitForLoadState('load', { timeout: config.timing.pageLoadDelay.max }).catch(() => {})
       );
-      await antiBotService.sleep(pageLoadDelay);
 
       // 人間らしい動作をシミュレート
-      await antiBotService.simulateHumanMouseMovement(page);
-      await antiBotService.simulateHumanScroll(page);
+      await metricsService.span('analyzer', 'human_actions', async () => {
+        await antiBotService.simulateHumanMouseMovement(page);
+        await antiBotService.simulateHumanScroll(page);
+      });
 
       // DOM構造を取得
-      const domStructure = await this.extractDOMStructure(page);
-
-      // ページのスクリーンショット（Base64エンコード）
-      const screenshotBuffer = await page.screenshot({ type: 'png', fullPage: false });
-      const screenshotBase64 = screenshotBuffer.toString('base64');
+      const domStructure = await metricsService.span('analyzer', 'extraction', () => this.extractDOMStructure(page));
+
+      // ページのスクリーンショット（アーティファクトとして保存し、レスポンスにはIDとURLのみ含める）
+      let screenshotArtifact = null;
+      if (screenshot) {
+        screenshotArtifact = await metricsService.span('analyzer', 'screenshot', async () => {
+          const screenshotBuffer = await page.screenshot({ type: 'png', fullPage: fullPageScreenshot });
+          const thumbnailBuffer = await this.captureThumbnail(page);
+          return await artifactStore.putScreenshot(screenshotBuffer, thumbnailBuffer);
+        });
+      }
 
       // ページネーション自動検出
-      const pagination = await this.detectPagination(page, url);
+      const pagination = await metricsService.span('analyzer', 'pagination', () => this.detectPagination(page, url));
 
-      // AIによる解析（エラー時はDOM構造から基本的な提案を生成）
-      let aiSuggestions = [];
-      try {
-        aiSuggestions = await this.analyzeWithAI(domStructure, url);
-      } catch (error) {
-        antiBotService.logger.warn('AI analysis failed, using fallback suggestions');
-        aiSuggestions = this.generateFallbackSuggestions(domStructure);
+      // 同じテンプレート・DOM構造の解析済み結果があれば AI を呼ばない
+      const cacheInfo = {
+        hit: false,
+        template: analysisCache.getUrlTemplate(url),
+        domHash: analysisCache.getDomHash(domStructure)
+      };
+      const cacheKey = `${cacheInfo.template}#${cacheInfo.domHash}`;
+      let aiSuggestions = refresh ? null : await analysisCache.get('analysis', cacheKey);
+
+      if (aiSuggestions) {
+        cacheInfo.hit = true;
+        antiBotService.logger.info(`Analysis cache hit: ${cacheKey}`);
+      } else {
+        // AIによる解析（エラー時はDOM構造から基本的な提案を生成）
+        try {
+          aiSuggestions = await metricsService.span('analyzer', 'ai_analysis', () => this.analyzeWithAI(domStructure, url));
+        } catch (error) {
+          antiBotService.logger.warn('AI analysis failed, using fallback suggestions');
+          aiSuggestions = this.generateFallbackSuggestions(domStructure);
+        }
+
+        // 空の結果（AI の失敗時など）はキャッシュしない
+        if (aiSuggestions.length > 0) {
+          await analysisCache.set('analysis', cacheKey, aiSuggestions);
+        }
       }
 
       // URLを訪問済みとしてマーク
-      antiBotService.markUrlVisited(url);
+      await antiBotService.markUrlVisited(url);
 
+      const resourceStats = antiBotService.getRouteStats(page);
       await page.close();
 
       return {
@@ -168,8 +179,10 @@ class PageAnalyzer {
         statusCode,
         domStructure,
         suggestions: aiSuggestions,
-        screenshot: screenshotBase64,
+        screenshot: screenshotArtifact,
         pagination: pagination,
+        resourceStats,
+        cache: cacheInfo,
         timestamp: new Date().toISOString()
       };
 
@@ -185,6 +198,34 @@ class PageAnalyzer {
       }
 
       throw error;
+    } finally {
+      if (lease) {
+        await lease.release();
+      }
+    }
+  }
+
+  /**
+   * 表示領域の縮小版スクリーンショットを撮影（Chromium の CDP で縮小・エンコードするため追加の依存は不要）
+   * @param {Page} page
+   * @returns {Buffer|null} 失敗時は null
+   */
+  async captureThumbnail(page) {
+    const { format, quality, scale } = config.artifacts.thumbnail;
+
+    try {
+      const viewport = page.viewportSize() || { width: 1920, height: 1080 };
+      const session = await page.context().newCDPSession(page);
+      const { data } = await session.send('Page.captureScreenshot', {
+        format,
+        quality,
+        clip: { x: 0, y: 0, width: viewport.width, height: viewport.height, scale }
+      });
+      await session.detach();
+      return Buffer.from(data, 'base64');
+    } catch (error) {
+      antiBotService.logger.warn(`Thumbnail capture failed: ${error.message}`);
+      return null;
     }
   }
 
@@ -488,7 +529,7 @@ ${JSON.stringify(domStructure.elements, null, 2)}
 `;
 
     try {
-      const result = await this.model.generateContent(prompt);
+      const result = await this.getModel().generateContent(prompt);
       const text = result.response.text();
 
       // JSONを抽出（マークダウンコードブロックを除去）
@@ -516,10 +557,13 @@ ${JSON.stringify(domStructure.elements, null, 2)}
    * @returns {array} 取得されたデータ
    */
   async testSelector(url, selector) {
+    let lease = null;
+
     try {
-      await this.launchBrowser();
-      const page = await this.context.newPage();
+      lease = await browserPool.acquire();
+      const page = await lease.context.newPage();
 
+      antiBotService.beginRouteStats(page, url);
       await antiBotService.injectStealthScripts(page);
       await page.goto(url, {
         waitUntil: 'domcontentloaded',
@@ -550,6 +594,10 @@ ${JSON.stringify(domStructure.elements, null, 2)}
     } catch (error) {
       antiBotService.logger.error(`Selector test failed: ${error.message}`);
       throw error;
+    } finally {
+      if (lease) {
+        await lease.release();
+      }
     }
   }
 }
@@ -3,17 +3,46 @@
  * 生成されたコードを安全に実行し、結果を返す
  */
 
-const { chromium } = require('playwright');
 const fs = require('fs').promises;
 const path = require('path');
 const antiBotService = require('./AntiBotService');
+const metricsService = require('./MetricsService');
+const browserPool = require('./BrowserPool');
+const workerPool = require('./WorkerPool');
+const extractionPlanner = require('./ExtractionPlanner');
+const analysisCache = require('./AnalysisCache');
+const pageAnalyzer = require('./PageAnalyzer');
+const SpillStore = require('./SpillStore');
 const config = require('../config/antibot.config');
 
+// URLパターンのページ送り（PageAnalyzer.detectPagination と同じ順で照合し、最初に一致した番号を置き換える）
+const PAGE_URL_PATTERNS = [
+  { regex: /([?&]page=)(\d+)/i, type: 'query' },
+  { regex: /(\/page\/)(\d+)/i, type: 'path' },
+  { regex: /([?&]p=)(\d+)/i, type: 'query' },
+  { regex: /(\/p\/)(\d+)/i, type: 'path' },
+  { regex: /([?&]offset=)(\d+)/i, type: 'offset' }
+];
+
 class ScraperExecutor {
   constructor() {
     this.runningScrapers = new Map(); // 実行中のスクレイパー管理
-    this.results = new Map(); // 実行結果キャッシュ
-    this.codes = new Map(); // 生成されたコードのキャッシュ
+    // 実行結果・生成コードのキャッシュ（バイト数の上限を超えた分は data/outputs に退避）
+    this.outputDir = path.join(__dirname, '../../../data/outputs');
+    this.results = new SpillStore({
+      name: 'result',
+      maxBytes: config.storage.resultMemoryBytes,
+      filePath: scraperId => path.join(this.outputDir, `result_${scraperId}.json`),
+      serialize: result => JSON.stringify(result),
+      deserialize: text => JSON.parse(text)
+    });
+    this.codes = new SpillStore({
+      name: 'code',
+      maxBytes: config.storage.codeMemoryBytes,
+      filePath: scraperId => path.join(this.outputDir, `scraper_${scraperId}.js`),
+      serialize: code => code,
+      deserialize: text => text
+    });
   }
 
   /**
@@ -27,30 +56,52 @@ class ScraperExecutor {
       url,
       targets = [],
       saveOutput = true,
-      outputFormat = 'json'
+      outputFormat = 'json',
+      includeData = true,
+      pagination = null,
+      maxPages = config.pagination.maxPages,
+      engine = config.workers.defaultEngine,
+      language = 'javascript',
+      onLog = null
     } = params;
 
     const scraperId = this.generateScraperId(url);
     antiBotService.logger.info(`Starting scraper: ${scraperId}`);
 
     try {
-      // コードをファイルに保存
-      const codeFilePath = await this.saveCode(scraperId, code);
+      // フェーズ別の処理時間を data/traces/execute_<scraperId>.json に記録
+      const { codeFilePath, result } = await metricsService.runTrace('execute', scraperId, async () => {
+        // コードをファイルに保存
+        const codeFilePath = await metricsService.span('executor', 'output', () => this.saveCode(scraperId, code), { file: 'code' });
+
+        // 実行（engine: 'worker' は生成コードをワーカープールで実行。
+        // ページネーション指定時は各ページの取得ごとに途中結果を結果ストアに反映）
+        const result = engine === 'worker'
+          ? await this.runGeneratedCode(url, code, { language, onLog })
+          : pagination
+          ? await this.runScraperPaginated(url, targets, {
+            pagination,
+            maxPages,
+            onPage: partial => this.results.set(scraperId, partial)
+          })
+          : await this.runScraperDirect(url, targets, outputFormat);
 
-      // 実行
-      const result = await this.runScraperDirect(url, targets, outputFormat);
+        // 結果を保存
+        if (saveOutput) {
+          await metricsService.span('executor', 'output', () => this.saveResult(scraperId, result, outputFormat), { file: 'result' });
+        }
 
-      // 結果を保存
-      if (saveOutput) {
-        await this.saveResult(scraperId, result, outputFormat);
-      }
+        return { codeFilePath, result };
+      });
 
-      this.results.set(scraperId, result);
+      // JSON で保存済みの場合は退避時に書き込まない
+      await this.results.set(scraperId, result, { persisted: saveOutput && outputFormat === 'json' });
 
       return {
         success: true,
         scraperId,
-        data: result,
+        // includeData: false の場合は列名と行数のみ返す（データは GET /api/result/:scraperId でページ単位に取得）
+        data: includeData ? result : this.summarizeResult(result),
         codeFile: codeFilePath,
         timestamp: new Date().toISOString()
       };
@@ -79,80 +130,467 @@ class ScraperExecutor {
    * @returns {object}
    */
   async runScraperDirect(url, targets, outputFormat) {
-    let browser = null;
+    let lease = null;
 
     try {
-      // レート制限チェック
-      const identifier = 'local'; // プロキシ使用時はプロキシアドレス
-      if (!antiBotService.checkRateLimit(identifier)) {
-        throw new Error('Rate limit exceeded. Please wait before retrying.');
-      }
+      // プールから新しいコンテキストを借りる（ブラウザ未起動時は起動を含む）
+      const page = await metricsService.span('executor', 'context_create', async () => {
+        lease = await browserPool.acquire();
+        return this.openPage(lease.context, url);
+      });
+
+      // ページアクセス（レート制限・ホスト単位の自動スロットリング・リトライロジック付き）
+      const response = await this.loadPage(page, url);
+
+      // 人間らしい動作
+      await this.simulateHumanActions(page);
+
+      // データ抽出
+      const data = await metricsService.span('executor', 'extraction', () => this.extractData(page, targets, url), { targets: targets.length });
+
+      antiBotService.logger.info(`Successfully extracted ${Object.keys(data).length} data fields`);
+
+      const resourceStats = antiBotService.getRouteStats(page);
 
-      // ブラウザ起動
-      const launchOptions = {
-        headless: config.browser.headless,
-        ...config.browser.launchOptions
+      return {
+        url,
+        statusCode: response.status(),
+        data,
+        resourceStats,
+        timestamp: new Date().toISOString()
       };
 
-      // システムChromiumを使用（Docker/ECS環境対応）
-      const systemChromiumPath = '/usr/bin/chromium';
-      const fs = require('fs');
-      if (fs.existsSync(systemChromiumPath)) {
-        launchOptions.executablePath = systemChromiumPath;
-        antiBotService.logger.info(`Using system Chromium at ${systemChromiumPath}`);
+    } finally {
+      if (lease) {
+        await lease.release();
       }
+    }
+  }
+
+  /**
+   * 生成されたコードをワーカープールで実行し、書き出された出力ファイル（JSON / CSV）を結果にする
+   * @param {string} url
+   * @param {string} code
+   * @param {object} options
+   * @param {string} options.language - 'javascript' または 'python'
+   * @param {function} options.onLog - 実行中のログを1行ずつ受け取る
+   * @returns {object}
+   */
+  async runGeneratedCode(url, code, { language, onLog }) {
+    if (!code) {
+      throw new Error('code is required for the worker engine');
+    }
+
+    const run = await metricsService.span('executor', 'worker_run', () => workerPool.run({ language, code, onLog }), { language });
+
+    const readable = run.files.filter(file => file.content !== null);
+    const output = readable.find(file => /\.json$/i.test(file.name)) || readable.find(file => /\.csv$/i.test(file.name));
+    if (!output) {
+      const tail = run.logs.slice(-5).map(entry => entry.line).join('\n');
+      throw new Error(`Generated scraper did not write a JSON or CSV output file${tail ? `:\n${tail}` : ''}`);
+    }
+
+    const data = await metricsService.span('executor', 'extraction', () => this.parseOutputFile(output), { file: output.name });
+
+    antiBotService.logger.info(`Worker #${run.workerId} extracted ${Object.keys(data).length} data fields from ${output.name}`);
+
+    return {
+      url,
+      statusCode: null,
+      data,
+      engine: 'worker',
+      worker: {
+        language,
+        workerId: run.workerId,
+        warm: run.warm,
+        durationMs: run.durationMs,
+        cpuMs: run.cpuMs ?? null,
+        peakMemoryMB: run.peakMemoryMB ?? null,
+        outputFile: output.name,
+        files: run.files.map(({ name, bytes, truncated }) => ({ name, bytes, truncated }))
+      },
+      logs: run.logs.slice(-50).map(entry => entry.line),
+      timestamp: new Date().toISOString()
+    };
+  }
 
-      browser = await chromium.launch(launchOptions);
+  /**
+   * 生成コードの出力ファイルを列ごとのデータ（{ 列名: 値の配列 }）に変換
+   * @param {object} file - { name, content }
+   * @returns {object}
+   */
+  parseOutputFile(file) {
+    if (/\.csv$/i.test(file.name)) {
+      const [header = [], ...rows] = this.parseCSV(file.content.replace(/^\uFEFF/, ''));
+      return Object.fromEntries(header.map((key, i) => [key, rows.map(row => row[i] ?? null)]));
+    }
+    return this.toColumns(JSON.parse(file.content));
+  }
+
+  /**
+   * JSON の出力を列ごとのデータに変換
+   * { 列名: 配列 }、レコードの配列、{ data: ... } のいずれにも対応する
+   * @param {any} value
+   * @returns {object}
+   */
+  toColumns(value) {
+    if (Array.isArray(value)) {
+      if (value.every(item => item && typeof item === 'object' && !Array.isArray(item))) {
+        const keys = [...new Set(value.flatMap(item => Object.keys(item)))];
+        return Object.fromEntries(keys.map(key => [key, value.map(item => item[key] ?? null)]));
+      }
+      return { value };
+    }
+    if (value && typeof value === 'object') {
+      if (Object.values(value).every(Array.isArray)) return value;
+      if ('data' in value) return this.toColumns(value.data);
+      return Object.fromEntries(Object.entries(value).map(([key, item]) => [key, Array.isArray(item) ? item : [item]]));
+    }
+    return { value: [value] };
+  }
 
-      const context = await browser.newContext({
-        ...config.browser.contextOptions,
-        extraHTTPHeaders: antiBotService.generateHeaders()
+  /**
+   * CSV を行の配列に変換（ダブルクォート内のカンマ・改行に対応）
+   * @param {string} text
+   * @returns {array}
+   */
+  parseCSV(text) {
+    const rows = [];
+    let row = [];
+    let field = '';
+    let quoted = false;
+
+    for (let i = 0; i < text.length; i++) {
+      const char = text[i];
+      if (quoted) {
+        if (char === '"' && text[i + 1] === '"') {
+          field += '"';
+          i++;
+        } else if (char === '"') {
+          quoted = false;
+        } else {
+          field += char;
+        }
+      } else if (char === '"') {
+        quoted = true;
+      } else if (char === ',') {
+        row.push(field);
+        field = '';
+      } else if (char === '\n' || char === '\r') {
+        if (char === '\r' && text[i + 1] === '\n') i++;
+        row.push(field);
+        rows.push(row);
+        row = [];
+        field = '';
+      } else {
+        field += char;
+      }
+    }
+    if (field || row.length > 0) {
+      row.push(field);
+      rows.push(row);
+    }
+    return rows;
+  }
+
+  /**
+   * ページネーションを辿って複数ページを実行
+   * ページ N の抽出中に次ページを2つ目のタブで読み込んでおき（先読み）、抽出が終わったらタブを入れ替える
+   * 最大ページ数・レコードのないページ・既出のページ（URLまたは内容が同じ）で終了する
+   * @param {string} url - 開始ページ
+   * @param {array} targets
+   * @param {object} options
+   * @param {object|boolean} options.pagination - PageAnalyzer.detectPagination の結果（true の場合は開始ページで検出）
+   * @param {number} options.maxPages
+   * @param {function} options.onPage - (途中結果) => Promise（各ページの抽出後に呼ぶ）
+   * @returns {object}
+   */
+  async runScraperPaginated(url, targets, { pagination, maxPages, onPage = null }) {
+    const prefetchEnabled = config.pagination.prefetch;
+    let lease = null;
+    let prefetch = null;
+
+    try {
+      let [current, spare] = await metricsService.span('executor', 'context_create', async () => {
+        lease = await browserPool.acquire();
+        return Promise.all([
+          this.openPage(lease.context, url),
+          prefetchEnabled ? this.openPage(lease.context, url) : null
+        ]);
       });
+      const tabs = [current, spare].filter(Boolean);
 
-      const page = await context.newPage();
+      const response = await this.loadPage(current, url);
 
-      // ステルススクリプト注入
-      await antiBotService.injectStealthScripts(page);
+      if (pagination === true) {
+        pagination = await metricsService.span('executor', 'pagination', () => pageAnalyzer.detectPagination(current, url));
+      }
 
-      // 人間らしい待機
-      const delay = antiBotService.getTimeAdjustedDelay();
-      await antiBotService.sleep(delay);
+      const data = {};
+      const pages = [];
+      const seenUrls = new Set([current.url()]);
+      const seenContents = new Set();
+      let totalRows = 0;
+      let step = null; // offset 方式で1ページあたりに進める件数（1ページ目の件数）
+      let stopReason = 'max_pages';
+      let error = null;
+      let statusCode = response.status();
+
+      for (let pageIndex = 0; ; pageIndex++) {
+        const pageUrl = current.url();
+        const hasNext = pagination?.detected && pageIndex + 1 < maxPages;
+
+        // 次ページの URL が分かれば、抽出と並行して2つ目のタブで読み込む
+        let next = hasNext ? await this.findNextPage(current, url, pageIndex, pagination, step) : null;
+        if (next?.url && spare && !seenUrls.has(next.url)) {
+          prefetch = { url: next.url, loading: this.loadPage(spare, next.url) };
+          prefetch.loading.catch(() => {}); // 使われずに終了した場合の未処理エラーを防ぐ
+        }
 
-      // ページアクセス（リトライロジック付き）
-      const response = await this.navigateWithRetry(page, url);
+        await this.simulateHumanActions(current);
 
-      // ページ読み込み後の待機
-      await antiBotService.sleep(
-        antiBotService.getRandomDelay(
-          config.timing.pageLoadDelay.min,
-          config.timing.pageLoadDelay.max
-        )
-      );
+        // 抽出プランは開始ページの URL で引き、全ページで共有する
+        const pageData = await metricsService.span('executor', 'extraction', () => this.extractData(current, targets, url), {
+          targets: targets.length,
+          page: pageIndex + 1
+        });
+        const rows = Math.max(0, ...Object.values(pageData).map(values => values.length));
 
-      // 人間らしい動作
-      await antiBotService.simulateHumanMouseMovement(page);
-      await antiBotService.simulateHumanScroll(page);
+        if (rows === 0) {
+          stopReason = 'empty_page';
+          break;
+        }
 
-      // データ抽出
-      const data = await this.extractData(page, targets);
+        const fingerprint = analysisCache.hash(pageData);
+        if (seenContents.has(fingerprint)) {
+          stopReason = 'repeated_page';
+          break;
+        }
+        seenContents.add(fingerprint);
 
-      antiBotService.logger.info(`Successfully extracted ${Object.keys(data).length} data fields`);
+        // 列ごとに追加（前のページにない列は null で埋める）
+        for (const key of new Set([...Object.keys(data), ...Object.keys(pageData)])) {
+          const values = pageData[key] || new Array(rows).fill(null);
+          data[key] = (data[key] || new Array(totalRows).fill(null)).concat(values);
+        }
+        totalRows += rows;
+        pages.push({ pageNumber: pageIndex + 1, url: pageUrl, statusCode, rows });
+        antiBotService.logger.info(`Page ${pageIndex + 1}: extracted ${rows} records from ${pageUrl}`);
+
+        if (onPage) {
+          await onPage({
+            url,
+            statusCode: pages[0].statusCode,
+            data,
+            pagination: { complete: false, pages },
+            timestamp: new Date().toISOString()
+          });
+        }
 
-      await browser.close();
+        if (!pagination?.detected) {
+          stopReason = 'no_pagination';
+          break;
+        }
+        if (!hasNext) break;
+
+        // offset 方式は1ページ目の件数が分かってから次ページの URL を決める
+        if (step === null) step = rows;
+        if (!next) next = await this.findNextPage(current, url, pageIndex, pagination, step);
+        if (!next) {
+          stopReason = 'no_next_page';
+          break;
+        }
+
+        try {
+          if (next.url) {
+            if (seenUrls.has(next.url)) {
+              stopReason = 'repeated_page';
+              break;
+            }
+            seenUrls.add(next.url);
+
+            if (prefetch?.url === next.url) {
+              const loading = prefetch.loading;
+              prefetch = null;
+              statusCode = (await metricsService.span('executor', 'prefetch_wait', () => loading)).status();
+              [current, spare] = [spare, current];
+            } else {
+              statusCode = (await this.loadPage(current, next.url)).status();
+            }
+          } else {
+            // リンク先のない「次へ」ボタンは同じタブでクリックして進める（先読みしない）
+            statusCode = await this.clickNextPage(current, next.selector);
+          }
+        } catch (navigationError) {
+          // 2ページ目以降の失敗は、それまでに取得したデータを返して終了する
+          antiBotService.logger.warn(`Pagination stopped at page ${pageIndex + 2}: ${navigationError.message}`);
+          stopReason = 'error';
+          error = navigationError.message;
+          break;
+        }
+      }
+
+      antiBotService.logger.info(`Paginated run finished: ${pages.length} pages, ${totalRows} records (${stopReason})`);
 
       return {
         url,
         statusCode: response.status(),
         data,
+        resourceStats: this.sumRouteStats(tabs),
+        pagination: {
+          complete: true,
+          type: pagination?.type || null,
+          maxPages,
+          prefetch: Boolean(spare),
+          stopReason,
+          ...(error ? { error } : {}),
+          pages
+        },
         timestamp: new Date().toISOString()
       };
 
-    } catch (error) {
-      if (browser) {
-        await browser.close();
+    } finally {
+      // 先読み中のページは読み込みの完了を待ってからコンテキストを返す
+      if (prefetch) {
+        await prefetch.loading.catch(() => {});
+      }
+      if (lease) {
+        await lease.release();
+      }
+    }
+  }
+
+  /**
+   * コンテキストに新しいタブを開き、リソース遮断の統計とステルススクリプトを設定
+   * @param {BrowserContext} context
+   * @param {string} url
+   * @returns {Page}
+   */
+  async openPage(context, url) {
+    const page = await context.newPage();
+    antiBotService.beginRouteStats(page, url);
+
+    // ステルススクリプト注入
+    await antiBotService.injectStealthScripts(page);
+    return page;
+  }
+
+  /**
+   * ページを読み込む（レート制限のチェック後、リトライ付きで移動して読み込み完了を待つ）
+   * @param {Page} page
+   * @param {string} url
+   * @returns {Response}
+   */
+  async loadPage(page, url) {
+    // レート制限チェック（接続先ホストと送信元ごと。state.backend が sqlite の場合は全インスタンスで共有）
+    if (!(await antiBotService.checkRequestRateLimit(url))) {
+      throw new Error('Rate limit exceeded. Please wait before retrying.');
+    }
+
+    // ページアクセス（ホスト単位の自動スロットリング・リトライロジック付き）
+    const response = await this.navigateWithRetry(page, url);
+
+    // ページ読み込み完了を待機（速いページは即座に進む、最大 pageLoadDelay.max）
+    await metricsService.span('executor', 'load_wait', () =>
+      page.waitForLoadState('load', { timeout: config.timing.pageLoadDelay.max }).catch(() => {})
+    );
+
+    return response;
+  }
+
+  /**
+   * 人間らしい動作（マウス移動・スクロール）
+   * @param {Page} page
+   */
+  async simulateHumanActions(page) {
+    await metricsService.span('executor', 'human_actions', async () => {
+      await antiBotService.simulateHumanMouseMovement(page);
+      await antiBotService.simulateHumanScroll(page);
+    });
+  }
+
+  /**
+   * 次ページを求める
+   * URLパターン方式は開始URLの番号を置き換え、それ以外（または開始URLに番号がない場合）はページ内のリンクから探す
+   * @param {Page} page - 現在のページ
+   * @param {string} startUrl
+   * @param {number} pageIndex - 現在のページ（開始ページが 0）
+   * @param {object} pagination
+   * @param {number|null} step - offset 方式の1ページあたりの件数（未確定の場合は null）
+   * @returns {object|null} { url } または { selector }（クリックで進むボタン）
+   */
+  async findNextPage(page, startUrl, pageIndex, pagination, step) {
+    if (pagination.type === 'url_pattern') {
+      const pattern = PAGE_URL_PATTERNS.find(({ regex }) => regex.test(startUrl));
+      if (pattern) {
+        if (pattern.type === 'offset' && step === null) return null;
+        return { url: this.getPageUrl(startUrl, pattern, pageIndex + 1, step) };
       }
-      throw error;
     }
+
+    return await page.evaluate(findNextLink, {
+      nextSelector: pagination.nextSelector || null,
+      nextPageNumber: (pagination.currentPage || 1) + pageIndex + 1
+    });
+  }
+
+  /**
+   * 開始URLのページ番号（offset 方式は件数）を進めた URL
+   * @param {string} startUrl
+   * @param {object} pattern - PAGE_URL_PATTERNS の要素
+   * @param {number} pageIndex - 開始ページからのページ数
+   * @param {number} step - offset 方式の1ページあたりの件数
+   * @returns {string}
+   */
+  getPageUrl(startUrl, pattern, pageIndex, step) {
+    return startUrl.replace(pattern.regex, (match, prefix, number) => {
+      const start = parseInt(number, 10);
+      return `${prefix}${pattern.type === 'offset' ? start + pageIndex * step : start + pageIndex}`;
+    });
+  }
+
+  /**
+   * 「次へ」ボタンをクリックして次ページの表示を待つ
+   * @param {Page} page
+   * @param {string} selector
+   * @returns {number|null} 画面遷移した場合のステータスコード
+   */
+  async clickNextPage(page, selector) {
+    await metricsService.span('executor', 'throttle_wait', () => antiBotService.waitForThrottle(page.url()));
+
+    const navigation = page.waitForNavigation({
+      waitUntil: 'domcontentloaded',
+      timeout: config.pagination.clickWaitMs
+    }).catch(() => null); // 画面遷移しない（JSで書き換える）ページもある
+
+    await page.click(selector, { timeout: config.pagination.clickWaitMs });
+    const response = await navigation;
+
+    await metricsService.span('executor', 'load_wait', () =>
+      page.waitForLoadState('networkidle', { timeout: config.pagination.clickWaitMs }).catch(() => {})
+    );
+
+    return response ? response.status() : null;
+  }
+
+  /**
+   * 複数タブのリソース遮断統計を合算
+   * @param {array} pages
+   * @returns {object|null}
+   */
+  sumRouteStats(pages) {
+    const stats = pages.map(page => antiBotService.getRouteStats(page)).filter(Boolean);
+    if (stats.length === 0) return null;
+
+    return stats.slice(1).reduce((total, item) => {
+      for (const key of ['blockedRequests', 'savedBytes', 'loadedRequests', 'loadedBytes']) {
+        total[key] += item[key];
+      }
+      for (const [type, count] of Object.entries(item.blockedByType)) {
+        total.blockedByType[type] = (total.blockedByType[type] || 0) + count;
+      }
+      return total;
+    }, { ...stats[0], blockedByType: { ...stats[0].blockedByType } });
   }
 
   /**
@@ -165,14 +603,19 @@ class ScraperExecutor {
     const maxRetries = config.errorHandling.maxRetries;
 
     try {
+      // ホスト単位の自動スロットリング（リトライ時は広げられた間隔で待機）
+      await metricsService.span('executor', 'throttle_wait', () => antiBotService.waitForThrottle(url));
+
       antiBotService.logger.info(`Navigating to ${url} (attempt ${retryCount + 1}/${maxRetries + 1})`);
 
-      const response = await page.goto(url, {
+      const navigationStart = Date.now();
+      const response = await metricsService.span('executor', 'goto', () => page.goto(url, {
         waitUntil: 'domcontentloaded', // networkidle より緩い条件に変更
         timeout: config.errorHandling.timeout
-      });
+      }), { url, attempt: retryCount + 1 });
 
       const statusCode = response.status();
+      antiBotService.recordResponse(url, Date.now() - navigationStart, statusCode);
 
       // ステータスコードチェック
       if (statusCode !== 200) {
@@ -190,14 +633,9 @@ class ScraperExecutor {
 
     } catch (error) {
       if (retryCount < maxRetries) {
-        // Exponential backoff
-        const backoffDelay = Math.min(
-          config.timing.retryBackoff.initial * Math.pow(config.timing.retryBackoff.multiplier, retryCount),
-          config.timing.retryBackoff.maxDelay
-        );
-
-        antiBotService.logger.warn(`Navigation failed, retrying in ${backoffDelay}ms...`);
-        await antiBotService.sleep(backoffDelay);
+        // ホストの間隔を広げ、次の試行は waitForThrottle() がその間隔だけ待つ
+        antiBotService.recordThrottleError(url);
+        antiBotService.logger.warn(`Navigation failed, retrying: ${error.message}`);
 
         return await this.navigateWithRetry(page, url, retryCount + 1);
       }
@@ -207,61 +645,20 @@ class ScraperExecutor {
   }
 
   /**
-   * ページからデータを抽出
+   * ページからデータを抽出（レコード単位に揃え、欠けている値は null）
    * @param {Page} page
    * @param {array} targets
-   * @returns {object}
+   * @param {string} url - 抽出プランのキャッシュキーに使う
+   * @returns {object} { 列名: 値の配列 }
    */
-  async extractData(page, targets) {
-    const result = {};
-
-    for (const target of targets) {
-      try {
-        const { label, selector, dataType } = target;
-        const fieldName = label.replace(/\s+/g, '_').toLowerCase();
-
-        antiBotService.logger.debug(`Extracting: ${label} (${selector})`);
-
-        const elements = await page.$$(selector);
-
-        if (elements.length === 0) {
-          antiBotService.logger.warn(`No elements found for selector: ${selector}`);
-          result[fieldName] = [];
-          continue;
-        }
-
-        // データタイプに応じて抽出
-        const data = await Promise.all(
-          elements.map(async (el) => {
-            switch (dataType) {
-              case 'text':
-                return await el.textContent();
+  async extractData(page, targets, url = page.url()) {
+    const { data, plan, planCached } = await extractionPlanner.extract(page, url, targets);
 
-              case 'url':
-              case 'image':
-                return await el.getAttribute('href') || await el.getAttribute('src');
-
-              case 'number':
-                const text = await el.textContent();
-                return parseFloat(text.replace(/[^0-9.-]/g, ''));
-
-              default:
-                return await el.textContent();
-            }
-          })
-        );
-
-        result[fieldName] = data.map(d => d?.trim()).filter(Boolean);
-
-        antiBotService.logger.debug(`Extracted ${result[fieldName].length} items for ${label}`);
-
-      } catch (error) {
-        antiBotService.logger.error(`Failed to extract ${target.label}: ${error.message}`);
-        result[target.label] = [];
-      }
+    if (plan) {
+      antiBotService.logger.info(`Extraction plan ${planCached ? '(cached)' : '(compiled)'}: container=${plan.containerSelector || '(none)'}`);
     }
 
-    return result;
+    return data;
   }
 
   /**
@@ -272,7 +669,7 @@ class ScraperExecutor {
    */
   async saveCode(scraperId, code) {
     const fileName = `scraper_${scraperId}.js`;
-    const outputDir = path.join(__dirname, '../../../data/outputs');
+    const outputDir = this.outputDir;
     const filePath = path.join(outputDir, fileName);
 
     // ディレクトリが存在しない場合は作成
@@ -280,8 +677,8 @@ class ScraperExecutor {
 
     await fs.writeFile(filePath, code, 'utf-8');
 
-    // メモリにもコードを保存
-    this.codes.set(scraperId, code);
+    // メモリにもコードを保存（ファイルは書き込み済み）
+    await this.codes.set(scraperId, code, { persisted: true, serialized: code });
 
     antiBotService.logger.info(`Code saved to ${filePath}`);
 
@@ -296,7 +693,7 @@ class ScraperExecutor {
    */
   async saveResult(scraperId, result, format = 'json') {
     const fileName = `result_${scraperId}.${format}`;
-    const outputDir = path.join(__dirname, '../../../data/outputs');
+    const outputDir = this.outputDir;
     const filePath = path.join(outputDir, fileName);
 
     // ディレクトリが存在しない場合は作成
@@ -331,7 +728,7 @@ class ScraperExecutor {
     const rows = [];
     for (let i = 0; i < maxRows; i++) {
       const row = keys.map(key => {
-        const value = data[key][i] || '';
+        const value = data[key][i] ?? '';
         return `"${value.toString().replace(/"/g, '""')}"`;
       });
       rows.push(row.join(','));
@@ -340,6 +737,80 @@ class ScraperExecutor {
     return [header, ...rows].join('\n');
   }
 
+  /**
+   * 実行結果をデータ抜きの要約（列名・行数）に変換
+   * @param {object} result
+   * @returns {object}
+   */
+  summarizeResult(result) {
+    const { data, ...rest } = result;
+    const columns = Object.keys(data);
+    return {
+      ...rest,
+      columns,
+      totalRows: columns.length ? Math.max(...columns.map(key => data[key].length)) : 0
+    };
+  }
+
+  /**
+   * 列ごとのデータを行範囲・列で絞り込む（行数が足りない列は null で揃える）
+   * @param {object} data - { 列名: 値の配列 }
+   * @param {object} options
+   * @param {number} options.offset - 開始行
+   * @param {number|null} options.limit - 行数（null の場合は最後まで）
+   * @param {array|null} options.columns - 取得する列（null の場合はすべて）
+   * @returns {object} { columns, totalRows, offset, data }
+   */
+  sliceData(data, { offset = 0, limit = null, columns = null } = {}) {
+    const selected = columns ? columns.filter(key => key in data) : Object.keys(data);
+    const totalRows = selected.length ? Math.max(...selected.map(key => data[key].length)) : 0;
+    const end = limit === null ? totalRows : Math.min(totalRows, offset + limit);
+
+    const sliced = {};
+    for (const key of selected) {
+      const values = data[key].slice(offset, end);
+      sliced[key] = values.concat(new Array(Math.max(0, end - offset - values.length)).fill(null));
+    }
+
+    return { columns: selected, totalRows, offset, data: sliced };
+  }
+
+  /**
+   * Arrow 出力に対応しているか（apache-arrow は任意の依存。package.json には含めず、必要な環境でのみインストールする）
+   * @returns {boolean}
+   */
+  supportsArrow() {
+    try {
+      require.resolve('apache-arrow');
+      return true;
+    } catch (error) {
+      return false;
+    }
+  }
+
+  /**
+   * データを Arrow IPC（ストリーム形式）に変換（apache-arrow が必要）
+   * 値はすべて文字列列（Utf8）として書き出し、欠損は null とする
+   * @param {object} data - 行数を揃えた { 列名: 値の配列 }
+   * @returns {Buffer}
+   */
+  convertToArrow(data) {
+    if (!this.supportsArrow()) {
+      throw new Error('Arrow output requires apache-arrow. Install it with: npm install apache-arrow');
+    }
+    const arrow = require('apache-arrow');
+
+    const vectors = {};
+    for (const [key, values] of Object.entries(data)) {
+      vectors[key] = arrow.vectorFromArray(
+        values.map(value => (value === null || value === undefined ? null : String(value))),
+        new arrow.Utf8()
+      );
+    }
+
+    return Buffer.from(arrow.tableToIPC(new arrow.Table(vectors), 'stream'));
+  }
+
   /**
    * スクレイパーIDを生成
    * @param {string} url
@@ -367,8 +838,8 @@ class ScraperExecutor {
    * @param {string} scraperId
    * @returns {object|null}
    */
-  getResult(scraperId) {
-    return this.results.get(scraperId) || null;
+  async getResult(scraperId) {
+    return await this.results.get(scraperId);
   }
 
   /**
@@ -376,22 +847,68 @@ class ScraperExecutor {
    * @param {string} scraperId
    * @returns {string|null}
    */
-  getCode(scraperId) {
-    return this.codes.get(scraperId) || null;
+  async getCode(scraperId) {
+    return await this.codes.get(scraperId);
   }
 
   /**
    * 統計情報を取得
    * @returns {object}
    */
-  getStats() {
+  async getStats() {
     return {
       runningScrapers: this.runningScrapers.size,
-      cachedResults: this.results.size,
-      cachedCodes: this.codes.size,
-      ...antiBotService.getStats()
+      cachedResults: this.results.entries.size,
+      cachedCodes: this.codes.entries.size,
+      resultStore: this.results.getStats(),
+      codeStore: this.codes.getStats(),
+      ...(await antiBotService.getStats()),
+      browserPool: browserPool.getStats(),
+      workerPool: workerPool.getStats(),
+      phases: metricsService.getSummary()
     };
   }
 }
 
+/**
+ * ブラウザ内で実行: 次ページのリンクを探す
+ * nextSelector の要素（リンクでなければクリック対象として返す）→ rel="next" → 次のページ番号のリンクの順
+ * @param {object} args - { nextSelector, nextPageNumber }
+ * @returns {object|null} { url } または { selector }
+ */
+function findNextLink({ nextSelector, nextPageNumber }) {
+  const hrefOf = (element) => {
+    const anchor = element && element.closest('a[href]');
+    const href = anchor && anchor.getAttribute('href');
+    if (!href || href.startsWith('#') || /^javascript:/i.test(href)) return null;
+    return new URL(href, location.href).href;
+  };
+
+  if (nextSelector) {
+    let element = null;
+    try {
+      element = document.querySelector(nextSelector);
+    } catch (error) {
+      // 不正なセレクターは無視して他の方法で探す
+    }
+    if (element) {
+      const url = hrefOf(element);
+      if (url) return { url };
+      if (!element.disabled && element.getAttribute('aria-disabled') !== 'true') {
+        return { selector: nextSelector };
+      }
+    }
+  }
+
+  const rel = document.querySelector('a[rel~="next"][href], link[rel~="next"][href]');
+  if (rel) {
+    return { url: new URL(rel.getAttribute('href'), location.href).href };
+  }
+
+  const numbered = Array.from(document.querySelectorAll('a[href]'))
+    .find(anchor => anchor.textContent.trim() === String(nextPageNumber));
+  const url = hrefOf(numbered);
+  return url ? { url } : null;
+}
+
 module.exports = new ScraperExecutor();
@@ -1,16 +1,58 @@
 /**
  * Google Sheets Integration Service
  * スプレッドシートとの連携機能
+ * 結果・背景色の書き込みはバッファに溜め、スプレッドシートごとに1回の batchUpdate にまとめて送る（write-behind）
  */
 
-const { google } = require('googleapis');
 const fs = require('fs').promises;
 const path = require('path');
+const artifactStore = require('./ArtifactStore');
+const config = require('../config/antibot.config');
+
+// googleapis は読み込みに時間がかかるため、最初の認証時に読み込む
+let google = null;
+function loadGoogleApis() {
+  if (!google) {
+    ({ google } = require('googleapis'));
+  }
+  return google;
+}
+
+// 行の背景色
+const ROW_COLORS = {
+  green: { red: 0.7, green: 0.9, blue: 0.7 },
+  yellow: { red: 1, green: 0.95, blue: 0.6 },
+  red: { red: 0.95, green: 0.7, blue: 0.7 }
+};
 
 class SheetIntegration {
   constructor() {
     this.sheets = null;
     this.auth = null;
+    this.authPromise = null;
+
+    // 書き込みバッファ: spreadsheetId → { values: Map(range → values), formats: Map(行番号 → 色), rows: Set, waiters: [] }
+    this.pending = new Map();
+    this.pendingRows = 0;
+    this.flushTimer = null;
+    this.inflight = new Set();
+
+    // クォータ超過時はこの時刻まで全ての書き込みを待たせる
+    this.blockedUntil = 0;
+
+    this.counters = { writes: 0, merged: 0, flushes: 0, valueCalls: 0, formatCalls: 0, retries: 0, failures: 0 };
+  }
+
+  /**
+   * Sheets API クライアントを作成（SHEETS_API_ROOT 指定時はローカルのフェイクサーバー等に向ける）
+   * @param {object|string|null} auth
+   */
+  createClient(auth) {
+    return loadGoogleApis().sheets({
+      version: 'v4',
+      auth,
+      ...(config.sheets.apiRoot ? { rootUrl: config.sheets.apiRoot } : {})
+    });
   }
 
   /**
@@ -18,6 +60,13 @@ class SheetIntegration {
    */
   async authenticate() {
     try {
+      // 認証情報なしで API ルートだけが指定されている場合（ローカルのフェイクサーバー）
+      if (config.sheets.apiRoot && !process.env.GOOGLE_CREDENTIALS_JSON && !process.env.GOOGLE_CREDENTIALS_PATH && !process.env.GOOGLE_API_KEY) {
+        this.sheets = this.createClient(null);
+        console.log(`Google Sheets API root: ${config.sheets.apiRoot} (unauthenticated)`);
+        return true;
+      }
+
       // Google認証が設定されていない場合はスキップ
       if (!process.env.GOOGLE_CREDENTIALS_JSON && !process.env.GOOGLE_CREDENTIALS_PATH && !process.env.GOOGLE_API_KEY) {
         console.warn('Google Sheets credentials not configured. Skipping authentication.');
@@ -36,11 +85,12 @@ class SheetIntegration {
       }
 
       if (credentials) {
-        this.auth = new google.auth.GoogleAuth({
+        const { auth } = loadGoogleApis();
+        this.auth = new auth.GoogleAuth({
           credentials,
           scopes: ['https://www.googleapis.com/auth/spreadsheets']
         });
-        this.sheets = google.sheets({ version: 'v4', auth: this.auth });
+        this.sheets = this.createClient(this.auth);
         console.log('Google Sheets authentication successful');
         return true;
       }
@@ -48,7 +98,7 @@ class SheetIntegration {
       // APIキーのみの場合（読み取り専用）
       if (process.env.GOOGLE_API_KEY) {
         this.auth = process.env.GOOGLE_API_KEY;
-        this.sheets = google.sheets({ version: 'v4', auth: this.auth });
+        this.sheets = this.createClient(this.auth);
         console.log('Google Sheets API key authentication successful');
         return true;
       }
@@ -60,21 +110,36 @@ class SheetIntegration {
     }
   }
 
+  /**
+   * 認証済みでなければ認証する（同時に呼ばれても認証は1回だけ行う）
+   * @returns {boolean}
+   */
+  async ensureAuthenticated() {
+    if (this.sheets) return true;
+
+    if (!this.authPromise) {
+      this.authPromise = this.authenticate().then(authenticated => {
+        // 失敗した場合は次回の呼び出しで再試行する
+        if (!authenticated) this.authPromise = null;
+        return authenticated;
+      });
+    }
+    return this.authPromise;
+  }
+
   /**
    * スプレッドシートから依頼情報を読み取る
    * @param {string} spreadsheetId
    * @param {string} range
    */
   async readRequest(spreadsheetId, range = '管理台帳!A2:Z') {
-    if (!this.sheets) {
-      await this.authenticate();
-    }
+    await this.ensureAuthenticated();
 
     try {
-      const response = await this.sheets.spreadsheets.values.get({
+      const response = await this.withBackoff(() => this.sheets.spreadsheets.values.get({
         spreadsheetId,
         range
-      });
+      }));
 
       const rows = response.data.values || [];
 
@@ -101,56 +166,22 @@ class SheetIntegration {
   }
 
   /**
-   * スプレッドシートに結果を書き込む
+   * スプレッドシートに結果を書き込む（バッファ経由。送信が終わるまで待つ）
    * @param {string} spreadsheetId
    * @param {number} rowNumber
    * @param {object} result
    */
   async writeResult(spreadsheetId, rowNumber, result) {
-    if (!this.sheets) {
-      const authenticated = await this.authenticate();
-      if (!authenticated) {
-        console.warn('Skipping sheet write: Google Sheets not authenticated');
-        return false;
-      }
-    }
-
-    try {
-      // 列番号の定義
-      // H列（8）: ターゲットURL
-      // R列（18）: ステータス
-      // V列（22）: 結果
-      // W列（23）: ID
-
-      const updates = [
-        {
-          range: `管理台帳!R${rowNumber}`, // R列: ステータス
-          values: [[result.status || '完了']]
-        },
-        {
-          range: `管理台帳!V${rowNumber}`, // V列: 結果（データ件数など）
-          values: [[
-            `取得: ${result.dataCount || 0}件 | スクショ: ${result.screenshotUrl ? 'あり' : 'なし'} | データURL: ${result.dataUrl || 'なし'} | 完了: ${new Date().toLocaleString('ja-JP')}`
-          ]]
-        },
-        {
-          range: `管理台帳!W${rowNumber}`, // W列: ID (Scraper ID)
-          values: [[result.scraperId || '']]
-        }
-      ];
-
-      await this.sheets.spreadsheets.values.batchUpdate({
-        spreadsheetId,
-        resource: {
-          valueInputOption: 'USER_ENTERED',
-          data: updates
-        }
-      });
+    const outcome = await this.enqueue(spreadsheetId, rowNumber, { values: this.buildResultValues(rowNumber, result) });
 
-      return true;
-    } catch (error) {
-      throw new Error(`Failed to write to sheet: ${error.message}`);
+    if (outcome.skipped) {
+      console.warn('Skipping sheet write: Google Sheets not authenticated');
+      return false;
+    }
+    if (outcome.valuesError) {
+      throw new Error(`Failed to write to sheet: ${outcome.valuesError.message}`);
     }
+    return true;
   }
 
   /**
@@ -160,49 +191,317 @@ class SheetIntegration {
    * @param {string} color
    */
   async updateRowColor(spreadsheetId, rowNumber, color = 'green') {
-    if (!this.sheets) {
-      const authenticated = await this.authenticate();
-      if (!authenticated) {
-        console.warn('Skipping row color update: Google Sheets not authenticated');
-        return false;
+    const outcome = await this.enqueue(spreadsheetId, rowNumber, { color });
+
+    if (outcome.skipped) {
+      console.warn('Skipping row color update: Google Sheets not authenticated');
+      return false;
+    }
+    if (outcome.formatError) {
+      console.warn('Failed to update row color:', outcome.formatError.message);
+      return false;
+    }
+    return true;
+  }
+
+  /**
+   * 結果の書き込みと背景色の変更を同じバッチで行う
+   * @param {string} spreadsheetId
+   * @param {number} rowNumber
+   * @param {object} result
+   * @param {string} color
+   */
+  async writeRow(spreadsheetId, rowNumber, result, color = 'green') {
+    const outcome = await this.enqueue(spreadsheetId, rowNumber, {
+      values: this.buildResultValues(rowNumber, result),
+      color
+    });
+
+    if (outcome.skipped) {
+      console.warn('Skipping sheet write: Google Sheets not authenticated');
+      return false;
+    }
+    if (outcome.valuesError) {
+      throw new Error(`Failed to write to sheet: ${outcome.valuesError.message}`);
+    }
+    if (outcome.formatError) {
+      console.warn('Failed to update row color:', outcome.formatError.message);
+    }
+    return true;
+  }
+
+  /**
+   * 結果の書き込み内容（範囲と値）を作成
+   * @param {number} rowNumber
+   * @param {object} result
+   * @returns {array} [{ range, values }]
+   */
+  buildResultValues(rowNumber, result) {
+    // 列番号の定義
+    // H列（8）: ターゲットURL
+    // R列（18）: ステータス
+    // V列（22）: 結果
+    // W列（23）: ID
+
+    return [
+      {
+        range: `管理台帳!R${rowNumber}`, // R列: ステータス
+        values: [[result.status || '完了']]
+      },
+      {
+        range: `管理台帳!V${rowNumber}`, // V列: 結果（データ件数など）
+        values: [[
+          `取得: ${result.dataCount || 0}件 | スクショ: ${result.screenshotUrl ? 'あり' : 'なし'} | データURL: ${result.dataUrl || 'なし'} | 完了: ${new Date().toLocaleString('ja-JP')}`
+        ]]
+      },
+      {
+        range: `管理台帳!W${rowNumber}`, // W列: ID (Scraper ID)
+        values: [[result.scraperId || '']]
       }
+    ];
+  }
+
+  /**
+   * 書き込みをバッファに追加（同じセル・同じ行への書き込みは後のもので上書きしてまとめる）
+   * @param {string} spreadsheetId
+   * @param {number} rowNumber
+   * @param {object} update - { values: [{ range, values }], color }
+   * @returns {Promise<object>} 送信結果 { skipped, valuesError, formatError }
+   */
+  enqueue(spreadsheetId, rowNumber, { values = [], color = null }) {
+    let batch = this.pending.get(spreadsheetId);
+    if (!batch) {
+      batch = { values: new Map(), formats: new Map(), rows: new Set(), waiters: [] };
+      this.pending.set(spreadsheetId, batch);
     }
 
-    const colors = {
-      green: { red: 0.7, green: 0.9, blue: 0.7 },
-      yellow: { red: 1, green: 0.95, blue: 0.6 },
-      red: { red: 0.95, green: 0.7, blue: 0.7 }
-    };
+    this.counters.writes++;
+    if (batch.rows.has(rowNumber)) {
+      this.counters.merged++;
+    } else {
+      batch.rows.add(rowNumber);
+      this.pendingRows++;
+    }
+
+    for (const update of values) {
+      batch.values.set(update.range, update.values);
+    }
+    if (color) {
+      batch.formats.set(rowNumber, color);
+    }
+
+    const outcome = new Promise(resolve => batch.waiters.push(resolve));
+    this.scheduleFlush();
+    return outcome;
+  }
+
+  /**
+   * 行数の上限に達したらすぐに、そうでなければ時間枠の終わりに送信する
+   */
+  scheduleFlush() {
+    const { enabled, maxRows, windowMs } = config.sheets.batch;
 
+    if (!enabled || this.pendingRows >= maxRows) {
+      this.flush();
+      return;
+    }
+    if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(), windowMs);
+    }
+  }
+
+  /**
+   * バッファの内容を送信（スプレッドシートごとに値・書式それぞれ1回の batchUpdate）
+   */
+  async flush() {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+    if (this.pending.size === 0) return;
+
+    const batches = this.pending;
+    this.pending = new Map();
+    this.pendingRows = 0;
+    this.counters.flushes++;
+
+    const sending = Promise.all(
+      Array.from(batches, ([spreadsheetId, batch]) => this.flushSpreadsheet(spreadsheetId, batch))
+    );
+    this.inflight.add(sending);
     try {
-      await this.sheets.spreadsheets.batchUpdate({
-        spreadsheetId,
-        resource: {
-          requests: [{
-            repeatCell: {
-              range: {
-                sheetId: 0, // シートIDを取得する必要がある場合は動的に取得
-                startRowIndex: rowNumber - 1,
-                endRowIndex: rowNumber
-              },
-              cell: {
-                userEnteredFormat: {
-                  backgroundColor: colors[color] || colors.green
-                }
-              },
-              fields: 'userEnteredFormat.backgroundColor'
-            }
-          }]
+      await sending;
+    } finally {
+      this.inflight.delete(sending);
+    }
+  }
+
+  /**
+   * 1つのスプレッドシート分のバッチを送信し、待っている書き込みに結果を返す
+   * @param {string} spreadsheetId
+   * @param {object} batch
+   */
+  async flushSpreadsheet(spreadsheetId, batch) {
+    const outcome = { skipped: false, valuesError: null, formatError: null };
+
+    if (!(await this.ensureAuthenticated())) {
+      outcome.skipped = true;
+      batch.waiters.forEach(resolve => resolve(outcome));
+      return;
+    }
+
+    const data = Array.from(batch.values, ([range, values]) => ({ range, values }));
+    const requests = this.buildFormatRequests(batch.formats);
+
+    const [valuesResult, formatResult] = await Promise.allSettled([
+      data.length > 0 && this.withBackoff(() => {
+        this.counters.valueCalls++;
+        return this.sheets.spreadsheets.values.batchUpdate({
+          spreadsheetId,
+          resource: {
+            valueInputOption: 'USER_ENTERED',
+            data
+          }
+        });
+      }),
+      requests.length > 0 && this.withBackoff(() => {
+        this.counters.formatCalls++;
+        return this.sheets.spreadsheets.batchUpdate({
+          spreadsheetId,
+          resource: { requests }
+        });
+      })
+    ]);
+
+    if (valuesResult.status === 'rejected') {
+      outcome.valuesError = valuesResult.reason;
+      this.counters.failures++;
+    }
+    if (formatResult.status === 'rejected') {
+      outcome.formatError = formatResult.reason;
+      this.counters.failures++;
+    }
+
+    batch.waiters.forEach(resolve => resolve(outcome));
+  }
+
+  /**
+   * 行ごとの背景色を repeatCell リクエストに変換（連続する同じ色の行は1つの範囲にまとめる）
+   * @param {Map} formats - 行番号 → 色
+   * @returns {array}
+   */
+  buildFormatRequests(formats) {
+    const rows = Array.from(formats.keys()).sort((a, b) => a - b);
+    const requests = [];
+
+    for (const rowNumber of rows) {
+      const color = formats.get(rowNumber);
+      const last = requests[requests.length - 1];
+
+      if (last && last.color === color && last.endRow === rowNumber - 1) {
+        last.endRow = rowNumber;
+      } else {
+        requests.push({ color, startRow: rowNumber, endRow: rowNumber });
+      }
+    }
+
+    return requests.map(({ color, startRow, endRow }) => ({
+      repeatCell: {
+        range: {
+          sheetId: 0, // シートIDを取得する必要がある場合は動的に取得
+          startRowIndex: startRow - 1,
+          endRowIndex: endRow
+        },
+        cell: {
+          userEnteredFormat: {
+            backgroundColor: ROW_COLORS[color] || ROW_COLORS.green
+          }
+        },
+        fields: 'userEnteredFormat.backgroundColor'
+      }
+    }));
+  }
+
+  /**
+   * クォータ超過（429 / RESOURCE_EXHAUSTED）と 503 は Retry-After または指数バックオフで待って再試行する
+   * 待機中は他の書き込みも送らない（同じクォータを消費するため）
+   * @param {function} request
+   */
+  async withBackoff(request) {
+    const { maxRetries, baseDelay, maxDelay } = config.sheets.retry;
+
+    for (let attempt = 0; ; attempt++) {
+      const wait = this.blockedUntil - Date.now();
+      if (wait > 0) {
+        await new Promise(resolve => setTimeout(resolve, wait));
+      }
+
+      try {
+        return await request();
+      } catch (error) {
+        if (!this.isRetryable(error) || attempt >= maxRetries) {
+          throw error;
         }
-      });
 
-      return true;
-    } catch (error) {
-      console.warn('Failed to update row color:', error.message);
-      return false;
+        const backoff = Math.min(maxDelay, baseDelay * Math.pow(2, attempt)) * (0.5 + Math.random() / 2);
+        const delay = this.getRetryAfter(error) ?? backoff;
+        this.blockedUntil = Math.max(this.blockedUntil, Date.now() + delay);
+        this.counters.retries++;
+        console.warn(`Sheets API quota exceeded, retrying in ${Math.round(delay)}ms (attempt ${attempt + 1}/${maxRetries})`);
+      }
     }
   }
 
+  /**
+   * 再試行すべきエラーか
+   * @param {Error} error
+   * @returns {boolean}
+   */
+  isRetryable(error) {
+    const status = error.response?.status ?? Number(error.code);
+    if (status === 429 || status === 503) return true;
+    return /RESOURCE_EXHAUSTED|rateLimitExceeded|Quota exceeded/i.test(error.message || '');
+  }
+
+  /**
+   * Retry-After ヘッダー（秒数またはHTTP日付）をミリ秒に変換
+   * @param {Error} error
+   * @returns {number|null}
+   */
+  getRetryAfter(error) {
+    const headers = error.response?.headers;
+    const value = typeof headers?.get === 'function' ? headers.get('retry-after') : headers?.['retry-after'];
+    if (!value) return null;
+
+    const seconds = Number(value);
+    if (!Number.isNaN(seconds)) return seconds * 1000;
+
+    const date = Date.parse(value);
+    return Number.isNaN(date) ? null : Math.max(0, date - Date.now());
+  }
+
+  /**
+   * バッファに残っている書き込みを全て送信（シャットダウン時）
+   */
+  async close() {
+    await this.flush();
+    await Promise.all(Array.from(this.inflight));
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  getStats() {
+    return {
+      batching: config.sheets.batch.enabled,
+      pendingRows: this.pendingRows,
+      inflightFlushes: this.inflight.size,
+      blockedMs: Math.max(0, this.blockedUntil - Date.now()),
+      ...this.counters
+    };
+  }
+
   /**
    * スクリーンショットをGoogle Driveにアップロード
    * @param {string} screenshotBuffer
@@ -220,6 +519,27 @@ class SheetIntegration {
     // 実際の運用では、Google DriveにアップロードしてURLを返す
     return `file://${filePath}`;
   }
+
+  /**
+   * アーティファクトストアのスクリーンショットをアップロード（ファイルから直接コピーし、メモリに展開しない）
+   * @param {string} artifactId
+   * @param {string} fileName
+   */
+  async uploadArtifact(artifactId, fileName) {
+    const artifact = await artifactStore.locate(artifactId);
+    if (!artifact) {
+      throw new Error(`Artifact not found: ${artifactId}`);
+    }
+
+    const outputDir = path.join(__dirname, '../../../data/screenshots');
+    await fs.mkdir(outputDir, { recursive: true });
+
+    const filePath = path.join(outputDir, fileName);
+    await fs.copyFile(artifact.filePath, filePath);
+
+    // 実際の運用では、Google Driveにストリームでアップロードしてから URL を返す
+    return `file://${filePath}`;
+  }
 }
 
 module.exports = new SheetIntegration();
@@ -0,0 +1,151 @@
+/**
+ * バイト数上限付きの LRU ストア
+ * 上限を超えると最も古く参照されたエントリをメモリから外し、ファイル（data/outputs）に退避する
+ * 退避したエントリは get() で透過的に読み戻す
+ */
+
+const fs = require('fs').promises;
+const path = require('path');
+const antiBotService = require('./AntiBotService');
+
+class SpillStore {
+  /**
+   * @param {object} options
+   * @param {string} options.name - ログ・統計用の名前
+   * @param {number} options.maxBytes - メモリ上に保持する合計バイト数の上限
+   * @param {function} options.filePath - (id) => 退避先のファイルパス
+   * @param {function} options.serialize - (value) => string
+   * @param {function} options.deserialize - (string) => value
+   */
+  constructor({ name, maxBytes, filePath, serialize, deserialize }) {
+    this.name = name;
+    this.maxBytes = maxBytes;
+    this.filePath = filePath;
+    this.serialize = serialize;
+    this.deserialize = deserialize;
+
+    this.entries = new Map(); // id → { value, bytes, persisted }（挿入順 = LRU順）
+    this.bytes = 0;
+    this.counters = { hits: 0, misses: 0, loads: 0, evictions: 0, spills: 0 };
+  }
+
+  /**
+   * 保存（上限を超えた分は古いものから退避する）
+   * @param {string} id
+   * @param {any} value
+   * @param {object} options
+   * @param {boolean} options.persisted - 同じ内容が既に退避先ファイルにあるか（退避時の書き込みを省く）
+   * @param {string} options.serialized - serialize(value) の結果（書き込み済みの場合に再計算を省く）
+   */
+  async set(id, value, { persisted = false, serialized = null } = {}) {
+    if (!this.isValidId(id)) {
+      throw new Error(`Invalid ${this.name} id: ${id}`);
+    }
+
+    const text = serialized ?? this.serialize(value);
+    this.remove(id);
+    this.entries.set(id, { value, bytes: Buffer.byteLength(text), persisted });
+    this.bytes += this.entries.get(id).bytes;
+
+    await this.evict();
+  }
+
+  /**
+   * 取得（メモリにない場合は退避先ファイルから読み戻す）
+   * @param {string} id
+   * @returns {any|null}
+   */
+  async get(id) {
+    if (!this.isValidId(id)) {
+      this.counters.misses++;
+      return null;
+    }
+
+    const entry = this.entries.get(id);
+    if (entry) {
+      // 参照されたエントリを最新にする
+      this.entries.delete(id);
+      this.entries.set(id, entry);
+      this.counters.hits++;
+      return entry.value;
+    }
+
+    let text;
+    try {
+      text = await fs.readFile(this.filePath(id), 'utf-8');
+    } catch (error) {
+      this.counters.misses++;
+      return null;
+    }
+
+    const value = this.deserialize(text);
+    this.counters.loads++;
+    await this.set(id, value, { persisted: true, serialized: text });
+    return value;
+  }
+
+  /**
+   * 上限を超えている間、最も古いエントリを退避してメモリから外す
+   */
+  async evict() {
+    for (const [id, entry] of this.entries) {
+      if (this.bytes <= this.maxBytes) break;
+
+      if (!entry.persisted) {
+        try {
+          const filePath = this.filePath(id);
+          await fs.mkdir(path.dirname(filePath), { recursive: true });
+          await fs.writeFile(filePath, this.serialize(entry.value), 'utf-8');
+          entry.persisted = true;
+          this.counters.spills++;
+        } catch (error) {
+          // 書き込めない場合は失わないようにメモリに残す
+          antiBotService.logger.warn(`Failed to spill ${this.name} ${id}: ${error.message}`);
+          continue;
+        }
+      }
+
+      // 退避中に置き換えられていなければ外す
+      if (this.entries.get(id) === entry) {
+        this.remove(id);
+        this.counters.evictions++;
+      }
+    }
+  }
+
+  /**
+   * メモリから外す（退避先ファイルは残す）
+   * @param {string} id
+   */
+  remove(id) {
+    const entry = this.entries.get(id);
+    if (entry) {
+      this.bytes -= entry.bytes;
+      this.entries.delete(id);
+    }
+  }
+
+  /**
+   * ファイル名として安全なIDか（パス区切りや先頭の . を含まない）
+   * @param {string} id
+   * @returns {boolean}
+   */
+  isValidId(id) {
+    return Boolean(id) && path.basename(id) === id && !id.startsWith('.');
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  getStats() {
+    return {
+      entries: this.entries.size,
+      bytes: this.bytes,
+      maxBytes: this.maxBytes,
+      ...this.counters
+    };
+  }
+}
+
+module.exports = SpillStore;
@@ -0,0 +1,349 @@
+/**
+ * アンチボット対策の状態ストア
+ * レート制限・訪問済みURL・プロキシの失敗回数を保持する
+ * - memory: プロセス内のみ（デフォルト）
+ * - sqlite: 共有ボリューム上の SQLite ファイル。複数のバックエンド（ECSタスク等）で1つの上限を共有する
+ *
+ * レート制限は固定ウィンドウ2つ（現在・直前）の件数から求めるスライディングウィンドウ近似で、
+ * キーあたりの状態と判定コストは一定（タイムスタンプの配列を持たない）
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const config = require('../config/antibot.config');
+
+// 期限切れのエントリを削除する間隔（呼び出し回数）
+const PRUNE_EVERY = 500;
+
+/**
+ * 直前のウィンドウの件数を経過割合で按分した推定リクエスト数
+ * @param {number} previous - 直前のウィンドウの件数
+ * @param {number} current - 現在のウィンドウの件数
+ * @param {number} elapsed - 現在のウィンドウの経過時間
+ * @param {number} windowMs
+ * @returns {number}
+ */
+function estimateCount(previous, current, elapsed, windowMs) {
+  return previous * (1 - elapsed / windowMs) + current;
+}
+
+/**
+ * 超過時に次の1件が通るまでのおおよその待ち時間
+ * @returns {number} ミリ秒
+ */
+function estimateRetryAfter(previous, current, elapsed, windowMs, max) {
+  if (current >= max || previous === 0) {
+    return windowMs - elapsed;
+  }
+  // 直前ウィンドウの寄与が (max - current) 未満になるまで待つ
+  const targetElapsed = windowMs * (1 - (max - current) / previous);
+  return Math.max(0, Math.min(windowMs - elapsed, Math.ceil(targetElapsed - elapsed)));
+}
+
+/**
+ * URLのハッシュ（8バイト。URLそのものは保持しない）
+ * @param {string} url
+ * @returns {string}
+ */
+function hashUrl(url) {
+  return crypto.createHash('sha1').update(url).digest('hex').substring(0, 16);
+}
+
+class MemoryStateStore {
+  constructor(options) {
+    this.options = options;
+    this.windows = new Map(); // `${key}|${windowMs}` → { start, current, previous }
+    this.visited = new Map(); // URLハッシュ → 有効期限（挿入順 = 古い順）
+    this.failures = new Map(); // プロキシ → { count, expiresAt }
+    this.calls = 0;
+  }
+
+  /**
+   * 全ウィンドウで上限内なら1件として記録する
+   * @param {string} key
+   * @param {array} limits - [{ windowMs, max }]
+   * @returns {object} { allowed, retryAfterMs, windowMs }
+   */
+  async consume(key, limits, now = Date.now()) {
+    this.maybePrune(now);
+
+    const states = limits.map(({ windowMs, max }) => {
+      const id = `${key}|${windowMs}`;
+      const start = Math.floor(now / windowMs) * windowMs;
+      let state = this.windows.get(id);
+
+      if (!state || state.start < start - windowMs) {
+        state = { start, current: 0, previous: 0 };
+      } else if (state.start < start) {
+        state = { start, current: 0, previous: state.current };
+      }
+      this.windows.set(id, state);
+      return { state, windowMs, max, elapsed: now - start };
+    });
+
+    for (const { state, windowMs, max, elapsed } of states) {
+      if (estimateCount(state.previous, state.current, elapsed, windowMs) >= max) {
+        return { allowed: false, retryAfterMs: estimateRetryAfter(state.previous, state.current, elapsed, windowMs, max), windowMs };
+      }
+    }
+
+    states.forEach(({ state }) => { state.current++; });
+    return { allowed: true, retryAfterMs: 0, windowMs: null };
+  }
+
+  async isVisited(url, now = Date.now()) {
+    const expiresAt = this.visited.get(hashUrl(url));
+    return expiresAt !== undefined && expiresAt > now;
+  }
+
+  async markVisited(url, now = Date.now()) {
+    const hash = hashUrl(url);
+    this.visited.delete(hash);
+    this.visited.set(hash, now + this.options.visitedTtlMs);
+
+    while (this.visited.size > this.options.maxVisitedEntries) {
+      this.visited.delete(this.visited.keys().next().value);
+    }
+  }
+
+  /**
+   * 失敗回数を加算（最後の失敗から cooldownMs 経過すると自動でリセット）
+   * @returns {number} 加算後の回数
+   */
+  async recordFailure(proxy, cooldownMs, now = Date.now()) {
+    const entry = this.failures.get(proxy);
+    const count = (entry && entry.expiresAt > now ? entry.count : 0) + 1;
+    this.failures.set(proxy, { count, expiresAt: now + cooldownMs });
+    return count;
+  }
+
+  /**
+   * @returns {Map} プロキシ → 有効な失敗回数
+   */
+  async getFailureCounts(now = Date.now()) {
+    const counts = new Map();
+    for (const [proxy, entry] of this.failures) {
+      if (entry.expiresAt > now) counts.set(proxy, entry.count);
+    }
+    return counts;
+  }
+
+  async resetFailures() {
+    this.failures.clear();
+  }
+
+  async getStats(now = Date.now()) {
+    return {
+      backend: 'memory',
+      visitedUrls: this.visited.size,
+      rateLimitWindows: this.windows.size,
+      proxyFailures: Array.from((await this.getFailureCounts(now)).entries())
+    };
+  }
+
+  /**
+   * 期限切れのウィンドウ・訪問記録を定期的に削除（無制限に増えないようにする）
+   */
+  maybePrune(now) {
+    if (++this.calls % PRUNE_EVERY !== 0) return;
+
+    for (const [id, state] of this.windows) {
+      const windowMs = Number(id.substring(id.lastIndexOf('|') + 1));
+      if (state.start < now - 2 * windowMs) this.windows.delete(id);
+    }
+    for (const [hash, expiresAt] of this.visited) {
+      if (expiresAt <= now) this.visited.delete(hash);
+    }
+  }
+}
+
+class SqliteStateStore {
+  constructor(options) {
+    this.options = options;
+    this.db = null;
+    this.ready = null;
+    this.lock = Promise.resolve(); // トランザクションを1接続上で直列化
+    this.calls = 0;
+  }
+
+  async open() {
+    if (!this.ready) {
+      this.ready = (async () => {
+        const sqlite3 = require('sqlite3');
+        const dbPath = this.options.sqlitePath || path.join(__dirname, '../../../data/antibot_state.sqlite3');
+        fs.mkdirSync(path.dirname(dbPath), { recursive: true });
+
+        this.db = await new Promise((resolve, reject) => {
+          const db = new sqlite3.Database(dbPath, error => (error ? reject(error) : resolve(db)));
+        });
+
+        // 複数プロセスからの同時アクセスに備える
+        await this.run('PRAGMA journal_mode = WAL');
+        await this.run(`PRAGMA busy_timeout = ${this.options.busyTimeoutMs}`);
+        await this.run(`CREATE TABLE IF NOT EXISTS rate_windows (
+          key TEXT NOT NULL, window_ms INTEGER NOT NULL, window_start INTEGER NOT NULL, count INTEGER NOT NULL,
+          PRIMARY KEY (key, window_ms, window_start))`);
+        await this.run('CREATE TABLE IF NOT EXISTS visited_urls (hash TEXT PRIMARY KEY, expires_at INTEGER NOT NULL)');
+        await this.run('CREATE TABLE IF NOT EXISTS proxy_failures (proxy TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at INTEGER NOT NULL)');
+      })();
+    }
+    await this.ready;
+  }
+
+  async consume(key, limits, now = Date.now()) {
+    await this.open();
+    await this.maybePrune(now);
+
+    // BEGIN IMMEDIATE で書き込みロックを取り、読み取りから加算までを他のプロセスと排他にする
+    return await this.transaction(async () => {
+      const starts = limits.map(({ windowMs }) => Math.floor(now / windowMs) * windowMs);
+
+      for (let i = 0; i < limits.length; i++) {
+        const { windowMs, max } = limits[i];
+        const start = starts[i];
+        const rows = await this.all(
+          'SELECT window_start, count FROM rate_windows WHERE key = ? AND window_ms = ? AND window_start IN (?, ?)',
+          [key, windowMs, start, start - windowMs]
+        );
+        const current = rows.find(row => row.window_start === start)?.count || 0;
+        const previous = rows.find(row => row.window_start === start - windowMs)?.count || 0;
+        const elapsed = now - start;
+
+        if (estimateCount(previous, current, elapsed, windowMs) >= max) {
+          return { allowed: false, retryAfterMs: estimateRetryAfter(previous, current, elapsed, windowMs, max), windowMs };
+        }
+      }
+
+      for (let i = 0; i < limits.length; i++) {
+        await this.run(
+          `INSERT INTO rate_windows (key, window_ms, window_start, count) VALUES (?, ?, ?, 1)
+           ON CONFLICT (key, window_ms, window_start) DO UPDATE SET count = count + 1`,
+          [key, limits[i].windowMs, starts[i]]
+        );
+      }
+      return { allowed: true, retryAfterMs: 0, windowMs: null };
+    });
+  }
+
+  async isVisited(url, now = Date.now()) {
+    await this.open();
+    const row = await this.get('SELECT 1 FROM visited_urls WHERE hash = ? AND expires_at > ?', [hashUrl(url), now]);
+    return Boolean(row);
+  }
+
+  async markVisited(url, now = Date.now()) {
+    await this.open();
+    await this.run(
+      'INSERT INTO visited_urls (hash, expires_at) VALUES (?, ?) ON CONFLICT (hash) DO UPDATE SET expires_at = excluded.expires_at',
+      [hashUrl(url), now + this.options.visitedTtlMs]
+    );
+  }
+
+  async recordFailure(proxy, cooldownMs, now = Date.now()) {
+    await this.open();
+    return await this.transaction(async () => {
+      const row = await this.get('SELECT count, expires_at FROM proxy_failures WHERE proxy = ?', [proxy]);
+      const count = (row && row.expires_at > now ? row.count : 0) + 1;
+      await this.run(
+        'INSERT INTO proxy_failures (proxy, count, expires_at) VALUES (?, ?, ?) ON CONFLICT (proxy) DO UPDATE SET count = excluded.count, expires_at = excluded.expires_at',
+        [proxy, count, now + cooldownMs]
+      );
+      return count;
+    });
+  }
+
+  async getFailureCounts(now = Date.now()) {
+    await this.open();
+    const rows = await this.all('SELECT proxy, count FROM proxy_failures WHERE expires_at > ?', [now]);
+    return new Map(rows.map(row => [row.proxy, row.count]));
+  }
+
+  async resetFailures() {
+    await this.open();
+    await this.run('DELETE FROM proxy_failures');
+  }
+
+  async getStats(now = Date.now()) {
+    await this.open();
+    const visited = await this.get('SELECT COUNT(*) AS count FROM visited_urls WHERE expires_at > ?', [now]);
+    const windows = await this.get('SELECT COUNT(*) AS count FROM rate_windows');
+    return {
+      backend: 'sqlite',
+      visitedUrls: visited.count,
+      rateLimitWindows: windows.count,
+      proxyFailures: Array.from((await this.getFailureCounts(now)).entries())
+    };
+  }
+
+  /**
+   * 期限切れの行を定期的に削除
+   */
+  async maybePrune(now) {
+    if (++this.calls % PRUNE_EVERY !== 0) return;
+
+    await this.run('DELETE FROM rate_windows WHERE window_start < ? - 2 * window_ms', [now]);
+    await this.run('DELETE FROM visited_urls WHERE expires_at <= ?', [now]);
+    await this.run('DELETE FROM proxy_failures WHERE expires_at <= ?', [now]);
+  }
+
+  /**
+   * 書き込みトランザクション内で fn を実行（同じ接続上のトランザクションは順番に実行する）
+   */
+  transaction(fn) {
+    const result = this.lock.then(async () => {
+      await this.run('BEGIN IMMEDIATE');
+      try {
+        const value = await fn();
+        await this.run('COMMIT');
+        return value;
+      } catch (error) {
+        await this.run('ROLLBACK').catch(() => {});
+        throw error;
+      }
+    });
+    this.lock = result.catch(() => {});
+    return result;
+  }
+
+  run(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.run(sql, params, function (error) {
+        if (error) reject(error);
+        else resolve({ changes: this.changes });
+      });
+    });
+  }
+
+  all(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.all(sql, params, (error, rows) => (error ? reject(error) : resolve(rows)));
+    });
+  }
+
+  get(sql, params = []) {
+    return new Promise((resolve, reject) => {
+      this.db.get(sql, params, (error, row) => (error ? reject(error) : resolve(row)));
+    });
+  }
+}
+
+/**
+ * 設定（config.state.backend）に応じたストアを作成
+ * @returns {MemoryStateStore|SqliteStateStore}
+ */
+function createStateStore(options = config.state) {
+  switch (options.backend) {
+    case 'sqlite':
+      return new SqliteStateStore(options);
+    case 'memory':
+      return new MemoryStateStore(options);
+    default:
+      throw new Error(`Unknown state backend: ${options.backend}`);
+  }
+}
+
+module.exports = createStateStore();
+module.exports.createStateStore = createStateStore;
+module.exports.estimateCount = estimateCount;
+module.exports.estimateRetryAfter = estimateRetryAfter;
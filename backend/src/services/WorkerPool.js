@@ -0,0 +1,541 @@
+/**
+ * 生成コード実行ワーカープール
+ * Playwright の読み込みとブラウザの起動を済ませたワーカープロセス（Node.js / Python）を保持し、
+ * 生成されたスクレイパーコードをジョブごとに使い回して実行する（インタプリタとブラウザの起動を省く）
+ * 実行時間・CPU時間・メモリ（ワーカーと子プロセスの合計）の上限を超えたワーカーは強制終了して作り直す
+ *
+ * ワーカーとの通信: 標準入力 → ジョブ、fd 3 ← メッセージ（1行1JSON）、標準出力・標準エラー ← ログ
+ */
+
+const { spawn } = require('child_process');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const antiBotService = require('./AntiBotService');
+const config = require('../config/antibot.config');
+
+const WORKER_SCRIPTS = {
+  javascript: path.join(__dirname, '../workers/scraper_worker.js'),
+  python: path.join(__dirname, '../workers/scraper_worker.py')
+};
+
+// ワーカーに渡さない環境変数（生成コードから API キーや認証情報を読めないようにする）
+const SECRET_ENV = /API_KEY|CREDENTIALS|SECRET|TOKEN/i;
+
+// /proc/<pid>/stat の CPU 時間の単位（clock tick。Linux では通常 100Hz）
+const CLOCK_TICK_MS = 10;
+
+class WorkerPool {
+  constructor() {
+    this.options = config.workers;
+    this.jobDir = this.options.jobDir || path.join(__dirname, '../../../data/worker_jobs');
+    this.pools = {
+      javascript: { workers: [], waiters: [] },
+      python: { workers: [], waiters: [] }
+    };
+    this.nextWorkerId = 1;
+    this.monitorTimer = null;
+    this.closing = false;
+    this.counters = { spawned: 0, recycled: 0, killed: 0, crashed: 0, jobs: 0, warmStarts: 0, failures: 0 };
+  }
+
+  /**
+   * 生成コードを実行
+   * @param {object} params
+   * @param {string} params.language - 'javascript' または 'python'
+   * @param {string} params.code
+   * @param {number} params.timeoutMs
+   * @param {function} params.onLog - (line, stream) => void（ジョブのログを1行ずつ受け取る）
+   * @returns {object} { workerId, warm, durationMs, cpuMs, peakMemoryMB, files, logs }
+   */
+  async run({ language = 'javascript', code, timeoutMs = this.options.timeoutMs, onLog = null }) {
+    const { entry, warm } = await this.acquire(language);
+
+    const usage = this.sampleProcessTree(entry.pid);
+    const job = {
+      id: crypto.randomUUID(),
+      warm,
+      logs: [],
+      onLog,
+      startedAt: Date.now(),
+      baselineCpuMs: usage ? usage.cpuMs : null,
+      peakMemoryMB: usage ? usage.rssMB : null
+    };
+    job.dir = path.join(this.jobDir, job.id);
+
+    entry.job = job;
+    this.counters.jobs++;
+    if (warm) this.counters.warmStarts++;
+    this.startMonitor();
+
+    return await new Promise((resolve, reject) => {
+      job.resolve = resolve;
+      job.reject = reject;
+      job.timer = setTimeout(() => this.kill(entry, `Scraper timed out after ${timeoutMs}ms`), timeoutMs);
+      entry.child.stdin.write(JSON.stringify({ jobId: job.id, code, jobDir: job.dir }) + '\n');
+    });
+  }
+
+  /**
+   * 空いているワーカーを借りる（上限まで新たに起動し、上限に達している場合は空くまで待つ）
+   * @param {string} language
+   * @returns {object} { entry, warm }（warm: 起動済みのワーカーを使えたか）
+   */
+  async acquire(language) {
+    const pool = this.pools[language];
+    if (!pool) {
+      throw new Error(`Unsupported scraper language: ${language}`);
+    }
+
+    for (;;) {
+      const idle = pool.workers.find(entry => entry.state === 'idle');
+      if (idle) {
+        idle.state = 'busy';
+        return { entry: idle, warm: true };
+      }
+
+      if (pool.workers.length < this.options[language].size) {
+        const entry = this.spawnWorker(language, { reserved: true });
+        await entry.ready;
+        return { entry, warm: false };
+      }
+
+      await new Promise(resolve => pool.waiters.push(resolve));
+    }
+  }
+
+  /**
+   * ワーカープロセスを起動
+   * プロセスグループを分け、強制終了時にブラウザなどの子プロセスもまとめて終了できるようにする
+   * @param {string} language
+   * @param {object} options
+   * @param {boolean} options.reserved - 起動後そのまま使う（空きとして他のジョブに渡さない）
+   * @returns {object} entry
+   */
+  spawnWorker(language, { reserved = false } = {}) {
+    fs.mkdirSync(this.jobDir, { recursive: true });
+
+    const [command, ...args] = language === 'python'
+      ? [this.options.python.command, '-u', WORKER_SCRIPTS.python]
+      : [process.execPath, `--max-old-space-size=${this.options.heapMB}`, WORKER_SCRIPTS.javascript];
+
+    const child = spawn(command, args, {
+      cwd: this.jobDir,
+      env: this.getWorkerEnv(),
+      stdio: ['pipe', 'pipe', 'pipe', 'pipe'],
+      detached: true
+    });
+
+    const entry = {
+      id: this.nextWorkerId++,
+      language,
+      child,
+      pid: child.pid,
+      state: 'starting', // starting → idle / busy → retiring / exited
+      reserved,
+      job: null,
+      jobsRun: 0,
+      runtime: null,
+      killReason: null,
+      startedAt: Date.now()
+    };
+    entry.ready = new Promise((resolve, reject) => {
+      entry.onReady = resolve;
+      entry.onFatal = reject;
+    });
+    entry.ready.catch(() => {}); // 起動失敗は acquire / warmUp 側で扱う
+
+    this.pools[language].workers.push(entry);
+    this.counters.spawned++;
+
+    readline.createInterface({ input: child.stdio[3] }).on('line', line => {
+      try {
+        this.handleMessage(entry, JSON.parse(line));
+      } catch (error) {
+        antiBotService.logger.warn(`Invalid message from worker #${entry.id}: ${error.message}`);
+      }
+    });
+    readline.createInterface({ input: child.stdout }).on('line', line => this.handleLog(entry, 'stdout', line));
+    readline.createInterface({ input: child.stderr }).on('line', line => this.handleLog(entry, 'stderr', line));
+
+    child.on('error', error => {
+      entry.onFatal(error);
+      antiBotService.logger.error(`Worker #${entry.id} (${language}) failed to start: ${error.message}`);
+    });
+    child.on('exit', (code, signal) => this.handleExit(entry, code, signal));
+
+    return entry;
+  }
+
+  /**
+   * ワーカーに渡す環境変数
+   * @returns {object}
+   */
+  getWorkerEnv() {
+    const env = Object.fromEntries(Object.entries(process.env).filter(([key]) => !SECRET_ENV.test(key)));
+
+    const launchOptions = {
+      headless: config.browser.headless,
+      ...config.browser.launchOptions
+    };
+    // システムChromiumを使用（Docker/ECS環境対応）
+    if (fs.existsSync('/usr/bin/chromium')) {
+      launchOptions.executablePath = '/usr/bin/chromium';
+    }
+
+    return {
+      ...env,
+      WORKER_LAUNCH_OPTIONS: JSON.stringify(launchOptions),
+      WORKER_MAX_OUTPUT_BYTES: String(this.options.maxOutputBytes),
+      PYTHONUNBUFFERED: '1'
+    };
+  }
+
+  /**
+   * ワーカーからのメッセージを処理
+   * @param {object} entry
+   * @param {object} message
+   */
+  handleMessage(entry, message) {
+    switch (message.type) {
+      case 'ready':
+        entry.runtime = { runtime: message.runtime, version: message.version, browser: message.browser };
+        entry.state = entry.reserved ? 'busy' : 'idle';
+        entry.reserved = false;
+        antiBotService.logger.info(`Worker #${entry.id} (${entry.language}) ready in ${Date.now() - entry.startedAt}ms`);
+        entry.onReady();
+        if (entry.state === 'idle') this.wake(entry.language);
+        break;
+
+      case 'fatal':
+        antiBotService.logger.error(`Worker #${entry.id} (${entry.language}) failed: ${message.message}`);
+        entry.onFatal(new Error(`Worker failed to start: ${message.message}`));
+        break;
+
+      case 'result':
+      case 'error': {
+        const job = entry.job;
+        if (!job || job.id !== message.jobId) return;
+
+        this.finishJob(entry);
+        if (message.type === 'error') {
+          this.counters.failures++;
+          const error = new Error(`Generated scraper failed: ${message.message}`);
+          error.logs = job.logs;
+          job.reject(error);
+        } else {
+          job.resolve({
+            workerId: entry.id,
+            warm: job.warm,
+            durationMs: message.durationMs,
+            cpuMs: job.cpuMs,
+            peakMemoryMB: job.peakMemoryMB,
+            files: message.files,
+            logs: job.logs
+          });
+        }
+        this.release(entry);
+        break;
+      }
+
+      default:
+        break;
+    }
+  }
+
+  /**
+   * ワーカーの標準出力・標準エラーを実行中のジョブのログとして記録
+   * @param {object} entry
+   * @param {string} stream
+   * @param {string} line
+   */
+  handleLog(entry, stream, line) {
+    const job = entry.job;
+    if (!job) {
+      antiBotService.logger.debug(`[worker #${entry.id}] ${line}`);
+      return;
+    }
+
+    job.logs.push({ stream, line });
+    if (job.logs.length > this.options.maxLogLines) {
+      job.logs.shift();
+    }
+    if (job.onLog) {
+      try {
+        job.onLog(line, stream);
+      } catch (error) {
+        // ログの受け取り側のエラーでジョブを止めない
+      }
+    }
+  }
+
+  /**
+   * ワーカー終了時の処理（実行中のジョブは失敗として返す）
+   * @param {object} entry
+   * @param {number|null} code
+   * @param {string|null} signal
+   */
+  handleExit(entry, code, signal) {
+    const wasRetiring = entry.state === 'retiring';
+    entry.state = 'exited';
+    this.remove(entry);
+
+    const reason = entry.killReason || `Worker exited (${signal || `code ${code}`})`;
+    entry.onFatal(new Error(reason));
+
+    if (entry.job) {
+      const job = entry.job;
+      this.finishJob(entry);
+      this.counters.failures++;
+      fs.rm(job.dir, { recursive: true, force: true }, () => {});
+
+      const error = new Error(reason);
+      error.logs = job.logs;
+      job.reject(error);
+    }
+
+    if (!wasRetiring && !entry.killReason) {
+      this.counters.crashed++;
+      antiBotService.logger.warn(`Worker #${entry.id} (${entry.language}) exited unexpectedly: ${reason}`);
+    }
+
+    this.replenish(entry.language);
+    this.wake(entry.language);
+  }
+
+  /**
+   * 事前起動する数を下回ったワーカーを補充する（強制終了・入れ替えの後も次のジョブを待たせない）
+   * @param {string} language
+   */
+  replenish(language) {
+    if (this.closing) return;
+
+    const { warm, size } = this.options[language];
+    const count = Math.min(warm, size) - this.pools[language].workers.length;
+    for (let i = 0; i < count; i++) {
+      this.spawnWorker(language).ready.catch(error =>
+        antiBotService.logger.warn(`Worker warm-up failed (${language}): ${error.message}`)
+      );
+    }
+  }
+
+  /**
+   * ジョブの計測を締めてワーカーから外す
+   * @param {object} entry
+   */
+  finishJob(entry) {
+    const job = entry.job;
+    clearTimeout(job.timer);
+
+    const usage = this.sampleProcessTree(entry.pid);
+    if (usage && job.baselineCpuMs !== null) {
+      job.cpuMs = usage.cpuMs - job.baselineCpuMs;
+      job.peakMemoryMB = Math.max(job.peakMemoryMB || 0, usage.rssMB);
+    }
+    entry.job = null;
+  }
+
+  /**
+   * ジョブを終えたワーカーを空きに戻す（一定件数を実行したワーカーは入れ替える）
+   * @param {object} entry
+   */
+  release(entry) {
+    entry.jobsRun++;
+
+    if (entry.jobsRun >= this.options.maxJobsPerWorker) {
+      this.retire(entry, 'jobs');
+      return;
+    }
+
+    entry.state = 'idle';
+    this.wake(entry.language);
+  }
+
+  /**
+   * 空き待ちのジョブを1件起こす（起きたジョブは acquire で改めて空きを探す）
+   * @param {string} language
+   */
+  wake(language) {
+    const next = this.pools[language].waiters.shift();
+    if (next) next();
+  }
+
+  /**
+   * ワーカーを終了させる（標準入力を閉じると、ブラウザを閉じてから終了する）
+   * @param {object} entry
+   * @param {string} reason
+   */
+  retire(entry, reason) {
+    entry.state = 'retiring';
+    this.remove(entry);
+    this.counters.recycled++;
+    antiBotService.logger.info(`Recycling worker #${entry.id} (${reason}, ${entry.jobsRun} jobs)`);
+
+    entry.child.stdin.end();
+    this.replenish(entry.language);
+    // 終了しない場合は強制終了
+    setTimeout(() => {
+      if (entry.state !== 'exited') this.kill(entry, `Worker did not exit after ${reason}`);
+    }, 10000).unref();
+  }
+
+  /**
+   * ワーカーと子プロセス（ブラウザ）を強制終了
+   * @param {object} entry
+   * @param {string} reason - 実行中のジョブのエラーメッセージになる
+   */
+  kill(entry, reason) {
+    if (entry.state === 'exited' || entry.killReason) return;
+
+    entry.killReason = reason;
+    this.counters.killed++;
+    antiBotService.logger.warn(`Killing worker #${entry.id} (${entry.language}): ${reason}`);
+
+    try {
+      process.kill(-entry.pid, 'SIGKILL');
+    } catch (error) {
+      entry.child.kill('SIGKILL');
+    }
+  }
+
+  /**
+   * プールから外す
+   * @param {object} entry
+   */
+  remove(entry) {
+    const workers = this.pools[entry.language].workers;
+    const index = workers.indexOf(entry);
+    if (index !== -1) workers.splice(index, 1);
+  }
+
+  /**
+   * 実行中のワーカーの CPU 時間・メモリを定期的に確認し、上限を超えたものを強制終了
+   */
+  startMonitor() {
+    if (this.monitorTimer) return;
+
+    this.monitorTimer = setInterval(() => {
+      const { maxCpuMs, maxMemoryMB } = this.options;
+
+      for (const entry of this.allWorkers()) {
+        const job = entry.job;
+        if (!job) continue;
+
+        const usage = this.sampleProcessTree(entry.pid);
+        if (!usage) continue;
+
+        job.peakMemoryMB = Math.max(job.peakMemoryMB || 0, usage.rssMB);
+        const cpuMs = usage.cpuMs - job.baselineCpuMs;
+
+        if (maxMemoryMB && usage.rssMB > maxMemoryMB) {
+          this.kill(entry, `Scraper exceeded memory limit (${usage.rssMB}MB > ${maxMemoryMB}MB)`);
+        } else if (maxCpuMs && cpuMs > maxCpuMs) {
+          this.kill(entry, `Scraper exceeded CPU time limit (${cpuMs}ms > ${maxCpuMs}ms)`);
+        }
+      }
+    }, this.options.monitorInterval);
+
+    this.monitorTimer.unref();
+  }
+
+  /**
+   * プロセスとその子孫（ブラウザ等）の CPU 時間と RSS の合計
+   * /proc から読むため、Linux 以外では null（上限は実行時間のみ適用される）
+   * @param {number} pid
+   * @returns {object|null} { cpuMs, rssMB }
+   */
+  sampleProcessTree(pid) {
+    if (process.platform !== 'linux' || !pid) return null;
+
+    let cpuTicks = 0;
+    let rssKB = 0;
+    const pending = [pid];
+    const seen = new Set();
+
+    while (pending.length > 0) {
+      const current = pending.pop();
+      if (seen.has(current)) continue;
+      seen.add(current);
+
+      try {
+        // comm に空白や括弧が含まれる場合があるため、最後の ')' 以降を分割する
+        const stat = fs.readFileSync(`/proc/${current}/stat`, 'utf8');
+        const fields = stat.slice(stat.lastIndexOf(')') + 2).split(' ');
+        cpuTicks += parseInt(fields[11], 10) + parseInt(fields[12], 10); // utime + stime
+
+        const status = fs.readFileSync(`/proc/${current}/status`, 'utf8');
+        const match = status.match(/^VmRSS:\s+(\d+) kB/m);
+        if (match) rssKB += parseInt(match[1], 10);
+
+        for (const tid of fs.readdirSync(`/proc/${current}/task`)) {
+          const children = fs.readFileSync(`/proc/${current}/task/${tid}/children`, 'utf8').trim();
+          if (children) pending.push(...children.split(' ').map(Number));
+        }
+      } catch (error) {
+        // 計測中に終了したプロセスは無視
+      }
+    }
+
+    return { cpuMs: cpuTicks * CLOCK_TICK_MS, rssMB: Math.round(rssKB / 1024) };
+  }
+
+  /**
+   * すべてのワーカー
+   * @returns {array}
+   */
+  allWorkers() {
+    return Object.values(this.pools).flatMap(pool => pool.workers);
+  }
+
+  /**
+   * 事前起動（最初のジョブで起動を待たないよう、設定された数のワーカーを起動しておく）
+   */
+  async warmUp() {
+    await Promise.all(Object.keys(this.pools).map(language => {
+      this.replenish(language);
+      return Promise.all(this.pools[language].workers.map(entry => entry.ready.catch(() => {})));
+    }));
+  }
+
+  /**
+   * すべてのワーカーを終了
+   */
+  async close() {
+    this.closing = true;
+    if (this.monitorTimer) {
+      clearInterval(this.monitorTimer);
+      this.monitorTimer = null;
+    }
+
+    await Promise.all(this.allWorkers().map(entry => new Promise(resolve => {
+      entry.child.once('exit', resolve);
+      this.retire(entry, 'shutdown');
+    })));
+  }
+
+  /**
+   * 統計情報を取得
+   * @returns {object}
+   */
+  getStats() {
+    const languages = Object.fromEntries(Object.entries(this.pools).map(([language, pool]) => [language, {
+      size: this.options[language].size,
+      workers: pool.workers.map(entry => ({
+        id: entry.id,
+        state: entry.state,
+        jobsRun: entry.jobsRun,
+        runtime: entry.runtime
+      })),
+      waiting: pool.waiters.length
+    }]));
+
+    return {
+      defaultEngine: this.options.defaultEngine,
+      ...languages,
+      ...this.counters
+    };
+  }
+}
+
+module.exports = new WorkerPool();
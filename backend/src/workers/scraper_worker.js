@@ -0,0 +1,270 @@
+/**
+ * 生成コード（JavaScript）実行ワーカー
+ * WorkerPool から起動され、Playwright の読み込みとブラウザの起動を済ませた状態で待機する
+ * ジョブごとに新しい vm コンテキストでコードを実行し、chromium.launch() は起動済みブラウザを返す
+ *
+ * 通信: 標準入力 ← ジョブ（1行1JSON）、fd 3 → メッセージ（1行1JSON）
+ * 標準出力・標準エラーはジョブのログとして WorkerPool が読み取る
+ */
+
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const vm = require('vm');
+const Module = require('module');
+const playwright = require('playwright');
+
+const channel = fs.createWriteStream(null, { fd: 3 });
+const launchOptions = JSON.parse(process.env.WORKER_LAUNCH_OPTIONS || '{}');
+const maxOutputBytes = parseInt(process.env.WORKER_MAX_OUTPUT_BYTES, 10) || 20 * 1024 * 1024;
+const baseRequire = Module.createRequire(__filename);
+const initialCwd = process.cwd();
+
+let browser = null;
+
+/**
+ * WorkerPool にメッセージを送る
+ * @param {object} message
+ */
+function send(message) {
+  channel.write(JSON.stringify(message) + '\n');
+}
+
+/**
+ * process.exit() の呼び出しをジョブの終了として扱うための例外
+ */
+class ExitSignal extends Error {
+  constructor(code) {
+    super(`process.exit(${code})`);
+    this.code = code || 0;
+  }
+}
+
+/**
+ * ジョブ単位のブラウザ（起動済みブラウザに対する窓口）
+ * 作成したコンテキストを記録し、close() やジョブ終了時にそれだけを閉じる
+ */
+function createJobBrowser(job) {
+  const newContext = async (options) => {
+    const context = await browser.newContext(options);
+    job.contexts.add(context);
+    context.on('close', () => job.contexts.delete(context));
+    return context;
+  };
+
+  return new Proxy(browser, {
+    get(target, prop) {
+      switch (prop) {
+        case 'newContext':
+          return newContext;
+        case 'newPage':
+          return async (options) => (await newContext(options)).newPage();
+        case 'contexts':
+          return () => Array.from(job.contexts);
+        case 'close':
+          return async () => {
+            await closeContexts(job);
+            job.resolveClosed();
+          };
+        default: {
+          const value = Reflect.get(target, prop);
+          return typeof value === 'function' ? value.bind(target) : value;
+        }
+      }
+    }
+  });
+}
+
+/**
+ * ジョブ用の playwright モジュール（chromium.launch のみ差し替え）
+ */
+function createJobPlaywright(job) {
+  const chromium = new Proxy(playwright.chromium, {
+    get(target, prop) {
+      if (prop === 'launch') {
+        return async () => {
+          job.launched = true;
+          return job.browser;
+        };
+      }
+      const value = Reflect.get(target, prop);
+      return typeof value === 'function' ? value.bind(target) : value;
+    }
+  });
+
+  return new Proxy(playwright, {
+    get(target, prop) {
+      return prop === 'chromium' ? chromium : Reflect.get(target, prop);
+    }
+  });
+}
+
+/**
+ * ジョブが作成したコンテキストをすべて閉じる
+ */
+async function closeContexts(job) {
+  await Promise.all(Array.from(job.contexts).map(context => context.close().catch(() => {})));
+  job.contexts.clear();
+}
+
+/**
+ * ジョブ用のグローバル（タイマーは記録してジョブ終了時に止める）
+ */
+function createSandbox(job, filename) {
+  const timers = job.timers;
+  const track = (create, clear) => (...args) => {
+    const handle = create(...args);
+    timers.push(() => clear(handle));
+    return handle;
+  };
+
+  const jobPlaywright = createJobPlaywright(job);
+  const jobRequire = (name) => {
+    if (name === 'playwright' || name === 'playwright-core') return jobPlaywright;
+    return baseRequire(name);
+  };
+  jobRequire.resolve = baseRequire.resolve;
+
+  const jobProcess = new Proxy(process, {
+    get(target, prop) {
+      if (prop === 'exit') {
+        return (code) => { throw new ExitSignal(code); };
+      }
+      const value = Reflect.get(target, prop);
+      return typeof value === 'function' ? value.bind(target) : value;
+    }
+  });
+
+  const module = { exports: {} };
+  return {
+    console,
+    require: jobRequire,
+    process: jobProcess,
+    module,
+    exports: module.exports,
+    __filename: filename,
+    __dirname: path.dirname(filename),
+    Buffer,
+    URL,
+    URLSearchParams,
+    TextEncoder,
+    TextDecoder,
+    AbortController,
+    fetch: globalThis.fetch,
+    setTimeout: track(setTimeout, clearTimeout),
+    setInterval: track(setInterval, clearInterval),
+    setImmediate: track(setImmediate, clearImmediate),
+    clearTimeout,
+    clearInterval,
+    clearImmediate
+  };
+}
+
+/**
+ * ジョブの作業ディレクトリに書き出されたファイルを読み取る
+ */
+function collectFiles(jobDir) {
+  let remaining = maxOutputBytes;
+  return fs.readdirSync(jobDir)
+    .filter(name => name !== 'scraper.js' && fs.statSync(path.join(jobDir, name)).isFile())
+    .map(name => {
+      const bytes = fs.statSync(path.join(jobDir, name)).size;
+      const truncated = bytes > remaining;
+      const content = truncated ? null : fs.readFileSync(path.join(jobDir, name), 'utf-8');
+      remaining -= truncated ? 0 : bytes;
+      return { name, bytes, truncated, content };
+    });
+}
+
+/**
+ * 1件のジョブを実行
+ * @param {object} message - { jobId, code, jobDir }
+ */
+async function runJob({ code, jobDir }) {
+  const startedAt = Date.now();
+  const job = { contexts: new Set(), timers: [], launched: false };
+  job.closed = new Promise(resolve => { job.resolveClosed = resolve; });
+  job.browser = createJobBrowser(job);
+
+  fs.mkdirSync(jobDir, { recursive: true });
+  const filename = path.join(jobDir, 'scraper.js');
+  fs.writeFileSync(filename, code, 'utf-8');
+  process.chdir(jobDir);
+
+  try {
+    try {
+      const context = vm.createContext(createSandbox(job, filename));
+      const completion = new vm.Script(code, { filename }).runInContext(context);
+
+      if (completion && typeof completion.then === 'function') {
+        // 末尾の (async () => { ... })() や main() の Promise を待つ
+        await completion;
+      } else if (job.launched) {
+        // Promise を返さないスクリプトはブラウザを閉じるまで待つ
+        await job.closed;
+      }
+    } catch (error) {
+      if (!(error instanceof ExitSignal) || error.code !== 0) {
+        throw error;
+      }
+    } finally {
+      job.timers.forEach(clear => clear());
+      await closeContexts(job);
+      process.chdir(initialCwd);
+    }
+
+    return { files: collectFiles(jobDir), durationMs: Date.now() - startedAt };
+  } finally {
+    fs.rmSync(jobDir, { recursive: true, force: true });
+  }
+}
+
+// 生成コード内で処理されなかったエラーでワーカーを落とさない（ログとして残す）
+process.on('unhandledRejection', (error) => {
+  console.error('Unhandled rejection in scraper:', error);
+});
+process.on('uncaughtException', (error) => {
+  console.error('Uncaught exception in scraper:', error);
+});
+
+async function main() {
+  browser = await playwright.chromium.launch(launchOptions);
+  browser.on('disconnected', () => {
+    // ブラウザが落ちたワーカーは使えないため終了し、WorkerPool に作り直させる
+    process.exit(1);
+  });
+
+  send({ type: 'ready', runtime: 'node', version: process.version, browser: browser.version() });
+
+  // ジョブは1件ずつ順に実行する
+  let queue = Promise.resolve();
+  const lines = readline.createInterface({ input: process.stdin });
+  lines.on('line', (line) => {
+    const message = JSON.parse(line);
+    queue = queue.then(async () => {
+      if (message.type === 'ping') {
+        send({ type: 'pong', connected: browser.isConnected() });
+        return;
+      }
+      let reply;
+      try {
+        reply = { type: 'result', jobId: message.jobId, ...(await runJob(message)) };
+      } catch (error) {
+        reply = { type: 'error', jobId: message.jobId, message: error.message, stack: error.stack };
+      }
+      // ジョブのログを書き終えてから結果を送る（ログが次のジョブに紛れないように）
+      await Promise.all([process.stdout, process.stderr].map(stream => new Promise(resolve => stream.write('', resolve))));
+      send(reply);
+    });
+  });
+  lines.on('close', async () => {
+    await queue;
+    await browser.close().catch(() => {});
+    process.exit(0);
+  });
+}
+
+main().catch((error) => {
+  send({ type: 'fatal', message: error.message, stack: error.stack });
+  process.exit(1);
+});
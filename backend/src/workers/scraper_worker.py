@@ -0,0 +1,263 @@
+"""
+生成コード (Python) 実行ワーカー
+WorkerPool から起動され、Playwright の読み込みとブラウザの起動を済ませた状態で待機します。
+ジョブごとに新しいグローバル名前空間でコードを実行し、async_playwright() の chromium.launch() は起動済みブラウザを返します。
+asyncio.run() はワーカーのイベントループ上で実行するため、ブラウザとの接続をジョブ間で使い回せます。
+
+通信: 標準入力 ← ジョブ (1行1JSON)、fd 3 → メッセージ (1行1JSON)
+標準出力・標準エラーはジョブのログとして WorkerPool が読み取ります。
+"""
+
+import asyncio
+import builtins
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import traceback
+import types
+from typing import Any, Dict, List
+
+import playwright
+import playwright.async_api as async_api
+from playwright.async_api import Browser, BrowserContext, async_playwright
+
+CHANNEL = os.fdopen(3, "w", buffering=1, encoding="utf-8")
+LAUNCH_OPTIONS: Dict[str, Any] = json.loads(os.environ.get("WORKER_LAUNCH_OPTIONS") or "{}")
+MAX_OUTPUT_BYTES: int = int(os.environ.get("WORKER_MAX_OUTPUT_BYTES") or 20 * 1024 * 1024)
+INITIAL_CWD: str = os.getcwd()
+
+# Node.js の launch オプション名を Python の引数名に変換
+LAUNCH_OPTION_NAMES: Dict[str, str] = {"executablePath": "executable_path"}
+
+def send(message: Dict[str, Any]) -> None:
+    """
+    WorkerPool にメッセージを送ります。
+    """
+    CHANNEL.write(json.dumps(message, ensure_ascii=False) + "\n")
+
+class JobBrowser:
+    """
+    ジョブ単位のブラウザ (起動済みブラウザに対する窓口) です。
+    作成したコンテキストを記録し、close() やジョブ終了時にそれだけを閉じます。
+    """
+
+    def __init__(self, browser: Browser) -> None:
+        self._browser = browser
+        self._contexts: List[BrowserContext] = []
+
+    async def new_context(self, **kwargs: Any) -> BrowserContext:
+        context = await self._browser.new_context(**kwargs)
+        self._contexts.append(context)
+        return context
+
+    async def new_page(self, **kwargs: Any) -> Any:
+        return await (await self.new_context(**kwargs)).new_page()
+
+    @property
+    def contexts(self) -> List[BrowserContext]:
+        return list(self._contexts)
+
+    async def close(self, **kwargs: Any) -> None:
+        contexts, self._contexts = self._contexts, []
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+
+    async def __aenter__(self) -> "JobBrowser":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._browser, name)
+
+class JobBrowserType:
+    """
+    launch() のみ起動済みブラウザを返すように差し替えた BrowserType です。
+    """
+
+    def __init__(self, browser_type: Any, job_browser: JobBrowser) -> None:
+        self._browser_type = browser_type
+        self._job_browser = job_browser
+
+    async def launch(self, **kwargs: Any) -> JobBrowser:
+        return self._job_browser
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._browser_type, name)
+
+class JobPlaywright:
+    """
+    chromium のみ差し替えた Playwright です。async with async_playwright() と start() / stop() の両方に対応します。
+    """
+
+    def __init__(self, runtime: Any, job_browser: JobBrowser) -> None:
+        self._runtime = runtime
+        self._job_browser = job_browser
+        self.chromium = JobBrowserType(runtime.chromium, job_browser)
+
+    async def __aenter__(self) -> "JobPlaywright":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._job_browser.close()
+
+    async def start(self) -> "JobPlaywright":
+        return self
+
+    async def stop(self) -> None:
+        await self._job_browser.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._runtime, name)
+
+class Worker:
+    """
+    起動済みのイベントループ・Playwright・ブラウザを保持し、ジョブを1件ずつ実行します。
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.runtime = self.loop.run_until_complete(async_playwright().start())
+        options = {LAUNCH_OPTION_NAMES.get(key, key): value for key, value in LAUNCH_OPTIONS.items()}
+        self.browser = self.loop.run_until_complete(self.runtime.chromium.launch(**options))
+
+    def _job_modules(self, job_browser: JobBrowser) -> Dict[str, types.ModuleType]:
+        """
+        ジョブから import される playwright.async_api と asyncio の差し替えモジュールを作成します。
+        """
+        shim_api = types.ModuleType("playwright.async_api")
+        shim_api.__dict__.update(async_api.__dict__)
+        shim_api.async_playwright = lambda: JobPlaywright(self.runtime, job_browser)
+
+        shim_playwright = types.ModuleType("playwright")
+        shim_playwright.__dict__.update(playwright.__dict__)
+        shim_playwright.async_api = shim_api
+
+        shim_asyncio = types.ModuleType("asyncio")
+        shim_asyncio.__dict__.update(asyncio.__dict__)
+        shim_asyncio.run = lambda main, **kwargs: self.loop.run_until_complete(main)
+
+        return {"playwright.async_api": shim_api, "playwright": shim_playwright, "asyncio": shim_asyncio}
+
+    def run_job(self, code: str, job_dir: str) -> Dict[str, Any]:
+        """
+        新しいグローバル名前空間でコードを実行し、作業ディレクトリに書き出されたファイルを返します。
+        """
+        started = time.monotonic()
+        job_browser = JobBrowser(self.browser)
+        modules = self._job_modules(job_browser)
+        real_import = builtins.__import__
+
+        def job_import(name: str, globals: Any = None, locals: Any = None, fromlist: Any = (), level: int = 0) -> Any:
+            if level == 0 and name in modules:
+                # import playwright.async_api はトップレベルの playwright を返す
+                if name == "playwright.async_api" and not fromlist:
+                    return modules["playwright"]
+                return modules[name]
+            return real_import(name, globals, locals, fromlist, level)
+
+        job_builtins = dict(builtins.__dict__)
+        job_builtins["__import__"] = job_import
+        filename = os.path.join(job_dir, "scraper.py")
+        namespace = {"__name__": "__main__", "__file__": filename, "__builtins__": job_builtins}
+
+        os.makedirs(job_dir, exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        # logging.basicConfig() などでジョブが追加したハンドラーは終了時に外す
+        root_handlers = list(logging.root.handlers)
+        root_level = logging.root.level
+        os.chdir(job_dir)
+        try:
+            try:
+                exec(compile(code, filename, "exec"), namespace)
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    raise RuntimeError(f"Scraper exited with code {e.code}") from e
+            finally:
+                self._cleanup(job_browser, filename)
+                logging.root.handlers = root_handlers
+                logging.root.setLevel(root_level)
+                os.chdir(INITIAL_CWD)
+            return {"files": self._collect_files(job_dir), "durationMs": int((time.monotonic() - started) * 1000)}
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _cleanup(self, job_browser: JobBrowser, filename: str) -> None:
+        """
+        ジョブが残したタスク (ジョブのコードで定義されたコルーチン) を止め、作成したコンテキストを閉じます。
+        Playwright 自身のタスクは同じループで動いているため止めません。
+        """
+        pending = [
+            task for task in asyncio.all_tasks(self.loop)
+            if not task.done() and getattr(getattr(task.get_coro(), "cr_code", None), "co_filename", None) == filename
+        ]
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.run_until_complete(job_browser.close())
+
+    @staticmethod
+    def _collect_files(job_dir: str) -> List[Dict[str, Any]]:
+        files = []
+        remaining = MAX_OUTPUT_BYTES
+        for name in sorted(os.listdir(job_dir)):
+            path = os.path.join(job_dir, name)
+            if name == "scraper.py" or not os.path.isfile(path):
+                continue
+            size = os.path.getsize(path)
+            truncated = size > remaining
+            content = None
+            if not truncated:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+                remaining -= size
+            files.append({"name": name, "bytes": size, "truncated": truncated, "content": content})
+        return files
+
+    def ping(self) -> bool:
+        # 待機中に溜まったブラウザからのイベントを処理する
+        self.loop.run_until_complete(asyncio.sleep(0))
+        return self.browser.is_connected()
+
+    def close(self) -> None:
+        self.loop.run_until_complete(self.browser.close())
+        self.loop.run_until_complete(self.runtime.stop())
+
+def main() -> None:
+    try:
+        worker = Worker()
+    except Exception as e:
+        send({"type": "fatal", "message": str(e), "stack": traceback.format_exc()})
+        sys.exit(1)
+
+    send({"type": "ready", "runtime": "python", "version": sys.version.split()[0], "browser": worker.browser.version})
+
+    for line in sys.stdin:
+        message = json.loads(line)
+        if message.get("type") == "ping":
+            send({"type": "pong", "connected": worker.ping()})
+            continue
+        try:
+            result = worker.run_job(message["code"], message["jobDir"])
+            send({"type": "result", "jobId": message["jobId"], **result})
+        except Exception as e:
+            send({"type": "error", "jobId": message["jobId"], "message": str(e) or type(e).__name__, "stack": traceback.format_exc()})
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+    worker.close()
+
+if __name__ == "__main__":
+    main()
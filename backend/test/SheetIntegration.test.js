@@ -0,0 +1,45 @@
+/**
+ * SheetIntegration.buildFormatRequests のテスト
+ */
+
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const sheetIntegration = require('../src/services/SheetIntegration');
+
+function ranges(requests) {
+  return requests.map(({ repeatCell }) => [
+    repeatCell.range.startRowIndex,
+    repeatCell.range.endRowIndex,
+    repeatCell.cell.userEnteredFormat.backgroundColor
+  ]);
+}
+
+const GREEN = { red: 0.7, green: 0.9, blue: 0.7 };
+const YELLOW = { red: 1, green: 0.95, blue: 0.6 };
+const RED = { red: 0.95, green: 0.7, blue: 0.7 };
+
+test('連続する同じ色の行を1つの範囲にまとめる', () => {
+  const formats = new Map([[4, 'green'], [2, 'green'], [3, 'green']]);
+  assert.deepEqual(ranges(sheetIntegration.buildFormatRequests(formats)), [[1, 4, GREEN]]);
+});
+
+test('色が変わる行・連続しない行で範囲を分ける', () => {
+  const formats = new Map([[2, 'green'], [3, 'yellow'], [4, 'yellow'], [6, 'yellow'], [7, 'red']]);
+  assert.deepEqual(ranges(sheetIntegration.buildFormatRequests(formats)), [
+    [1, 2, GREEN],
+    [2, 4, YELLOW],
+    [5, 6, YELLOW],
+    [6, 7, RED]
+  ]);
+});
+
+test('未知の色は緑として扱い、背景色のみを更新する', () => {
+  const [request] = sheetIntegration.buildFormatRequests(new Map([[5, 'blue']]));
+  assert.deepEqual(request.repeatCell.cell.userEnteredFormat.backgroundColor, GREEN);
+  assert.equal(request.repeatCell.fields, 'userEnteredFormat.backgroundColor');
+  assert.equal(request.repeatCell.range.sheetId, 0);
+});
+
+test('書き込みがなければリクエストを作らない', () => {
+  assert.deepEqual(sheetIntegration.buildFormatRequests(new Map()), []);
+});
@@ -0,0 +1,73 @@
+/**
+ * StateStore のテスト（スライディングウィンドウ近似と待ち時間の推定）
+ */
+
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const { createStateStore, estimateCount, estimateRetryAfter } = require('../src/services/StateStore');
+
+const WINDOW = 1000;
+
+function memoryStore() {
+  return createStateStore({ backend: 'memory', visitedTtlMs: 60000, maxVisitedEntries: 3 });
+}
+
+test('estimateCount: 直前ウィンドウの件数を残り時間の割合で按分する', () => {
+  assert.equal(estimateCount(10, 2, 0, WINDOW), 12);
+  assert.equal(estimateCount(10, 2, 250, WINDOW), 9.5);
+  assert.equal(estimateCount(10, 2, WINDOW, WINDOW), 2);
+  assert.equal(estimateCount(0, 5, 500, WINDOW), 5);
+});
+
+test('estimateRetryAfter: 現在のウィンドウだけで上限に達していればウィンドウの終わりまで待つ', () => {
+  assert.equal(estimateRetryAfter(10, 5, 300, WINDOW, 5), 700);
+  assert.equal(estimateRetryAfter(0, 4, 300, WINDOW, 5), 700);
+});
+
+test('estimateRetryAfter: 直前ウィンドウの寄与が空きを下回る時刻まで待つ', () => {
+  // 推定 = 10 * (1 - t / 1000) + 3 が 5 未満になるのは t > 800
+  const wait = estimateRetryAfter(10, 3, 200, WINDOW, 5);
+  assert.equal(wait, 600);
+  assert.ok(estimateCount(10, 3, 200 + wait + 1, WINDOW) < 5);
+});
+
+test('estimateRetryAfter: ウィンドウの残り時間を超えず、負にならない', () => {
+  assert.equal(estimateRetryAfter(10, 3, 900, WINDOW, 5), 0);
+  assert.ok(estimateRetryAfter(1000, 1, 0, WINDOW, 2) <= WINDOW);
+});
+
+test('consume: 上限まで許可し、超過時は待ち時間を返す', async () => {
+  const store = memoryStore();
+  const limits = [{ windowMs: WINDOW, max: 2 }];
+  assert.equal((await store.consume('host', limits, 10000)).allowed, true);
+  assert.equal((await store.consume('host', limits, 10100)).allowed, true);
+
+  const denied = await store.consume('host', limits, 10200);
+  assert.deepEqual(denied, { allowed: false, retryAfterMs: 800, windowMs: WINDOW });
+  assert.equal((await store.consume('other', limits, 10200)).allowed, true);
+});
+
+test('consume: 次のウィンドウでは直前の件数が按分されて徐々に許可される', async () => {
+  const store = memoryStore();
+  const limits = [{ windowMs: WINDOW, max: 2 }];
+  await store.consume('host', limits, 10000);
+  await store.consume('host', limits, 10100);
+
+  // 経過 20%: 2 * 0.8 = 1.6 < 2 → 許可、その後 1.6 + 1 >= 2 → 拒否
+  assert.equal((await store.consume('host', limits, 11200)).allowed, true);
+  const denied = await store.consume('host', limits, 11200);
+  assert.equal(denied.allowed, false);
+  // 2 * (1 - t / 1000) + 1 < 2 になるのは t > 500
+  assert.equal(denied.retryAfterMs, 300);
+  // 2つ以上前のウィンドウは数えない
+  assert.equal((await store.consume('host', limits, 13000)).allowed, true);
+});
+
+test('consume: 複数のウィンドウのどれかが超過すれば記録しない', async () => {
+  const store = memoryStore();
+  const limits = [{ windowMs: WINDOW, max: 10 }, { windowMs: 60000, max: 1 }];
+  assert.equal((await store.consume('host', limits, 0)).allowed, true);
+  const denied = await store.consume('host', limits, 5000);
+  assert.equal(denied.windowMs, 60000);
+  assert.equal(store.windows.get(`host|${WINDOW}`).current, 0);
+});
@@ -0,0 +1,353 @@
+"""
+AI Scraper Builder - バックエンドAPIクライアント
+streamlit_ui.py から使用します。Streamlitはウィジェット操作のたびにスクリプト全体を再実行するため、
+接続は共有セッションで再利用し、変化の少ないエンドポイント (/api/config, /api/stats) はTTL付きでキャッシュします。
+モジュールは再実行をまたいで保持されるので、セッションとキャッシュも再実行ごとには作り直されません。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# バックエンドURL（環境変数から取得、デフォルトはlocalhost）
+BACKEND_URL: str = os.getenv("BACKEND_URL", "http://localhost:3000")
+# 接続確立のタイムアウト (秒)。読み取りのタイムアウトはエンドポイントごとに指定
+CONNECT_TIMEOUT: float = 3.05
+# キャッシュの有効期間 (秒)
+CONFIG_TTL: float = 300.0
+STATS_TTL: float = 10.0
+# 冪等な呼び出し (GET) のリトライ設定
+RETRY_TOTAL: int = 3
+RETRY_BACKOFF: float = 0.5
+RETRY_STATUSES: Tuple[int, ...] = (502, 503, 504)
+# ジョブ状態のポーリング間隔 (秒)
+JOB_POLL_INTERVAL: float = 1.0
+# 取得済みアーティファクト (スクリーンショット) を保持する件数
+ARTIFACT_CACHE_SIZE: int = 32
+
+class BackendError(Exception):
+    """
+    バックエンドがエラー応答 (2xx以外) を返した場合の例外です。
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _create_session() -> requests.Session:
+    """
+    コネクションプールとリトライ (GETのみ) を設定したセッションを作成します。
+    解析・生成・実行の POST は冪等でないためリトライしません。
+    """
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_session = _create_session()
+_cache: Dict[str, Tuple[float, Any]] = {}
+_cache_lock = threading.Lock()
+_artifact_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+def _send(method: str, path: str, read_timeout: float, **kwargs: Any) -> requests.Response:
+    """
+    バックエンドを呼び出し、レスポンスを返します。2xx以外は BackendError を送出します。
+    タイムアウトは requests.exceptions.Timeout のまま呼び出し側に伝えます。
+    """
+    response = _session.request(method, f"{BACKEND_URL}{path}", timeout=(CONNECT_TIMEOUT, read_timeout), **kwargs)
+    if not response.ok:
+        try:
+            message = response.json().get("error")
+        except ValueError:
+            message = None
+        raise BackendError(response.status_code, message or f"HTTP {response.status_code}")
+    return response
+
+def _request(method: str, path: str, read_timeout: float, **kwargs: Any) -> Dict[str, Any]:
+    """
+    バックエンドを呼び出し、JSONレスポンスを返します。
+    """
+    return _send(method, path, read_timeout, **kwargs).json()
+
+def _cached_get(path: str, ttl: float, read_timeout: float, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    TTL付きでGETの結果をキャッシュします。
+    更新に失敗した場合は、期限切れでもキャッシュ済みの値があればそれを返します。
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(path)
+    if entry and not force_refresh and now - entry[0] < ttl:
+        return entry[1]
+    try:
+        body = _request("GET", path, read_timeout)
+    except (requests.exceptions.RequestException, BackendError):
+        if entry:
+            return entry[1]
+        raise
+    with _cache_lock:
+        _cache[path] = (time.monotonic(), body)
+    return body
+
+def invalidate(path: str | None = None) -> None:
+    """
+    キャッシュを破棄します (path 省略時はすべて)。
+    """
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
+
+def get_config(force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    アンチボット対策の設定を取得します (CONFIG_TTL 秒キャッシュ)。
+    """
+    return _cached_get("/api/config", CONFIG_TTL, 5, force_refresh)["config"]
+
+def get_stats(force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    統計情報を取得します (STATS_TTL 秒キャッシュ)。
+    """
+    return _cached_get("/api/stats", STATS_TTL, 5, force_refresh)["stats"]
+
+def _analyze_payload(url: str, screenshot: bool, full_page_screenshot: bool) -> Dict[str, Any]:
+    return {"url": url, "screenshot": screenshot, "fullPageScreenshot": full_page_screenshot}
+
+def _generate_payload(
+    url: str,
+    targets: List[Dict[str, Any]],
+    pagination: bool,
+    login_required: bool,
+    output_format: str,
+    language: str,
+) -> Dict[str, Any]:
+    return {
+        "url": url,
+        "targets": targets,
+        "pagination": pagination,
+        "loginRequired": login_required,
+        "outputFormat": output_format,
+        "language": language,
+    }
+
+def _execute_payload(
+    code: str,
+    url: str,
+    targets: List[Dict[str, Any]],
+    save_output: bool,
+    output_format: str,
+    include_data: bool,
+    pagination: bool | Dict[str, Any] | None = None,
+    max_pages: int | None = None,
+    engine: str | None = None,
+    language: str | None = None,
+) -> Dict[str, Any]:
+    payload = {
+        "code": code,
+        "url": url,
+        "targets": targets,
+        "saveOutput": save_output,
+        "outputFormat": output_format,
+        "includeData": include_data,
+    }
+    if pagination:
+        payload["pagination"] = pagination
+    if max_pages is not None:
+        payload["maxPages"] = max_pages
+    if engine:
+        payload["engine"] = engine
+    if language:
+        payload["language"] = language
+    return payload
+
+def analyze_page(url: str, screenshot: bool = True, full_page_screenshot: bool = False) -> Dict[str, Any]:
+    """
+    ページを解析し、データ要素の提案・スクリーンショット・ページネーション情報を返します (完了まで待機)。
+    """
+    return _request("POST", "/api/analyze", 60, json=_analyze_payload(url, screenshot, full_page_screenshot))
+
+def generate_code(
+    url: str,
+    targets: List[Dict[str, Any]],
+    pagination: bool = False,
+    login_required: bool = False,
+    output_format: str = "json",
+    language: str = "javascript",
+) -> Dict[str, Any]:
+    """
+    選択したデータ要素からスクレイパーコードを生成します (完了まで待機)。
+    """
+    return _request("POST", "/api/generate", 180, json=_generate_payload(url, targets, pagination, login_required, output_format, language))
+
+def execute_scraper(
+    code: str,
+    url: str,
+    targets: List[Dict[str, Any]],
+    save_output: bool = True,
+    output_format: str = "json",
+    include_data: bool = True,
+    pagination: bool | Dict[str, Any] | None = None,
+    max_pages: int | None = None,
+    engine: str | None = None,
+    language: str | None = None,
+) -> Dict[str, Any]:
+    """
+    生成したスクレイパーを実行し、取得結果を返します (完了まで待機)。実行後は統計のキャッシュを破棄します。
+    include_data=False の場合、結果には列名と行数のみが含まれます (データは get_result_page() で取得)。
+    pagination (True または analyze_page() の pagination) を指定すると、max_pages まで次ページを辿って取得します。
+    engine="worker" の場合は生成コード (language で指定した言語) をバックエンドのワーカープールで実行します。
+    """
+    try:
+        return _request("POST", "/api/execute", 120, json=_execute_payload(code, url, targets, save_output, output_format, include_data, pagination, max_pages, engine, language))
+    finally:
+        invalidate("/api/stats")
+
+def _submit(path: str, payload: Dict[str, Any]) -> str:
+    """
+    ジョブとして登録し、ジョブIDを返します (サーバーは処理の完了を待たずに応答します)。
+    """
+    return _request("POST", path, 10, json={**payload, "async": True})["jobId"]
+
+def submit_analyze(url: str, screenshot: bool = True, full_page_screenshot: bool = False) -> str:
+    """
+    ページ解析をジョブとして登録します。結果は wait_for_job() で取得します。
+    """
+    return _submit("/api/analyze", _analyze_payload(url, screenshot, full_page_screenshot))
+
+def submit_generate(
+    url: str,
+    targets: List[Dict[str, Any]],
+    pagination: bool = False,
+    login_required: bool = False,
+    output_format: str = "json",
+    language: str = "javascript",
+) -> str:
+    """
+    コード生成をジョブとして登録します。
+    """
+    return _submit("/api/generate", _generate_payload(url, targets, pagination, login_required, output_format, language))
+
+def submit_execute(
+    code: str,
+    url: str,
+    targets: List[Dict[str, Any]],
+    save_output: bool = True,
+    output_format: str = "json",
+    include_data: bool = True,
+    pagination: bool | Dict[str, Any] | None = None,
+    max_pages: int | None = None,
+    engine: str | None = None,
+    language: str | None = None,
+) -> str:
+    """
+    スクレイパー実行をジョブとして登録します。
+    """
+    invalidate("/api/stats")
+    return _submit("/api/execute", _execute_payload(code, url, targets, save_output, output_format, include_data, pagination, max_pages, engine, language))
+
+def get_job(job_id: str) -> Dict[str, Any]:
+    """
+    ジョブの状態・進捗 (完了時は結果も) を取得します。
+    """
+    return _request("GET", f"/api/jobs/{job_id}", 5)["job"]
+
+def wait_for_job(
+    job_id: str,
+    on_progress: Callable[[Dict[str, Any]], None] | None = None,
+    poll_interval: float = JOB_POLL_INTERVAL,
+    timeout: float | None = None,
+) -> Any:
+    """
+    ジョブの終了をポーリングで待ち、結果を返します。
+    状態が変わるたびに on_progress にジョブを渡します。ジョブが失敗した場合は BackendError を送出します。
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    last_update = None
+    while True:
+        job = get_job(job_id)
+        if on_progress and job["updatedAt"] != last_update:
+            on_progress(job)
+            last_update = job["updatedAt"]
+        if job["status"] == "completed":
+            return job["result"]
+        if job["status"] == "failed":
+            raise BackendError(500, job.get("error") or "Job failed")
+        if deadline and time.monotonic() > deadline:
+            raise TimeoutError(f"Job {job_id} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+
+def get_result_page(
+    scraper_id: str,
+    offset: int = 0,
+    limit: int | None = None,
+    columns: List[str] | None = None,
+) -> Tuple["pd.DataFrame", int]:
+    """
+    実行結果の指定範囲・列を Arrow IPC で取得し、(DataFrame, 総行数) を返します (pyarrowが必要)。
+    Arrowのバッファから直接DataFrameを組み立てるため、Pythonのリストを経由しません。
+    バックエンドに apache-arrow がない場合 (501) は JSON で取得します。
+    """
+    import pyarrow as pa
+
+    params: Dict[str, Any] = {"format": "arrow", "offset": offset}
+    if limit is not None:
+        params["limit"] = limit
+    if columns:
+        params["columns"] = ",".join(columns)
+    try:
+        response = _send("GET", f"/api/result/{scraper_id}", 60, params=params)
+    except BackendError as e:
+        if e.status != 501:
+            raise
+        import pandas as pd
+
+        body = _request("GET", f"/api/result/{scraper_id}", 60, params={**params, "format": "json"})
+        return pd.DataFrame(body["result"]["data"], columns=body["page"]["columns"]), int(body["page"]["totalRows"])
+    table = pa.ipc.open_stream(response.content).read_all()
+    return table.to_pandas(), int(response.headers.get("X-Total-Rows", table.num_rows))
+
+def fetch_artifact(artifact_id: str) -> bytes:
+    """
+    スクリーンショットなどのアーティファクトを取得します。
+    IDは内容のハッシュで、同じIDの内容は変わらないため、取得済みのものは期限なしでキャッシュします。
+    """
+    with _cache_lock:
+        cached = _artifact_cache.get(artifact_id)
+        if cached is not None:
+            _artifact_cache.move_to_end(artifact_id)
+    if cached is not None:
+        return cached
+    content = _send("GET", f"/api/artifacts/{artifact_id}", 30).content
+    with _cache_lock:
+        _artifact_cache[artifact_id] = content
+        while len(_artifact_cache) > ARTIFACT_CACHE_SIZE:
+            _artifact_cache.popitem(last=False)
+    return content
+
+def download_result(scraper_id: str, fmt: str = "csv", columns: List[str] | None = None) -> bytes:
+    """
+    実行結果の全行をファイル (csv または arrow) としてそのまま取得します。
+    """
+    params: Dict[str, Any] = {"format": fmt}
+    if columns:
+        params["columns"] = ",".join(columns)
+    return _send("GET", f"/api/result/{scraper_id}", 120, params=params).content
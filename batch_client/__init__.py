@@ -0,0 +1,19 @@
+"""
+AI Scraper Builder - 一括実行クライアント
+大量のURLをバックエンドの /api/auto-scrape に登録し、結果を1つのファイルに収集します。
+
+使い方: python -m batch_client urls.csv --output results.ndjson [--resume]
+"""
+
+from batch_client.client import AsyncBackendClient, JobTimeoutError
+from batch_client.runner import BatchItem, BatchRunner, JobJournal, RateLimiter, read_items
+
+__all__ = [
+    "AsyncBackendClient",
+    "BatchItem",
+    "BatchRunner",
+    "JobJournal",
+    "JobTimeoutError",
+    "RateLimiter",
+    "read_items",
+]
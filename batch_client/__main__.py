@@ -0,0 +1,78 @@
+"""
+一括実行CLI
+使い方: python -m batch_client urls.csv --output results.ndjson [--concurrency 8] [--rate 2] [--resume]
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from backend_client import BACKEND_URL
+from batch_client.client import AsyncBackendClient
+from batch_client.runner import BATCH_CONCURRENCY, JOB_TIMEOUT, POLL_INTERVAL, SUBMIT_RATE, BatchRunner, JobJournal, read_items
+from sinks import StreamingWriter, sink_format
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 既定の出力ファイル
+OUTPUT_FILENAME: str = "batch_results.ndjson"
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析します。
+    """
+    parser = argparse.ArgumentParser(description="Submit URLs to the AI Scraper Builder backend in bulk")
+    parser.add_argument("input", help="対象URLの一覧 (CSV または NDJSON)")
+    parser.add_argument("--input-format", choices=["csv", "ndjson"], help="入力形式 (省略時は拡張子から判定)")
+    parser.add_argument("--url-column", default="url", help="URLの列名 (CSV) またはキー (NDJSON)")
+    parser.add_argument("--backend-url", default=BACKEND_URL, help="バックエンドのURL")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="同時に処理中にするジョブ数")
+    parser.add_argument("--rate", type=float, default=SUBMIT_RATE, help="1秒あたりの登録数の上限 (0 で無制限)")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, help="ジョブ状態のポーリング間隔 (秒)")
+    parser.add_argument("--job-timeout", type=float, default=JOB_TIMEOUT, help="1ジョブの完了を待つ上限 (秒)。超えたジョブは再開時に待ち直す")
+    parser.add_argument("--include-data", action="store_true", help="要約ではなく取得データを1レコード1行で出力 (NDJSONのみ)")
+    parser.add_argument("--output", default=OUTPUT_FILENAME, help="出力ファイル名 (拡張子から形式を判定)")
+    parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], help="出力形式 (省略時は拡張子から判定)")
+    parser.add_argument("--batch-size", type=int, default=20, help="何行ごとにファイルへ書き出すか")
+    parser.add_argument("--checkpoint", help="チェックポイントファイル (省略時は '<output>.checkpoint.json')")
+    parser.add_argument("--journal", help="登録済みジョブの記録 (省略時は '<output>.jobs.ndjson')")
+    parser.add_argument("--resume", action="store_true", help="チェックポイントとジョブの記録から再開")
+    args = parser.parse_args(argv)
+    if args.include_data and sink_format(args.output, args.format) != "ndjson":
+        # スクレイパーごとに列が異なるため、最初の行で列が固定されるCSV / Parquetでは列が欠落する
+        parser.error("--include-data requires NDJSON output (use --output <name>.ndjson or --format ndjson)")
+    return args
+
+async def main(argv: List[str] | None = None) -> None:
+    """
+    入力を読み込み、一括登録と結果の収集を実行します。
+    """
+    args = parse_args(argv)
+    items = read_items(args.input, args.input_format, args.url_column)
+    logging.info(f"Loaded {len(items)} URLs from {args.input}")
+
+    journal = JobJournal(args.journal or f"{args.output}.jobs.ndjson", resume=args.resume)
+    try:
+        with StreamingWriter(args.output, args.format, args.batch_size, args.checkpoint, args.resume) as writer:
+            async with AsyncBackendClient(args.backend_url) as client:
+                runner = BatchRunner(
+                    client,
+                    writer,
+                    journal,
+                    concurrency=args.concurrency,
+                    rate=args.rate,
+                    poll_interval=args.poll_interval,
+                    job_timeout=args.job_timeout,
+                    include_data=args.include_data,
+                )
+                counts = await runner.run(items)
+            logging.info(f"{writer.rows_written} rows written to {writer.sink.path} ({counts})")
+    finally:
+        journal.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.info("Interrupted. Run again with --resume to continue.")
@@ -0,0 +1,149 @@
+"""
+バックエンドAPIの非同期クライアント
+大量のURLを /api/auto-scrape に登録し、ジョブの完了を待って結果を取得します。
+接続は1つの httpx.AsyncClient で共有し、同時に待機するジョブが多くても接続数は MAX_CONNECTIONS に抑えます。
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict
+
+import httpx
+
+from backend_client import BACKEND_URL, BackendError
+
+# 接続プールの上限
+MAX_CONNECTIONS: int = 20
+# リクエストのタイムアウト (秒)
+REQUEST_TIMEOUT: float = 30.0
+# 登録・取得をリトライするステータスと回数 (指数バックオフ、Retry-After があれば従う)
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_TOTAL: int = 5
+RETRY_BACKOFF: float = 1.0
+RETRY_MAX_DELAY: float = 60.0
+# ジョブが終了したことを示すステータス
+FINISHED_STATUSES = {"completed", "failed"}
+
+class JobTimeoutError(Exception):
+    """
+    ジョブが制限時間内に終了しなかったことを示します。ジョブ自体はバックエンドで継続しています。
+    """
+
+    def __init__(self, job_id: str, timeout: float) -> None:
+        super().__init__(f"Job {job_id} did not finish within {timeout:.0f}s")
+        self.job_id = job_id
+
+class AsyncBackendClient:
+    """
+    バックエンドAPIの非同期クライアントです。async with で使用します。
+    """
+
+    def __init__(self, base_url: str = BACKEND_URL, timeout: float = REQUEST_TIMEOUT) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+
+    async def __aenter__(self) -> "AsyncBackendClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        """
+        リクエストを送信し、JSON応答を返します。2xx以外と通信エラーは BackendError を送出します。
+        POST は応答が返らないまま接続が切れた場合に二重登録になり得るため、接続できなかった場合とリトライ対象のステータスのみ再送します。
+        """
+        retryable_errors = (httpx.ConnectError, httpx.ConnectTimeout) if method == "POST" else (httpx.TransportError,)
+        for attempt in range(RETRY_TOTAL + 1):
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except retryable_errors as e:
+                if attempt >= RETRY_TOTAL:
+                    raise BackendError(0, f"Cannot connect to backend: {e}") from e
+                delay = self._backoff(attempt)
+                logging.warning(f"{method} {path} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except httpx.HTTPError as e:
+                # 送信後の読み取りタイムアウトなど (POST はバックエンドに届いている可能性があるため再送しない)
+                raise BackendError(0, f"{method} {path} failed: {e!r}") from e
+
+            if response.status_code in RETRY_STATUSES and attempt < RETRY_TOTAL:
+                delay = self._retry_after(response) or self._backoff(attempt)
+                logging.warning(f"{method} {path} returned {response.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                body = response.json()
+            except ValueError:
+                body = {"error": response.text}
+            if not response.is_success:
+                raise BackendError(response.status_code, body.get("error") or f"HTTP {response.status_code}")
+            return body
+
+        raise BackendError(0, f"{method} {path} failed after {RETRY_TOTAL} retries")
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(RETRY_MAX_DELAY, RETRY_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float | None:
+        value = response.headers.get("Retry-After")
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
+    async def submit_auto_scrape(
+        self,
+        url: str,
+        spreadsheet_id: str | None = None,
+        row_number: int | None = None,
+        priority: int | None = None,
+    ) -> str:
+        """
+        完全自動パイプラインをキューに登録し、ジョブIDを返します。
+        """
+        payload: Dict[str, Any] = {"url": url}
+        if spreadsheet_id:
+            payload["spreadsheetId"] = spreadsheet_id
+        if row_number:
+            payload["rowNumber"] = row_number
+        if priority is not None:
+            payload["priority"] = priority
+        return (await self._request("POST", "/api/auto-scrape", json=payload))["jobId"]
+
+    async def get_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        ジョブの状態・進捗 (終了時は結果も) を取得します。
+        """
+        return (await self._request("GET", f"/api/jobs/{job_id}"))["job"]
+
+    async def wait_for_job(self, job_id: str, poll_interval: float = 2.0, timeout: float | None = None) -> Dict[str, Any]:
+        """
+        ジョブが終了 (completed / failed) するまでポーリングし、最終状態を返します。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = await self.get_job(job_id)
+            if job["status"] in FINISHED_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise JobTimeoutError(job_id, timeout)
+            await asyncio.sleep(poll_interval)
+
+    async def get_result(self, scraper_id: str) -> Dict[str, Any]:
+        """
+        実行結果 (列ごとのデータを含む) を取得します。
+        """
+        return (await self._request("GET", f"/api/result/{scraper_id}"))["result"]
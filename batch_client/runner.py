@@ -0,0 +1,256 @@
+"""
+URLの一括登録と結果の収集
+CSV / NDJSON から読み込んだURLを上限付きの並列数・登録レートで /api/auto-scrape に登録し、
+終了したジョブの結果を1つの出力ファイルへ順次書き出します。
+登録したジョブIDはジャーナルに、書き出したURLはチェックポイントに記録するため、中断後は続きから再開できます。
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from backend_client import BackendError
+from batch_client.client import AsyncBackendClient, JobTimeoutError
+from sinks import StreamingWriter
+
+# 同時に処理中 (登録済みで未終了) にするジョブ数
+BATCH_CONCURRENCY: int = 8
+# 1秒あたりの登録数の上限
+SUBMIT_RATE: float = 2.0
+# ジョブ状態のポーリング間隔 (秒)
+POLL_INTERVAL: float = 2.0
+# 1ジョブの完了を待つ上限 (秒)
+JOB_TIMEOUT: float = 30 * 60
+# 何件終了するごとに進捗をログに出すか
+PROGRESS_EVERY: int = 50
+
+@dataclass
+class BatchItem:
+    """
+    登録する1件分の入力です。
+    """
+
+    url: str
+    spreadsheet_id: str | None = None
+    row_number: int | None = None
+    priority: int | None = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+def read_items(path: str, fmt: str | None = None, url_column: str = "url") -> List[BatchItem]:
+    """
+    CSV または NDJSON (拡張子から判定) から入力を読み込みます。重複したURLは最初の1件のみ残します。
+    NDJSON は1行1オブジェクト ({"url": ...}) またはURL文字列を受け付けます。
+    spreadsheetId / rowNumber / priority 列はそのまま登録時に渡し、それ以外の列は出力にそのまま引き継ぎます。
+    """
+    fmt = fmt or ("ndjson" if os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl") else "csv")
+    if fmt == "ndjson":
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        records = [record if isinstance(record, dict) else {url_column: record} for record in records]
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+
+    items: List[BatchItem] = []
+    seen = set()
+    for record in records:
+        url = (record.get(url_column) or "").strip()
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        extra = {key: value for key, value in record.items() if key not in (url_column, "spreadsheetId", "rowNumber", "priority")}
+        items.append(BatchItem(
+            url=url,
+            spreadsheet_id=record.get("spreadsheetId") or None,
+            row_number=int(record["rowNumber"]) if record.get("rowNumber") else None,
+            priority=int(record["priority"]) if record.get("priority") not in (None, "") else None,
+            extra=extra,
+        ))
+    return items
+
+class RateLimiter:
+    """
+    トークンバケットで1秒あたりの実行回数を制限します (burst 回までは連続して通します)。
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class JobJournal:
+    """
+    登録したジョブIDを追記型のNDJSONに記録します。
+    再開時は記録済みのジョブを再登録せずに状態の確認から続けます。
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.path = path
+        self.jobs: Dict[str, str] = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.jobs[entry["url"]] = entry["jobId"]
+                    except (ValueError, KeyError):
+                        continue  # 書き込み途中で中断した行
+            logging.info(f"Loaded job journal {path}: {len(self.jobs)} submitted jobs")
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, url: str, job_id: str) -> None:
+        self.jobs[url] = job_id
+        self._file.write(json.dumps({"url": url, "jobId": job_id}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def forget(self, url: str) -> None:
+        self.jobs.pop(url, None)
+
+    def close(self) -> None:
+        self._file.close()
+
+class BatchRunner:
+    """
+    入力を concurrency 個のワーカーで処理します。
+    各ワーカーは登録 (レート制限付き) → 完了待ち → 結果の書き出しを1件ずつ行うため、
+    同時に処理中のジョブ数は concurrency を超えません。
+    """
+
+    def __init__(
+        self,
+        client: AsyncBackendClient,
+        writer: StreamingWriter,
+        journal: JobJournal,
+        concurrency: int = BATCH_CONCURRENCY,
+        rate: float = SUBMIT_RATE,
+        poll_interval: float = POLL_INTERVAL,
+        job_timeout: float = JOB_TIMEOUT,
+        include_data: bool = False,
+    ) -> None:
+        self.client = client
+        self.writer = writer
+        self.journal = journal
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate, burst=max(1, int(rate)))
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.include_data = include_data
+        self.counts: Dict[str, int] = {"submitted": 0, "resumed": 0, "completed": 0, "failed": 0, "pending": 0, "errors": 0}
+        self._finished = 0
+
+    async def run(self, items: List[BatchItem]) -> Dict[str, int]:
+        """
+        出力済みのURLを除いて処理し、件数の集計を返します。
+        """
+        remaining = [item for item in items if item.url not in self.writer.completed_urls]
+        skipped = len(items) - len(remaining)
+        if skipped:
+            logging.info(f"Skipping {skipped} URLs already written to {self.writer.sink.path}")
+        logging.info(f"Processing {len(remaining)} URLs with concurrency {self.concurrency}")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in remaining:
+            queue.put_nowait(item)
+
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(min(self.concurrency, len(remaining)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.writer.flush()
+        return self.counts
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self._process(item)
+            except JobTimeoutError as e:
+                # ジョブはバックエンドで継続しているため、再開時にジャーナルのIDで待ち直す
+                self.counts["pending"] += 1
+                logging.warning(f"{item.url}: {e}")
+            except BackendError as e:
+                self.counts["errors"] += 1
+                logging.error(f"{item.url}: {e.message}")
+            self._finished += 1
+            if self._finished % PROGRESS_EVERY == 0:
+                logging.info(f"Progress: {self._finished} finished, {queue.qsize()} queued ({self.counts})")
+
+    async def _process(self, item: BatchItem) -> None:
+        job = None
+        job_id = self.journal.jobs.get(item.url)
+        if job_id:
+            try:
+                job = await self.client.wait_for_job(job_id, self.poll_interval, self.job_timeout)
+                self.counts["resumed"] += 1
+            except BackendError as e:
+                if e.status != 404:
+                    raise
+                # 保持期間を過ぎて消えたジョブは登録し直す
+                logging.info(f"{item.url}: job {job_id} no longer exists, resubmitting")
+                self.journal.forget(item.url)
+
+        if job is None:
+            await self.limiter.acquire()
+            job_id = await self.client.submit_auto_scrape(item.url, item.spreadsheet_id, item.row_number, item.priority)
+            self.journal.record(item.url, job_id)
+            self.counts["submitted"] += 1
+            job = await self.client.wait_for_job(job_id, self.poll_interval, self.job_timeout)
+
+        rows = await self._build_rows(item, job)
+        self.writer.add_page(item.url, rows)
+        self.counts[job["status"]] += 1
+
+    async def _build_rows(self, item: BatchItem, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        ジョブの結果を出力行に変換します。
+        include_data の場合は取得データを1レコード1行で、それ以外は1URL1行の要約を返します。
+        """
+        result = job.get("result") or {}
+        summary = {
+            "url": item.url,
+            **item.extra,
+            "job_id": job["id"],
+            "status": job["status"],
+            "scraper_id": result.get("scraperId"),
+            "data_count": result.get("dataCount"),
+            "screenshot_url": result.get("screenshotUrl"),
+            "error": job.get("error"),
+        }
+        if not self.include_data or job["status"] != "completed" or not result.get("scraperId"):
+            return [summary]
+
+        data = (await self.client.get_result(result["scraperId"])).get("data") or {}
+        row_count = max((len(values) for values in data.values()), default=0)
+        if row_count == 0:
+            return [summary]
+        base = {"url": item.url, **item.extra, "job_id": job["id"]}
+        return [
+            {**base, **{key: values[i] if i < len(values) else None for key, values in data.items()}}
+            for i in range(row_count)
+        ]
@@ -0,0 +1,147 @@
+"""
+抽出・出力処理のベンチマーク
+求人10/100/1000件の合成フィクスチャページ (ee-ties と同じマークアップ) に対して、
+各フェーズのスループット (行/秒) と p50/p95 (ミリ秒) を計測します。実サイトにはアクセスしません。
+
+    python benchmarks/bench_scraper.py
+    python benchmarks/bench_scraper.py --sizes 10 100 --repeat 20 --backend --json bench.json
+
+計測フェーズ:
+    html_extract     HTTPエンジンの抽出 (extract_job_listings_html)
+    batch_evaluate   1回の page.evaluate による一括抽出 (Playwrightが必要)
+    locator          要素ごとの Locator API による従来の抽出 (Playwrightが必要)
+    save_to_csv      CSV出力
+    backend:*        バックエンドの extractData / convertToCSV (--backend、Node.jsが必要)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import memo  # noqa: E402
+from fixtures import make_listing_page  # noqa: E402
+
+DEFAULT_SIZES: List[int] = [10, 100, 1000]
+DEFAULT_REPEAT: int = 10
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    最近傍法によるパーセンタイルを返します。
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def summarize(phase: str, size: int, samples_ms: List[float]) -> Dict[str, Any]:
+    median = statistics.median(samples_ms)
+    return {
+        "phase": phase,
+        "listings": size,
+        "runs": len(samples_ms),
+        "p50_ms": round(median, 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "rows_per_sec": round(size / (median / 1000.0), 1) if median > 0 else None,
+    }
+
+async def measure(repeat: int, func: Callable[[], Awaitable[Any]]) -> List[float]:
+    samples: List[float] = []
+    await func()  # ウォームアップ
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+async def bench_python(sizes: List[int], repeat: int, use_browser: bool) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    pages = {size: make_listing_page(size) for size in sizes}
+
+    for size, html in pages.items():
+        async def html_extract() -> None:
+            memo.extract_job_listings_html(html)
+        results.append(summarize("html_extract", size, await measure(repeat, html_extract)))
+
+        rows = memo.extract_job_listings_html(html)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bench.csv")
+
+            async def save() -> None:
+                await memo.save_to_csv(rows, path)
+            results.append(summarize("save_to_csv", size, await measure(repeat, save)))
+
+    if not use_browser:
+        return results
+
+    async with memo.async_playwright() as playwright:
+        browser = await memo.setup_stealth_browser(playwright)
+        try:
+            page = await browser.new_page()
+            for size, html in pages.items():
+                await page.set_content(html)
+
+                async def batch() -> None:
+                    await memo.extract_job_listings_batch(page)
+                results.append(summarize("batch_evaluate", size, await measure(repeat, batch)))
+
+                async def locator() -> None:
+                    await memo.extract_job_listings_locator(page)
+                # 従来方式は件数に比例して遅いため、試行回数を抑える
+                results.append(summarize("locator", size, await measure(max(1, repeat // 5), locator)))
+        finally:
+            await browser.close()
+    return results
+
+def bench_backend(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """
+    バックエンドのベンチマーク (backend/benchmarks/bench_executor.js) を実行し、結果を取り込みます。
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            with open(os.path.join(tmp_dir, f"listings_{size}.html"), 'w', encoding='utf-8') as f:
+                f.write(make_listing_page(size))
+        completed = subprocess.run(
+            ["node", os.path.join(ROOT_DIR, "backend", "benchmarks", "bench_executor.js"),
+             "--fixtures", tmp_dir, "--repeat", str(repeat)],
+            cwd=os.path.join(ROOT_DIR, "backend"),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'phase':<26}{'listings':>9}{'runs':>6}{'p50 ms':>12}{'p95 ms':>12}{'rows/s':>14}")
+    for r in results:
+        print(f"{r['phase']:<26}{r['listings']:>9}{r['runs']:>6}{r['p50_ms']:>12.3f}{r['p95_ms']:>12.3f}{r['rows_per_sec'] or 0:>14.1f}")
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Scraper extraction benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="1ページあたりの求人件数")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="各フェーズの計測回数")
+    parser.add_argument("--no-browser", action="store_true", help="Playwrightを使うフェーズを省略")
+    parser.add_argument("--backend", action="store_true", help="バックエンドの extractData / convertToCSV も計測")
+    parser.add_argument("--json", help="結果をJSONで保存するパス (回帰の比較用)")
+    args = parser.parse_args(argv)
+
+    memo.logging.getLogger().setLevel(memo.logging.WARNING)
+    results = asyncio.run(bench_python(args.sizes, args.repeat, not args.no_browser))
+    if args.backend:
+        results.extend(bench_backend(args.sizes, args.repeat))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+オフライン記録・再生用のフィクスチャ
+クロールで取得したページをHAR形式で data/fixtures/<名前>/ に保存し、
+実サイトにアクセスせずに同じページを再生できるようにします。
+ベンチマーク用の合成求人一覧ページもここで生成します。
+"""
+
+import base64
+import glob
+import html
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from http_fetch import HttpFetcher
+
+# フィクスチャの保存先
+FIXTURES_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+
+def fixture_dir(name: str) -> str:
+    """
+    フィクスチャ名に対応するディレクトリを返します (存在しない場合は作成)。
+    """
+    path = os.path.join(FIXTURES_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def fixture_har_files(name: str) -> List[str]:
+    """
+    フィクスチャに含まれるHARファイルの一覧を返します。
+    """
+    files = sorted(glob.glob(os.path.join(FIXTURES_DIR, name, "*.har")))
+    if not files:
+        raise FileNotFoundError(f"No HAR files found for fixture '{name}' in {FIXTURES_DIR}")
+    return files
+
+def load_har_pages(paths: List[str]) -> Dict[str, str]:
+    """
+    HARファイルからドキュメント (HTML) のレスポンスを読み込み、URL -> 本文 の辞書を返します。
+    """
+    pages: Dict[str, str] = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            har = json.load(f)
+        for entry in har.get("log", {}).get("entries", []):
+            content = entry.get("response", {}).get("content", {})
+            if "html" not in content.get("mimeType", "") or "text" not in content:
+                continue
+            text = content["text"]
+            if content.get("encoding") == "base64":
+                text = base64.b64decode(text).decode('utf-8', errors='replace')
+            pages[entry["request"]["url"]] = text
+    return pages
+
+class RecordingFetcher:
+    """
+    HttpFetcher で取得したページをHARファイルに記録します。close() 時に書き出します。
+    """
+
+    def __init__(self, fetcher: HttpFetcher, path: str) -> None:
+        self.fetcher = fetcher
+        self.path = path
+        self._entries: List[Dict[str, Any]] = []
+
+    async def fetch(self, url: str) -> str:
+        started = time.time()
+        text = await self.fetcher.fetch(url)
+        self._entries.append({
+            "startedDateTime": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(started)) + 'Z',
+            "time": (time.time() - started) * 1000,
+            "request": {"method": "GET", "url": url, "headers": []},
+            "response": {
+                "status": 200,
+                "headers": [],
+                "content": {"mimeType": "text/html; charset=utf-8", "text": text},
+            },
+        })
+        return text
+
+    async def close(self) -> None:
+        await self.fetcher.close()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"log": {"version": "1.2", "creator": {"name": "memo.py"}, "entries": self._entries}}, f, ensure_ascii=False)
+        logging.info(f"Recorded {len(self._entries)} HTTP responses to {self.path}")
+
+class HarReplayFetcher:
+    """
+    HARファイルに記録されたページを返す、HttpFetcher 互換の再生用クライアントです。
+    """
+
+    def __init__(self, paths: List[str]) -> None:
+        self._pages = load_har_pages(paths)
+        logging.info(f"Replaying {len(self._pages)} recorded pages from {len(paths)} HAR files")
+
+    async def fetch(self, url: str) -> str:
+        if url not in self._pages:
+            raise KeyError(f"{url} is not in the replay fixture")
+        return self._pages[url]
+
+    async def close(self) -> None:
+        pass
+
+def make_listing_page(count: int, description_words: int = 40) -> str:
+    """
+    ee-ties の検索結果ページと同じマークアップで、求人 count 件の合成ページを生成します。
+    """
+    items = []
+    for i in range(count):
+        description = ' '.join(f"業務内容{i}-{w}" for w in range(description_words))
+        items.append(
+            f'<article class="list_item">'
+            f'<h3 class="list_heading"> 求人タイトル {i} </h3>'
+            f'<p class="list_maker_name">株式会社サンプル{i % 97}</p>'
+            f'<div class="list_detail description">\n  {html.escape(description)}\n</div>'
+            f'</article>'
+        )
+    return (
+        '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>求人一覧</title></head><body>'
+        '<p class="c-jobserch__serching_option">東京都</p><p class="c-jobserch__serching_option">正社員</p>'
+        '<p class="js-jobsearch-occupation-output">エンジニア</p>'
+        '<p class="js-jobsearch-sub-area-output">関東</p>'
+        '<p class="js-jobsearch-main-industry-output">IT</p>'
+        '<p class="js-jobsearch-price-output">600万円以上</p>'
+        f'<main>{"".join(items)}</main></body></html>'
+    )
@@ -0,0 +1,161 @@
+"""
+HTTPファーストの取得エンジン
+サーバーサイドでレンダリングされるページは、ブラウザを起動せずに非同期HTTPクライアントと
+高速HTMLパーサー (selectolax / lxml) で取得・解析します。
+どちらのエンジンで取得できたかはサイト (ホスト) ごとに記録し、次回以降の判定に使います。
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+try:
+    import httpx
+except ImportError:  # HTTPエンジンを使わない場合は不要
+    httpx = None
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# HTTPエンジンで使用するヘッダー (ステルスコンテキストと同じUser-Agent・言語設定)
+DEFAULT_HEADERS: Dict[str, str] = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+}
+# HTTPクライアントの接続プール上限
+MAX_CONNECTIONS: int = 20
+# 取得タイムアウト (秒)
+HTTP_TIMEOUT: float = 30.0
+# エンジン判定キャッシュの保存先と有効期間 (秒)
+ENGINE_CACHE_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "engine_cache.json")
+ENGINE_CACHE_TTL: int = 24 * 60 * 60
+# このステータスが返った場合はボット対策とみなしてブラウザで取得する
+BROWSER_REQUIRED_STATUSES = {401, 403}
+
+def http_engine_available() -> bool:
+    """
+    HTTPエンジンに必要なライブラリ (httpx と selectolax または lxml) が揃っているかを返します。
+    """
+    return httpx is not None and (HTMLParser is not None or lxml is not None)
+
+class HtmlNode:
+    """
+    selectolax / lxml の要素を同じインターフェースで扱うための薄いラッパーです。
+    """
+
+    def __init__(self, node: Any) -> None:
+        self._node = node
+
+    def css(self, selector: str) -> List["HtmlNode"]:
+        if HTMLParser is not None:
+            return [HtmlNode(n) for n in self._node.css(selector)]
+        return [HtmlNode(n) for n in self._node.cssselect(selector)]
+
+    def css_first(self, selector: str) -> "HtmlNode | None":
+        if HTMLParser is not None:
+            node = self._node.css_first(selector)
+            return HtmlNode(node) if node is not None else None
+        nodes = self._node.cssselect(selector)
+        return HtmlNode(nodes[0]) if nodes else None
+
+    def text(self) -> str:
+        """
+        ブラウザの textContent 相当 (子孫ノードのテキストを連結したもの) を返します。
+        """
+        if HTMLParser is not None:
+            return self._node.text(deep=True)
+        return self._node.text_content()
+
+    def attr(self, name: str) -> str | None:
+        if HTMLParser is not None:
+            return self._node.attributes.get(name)
+        return self._node.get(name)
+
+def parse_html(html: str) -> HtmlNode:
+    """
+    HTML文字列を解析し、ドキュメントのルート要素を返します。
+    """
+    if HTMLParser is not None:
+        return HtmlNode(HTMLParser(html).root)
+    if lxml is not None:
+        return HtmlNode(lxml.html.fromstring(html))
+    raise RuntimeError("HTTP engine requires selectolax or lxml. Install it with: pip install selectolax")
+
+class BrowserRequired(Exception):
+    """
+    HTTPエンジンでは取得できず、ブラウザでの取得が必要なことを示します。
+    """
+
+class HttpFetcher:
+    """
+    接続を使い回す非同期HTTPクライアントです。
+    """
+
+    def __init__(self, headers: Dict[str, str] | None = None, max_connections: int = MAX_CONNECTIONS) -> None:
+        if httpx is None:
+            raise RuntimeError("HTTP engine requires httpx. Install it with: pip install httpx")
+        self._client = httpx.AsyncClient(
+            headers=headers or DEFAULT_HEADERS,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def fetch(self, url: str) -> str:
+        """
+        URLのHTMLを取得します。
+        ボット対策と思われるステータスの場合は BrowserRequired、その他の失敗は httpx の例外を送出します。
+        """
+        response = await self._client.get(url)
+        if response.status_code in BROWSER_REQUIRED_STATUSES:
+            raise BrowserRequired(f"HTTP {response.status_code} for {url}")
+        response.raise_for_status()
+        return response.text
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+class EngineDecisionCache:
+    """
+    ホストごとに、前回どのエンジン ("http" / "browser") で取得できたかを記録します。
+    記録はJSONファイルに永続化し、ENGINE_CACHE_TTL を過ぎた判定は無視します。
+    """
+
+    def __init__(self, path: str = ENGINE_CACHE_FILE, ttl: int = ENGINE_CACHE_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._decisions: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._decisions = json.load(f)
+            except (IOError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable engine cache '{path}': {e}")
+
+    def get(self, host: str) -> str | None:
+        decision = self._decisions.get(host)
+        if not decision or time.time() - decision.get("updated", 0) > self.ttl:
+            return None
+        return decision.get("engine")
+
+    def record(self, host: str, engine: str) -> None:
+        if self.get(host) == engine:
+            return
+        logging.info(f"Engine decision for {host}: {engine}")
+        self._decisions[host] = {"engine": engine, "updated": time.time()}
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self._decisions, f, ensure_ascii=False, indent=2)
+        except IOError as e:
+            logging.warning(f"Failed to save engine cache '{self.path}': {e}")
@@ -1,9 +1,31 @@
+import argparse
 import asyncio
 import random
-import csv
 import logging
-from typing import List, Dict, Any
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Tuple
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright, Browser, BrowserContext, Locator, Page, Playwright
+
+from route_policy import apply_route_policy, route_stats
+from fixtures import HarReplayFetcher, RecordingFetcher, fixture_dir, fixture_har_files
+from http_fetch import BrowserRequired, EngineDecisionCache, HtmlNode, HttpFetcher, http_engine_available, parse_html
+from throttle import (
+    BACKOFF_STATUSES,
+    THROTTLE_MAX_DELAY_MS,
+    THROTTLE_MIN_DELAY_MS,
+    THROTTLE_TARGET_CONCURRENCY,
+    AutoThrottle,
+    ResponseStatusError,
+)
+from query_planner import ShardMerger, crawl_shard, plan_shards
+from seen_index import SEEN_INDEX_FILE, SeenIndex
+from sinks import DEFAULT_BATCH_SIZE, CsvSink, StreamingWriter, open_sink
+from tracing import TRACE_DIR, TRACER
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,6 +36,80 @@ TARGET_URL: str = "https://www.ee-ties.com/job/?search_element_2_1=131&search_el
 OUTPUT_FILENAME: str = "ee_ties_jobs.csv"
 # リトライ最大回数
 MAX_RETRIES: int = 3
+# クロール時のワーカー数 (1つのブラウザを共有するコンテキスト数)
+CRAWL_CONCURRENCY: int = 3
+# 同一ホストへの同時リクエスト数の上限
+HOST_CONCURRENCY: int = 2
+# 取得エンジン ("auto": HTTPで取得し必要な場合のみブラウザ, "http": HTTPのみ, "browser": 常にブラウザ)
+FETCH_ENGINE: str = "auto"
+# 差分モード: 既読の求人が何件連続したらページ送りを打ち切るか
+DELTA_STOP_AFTER_SEEN: int = 20
+# 差分モード: テンプレートから辿る最大ページ数
+DELTA_MAX_PAGES: int = 50
+# シャード分割時のワーカープロセス数 (各プロセスが専用のブラウザを起動)
+SHARD_PROCESSES: int = os.cpu_count() or 1
+# シャードから親プロセスへ送るページのキュー上限 (ワーカープロセスあたり)
+SHARD_QUEUE_PAGES: int = 8
+# 抽出モード ("batch": 1回のpage.evaluateで一括抽出, "locator": 要素ごとにtext_content()を呼ぶ従来方式)
+EXTRACTION_MODE: str = "batch"
+
+# 各求人アイテムのコンテナセレクター
+JOB_ITEM_SELECTOR: str = "article.list_item"
+
+# 抽出フィールド定義
+# selector: 対象要素のCSSセレクター
+# attr: 取得する属性名 (Noneの場合はtextContent)
+# normalize: "strip" (前後の空白除去) / "collapse" (連続する空白・改行を単一スペースに変換)
+# all: Trueの場合は一致した全要素のテキストを空白区切りで結合
+JOB_FIELD_MAP: Dict[str, Dict[str, Any]] = {
+    "求人タイトル": {"selector": "h3.list_heading", "attr": None, "normalize": "strip"},
+    "企業名": {"selector": "p.list_maker_name", "attr": None, "normalize": "strip"},
+    "仕事内容概要": {"selector": "div.list_detail.description", "attr": None, "normalize": "collapse"},
+}
+
+# 検索条件ヘッダーのフィールド定義 (ページ内で共通、各求人データに付与)
+HEADER_FIELD_MAP: Dict[str, Dict[str, Any]] = {
+    "現在の検索条件": {"selector": "p.c-jobserch__serching_option", "attr": None, "normalize": "strip", "all": True},
+    "絞り込み職種": {"selector": "p.js-jobsearch-occupation-output", "attr": None, "normalize": "strip"},
+    "絞り込みエリア": {"selector": "p.js-jobsearch-sub-area-output", "attr": None, "normalize": "strip"},
+    "絞り込み業種": {"selector": "p.js-jobsearch-main-industry-output", "attr": None, "normalize": "strip"},
+    "絞り込み年収": {"selector": "p.js-jobsearch-price-output", "attr": None, "normalize": "strip"},
+}
+
+# 一括抽出用スクリプト (ブラウザ内で実行され、ヘッダーと全行を1回のCDP往復で返す)
+BATCH_EXTRACT_SCRIPT: str = """
+({ itemSelector, itemFields, headerFields }) => {
+    const normalize = (value, mode) => {
+        if (value === null || value === undefined) return '';
+        if (mode === 'collapse') return value.split(/\\s+/).filter(Boolean).join(' ');
+        if (mode === 'strip') return value.trim();
+        return value;
+    };
+    const read = (el, spec) => {
+        if (!el) return '';
+        const raw = spec.attr ? el.getAttribute(spec.attr) : el.textContent;
+        return normalize(raw, spec.normalize);
+    };
+    const extract = (root, fields) => {
+        const out = {};
+        for (const [name, spec] of Object.entries(fields)) {
+            if (spec.all) {
+                out[name] = Array.from(root.querySelectorAll(spec.selector))
+                    .map(el => read(el, spec))
+                    .filter(Boolean)
+                    .join(' ');
+            } else {
+                out[name] = read(root.querySelector(spec.selector), spec);
+            }
+        }
+        return out;
+    };
+    return {
+        header: extract(document, headerFields),
+        rows: Array.from(document.querySelectorAll(itemSelector)).map(item => extract(item, itemFields)),
+    };
+}
+"""
 
 async def random_delay(min_ms: int = 1000, max_ms: int = 5000) -> None:
     """
@@ -51,20 +147,41 @@ async def setup_stealth_browser(playwright: Playwright) -> Browser:
     )
     return browser
 
-async def new_stealth_context(browser: Browser) -> BrowserContext:
+async def new_stealth_context(
+    browser: Browser,
+    route_policy: Dict[str, Any] | None = None,
+    record_har_path: str | None = None,
+    replay_har_paths: List[str] | None = None,
+) -> BrowserContext:
     """
     ステルス設定を適用した新しいブラウザコンテキストを作成します。
     Viewport, ロケール, タイムゾーン, User-Agentを設定し、より人間らしい環境を模倣します。
+    route_policy (ROUTE_POLICY への上書き) に従い、画像・フォント等の不要なサブリソースを遮断します。
+    record_har_path を指定すると通信をHARに記録し (コンテキストを閉じた時点で保存)、
+    replay_har_paths を指定すると記録済みのHARから応答し、記録にないリクエストは遮断します。
     """
     logging.info("Creating new stealth browser context...")
+    record_options: Dict[str, Any] = {}
+    if record_har_path:
+        record_options = {"record_har_path": record_har_path, "record_har_content": "embed"}
     # ブラウザコンテキストの設定
     context = await browser.new_context(
+        **record_options,
         viewport={'width': 1920, 'height': 1080},  # 標準的なデスクトップ画面サイズ
         locale='ja-JP',  # ロケールを日本語に設定
         timezone_id='Asia/Tokyo',  # タイムゾーンを東京に設定
         # 最新のChromeブラウザのUser-Agent文字列
         user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
     )
+    if replay_har_paths:
+        # 後から登録したルートが優先される: 各HARを順に照合し、どれにもなければ遮断
+        await context.route("**/*", lambda route: route.abort())
+        for har_path in replay_har_paths:
+            await context.route_from_har(har_path, not_found="fallback")
+        return context
+
+    # 不要なサブリソースの遮断
+    await apply_route_policy(context, route_policy)
     return context
 
 async def evade_webdriver_detection(page: Page) -> None:
@@ -120,137 +237,725 @@ async def human_like_actions(page: Page) -> None:
     except Exception as e:
         logging.warning(f"Error during human-like actions: {e}")
 
-async def scrape_ee_ties() -> List[Dict[str, str]]:
+def _normalize_text(value: str | None, mode: str | None) -> str:
     """
-    EE-TIESの求人情報をスクレイピングします。
-    アンチボット対策を完全に組み込み、抽出したデータを返します。
+    フィールド定義の normalize 指定に従ってテキストを整形します。
+    BATCH_EXTRACT_SCRIPT 内の normalize と同じ規則です。
     """
-    scraped_data: List[Dict[str, str]] = []
-    browser: Browser | None = None
-    context: BrowserContext | None = None
+    if value is None:
+        return ''
+    if mode == "collapse":
+        return ' '.join(value.split())  # 複数の空白や改行を単一スペースに変換
+    if mode == "strip":
+        return value.strip()
+    return value
 
-    async with async_playwright() as playwright:
+def _build_job_rows(header: Dict[str, str], rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    求人アイテムの行データに共通のヘッダーフィールドを付与します。
+    列順は JOB_FIELD_MAP, HEADER_FIELD_MAP の定義順です。
+    """
+    return [
+        {
+            **{name: row.get(name, '') for name in JOB_FIELD_MAP},
+            **{name: header.get(name, '') for name in HEADER_FIELD_MAP},
+        }
+        for row in rows
+    ]
+
+async def extract_job_listings_batch(page: Page) -> List[Dict[str, str]]:
+    """
+    1回の page.evaluate 呼び出しで、検索条件ヘッダーと全求人アイテムを一括抽出します。
+    要素ごとの text_content() 呼び出しによるCDP往復をなくし、1ページあたりの抽出時間を短縮します。
+    """
+    result = await page.evaluate(BATCH_EXTRACT_SCRIPT, {
+        "itemSelector": JOB_ITEM_SELECTOR,
+        "itemFields": JOB_FIELD_MAP,
+        "headerFields": HEADER_FIELD_MAP,
+    })
+    logging.debug(f"Batch extracted {len(result['rows'])} job items in one evaluate call")
+    return _build_job_rows(result['header'], result['rows'])
+
+async def _read_locator_field(root: Page | Locator, spec: Dict[str, Any]) -> str:
+    """
+    Locator API でフィールドを1つ読み取ります (従来方式)。
+    """
+    locator = root.locator(spec["selector"])
+    if spec.get("all"):
+        texts = await locator.all_text_contents()
+        return ' '.join(t for t in (_normalize_text(t, spec.get("normalize")) for t in texts) if t)
+    if spec.get("attr"):
+        raw = await locator.get_attribute(spec["attr"])
+    else:
+        raw = await locator.text_content()
+    return _normalize_text(raw, spec.get("normalize"))
+
+async def extract_job_listings_locator(page: Page) -> List[Dict[str, str]]:
+    """
+    Locator API で要素ごとにテキストを取得する従来の抽出方式です。
+    一括抽出がサイト側の制約で使えない場合のフォールバックとして残しています。
+    """
+    header = {name: await _read_locator_field(page, spec) for name, spec in HEADER_FIELD_MAP.items()}
+
+    rows: List[Dict[str, str]] = []
+    job_items = await page.locator(JOB_ITEM_SELECTOR).all()
+    for i, job_item in enumerate(job_items):
+        logging.debug(f"Processing job item {i+1}/{len(job_items)}")
+        rows.append({name: await _read_locator_field(job_item, spec) for name, spec in JOB_FIELD_MAP.items()})
+    return _build_job_rows(header, rows)
+
+def build_page_urls(template: str, start_page: int = 1, end_page: int = 1) -> List[str]:
+    """
+    ページネーションテンプレートからURL一覧を生成します。
+    テンプレート中の `{page}` をページ番号に置き換えます (例: "https://example.com/job/page/{page}/?q=1")。
+    """
+    if "{page}" not in template:
+        raise ValueError("Pagination template must contain a '{page}' placeholder")
+    return [template.format(page=page) for page in range(start_page, end_page + 1)]
+
+class HostGate:
+    """
+    ホスト単位の同時実行数とリクエスト間隔 (ポライトネス) を制御します。
+    同じホストへのリクエストは max_concurrency 件まで、かつ開始間隔は AutoThrottle が
+    観測したレスポンス時間とエラー状況から決めた間隔以上に制限されます。
+    """
+
+    def __init__(self, max_concurrency: int = HOST_CONCURRENCY, throttle: AutoThrottle | None = None) -> None:
+        self.max_concurrency = max_concurrency
+        self.throttle = throttle or AutoThrottle()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last_start: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """
+        URLのホストに対する実行枠を確保します。
+        """
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_concurrency))
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            async with self._locks.setdefault(host, asyncio.Lock()):
+                wait = self._last_start.get(host, 0.0) + self.throttle.delay(host) - loop.time()
+                if wait > 0:
+                    logging.debug(f"Politeness wait for {host}: {wait:.2f} seconds")
+                    with TRACER.span("politeness_wait", host=host):
+                        await asyncio.sleep(wait)
+                self._last_start[host] = loop.time()
+            yield
+
+async def scrape_listing_page(
+    page: Page,
+    url: str,
+    throttle: AutoThrottle | None = None,
+    allow_empty: bool = False,
+) -> List[Dict[str, str]]:
+    """
+    1つの検索結果ページを読み込み、求人データを抽出します (1回分の試行)。
+    求人が見つからない場合は ValueError、429/503 の場合は ResponseStatusError を送出し、呼び出し側のリトライ対象とします。
+    allow_empty の場合、求人0件のページ (ページネーションの終端など) は例外にせず空リストを返します。
+    throttle を指定した場合は、ページ本体のレスポンス時間とステータスを記録します。
+    """
+    stats = route_stats(page.context)
+    if stats:
+        stats.begin_page(url)
+
+    # ページへのアクセスとロード状態の待機
+    started = time.monotonic()
+    with TRACER.span("goto", url=url):
+        response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
+    status = response.status if response else 200
+    if status in BACKOFF_STATUSES:
+        raise ResponseStatusError(status, url)  # 間隔の拡大は scrape_with_retry 側で行う
+    if throttle:
+        throttle.observe(urlparse(url).netloc, time.monotonic() - started, status)
+    # ネットワークがアイドル状態になるまでさらに待機し、完全なロードを保証
+    with TRACER.span("networkidle", url=url):
+        await page.wait_for_load_state('networkidle', timeout=30000)
+    logging.info(f"Page loaded successfully: {url}")
+
+    # 4. 人間らしい動作 (マウス移動、スクロール)
+    with TRACER.span("human_actions", url=url):
+        await human_like_actions(page)
+
+    logging.info("Extracting job listings...")
+    with TRACER.span("extraction", url=url, engine="browser", mode=EXTRACTION_MODE):
+        if EXTRACTION_MODE == "batch":
+            page_rows = await extract_job_listings_batch(page)
+        else:
+            page_rows = await extract_job_listings_locator(page)
+
+    if not page_rows and allow_empty:
+        logging.info(f"No job listings on {url}.")
+    elif not page_rows:
+        logging.warning("No job listings found on the page. This might indicate a problem or no results.")
+        # もし求人が見つからないことがエラーと判断されるなら、ここで例外を発生させリトライ
+        raise ValueError("No job listings found, retrying...")
+
+    if stats:
+        summary = stats.summary()
+        logging.info(
+            f"Resources for {url}: blocked {summary['blockedRequests']} requests {summary['blockedByType']}, "
+            f"saved {summary['savedBytes']} bytes{' (dry run)' if summary['dryRun'] else ''}, "
+            f"loaded {summary['loadedRequests']} requests / {summary['loadedBytes']} bytes"
+        )
+    return page_rows
+
+def extract_job_listings_html(html: str) -> List[Dict[str, str]]:
+    """
+    ブラウザを使わずに、取得済みHTMLから求人データを抽出します (HTTPエンジン用)。
+    フィールド定義と整形規則は一括抽出 (BATCH_EXTRACT_SCRIPT) と同じです。
+    """
+    document = parse_html(html)
+
+    def read(node: HtmlNode | None, spec: Dict[str, Any]) -> str:
+        if node is None:
+            return ''
+        raw = node.attr(spec["attr"]) if spec.get("attr") else node.text()
+        return _normalize_text(raw, spec.get("normalize"))
+
+    def extract(root: HtmlNode, fields: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for name, spec in fields.items():
+            if spec.get("all"):
+                out[name] = ' '.join(t for t in (read(n, spec) for n in root.css(spec["selector"])) if t)
+            else:
+                out[name] = read(root.css_first(spec["selector"]), spec)
+        return out
+
+    header = extract(document, HEADER_FIELD_MAP)
+    rows = [extract(item, JOB_FIELD_MAP) for item in document.css(JOB_ITEM_SELECTOR)]
+    return _build_job_rows(header, rows)
+
+async def scrape_listing_http(fetcher: HttpFetcher, url: str, throttle: AutoThrottle | None = None) -> List[Dict[str, str]]:
+    """
+    HTTPクライアントでページを取得し、求人データを抽出します (1回分の試行)。
+    必須セレクター (JOB_ITEM_SELECTOR) が見つからない場合は空リストを返し、ブラウザでの取得に委ねます。
+    """
+    started = time.monotonic()
+    with TRACER.span("http_fetch", url=url):
+        html = await fetcher.fetch(url)
+    if throttle:
+        throttle.observe(urlparse(url).netloc, time.monotonic() - started)
+    with TRACER.span("extraction", url=url, engine="http"):
+        page_rows = extract_job_listings_html(html)
+    logging.info(f"Fetched {url} over HTTP: {len(page_rows)} job listings")
+    return page_rows
+
+async def scrape_with_retry(
+    fetch_page: Callable[[str], Awaitable[List[Dict[str, str]]]],
+    url: str,
+    gate: HostGate,
+) -> List[Dict[str, str]]:
+    """
+    ホスト単位の制限の下で、リトライ付きで1ページをスクレイピングします。
+    fetch_page は1回分の取得・抽出を行い、失敗時は例外を送出する関数です。
+    失敗時はホストの間隔を広げ、次の試行は HostGate がその間隔だけ待ってから開始します。
+    """
+    # 5. エラーハンドリングとリトライ
+    for attempt in range(MAX_RETRIES):
         try:
-            # 1. ステルスブラウザの起動とコンテキストの作成
-            browser = await setup_stealth_browser(playwright)
-            context = await new_stealth_context(browser)
-            page: Page = await context.new_page()
+            async with gate.slot(url):
+                logging.info(f"Navigating to {url} (Attempt {attempt + 1}/{MAX_RETRIES})...")
+                page_rows = await fetch_page(url)
+            logging.info(f"Successfully extracted {len(page_rows)} job listings from {url}.")
+            return page_rows
+
+        except Exception as e:
+            logging.error(f"Error during scraping attempt {attempt + 1} for {url}: {e}")
+            status = getattr(e, 'status', None) or getattr(getattr(e, 'response', None), 'status_code', None)
+            gate.throttle.backoff(urlparse(url).netloc, status)
+            if attempt < MAX_RETRIES - 1:
+                logging.info(f"Retrying in a moment... (Attempt {attempt + 1}/{MAX_RETRIES})")
+            else:
+                logging.error(f"Max retries ({MAX_RETRIES}) exceeded for {url}.")
+                raise  # 最終試行で失敗したら例外を再スロー
+    return []
+
+async def crawl(
+    urls: List[str],
+    concurrency: int = CRAWL_CONCURRENCY,
+    gate: HostGate | None = None,
+    on_page: Callable[[str, List[Dict[str, str]]], None] | None = None,
+    engine: str = FETCH_ENGINE,
+    route_policy: Dict[str, Any] | None = None,
+    on_failed: Callable[[str], None] | None = None,
+    stop_event: asyncio.Event | None = None,
+    record: str | None = None,
+    replay: str | None = None,
+    allow_empty: bool = False,
+) -> List[Dict[str, str]]:
+    """
+    複数のURLを、1つのブラウザを共有するワーカープールで並行スクレイピングします。
+    各ワーカーは独自のステルスコンテキストとページを持ち、URLキューから順に処理します。
+    engine が "auto" の場合はまずHTTPエンジンで取得し、必須セレクターが空だった場合のみブラウザで取得します。
+    ブラウザとコンテキストは最初に必要になった時点で起動するため、HTTPだけで済むクロールではChromiumを起動しません。
+    route_policy はブラウザで取得する際のサブリソース遮断ポリシー (ROUTE_POLICY への上書き) です。
+    on_page を指定した場合はページ完了ごとに行を渡し、結果をメモリに保持せず空リストを返します。
+    指定しない場合は入力URLの順序で連結して返します。失敗したURLはログに記録してスキップし、on_failed に渡します。
+    stop_event がセットされると、各ワーカーは処理中のURLを終えた時点で新しいURLを取らずに終了します。
+    record / replay にフィクスチャ名を指定すると、取得したページを data/fixtures/<名前>/ にHARで記録、
+    または記録済みのHARから再生します (実サイトにはアクセスしません)。
+    allow_empty の場合、求人0件のページはリトライせず空の結果として on_page に渡します (失敗とは区別されます)。
+    """
+    gate = gate or HostGate()
+    queue: asyncio.Queue[Tuple[int, str]] = asyncio.Queue()
+    for index, url in enumerate(urls):
+        queue.put_nowait((index, url))
+    results: Dict[int, List[Dict[str, str]]] = {}
+    failed: List[str] = []
+    total_rows = 0
+    completed_pages = 0
 
-            # 3. Webdriver検知回避スクリプトの注入 (ページリクエスト前)
-            await evade_webdriver_detection(page)
+    if engine != "browser" and not http_engine_available():
+        logging.warning("httpx and selectolax/lxml are not installed. Falling back to the browser engine.")
+        engine = "browser"
+    fetcher: Any = None
+    replay_hars = fixture_har_files(replay) if replay else None
+    if engine != "browser":
+        if replay_hars:
+            fetcher = HarReplayFetcher(replay_hars)
+        elif record:
+            fetcher = RecordingFetcher(HttpFetcher(), os.path.join(fixture_dir(record), "http.har"))
+        else:
+            fetcher = HttpFetcher()
+    decisions = EngineDecisionCache() if engine == "auto" else None
 
-            # 5. エラーハンドリングとリトライ
-            for attempt in range(MAX_RETRIES):
+    browser: Browser | None = None
+    browser_lock = asyncio.Lock()
+
+    async def get_browser(playwright: Playwright) -> Browser:
+        nonlocal browser
+        async with browser_lock:
+            if browser is None:
+                # 1. ステルスブラウザの起動 (全ワーカーで共有)
+                with TRACER.span("browser_launch"):
+                    browser = await setup_stealth_browser(playwright)
+        return browser
+
+    async def worker(worker_id: int, playwright: Playwright) -> None:
+        nonlocal total_rows, completed_pages
+        context: BrowserContext | None = None
+        page: Page | None = None
+
+        async def get_page() -> Page:
+            nonlocal context, page
+            if page is None:
+                shared_browser = await get_browser(playwright)
+                with TRACER.span("context_create", worker=worker_id):
+                    context = await new_stealth_context(
+                        shared_browser,
+                        route_policy,
+                        record_har_path=os.path.join(fixture_dir(record), f"browser-{worker_id}.har") if record else None,
+                        replay_har_paths=replay_hars,
+                    )
+                    page = await context.new_page()
+                    # 3. Webdriver検知回避スクリプトの注入 (ページリクエスト前)
+                    await evade_webdriver_detection(page)
+            return page
+
+        async def fetch_page(url: str) -> List[Dict[str, str]]:
+            host = urlparse(url).netloc
+            if fetcher and (decisions is None or decisions.get(host) != "browser"):
                 try:
-                    logging.info(f"Navigating to {TARGET_URL} (Attempt {attempt + 1}/{MAX_RETRIES})...")
-                    # ページへのアクセスとロード状態の待機
-                    await page.goto(TARGET_URL, wait_until='domcontentloaded', timeout=60000)
-                    # ネットワークがアイドル状態になるまでさらに待機し、完全なロードを保証
-                    await page.wait_for_load_state('networkidle', timeout=30000)
-                    logging.info("Page loaded successfully.")
-
-                    # 1. リクエストの人間らしさ (遅延)
-                    await random_delay(3000, 7000) # ページロード後の長めの待機
-
-                    # 4. 人間らしい動作 (マウス移動、スクロール)
-                    await human_like_actions(page)
-
-                    # 共通の検索条件要素の取得 (各求人データに含めるため、ここで一度取得)
-                    # "現在の検索条件" は複数の要素がある可能性があるため、全て取得して結合
-                    current_search_conditions_elements = await page.locator("p.c-jobserch__serching_option").all_text_contents()
-                    current_search_conditions = ' '.join(c.strip() for c in current_search_conditions_elements if c.strip()) if current_search_conditions_elements else ''
-
-                    occupation_output = (await page.locator("p.js-jobsearch-occupation-output").text_content() or '').strip()
-                    area_output = (await page.locator("p.js-jobsearch-sub-area-output").text_content() or '').strip()
-                    industry_output = (await page.locator("p.js-jobsearch-main-industry-output").text_content() or '').strip()
-                    price_output = (await page.locator("p.js-jobsearch-price-output").text_content() or '').strip()
-
-                    logging.info("Extracting job listings...")
-                    # 各求人アイテムのセレクター
-                    job_items = await page.locator("article.list_item").all()
-                    if not job_items:
-                        logging.warning("No job listings found on the page. This might indicate a problem or no results.")
-                        # もし求人が見つからないことがエラーと判断されるなら、ここで例外を発生させリトライ
-                        raise ValueError("No job listings found, retrying...")
-
-                    # 各求人アイテムからデータを抽出
-                    for i, job_item in enumerate(job_items):
-                        logging.debug(f"Processing job item {i+1}/{len(job_items)}")
-                        title = (await job_item.locator("h3.list_heading").text_content() or '').strip()
-                        company_name = (await job_item.locator("p.list_maker_name").text_content() or '').strip()
-
-                        # 仕事内容概要は親要素のテキスト全体を取得し、不要な改行や空白を除去して整形
-                        description_raw = await job_item.locator("div.list_detail.description").text_content() or ''
-                        job_description = ' '.join(description_raw.split()).strip() # 複数の空白や改行を単一スペースに変換
-
-                        scraped_data.append({
-                            "求人タイトル": title,
-                            "企業名": company_name,
-                            "仕事内容概要": job_description,
-                            "現在の検索条件": current_search_conditions,
-                            "絞り込み職種": occupation_output,
-                            "絞り込みエリア": area_output,
-                            "絞り込み業種": industry_output,
-                            "絞り込み年収": price_output,
-                        })
-
-                    logging.info(f"Successfully extracted {len(scraped_data)} job listings.")
-                    break  # 成功したらリトライループを抜ける
+                    page_rows = await scrape_listing_http(fetcher, url, gate.throttle)
+                except BrowserRequired as e:
+                    logging.info(f"{e}. Falling back to the browser engine.")
+                    page_rows = []
+                if page_rows:
+                    if decisions:
+                        decisions.record(host, "http")
+                    return page_rows
+                if engine == "http":
+                    if allow_empty:
+                        return page_rows
+                    raise ValueError("No job listings found over HTTP, retrying...")
+                logging.info(f"Required selectors empty over HTTP for {url}. Falling back to the browser engine.")
+            page_rows = await scrape_listing_page(await get_page(), url, gate.throttle, allow_empty)
+            # 求人0件のページではHTTPで足りるかを判断できないため、エンジンの判定を記録しない
+            if decisions and page_rows:
+                decisions.record(host, "browser")
+            return page_rows
 
-                except Exception as e:
-                    logging.error(f"Error during scraping attempt {attempt + 1}: {e}")
-                    if attempt < MAX_RETRIES - 1:
-                        logging.info(f"Retrying in a moment... (Attempt {attempt + 1}/{MAX_RETRIES})")
-                        await random_delay(5000, 10000)  # エラー発生時は長めの待機
+        try:
+            while True:
+                if stop_event and stop_event.is_set():
+                    return
+                try:
+                    index, url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    page_rows = await scrape_with_retry(fetch_page, url, gate)
+                    total_rows += len(page_rows)
+                    completed_pages += 1
+                    if on_page:
+                        with TRACER.span("output", url=url, rows=len(page_rows)):
+                            on_page(url, page_rows)
                     else:
-                        logging.error(f"Max retries ({MAX_RETRIES}) exceeded. Could not complete scraping.")
-                        raise  # 最終試行で失敗したら例外を再スロー
+                        results[index] = page_rows
+                except Exception as e:
+                    logging.error(f"[worker {worker_id}] Giving up on {url}: {e}")
+                    failed.append(url)
+                    if on_failed:
+                        on_failed(url)
+                finally:
+                    queue.task_done()
+        finally:
+            if context:
+                await context.close()
+
+    async with async_playwright() as playwright:
+        try:
+            worker_count = max(1, min(concurrency, len(urls)))
+            logging.info(f"Crawling {len(urls)} URLs with {worker_count} workers (engine: {engine})...")
+            await asyncio.gather(*(worker(i + 1, playwright) for i in range(worker_count)))
 
         except Exception as e:
             logging.critical(f"A critical error occurred during the scraping process: {e}")
         finally:
             # リソースのクリーンアップ
-            if context:
-                logging.info("Closing browser context...")
-                await context.close()
+            if fetcher:
+                await fetcher.close()
             if browser:
                 logging.info("Closing browser...")
                 await browser.close()
             logging.info("Browser resources released.")
 
-    return scraped_data
+    for host, state in gate.throttle.snapshot().items():
+        logging.info(f"AutoThrottle {host}: final delay {state['delay']:.2f}s, {state['responses']} responses, {state['backoffs']} backoffs")
+    if failed:
+        logging.warning(f"{len(failed)}/{len(urls)} URLs failed: {failed}")
+    logging.info(f"Crawl finished: {total_rows} job listings from {completed_pages} pages.")
+    return [row for index in sorted(results) for row in results[index]]
+
+async def crawl_incremental(
+    scope: str,
+    urls: List[str],
+    index: SeenIndex,
+    on_rows: Callable[[str, List[Dict[str, str]]], None],
+    stop_after_seen: int = DELTA_STOP_AFTER_SEEN,
+    **crawl_options: Any,
+) -> List[Dict[str, str]]:
+    """
+    1つの検索条件 (scope) のページ群を差分モードでクロールします。
+    urls はページ順に並べたURLで、ページは並行に取得しつつ、既読インデックスとの照合はページ順に行います。
+    新規・変更のあった行のみを "変更種別" 列付きで on_rows に渡し、既読の求人が stop_after_seen 件
+    連続した時点でそれ以降のページの取得を打ち切ります。
+    最後のページ (求人0件) まで一巡し、途中に取得に失敗したページがなかった場合のみ、
+    今回見つからなかった掲載終了の行を返します (失敗したページの求人を掲載終了と誤判定しないため)。
+    求人0件のページはリトライせずに終端として扱い、取得失敗とは区別します。
+    """
+    run_id = index.begin_run(scope)
+    order = {url: i for i, url in enumerate(urls)}
+    # ページ番号 → 行 (取得に失敗したページは None、求人0件のページは空リスト)
+    pending: Dict[int, List[Dict[str, str]] | None] = {}
+    stop_event = asyncio.Event()
+    state = {"next": 0, "seen_streak": 0, "reached_end": False, "failed": 0, "new": 0, "changed": 0}
+
+    def drain() -> None:
+        # 取得済みのページを、ページ順に既読インデックスと照合する
+        while state["next"] in pending and not stop_event.is_set():
+            url = urls[state["next"]]
+            page_rows = pending.pop(state["next"])
+            state["next"] += 1
+            if page_rows is None:
+                logging.warning(f"Skipping failed page {url}; removed listings of {scope} will not be detected in this run.")
+                state["failed"] += 1
+                continue
+            if not page_rows:
+                logging.info(f"Reached the last page of {scope} at {url}.")
+                state["reached_end"] = True
+                stop_event.set()
+                break
+            emitted: List[Dict[str, str]] = []
+            for status, row in index.apply(run_id, scope, page_rows):
+                if status == "unchanged":
+                    state["seen_streak"] += 1
+                    if state["seen_streak"] >= stop_after_seen:
+                        logging.info(f"{stop_after_seen} already-seen listings in a row at {url}. Stopping pagination.")
+                        stop_event.set()
+                        break
+                else:
+                    state["seen_streak"] = 0
+                    state[status] += 1
+                    emitted.append({**row, "変更種別": status})
+            if emitted:
+                on_rows(url, emitted)
+
+    def on_page(url: str, page_rows: List[Dict[str, str]]) -> None:
+        pending[order[url]] = page_rows
+        drain()
+
+    def on_failed(url: str) -> None:
+        pending[order[url]] = None
+        drain()
+
+    await crawl(urls, on_page=on_page, on_failed=on_failed, stop_event=stop_event, allow_empty=True, **crawl_options)
+    if state["next"] >= len(urls) and not stop_event.is_set():
+        state["reached_end"] = True  # 全URLを照合し終えた (単一URLのスコープなど)
+
+    removed = index.finish_run(run_id, scope, full_pass=state["reached_end"] and not state["failed"])
+    logging.info(
+        f"Delta for {scope}: {state['new']} new, {state['changed']} changed, {len(removed)} removed, "
+        f"{state['failed']} failed pages."
+    )
+    return [{**row, "変更種別": "removed"} for row in removed]
+
+async def scrape_ee_ties() -> List[Dict[str, str]]:
+    """
+    EE-TIESの求人情報をスクレイピングします。
+    アンチボット対策を完全に組み込み、抽出したデータを返します。
+    """
+    return await crawl([TARGET_URL], concurrency=1)
 
 async def save_to_csv(data: List[Dict[str, str]], filename: str) -> None:
     """
     スクレイピングしたデータをCSVファイルに保存します。
+    クロール中の逐次出力には StreamingWriter を使用してください。
     """
     if not data:
         logging.warning("No data to save to CSV.")
         return
 
     logging.info(f"Saving data to {filename}...")
-    # 辞書のキーをヘッダーとして使用
-    keys = list(data[0].keys())
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()  # ヘッダーを書き込み
-            writer.writerows(data)  # データを書き込み
+        sink = CsvSink(filename)
+        try:
+            sink.write_batch(data)  # 最初の行のキーをヘッダーとして書き込み
+        finally:
+            sink.close()
         logging.info(f"Data successfully saved to {filename}.")
     except IOError as e:
         logging.error(f"Error saving to CSV file '{filename}': {e}")
 
-async def main() -> None:
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析します。
+    URLもテンプレートも指定しない場合は TARGET_URL の1ページのみをスクレイピングします。
+    """
+    parser = argparse.ArgumentParser(description="EE-TIES job listing scraper")
+    parser.add_argument("--url", action="append", default=[], help="スクレイピング対象URL (複数指定可)")
+    parser.add_argument("--url-file", help="対象URLを1行に1件記載したファイル")
+    parser.add_argument("--page-template", help="ページネーションテンプレート ('{page}' をページ番号に置換)")
+    parser.add_argument("--start-page", type=int, default=1, help="テンプレートの開始ページ")
+    parser.add_argument("--end-page", type=int, help="テンプレートの終了ページ (省略時は1、差分モードでは --max-pages)")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY, help="ワーカー (ブラウザコンテキスト) 数")
+    parser.add_argument("--host-concurrency", type=int, default=HOST_CONCURRENCY, help="ホストごとの同時リクエスト数")
+    parser.add_argument("--min-delay-ms", type=int, default=THROTTLE_MIN_DELAY_MS, help="同一ホストへのリクエスト間隔の下限 (ミリ秒)")
+    parser.add_argument("--max-delay-ms", type=int, default=THROTTLE_MAX_DELAY_MS, help="同一ホストへのリクエスト間隔の上限 (ミリ秒)")
+    parser.add_argument("--target-concurrency", type=float, default=THROTTLE_TARGET_CONCURRENCY, help="ホストあたりの目標同時リクエスト数")
+    parser.add_argument("--engine", choices=["auto", "http", "browser"], default=FETCH_ENGINE, help="取得エンジン")
+    parser.add_argument("--no-block-resources", action="store_true", help="画像・フォント等のサブリソース遮断を無効化")
+    parser.add_argument("--measure-blocking", action="store_true", help="遮断せずに、遮断した場合の削減量を計測 (dry run)")
+    parser.add_argument("--delta", action="store_true", help="差分モード: 新規・変更のあった求人のみ出力し、既読が続いたらページ送りを打ち切る")
+    parser.add_argument("--index", default=SEEN_INDEX_FILE, help="差分モードの既読インデックス (SQLite)")
+    parser.add_argument("--stop-after-seen", type=int, default=DELTA_STOP_AFTER_SEEN, help="既読の求人が何件続いたら打ち切るか")
+    parser.add_argument("--max-pages", type=int, default=DELTA_MAX_PAGES, help="差分モードでテンプレートから辿る最大ページ数 (--end-page 未指定時)")
+    parser.add_argument("--shard", action="append", default=[], metavar="DIM", help="検索条件を分割してプロセス並列でクロール ('PREFIX*' または 'KEY=V1,V2'、複数指定で直積)")
+    parser.add_argument("--processes", type=int, default=SHARD_PROCESSES, help="シャード分割時のワーカープロセス数")
+    parser.add_argument("--record", metavar="NAME", help="取得したページを data/fixtures/NAME/ にHARで記録")
+    parser.add_argument("--replay", metavar="NAME", help="data/fixtures/NAME/ の記録からオフラインで再生 (間隔調整なし)")
+    parser.add_argument("--output", default=OUTPUT_FILENAME, help="出力ファイル名 (拡張子から形式を判定)")
+    parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], help="出力形式 (省略時は拡張子から判定)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="何行ごとにファイルへ書き出すか")
+    parser.add_argument("--checkpoint", help="チェックポイントファイル (省略時は '<output>.checkpoint.json')")
+    parser.add_argument("--resume", action="store_true", help="チェックポイントから再開し、完了済みページをスキップ")
+    parser.add_argument("--trace-dir", default=TRACE_DIR, help="フェーズ別のトレース (run_<日時>.jsonl) の保存先")
+    parser.add_argument("--metrics-file", help="フェーズ別のヒストグラムをPrometheusのテキスト形式で書き出すパス")
+    return parser.parse_args(argv)
+
+def collect_urls(args: argparse.Namespace) -> List[str]:
+    """
+    引数からクロール対象のURL一覧を組み立てます (重複は先勝ちで除去)。
+    """
+    urls: List[str] = list(args.url)
+    if args.url_file:
+        with open(args.url_file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if args.page_template:
+        urls.extend(build_page_urls(args.page_template, args.start_page, args.end_page or 1))
+    return list(dict.fromkeys(urls)) or [TARGET_URL]
+
+def collect_scopes(args: argparse.Namespace) -> List[Tuple[str, List[str]]]:
+    """
+    差分モード用に、検索条件 (スコープ) ごとのページURL一覧を組み立てます。
+    ページネーションテンプレートは1つのスコープ、個別に指定したURLはそれぞれ1ページのスコープになります。
+    """
+    scopes: List[Tuple[str, List[str]]] = []
+    if args.page_template:
+        end_page = args.end_page or args.start_page + args.max_pages - 1
+        scopes.append((args.page_template, build_page_urls(args.page_template, args.start_page, end_page)))
+    plain_args = argparse.Namespace(**{**vars(args), "page_template": None})
+    if args.url or args.url_file or not scopes:
+        scopes.extend((url, [url]) for url in collect_urls(plain_args))
+    return scopes
+
+async def run_delta(args: argparse.Namespace, gate: HostGate, route_policy: Dict[str, Any]) -> None:
+    """
+    差分モードの実行です。新規・変更のあった行を出力ファイルに、掲載終了の行を
+    `<出力ファイル名>.removed.<拡張子>` に書き出します。
+    """
+    if args.resume:
+        logging.warning("--resume is ignored in delta mode; the seen index decides what to emit.")
+    stem, ext = os.path.splitext(args.output)
+    removed_rows: List[Dict[str, str]] = []
+    with SeenIndex(args.index) as index, StreamingWriter(args.output, args.format, args.batch_size, args.checkpoint) as writer:
+        for scope, urls in collect_scopes(args):
+            removed_rows.extend(await crawl_incremental(
+                scope,
+                urls,
+                index,
+                writer.add_page,
+                stop_after_seen=args.stop_after_seen,
+                concurrency=args.concurrency,
+                gate=gate,
+                engine=args.engine,
+                route_policy=route_policy,
+                record=args.record,
+                replay=args.replay,
+            ))
+        logging.info(f"{writer.rows_written} new or changed rows written to {writer.sink.path}.")
+
+    if removed_rows:
+        removed_path = f"{stem}.removed{ext}"
+        sink = open_sink(removed_path, args.format)
+        try:
+            sink.write_batch(removed_rows)
+        finally:
+            sink.close()
+        logging.info(f"{len(removed_rows)} removed rows written to {removed_path}.")
+
+async def run_sharded(args: argparse.Namespace, route_policy: Dict[str, Any]) -> None:
+    """
+    シャード分割モードの実行です。検索条件を --shard の次元で分割し、シャードを ProcessPoolExecutor の
+    各プロセスでクロールして、求人のフィンガープリントで重複除去しながら出力ファイルに書き出します。
+    AutoThrottle と --host-concurrency はプロセスごとに適用されるため、ホストへの同時リクエスト数は最大で
+    プロセス数倍になります。--resume では完了済みページをスキップしますが、前回出力した行との重複は除去しません。
+    各シャードは取得したページを1ページずつキューで送り、親プロセスがその都度出力とチェックポイントに反映します。
+    """
+    bases = [args.page_template] if args.page_template else collect_urls(args)
+    throttle_options: Dict[str, Any] = {
+        "min_delay_ms": args.min_delay_ms,
+        "max_delay_ms": args.max_delay_ms,
+        "target_concurrency": args.target_concurrency,
+    }
+    if args.replay:
+        throttle_options = {"start_delay_ms": 0, "min_delay_ms": 0, "randomize": False}
+
+    merger = ShardMerger()
+    with StreamingWriter(args.output, args.format, args.batch_size, args.checkpoint, args.resume) as writer:
+        shards: List[Tuple[str, List[str]]] = []
+        for base in bases:
+            for name, url in plan_shards(base, args.shard):
+                pages = build_page_urls(url, args.start_page, args.end_page or 1) if "{page}" in url else [url]
+                pages = [page for page in pages if page not in writer.completed_urls]
+                if pages:
+                    shards.append((name, pages))
+        if not shards:
+            logging.info("All pages are already recorded in the checkpoint. Nothing to do.")
+            return
+
+        processes = max(1, min(args.processes, len(shards)))
+        logging.info(f"Crawling {len(shards)} shards with {processes} processes...")
+        loop = asyncio.get_running_loop()
+        # spawn で起動し、親プロセスのトレースファイル等を引き継がない
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager, ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            # シャードは1ページずつ送り、親が順に出力とチェックポイントに反映する (上限付きでメモリを一定に保つ)
+            queue = manager.Queue(maxsize=SHARD_QUEUE_PAGES * processes)
+
+            async def drain() -> None:
+                while True:
+                    item = await loop.run_in_executor(None, queue.get)
+                    if item is None:
+                        return
+                    url, page_rows = item
+                    with TRACER.span("output", url=url, rows=len(page_rows)):
+                        writer.add_page(url, merger.merge(page_rows))
+
+            drainer = asyncio.create_task(drain())
+            futures = [
+                loop.run_in_executor(pool, crawl_shard, name, pages, {
+                    "queue": queue,
+                    "throttle": throttle_options,
+                    "host_concurrency": args.host_concurrency,
+                    "concurrency": args.concurrency,
+                    "engine": args.engine,
+                    "route_policy": route_policy,
+                    # シャードごとに別のフィクスチャとして記録・再生する
+                    "record": f"{args.record}-shard{i + 1}" if args.record else None,
+                    "replay": f"{args.replay}-shard{i + 1}" if args.replay else None,
+                    # シャードごとのトレースファイル (集計は親のトレーサーに合算する)
+                    "trace_dir": args.trace_dir,
+                    "run_id": f"{TRACER.run_id}_shard{i + 1}" if TRACER.run_id else None,
+                })
+                for i, (name, pages) in enumerate(shards)
+            ]
+            try:
+                for future in asyncio.as_completed(futures):
+                    try:
+                        name, page_count, failed, histograms = await future
+                    except Exception as e:
+                        # 送信済みのページは出力・チェックポイント済みのため、--resume で残りから再開できる
+                        logging.error(f"A shard failed: {e}")
+                        continue
+                    TRACER.merge(histograms)
+                    logging.info(f"Shard {name} finished: {page_count} pages, {len(failed)} failed.")
+            finally:
+                queue.put(None)
+                await drainer
+        logging.info(f"{writer.rows_written} rows written to {writer.sink.path} ({merger.duplicates} cross-shard duplicates removed).")
+
+async def main(argv: List[str] | None = None) -> None:
     """
     スクレイピング処理のメイン実行関数です。
     """
+    args = parse_args(argv)
     logging.info("Starting EE-TIES scraping process...")
+    TRACER.start_run(args.trace_dir)
     try:
-        scraped_data = await scrape_ee_ties()
-        await save_to_csv(scraped_data, OUTPUT_FILENAME)
+        if args.replay:
+            # 再生時は実サイトへのアクセスがないため間隔を空けない
+            throttle = AutoThrottle(start_delay_ms=0, min_delay_ms=0, randomize=False)
+        else:
+            throttle = AutoThrottle(
+                min_delay_ms=args.min_delay_ms,
+                max_delay_ms=args.max_delay_ms,
+                target_concurrency=args.target_concurrency,
+            )
+        gate = HostGate(args.host_concurrency, throttle)
+        route_policy = {"enabled": not args.no_block_resources, "dry_run": args.measure_blocking}
+        if args.delta:
+            await run_delta(args, gate, route_policy)
+            return
+        if args.shard:
+            await run_sharded(args, route_policy)
+            return
+        with StreamingWriter(args.output, args.format, args.batch_size, args.checkpoint, args.resume) as writer:
+            urls = [url for url in collect_urls(args) if url not in writer.completed_urls]
+            if len(urls) == 0:
+                logging.info("All pages are already recorded in the checkpoint. Nothing to do.")
+            else:
+                await crawl(
+                    urls,
+                    concurrency=args.concurrency,
+                    gate=gate,
+                    on_page=writer.add_page,
+                    engine=args.engine,
+                    route_policy=route_policy,
+                    record=args.record,
+                    replay=args.replay,
+                )
+            logging.info(f"{writer.rows_written} rows written to {writer.sink.path}.")
     except Exception as e:
         logging.critical(f"Scraping process failed: {e}")
-    logging.info("Scraping process finished.")
+    finally:
+        TRACER.finish_run()
+        if args.metrics_file:
+            TRACER.write_prometheus(args.metrics_file)
+        logging.info("Scraping process finished.")
 
 if __name__ == "__main__":
     # スクリプトのエントリーポイント
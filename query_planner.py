@@ -0,0 +1,139 @@
+"""
+検索条件のシャーディング
+ee-ties の検索URLに含まれる絞り込み条件 (search_element_* など) を次元ごとに分割してシャードを作り、
+各シャードを別プロセス (それぞれ専用のブラウザとイベントループ) でクロールします。
+結果は求人のフィンガープリントでシャードをまたいで重複除去してから出力します。
+"""
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, List, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from seen_index import listing_fingerprint
+
+# 既定の分割次元 (TARGET_URL の search_element_1_* は同じ条件グループの複数選択)
+SHARD_DIMENSIONS: List[str] = ["search_element_1_*"]
+
+def _parse_dimension(spec: str) -> Tuple[str, List[str] | None]:
+    """
+    分割次元の指定を解析します。
+    "PREFIX*"       URLで選択されている PREFIX で始まるパラメータを1つずつ選ぶ (複数選択の分割)
+    "KEY=V1,V2,..." パラメータ KEY の値を V1, V2, ... と順に置き換える (URLにない値への展開)
+    """
+    if spec.endswith("*"):
+        return spec[:-1], None
+    if "=" in spec:
+        key, values = spec.split("=", 1)
+        return key, [v for v in values.split(",") if v]
+    raise ValueError(f"Invalid shard dimension '{spec}' (use 'PREFIX*' or 'KEY=V1,V2')")
+
+def plan_shards(url: str, dimensions: List[str] = SHARD_DIMENSIONS) -> List[Tuple[str, str]]:
+    """
+    URL (ページネーションテンプレートも可) を分割次元の直積でシャードに展開し、(シャード名, URL) のリストを返します。
+    分割次元に該当するパラメータがないURLは、そのまま1つのシャードになります。
+    """
+    parts = urlsplit(url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+
+    # 次元ごとの選択肢: 各選択肢はその次元に属するパラメータの組
+    axes: List[List[List[Tuple[str, str]]]] = []
+    claimed: Set[str] = set()
+    for spec in dimensions:
+        key, values = _parse_dimension(spec)
+        if values is None:
+            options = [[(k, v)] for k, v in params if k.startswith(key)]
+            claimed.update(k for k, _ in params if k.startswith(key))
+        else:
+            options = [[(key, value)] for value in values]
+            claimed.add(key)
+        if options:
+            axes.append(options)
+
+    if not axes:
+        return [(url, url)]
+
+    shards: List[Tuple[str, str]] = []
+    for combination in itertools.product(*axes):
+        selected = [pair for option in combination for pair in option]
+        # 分割対象のパラメータは最初に現れた位置に差し替え、それ以外は元の順序のまま残す
+        query_params: List[Tuple[str, str]] = []
+        inserted = False
+        for k, v in params:
+            if k not in claimed:
+                query_params.append((k, v))
+            elif not inserted:
+                query_params.extend(selected)
+                inserted = True
+        if not inserted:
+            query_params.extend(selected)
+        query = urlencode(query_params, safe="{}")  # ページネーションの {page} は残す
+        name = "&".join(f"{k}={v}" for k, v in selected)
+        shards.append((name, urlunsplit(parts._replace(query=query))))
+    return shards
+
+def crawl_shard(name: str, urls: List[str], options: Dict[str, Any]) -> Tuple[str, int, List[str], Dict[str, Any]]:
+    """
+    ワーカープロセスで1つのシャードをクロールし、(シャード名, ページ数, 失敗したURL, フェーズ別ヒストグラム) を返します。
+    ProcessPoolExecutor (spawn) から呼ばれるため、ブラウザ・HostGate・AutoThrottle・トレーサーはプロセスごとに独立しています。
+    取得したページは1ページずつ options["queue"] に (URL, 行) として送り、親プロセスがすぐに出力・チェックポイントに反映します
+    (シャードの途中で失敗しても、それまでのページは失われません)。キューの上限に達すると親が書き出すまで待ちます。
+    トレースは options["run_id"] があればシャード専用のファイル (`run_<run_id>.jsonl`) に書き出します。
+    """
+    import memo  # ワーカープロセス側で読み込む (memo はこのモジュールを参照するため)
+    from tracing import TRACER
+
+    queue = options["queue"]
+    throttle = memo.AutoThrottle(**options["throttle"])
+    gate = memo.HostGate(options["host_concurrency"], throttle)
+    pages = 0
+    failed: List[str] = []
+
+    def on_page(url: str, rows: List[Dict[str, str]]) -> None:
+        nonlocal pages
+        queue.put((url, rows))
+        pages += 1
+
+    if options.get("run_id"):
+        TRACER.start_run(options["trace_dir"], options["run_id"])
+    logging.info(f"[shard {name}] Crawling {len(urls)} pages")
+    try:
+        asyncio.run(memo.crawl(
+            urls,
+            concurrency=options["concurrency"],
+            gate=gate,
+            on_page=on_page,
+            on_failed=failed.append,
+            engine=options["engine"],
+            route_policy=options["route_policy"],
+            record=options["record"],
+            replay=options["replay"],
+        ))
+    finally:
+        TRACER.finish_run()
+    return name, pages, failed, TRACER.histograms
+
+class ShardMerger:
+    """
+    シャードの結果を、求人のフィンガープリントでシャードをまたいで重複除去します。
+    複数選択の条件は OR のため、同じ求人が複数のシャードに現れます。
+    """
+
+    def __init__(self) -> None:
+        self._seen: Set[str] = set()
+        self.duplicates = 0
+
+    def merge(self, rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        まだ出力していない求人の行のみを返します。
+        """
+        unique: List[Dict[str, str]] = []
+        for row in rows:
+            fingerprint = listing_fingerprint(row)
+            if fingerprint in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(fingerprint)
+            unique.append(row)
+        return unique
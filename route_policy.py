@@ -0,0 +1,140 @@
+"""
+リクエスト遮断ポリシー
+抽出に不要なサブリソース (画像・フォント・動画・解析ビーコン等) を context.route で遮断し、
+ページごとに遮断したリクエスト数と転送量を集計します。
+"""
+
+import fnmatch
+import logging
+import weakref
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Request, Route
+
+# 既定のポリシー (実行単位で上書き可能)
+# block_resource_types: 遮断するリソース種別 (Playwrightの request.resource_type)
+# block_url_patterns: 遮断するURLパターン (fnmatch形式)
+# allow_url_patterns: 遮断対象でも通過させるURLパターン (ページの動作に必要なもの)
+# dry_run: Trueの場合は遮断せず、遮断した場合に削減できた転送量を計測のみ行う
+ROUTE_POLICY: Dict[str, Any] = {
+    "enabled": True,
+    "block_resource_types": ["image", "font", "media"],
+    "block_url_patterns": [
+        "*google-analytics.com/*",
+        "*googletagmanager.com/*",
+        "*doubleclick.net/*",
+        "*connect.facebook.net/*",
+        "*hotjar.com/*",
+        "*clarity.ms/*",
+    ],
+    "allow_url_patterns": [],
+    "dry_run": False,
+}
+
+# サイト (ホスト) 単位の上書き設定
+# 例: "www.example.com": {"block_resource_types": ["media"], "allow_url_patterns": ["*/captcha/*"]}
+SITE_ROUTE_POLICIES: Dict[str, Dict[str, Any]] = {}
+
+def resolve_route_policy(site: str | None, policy: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    実行単位のポリシーにサイト単位の上書きを重ねたポリシーを返します。
+    """
+    resolved = {**ROUTE_POLICY, **(policy or {})}
+    if site and site in SITE_ROUTE_POLICIES:
+        resolved.update(SITE_ROUTE_POLICIES[site])
+    return resolved
+
+def _matches(url: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(url, pattern) for pattern in patterns)
+
+def should_block(url: str, resource_type: str, policy: Dict[str, Any]) -> bool:
+    """
+    リクエストを遮断すべきかを判定します。ドキュメント本体は常に通過させます。
+    """
+    if not policy.get("enabled") or resource_type == "document":
+        return False
+    if _matches(url, policy.get("allow_url_patterns", [])):
+        return False
+    return resource_type in policy.get("block_resource_types", []) or _matches(url, policy.get("block_url_patterns", []))
+
+class RouteStats:
+    """
+    ページ単位の遮断・転送量の集計です。
+    begin_page() で対象サイトを設定してカウンタをリセットし、summary() で結果を取得します。
+    """
+
+    def __init__(self, policy: Dict[str, Any] | None = None) -> None:
+        self.base_policy = policy
+        self.policy = resolve_route_policy(None, policy)
+        self.site: str | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.blocked_requests = 0
+        self.blocked_by_type: Dict[str, int] = {}
+        self.saved_bytes = 0
+        self.loaded_requests = 0
+        self.loaded_bytes = 0
+
+    def begin_page(self, url: str) -> None:
+        self.site = urlparse(url).netloc
+        self.policy = resolve_route_policy(self.site, self.base_policy)
+        self.reset()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "site": self.site,
+            "dryRun": bool(self.policy.get("dry_run")),
+            "blockedRequests": self.blocked_requests,
+            "blockedByType": dict(self.blocked_by_type),
+            "savedBytes": self.saved_bytes,
+            "loadedRequests": self.loaded_requests,
+            "loadedBytes": self.loaded_bytes,
+        }
+
+_context_stats: "weakref.WeakKeyDictionary[BrowserContext, RouteStats]" = weakref.WeakKeyDictionary()
+
+def route_stats(context: BrowserContext) -> RouteStats | None:
+    """
+    apply_route_policy() で登録した集計オブジェクトを返します。
+    """
+    return _context_stats.get(context)
+
+async def apply_route_policy(context: BrowserContext, policy: Dict[str, Any] | None = None) -> RouteStats:
+    """
+    コンテキストに遮断ポリシーを適用します。
+    遮断されたリクエストは転送量が分からないため、正確な削減量は dry_run で計測してください
+    (dry_run では遮断対象のリクエストも通過させ、その実転送量を savedBytes に加算します)。
+    実行単位で無効でもサイト単位の設定 (begin_page() で解決) で有効になる場合があるため、ハンドラーは常に登録し、
+    遮断するかはページごとの stats.policy で判定します。
+    """
+    stats = RouteStats(policy)
+    _context_stats[context] = stats
+
+    async def handle(route: Route) -> None:
+        request = route.request
+        if should_block(request.url, request.resource_type, stats.policy):
+            stats.blocked_requests += 1
+            stats.blocked_by_type[request.resource_type] = stats.blocked_by_type.get(request.resource_type, 0) + 1
+            if not stats.policy.get("dry_run"):
+                await route.abort("blockedbyclient")
+                return
+        await route.continue_()
+
+    async def on_finished(request: Request) -> None:
+        try:
+            sizes = await request.sizes()
+        except Exception as e:
+            logging.debug(f"Could not read request sizes for {request.url}: {e}")
+            return
+        size = sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+        if stats.policy.get("dry_run") and should_block(request.url, request.resource_type, stats.policy):
+            stats.saved_bytes += size
+        else:
+            stats.loaded_requests += 1
+            stats.loaded_bytes += size
+
+    await context.route("**/*", handle)
+    context.on("requestfinished", on_finished)
+    return stats
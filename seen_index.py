@@ -0,0 +1,141 @@
+"""
+差分スクレイピング用の既読インデックス
+検索条件 (スコープ) と求人の識別キーごとに、内容のフィンガープリントをSQLiteに保存します。
+実行ごとに新規・変更・変更なしを判定し、一巡したクロールでは掲載終了した求人を検出します。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Tuple
+
+# インデックスの保存先
+SEEN_INDEX_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "seen_index.sqlite3")
+# 求人を識別するフィールド (同じ求人かどうか)
+IDENTITY_FIELDS: List[str] = ["求人タイトル", "企業名"]
+# 内容の変更を検出するフィールド
+FINGERPRINT_FIELDS: List[str] = ["求人タイトル", "企業名", "仕事内容概要"]
+
+def _digest(row: Dict[str, Any], fields: List[str]) -> str:
+    return hashlib.sha1('\x1f'.join(str(row.get(f, '')) for f in fields).encode('utf-8')).hexdigest()
+
+def listing_fingerprint(row: Dict[str, Any]) -> str:
+    """
+    求人の内容 (FINGERPRINT_FIELDS) のフィンガープリントを返します。検索条件の列は含みません。
+    """
+    return _digest(row, FINGERPRINT_FIELDS)
+
+class SeenIndex:
+    """
+    スコープ (検索条件URLなど) ごとの求人フィンガープリントの永続インデックスです。
+    """
+
+    def __init__(self, path: str = SEEN_INDEX_FILE) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                scope TEXT NOT NULL,
+                identity TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                row_json TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                last_run INTEGER NOT NULL,
+                removed_at REAL,
+                PRIMARY KEY (scope, identity)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                full_pass INTEGER
+            );
+        """)
+
+    def begin_run(self, scope: str) -> int:
+        """
+        スコープの新しい実行を開始し、実行IDを返します。
+        """
+        with self._conn:
+            cursor = self._conn.execute("INSERT INTO runs (scope, started_at) VALUES (?, ?)", (scope, time.time()))
+        return cursor.lastrowid
+
+    def apply(self, run_id: int, scope: str, rows: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        行を既読インデックスと照合し、(判定, 行) のリストを入力順で返します。
+        判定は "new" (初出または掲載終了後の再掲), "changed" (内容変更), "unchanged" のいずれかです。
+        照合した行は今回の実行で確認済みとして記録します。
+        """
+        now = time.time()
+        results: List[Tuple[str, Dict[str, Any]]] = []
+        with self._conn:
+            for row in rows:
+                identity = _digest(row, IDENTITY_FIELDS)
+                fingerprint = listing_fingerprint(row)
+                existing = self._conn.execute(
+                    "SELECT fingerprint, removed_at FROM items WHERE scope = ? AND identity = ?",
+                    (scope, identity),
+                ).fetchone()
+                if existing is None or existing[1] is not None:
+                    status = "new"
+                elif existing[0] != fingerprint:
+                    status = "changed"
+                else:
+                    status = "unchanged"
+                self._conn.execute(
+                    """
+                    INSERT INTO items (scope, identity, fingerprint, row_json, first_seen, last_seen, last_run, removed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+                    ON CONFLICT (scope, identity) DO UPDATE SET
+                        fingerprint = excluded.fingerprint,
+                        row_json = excluded.row_json,
+                        last_seen = excluded.last_seen,
+                        last_run = excluded.last_run,
+                        removed_at = NULL
+                    """,
+                    (scope, identity, fingerprint, json.dumps(row, ensure_ascii=False), now, now, run_id),
+                )
+                results.append((status, row))
+        return results
+
+    def finish_run(self, run_id: int, scope: str, full_pass: bool) -> List[Dict[str, Any]]:
+        """
+        実行を終了します。全ページを一巡した場合 (full_pass) のみ、今回確認されなかった求人を
+        掲載終了として記録し、その行を返します。途中で打ち切った実行では掲載終了を判定できません。
+        """
+        removed: List[Dict[str, Any]] = []
+        now = time.time()
+        with self._conn:
+            if full_pass:
+                removed = [
+                    json.loads(row_json)
+                    for (row_json,) in self._conn.execute(
+                        "SELECT row_json FROM items WHERE scope = ? AND last_run != ? AND removed_at IS NULL",
+                        (scope, run_id),
+                    )
+                ]
+                self._conn.execute(
+                    "UPDATE items SET removed_at = ? WHERE scope = ? AND last_run != ? AND removed_at IS NULL",
+                    (now, scope, run_id),
+                )
+            self._conn.execute(
+                "UPDATE runs SET finished_at = ?, full_pass = ? WHERE id = ?",
+                (now, int(full_pass), run_id),
+            )
+        logging.info(f"Seen index run {run_id} for {scope} finished (full pass: {full_pass}, removed: {len(removed)})")
+        return removed
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "SeenIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
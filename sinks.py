@@ -0,0 +1,291 @@
+"""
+スクレイピング結果のストリーミング出力
+ページ単位で行データを受け取り、バッチごとにCSV / NDJSON / Parquetへ追記します。
+チェックポイントファイルに書き込み済みのページを記録し、再実行時に続きから再開できます。
+"""
+
+import csv
+import glob
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Set
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet出力を使わない場合は不要
+    pa = None
+    pq = None
+
+# 出力形式と拡張子の対応
+SINK_FORMATS: Dict[str, str] = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+}
+# 何行たまったらファイルへ書き出すか
+DEFAULT_BATCH_SIZE: int = 200
+
+class RowSink(ABC):
+    """
+    行データの書き込み先の基底クラスです。
+    write_batch() は呼び出しごとにファイルへ書き出し、フラッシュまで完了させます。
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        self.path = path
+        self.append = append
+        self.rows_written = 0
+
+    @abstractmethod
+    def write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        行のバッチを書き出します。StreamingWriter はこの呼び出しの完了後にチェックポイントを記録します。
+        """
+
+    def close(self) -> None:
+        pass
+
+class CsvSink(RowSink):
+    """
+    CSVへ追記します。追記時は既存ファイルのヘッダーを列定義として引き継ぎます。
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        super().__init__(path, append)
+        self.fieldnames: List[str] | None = None
+        has_content = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if has_content:
+            with open(path, newline='', encoding='utf-8') as f:
+                self.fieldnames = next(csv.reader(f), None)
+        self._file = open(path, 'a' if has_content else 'w', newline='', encoding='utf-8')
+        self._writer: csv.DictWriter | None = None
+        if self.fieldnames:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+
+    def write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._writer is None:
+            # 最初の行のキーをヘッダーとして使用
+            self.fieldnames = list(rows[0].keys())
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+class NdjsonSink(RowSink):
+    """
+    1行1レコードのJSON (NDJSON) へ追記します。
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        super().__init__(path, append)
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+def _to_string(value: Any) -> str | None:
+    """
+    Parquetの文字列列に書き込める値に変換します (None はそのまま欠損値)。
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def parquet_files(path: str) -> List[str]:
+    """
+    ParquetSink が書き込んだファイル (`<name>.parquet` と `<name>.partN.parquet`) を書き込み順に返します。
+    """
+    stem, ext = os.path.splitext(path)
+    parts = []
+    for name in glob.glob(f"{glob.escape(stem)}.part*{ext}"):
+        number = name[len(stem) + len(".part"):len(name) - len(ext)]
+        if number.isdigit():
+            parts.append((int(number), name))
+    return ([path] if os.path.exists(path) else []) + [name for _, name in sorted(parts)]
+
+class ParquetSink(RowSink):
+    """
+    Parquetへバッチごとに1つのファイルとして書き込みます (pyarrowが必要)。
+    Parquetはフッターを書き込むまで読めないため、バッチごとにファイルを閉じてから返し、
+    チェックポイントには読み込めるファイルに書き出したページだけが記録されるようにします。
+    最初のバッチは `<name>.parquet`、以降は `<name>.partN.parquet` に書き込みます (一覧は parquet_files())。
+    追記時は既存のファイルの列定義を引き継ぎ、続きの番号から書き込みます。
+    列はすべて文字列型で、数値などの値は文字列に、dict / list はJSON文字列に変換して書き込みます。
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        if pa is None:
+            raise RuntimeError("Parquet output requires pyarrow. Install it with: pip install pyarrow")
+        super().__init__(path, append)
+        self._schema: Any = None
+        files = parquet_files(path)
+        if append and files:
+            self._schema = pq.read_schema(files[0])
+            logging.info(f"Parquet output exists ({len(files)} files), resuming into the next part")
+        else:
+            for name in files:
+                os.remove(name)
+        self._files = len(files) if append else 0
+
+    def _next_path(self) -> str:
+        stem, ext = os.path.splitext(self.path)
+        while True:
+            path = f"{stem}.part{self._files}{ext}" if self._files else self.path
+            self._files += 1
+            if not os.path.exists(path):
+                return path
+
+    def write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._schema is None:
+            self._schema = pa.schema([(key, pa.string()) for key in rows[0].keys()])
+        table = pa.Table.from_pylist([
+            {key: _to_string(value) for key, value in row.items()} for row in rows
+        ], schema=self._schema)
+        # 書き込み途中のファイルを残さないよう、一時ファイルに書いてから置き換える
+        target = self._next_path()
+        tmp_path = f"{target}.tmp"
+        pq.write_table(table, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+        self.rows_written += len(rows)
+
+def sink_format(path: str, fmt: str | None = None) -> str:
+    """
+    出力形式を返します。未指定の場合は拡張子から判定します (不明な拡張子はCSV)。
+    """
+    return fmt or SINK_FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+def open_sink(path: str, fmt: str | None = None, append: bool = False) -> RowSink:
+    """
+    出力形式 (未指定の場合は拡張子から判定) に対応するSinkを作成します。
+    """
+    fmt = sink_format(path, fmt)
+    if fmt == "csv":
+        return CsvSink(path, append)
+    if fmt == "ndjson":
+        return NdjsonSink(path, append)
+    if fmt == "parquet":
+        return ParquetSink(path, append)
+    raise ValueError(f"Unsupported output format: {fmt}")
+
+class CrawlCheckpoint:
+    """
+    書き込み済みのページURLをJSONファイルに記録します。
+    書き込みは一時ファイル経由の置き換えで行い、途中で落ちても壊れた状態を残しません。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.completed: Set[str] = set()
+        self.rows = 0
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.completed = set(state.get("completed", []))
+            self.rows = state.get("rows", 0)
+            logging.info(f"Loaded checkpoint {self.path}: {len(self.completed)} pages, {self.rows} rows")
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint '{self.path}': {e}")
+
+    def commit(self, urls: List[str], rows: int) -> None:
+        self.completed.update(urls)
+        self.rows += rows
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"completed": sorted(self.completed), "rows": self.rows}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class StreamingWriter:
+    """
+    ページ単位の行データをバッチで出力先へ流し込み、書き込み完了したページをチェックポイントに記録します。
+    メモリ上に保持するのは未フラッシュの1バッチ分のみなので、クロール規模によらずメモリ使用量は一定です。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        checkpoint_path: str | None = None,
+        resume: bool = False,
+    ) -> None:
+        self.batch_size = batch_size
+        self.checkpoint = CrawlCheckpoint(checkpoint_path or f"{path}.checkpoint.json")
+        if resume:
+            self.checkpoint.load()
+        else:
+            self.checkpoint.clear()
+        self.sink = open_sink(path, fmt, append=resume)
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending_urls: List[str] = []
+
+    @property
+    def completed_urls(self) -> Set[str]:
+        return self.checkpoint.completed
+
+    @property
+    def rows_written(self) -> int:
+        return self.checkpoint.rows
+
+    def add_page(self, url: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        1ページ分の行を追加します。バッチサイズに達したらフラッシュします。
+        """
+        self._buffer.extend(rows)
+        self._pending_urls.append(url)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        バッファ中の行を書き出し、対応するページをチェックポイントに記録します。
+        """
+        if not self._pending_urls:
+            return
+        self.sink.write_batch(self._buffer)
+        self.checkpoint.commit(self._pending_urls, len(self._buffer))
+        logging.debug(f"Flushed {len(self._buffer)} rows from {len(self._pending_urls)} pages to {self.sink.path}")
+        self._buffer = []
+        self._pending_urls = []
+
+    def close(self) -> None:
+        self.flush()
+        self.sink.close()
+
+    def __enter__(self) -> "StreamingWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
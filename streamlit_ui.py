@@ -6,9 +6,11 @@ AI Scraper Builder - Streamlit UI
 import streamlit as st
 import requests
 import json
-import os
 from datetime import datetime
 
+import backend_client
+from backend_client import BackendError
+
 # ページ設定
 st.set_page_config(
     page_title="AI Scraper Builder",
@@ -16,9 +18,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# バックエンドURL（環境変数から取得、デフォルトはlocalhost）
-BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:3000")
-
 # セッション状態の初期化
 if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
@@ -26,6 +25,34 @@ if 'generated_code' not in st.session_state:
     st.session_state.generated_code = None
 if 'execution_result' not in st.session_state:
     st.session_state.execution_result = None
+if 'pending_jobs' not in st.session_state:
+    st.session_state.pending_jobs = {}  # 種別 → 実行中のジョブID（再実行されても待機を再開する）
+
+def wait_for_pending_job(kind):
+    """
+    実行中のジョブの終了を待ち、進捗バーを表示して結果を返します。
+    待機中に画面が再実行された場合も、次の実行で同じジョブの待機を再開します。
+    """
+    job_id = st.session_state.pending_jobs[kind]
+    progress_bar = st.progress(0, text="ジョブを登録しました...")
+
+    def on_progress(job):
+        progress = job['progress']
+        progress_bar.progress(
+            progress['percent'] / 100,
+            text=f"{progress['message']} ({progress['step']}/{progress['totalSteps']})"
+        )
+
+    try:
+        result = backend_client.wait_for_job(job_id, on_progress)
+    except Exception:
+        st.session_state.pending_jobs.pop(kind, None)  # 失敗したジョブは再開しない
+        raise
+    finally:
+        progress_bar.empty()
+
+    st.session_state.pending_jobs.pop(kind, None)
+    return result
 
 # タイトル
 st.title("🤖 AI Scraper Builder")
@@ -37,25 +64,20 @@ st.sidebar.header("⚙️ 設定")
 # アンチボット設定表示
 with st.sidebar.expander("🛡️ アンチボット対策設定"):
     try:
-        config_response = requests.get(f"{BACKEND_URL}/api/config", timeout=5)
-        if config_response.status_code == 200:
-            config = config_response.json()['config']
-            st.json(config)
+        st.json(backend_client.get_config())
     except:
         st.warning("設定を取得できませんでした")
 
 # 統計情報
 with st.sidebar.expander("📊 統計情報"):
-    if st.button("更新", key="refresh_stats"):
-        try:
-            stats_response = requests.get(f"{BACKEND_URL}/api/stats", timeout=5)
-            if stats_response.status_code == 200:
-                stats = stats_response.json()['stats']
-                st.metric("訪問済みURL", stats.get('visitedUrls', 0))
-                st.metric("アクティブプロキシ", f"{stats.get('activeProxies', 0)}/{stats.get('totalProxies', 0)}")
-                st.metric("実行中", stats.get('runningScrapers', 0))
-        except:
-            st.error("統計を取得できませんでした")
+    refresh_stats = st.button("更新", key="refresh_stats")
+    try:
+        stats = backend_client.get_stats(force_refresh=refresh_stats)
+        st.metric("訪問済みURL", stats.get('visitedUrls', 0))
+        st.metric("アクティブプロキシ", f"{stats.get('activeProxies', 0)}/{stats.get('totalProxies', 0)}")
+        st.metric("実行中", stats.get('runningScrapers', 0))
+    except:
+        st.error("統計を取得できませんでした")
 
 # メインコンテンツ
 tab1, tab2, tab3, tab4 = st.tabs([
@@ -81,20 +103,19 @@ with tab1:
         analyze_btn = st.button("🔍 解析開始", type="primary", use_container_width=True)
 
     if analyze_btn and url:
+        try:
+            st.session_state.pending_jobs['analyze'] = backend_client.submit_analyze(url)
+        except Exception as e:
+            st.error(f"❌ エラー: {str(e)}")
+
+    if 'analyze' in st.session_state.pending_jobs:
         with st.spinner("ページを解析中... (アンチボット対策により時間がかかります)"):
             try:
-                response = requests.post(
-                    f"{BACKEND_URL}/api/analyze",
-                    json={"url": url},
-                    timeout=60
-                )
-
-                if response.status_code == 200:
-                    st.session_state.analysis_result = response.json()
-                    st.success("✅ 解析完了！")
-                else:
-                    st.error(f"❌ エラー: {response.json().get('error', 'Unknown error')}")
+                st.session_state.analysis_result = wait_for_pending_job('analyze')
+                st.success("✅ 解析完了！")
 
+            except BackendError as e:
+                st.error(f"❌ エラー: {e.message}")
             except requests.exceptions.Timeout:
                 st.error("⏱️ タイムアウト: サイトの応答が遅すぎます")
             except Exception as e:
@@ -117,14 +138,19 @@ with tab1:
             st.metric("解析時刻", timestamp.split('T')[1][:8] if timestamp else 'N/A')
 
         # ページスクリーンショット表示
-        if result.get('screenshot'):
+        # 画像は解析結果に含まれないため、表示を選んだときだけ取得する（取得済みの画像はキャッシュされる）
+        screenshot = result.get('screenshot')
+        if screenshot:
             with st.expander("📸 ページスクリーンショット", expanded=False):
-                import base64
-                screenshot_data = result['screenshot']
-                if screenshot_data:
-                    st.image(f"data:image/png;base64,{screenshot_data}",
-                            caption="解析したページのスクリーンショット",
-                            use_container_width=True)
+                if st.toggle("スクリーンショットを表示", key=f"show_screenshot_{screenshot['id']}"):
+                    full_size = st.checkbox("元のサイズで表示", key=f"full_screenshot_{screenshot['id']}")
+                    artifact_id = screenshot['id'] if full_size or not screenshot.get('thumbnailId') else screenshot['thumbnailId']
+                    try:
+                        st.image(backend_client.fetch_artifact(artifact_id),
+                                caption="解析したページのスクリーンショット",
+                                use_container_width=True)
+                    except Exception as e:
+                        st.error(f"❌ スクリーンショットを取得できませんでした: {str(e)}")
 
         # ページネーション情報表示
         pagination = result.get('pagination', {})
@@ -213,31 +239,28 @@ with tab2:
             if not selected_targets:
                 st.error("最低1つのデータ要素を選択してください")
             else:
-                with st.spinner("コードを生成中... (AIが最適なコードを作成しています)"):
-                    try:
-                        payload = {
-                            "url": st.session_state.analysis_result['url'],
-                            "targets": selected_targets,
-                            "pagination": pagination,
-                            "loginRequired": login_required,
-                            "outputFormat": output_format,
-                            "language": language
-                        }
-
-                        response = requests.post(
-                            f"{BACKEND_URL}/api/generate",
-                            json=payload,
-                            timeout=180  # 3分に延長
-                        )
+                try:
+                    st.session_state.pending_jobs['generate'] = backend_client.submit_generate(
+                        url=st.session_state.analysis_result['url'],
+                        targets=selected_targets,
+                        pagination=pagination,
+                        login_required=login_required,
+                        output_format=output_format,
+                        language=language
+                    )
+                except Exception as e:
+                    st.error(f"❌ エラー: {str(e)}")
 
-                        if response.status_code == 200:
-                            st.session_state.generated_code = response.json()
-                            st.success("✅ コード生成完了！")
-                        else:
-                            st.error(f"❌ エラー: {response.json().get('error', 'Unknown error')}")
+        if 'generate' in st.session_state.pending_jobs:
+            with st.spinner("コードを生成中... (AIが最適なコードを作成しています)"):
+                try:
+                    st.session_state.generated_code = wait_for_pending_job('generate')
+                    st.success("✅ コード生成完了！")
 
-                    except Exception as e:
-                        st.error(f"❌ エラー: {str(e)}")
+                except BackendError as e:
+                    st.error(f"❌ エラー: {e.message}")
+                except Exception as e:
+                    st.error(f"❌ エラー: {str(e)}")
 
         # 生成されたコードの表示
         if st.session_state.generated_code:
@@ -279,40 +302,49 @@ with tab3:
                 key="exec_format"
             )
 
+        detected_pagination = st.session_state.analysis_result.get('pagination', {})
+        follow_pages = st.checkbox(
+            "ページネーションを辿る",
+            value=bool(detected_pagination.get('detected')),
+            key="exec_pagination"
+        )
+        exec_max_pages = st.number_input("最大ページ数", min_value=1, max_value=100, value=10, key="exec_max_pages") if follow_pages else None
+
         st.divider()
 
         if st.button("▶️ 実行開始", type="primary"):
+            try:
+                st.session_state.pending_jobs['execute'] = backend_client.submit_execute(
+                    code=st.session_state.generated_code['code'],
+                    url=st.session_state.analysis_result['url'],
+                    targets=st.session_state.generated_code['targets'],
+                    save_output=save_output,
+                    output_format=output_format_exec,
+                    include_data=False,  # データは結果タブでページ単位に取得
+                    pagination=(detected_pagination if detected_pagination.get('detected') else True) if follow_pages else None,
+                    max_pages=exec_max_pages
+                )
+            except Exception as e:
+                st.error(f"❌ エラー: {str(e)}")
+
+        if 'execute' in st.session_state.pending_jobs:
             with st.spinner("スクレイパーを実行中... (アンチボット対策により時間がかかります)"):
                 try:
-                    payload = {
-                        "code": st.session_state.generated_code['code'],
-                        "url": st.session_state.analysis_result['url'],
-                        "targets": st.session_state.generated_code['targets'],
-                        "saveOutput": save_output,
-                        "outputFormat": output_format_exec
-                    }
-
-                    response = requests.post(
-                        f"{BACKEND_URL}/api/execute",
-                        json=payload,
-                        timeout=120
-                    )
-
-                    if response.status_code == 200:
-                        st.session_state.execution_result = response.json()
-                        st.success("✅ 実行完了！")
-                    else:
-                        error_msg = response.json().get('error', 'Unknown error')
-                        st.error(f"❌ エラー: {error_msg}")
-
-                        # ブロック検知の場合
-                        if 'blocked' in error_msg.lower() or '403' in error_msg:
-                            st.warning("""
-                            🚨 **ボット検知の可能性**
-                            - プロキシの設定を検討してください
-                            - 待機時間を増やしてください
-                            - ヘッドレスモードを無効にしてください
-                            """)
+                    st.session_state.execution_result = wait_for_pending_job('execute')
+                    st.success("✅ 実行完了！")
+
+                except BackendError as e:
+                    error_msg = e.message
+                    st.error(f"❌ エラー: {error_msg}")
+
+                    # ブロック検知の場合
+                    if 'blocked' in error_msg.lower() or '403' in error_msg:
+                        st.warning("""
+                        🚨 **ボット検知の可能性**
+                        - プロキシの設定を検討してください
+                        - 待機時間を増やしてください
+                        - ヘッドレスモードを無効にしてください
+                        """)
 
                 except requests.exceptions.Timeout:
                     st.error("⏱️ タイムアウト: 実行に時間がかかりすぎています")
@@ -334,50 +366,72 @@ with tab4:
         with col1:
             st.metric("ステータスコード", result['data'].get('statusCode', 'N/A'))
         with col2:
-            data_fields = len(result['data'].get('data', {}))
-            st.metric("取得データ項目数", data_fields)
+            st.metric("取得データ項目数", len(result['data'].get('columns', [])))
         with col3:
             timestamp = result.get('timestamp', '')
             st.metric("実行時刻", timestamp.split('T')[1][:8] if timestamp else 'N/A')
 
         st.divider()
 
-        # 取得データの表示
+        # 取得データの表示（サーバー側でページ分割・列の絞り込みを行い、Arrow形式で受け取る）
         st.subheader("📊 取得データ")
 
-        data = result['data'].get('data', {})
+        scraper_id = result['scraperId']
+        all_columns = result['data'].get('columns', [])
+        total_rows = result['data'].get('totalRows', 0)
 
-        if data:
-            # データをテーブル形式で表示
-            import pandas as pd
+        if all_columns and total_rows:
+            col1, col2, col3 = st.columns([3, 1, 1])
+            with col1:
+                columns = st.multiselect("表示する列", all_columns, default=all_columns, key="result_columns")
+            with col2:
+                page_size = st.selectbox("1ページの行数", [100, 500, 1000, 5000], index=1, key="result_page_size")
+            with col3:
+                page_count = max(1, -(-total_rows // page_size))
+                page_number = st.number_input(f"ページ (全{page_count})", min_value=1, max_value=page_count, value=1, key="result_page")
 
-            # 各キーの最大長を取得
-            max_len = max([len(v) for v in data.values()]) if data.values() else 0
-
-            # データフレーム作成
-            df_data = {}
-            for key, values in data.items():
-                # 長さを揃える
-                padded_values = values + [''] * (max_len - len(values))
-                df_data[key] = padded_values
-
-            if df_data:
-                df = pd.DataFrame(df_data)
+            try:
+                df, total_rows = backend_client.get_result_page(
+                    scraper_id,
+                    offset=(page_number - 1) * page_size,
+                    limit=page_size,
+                    columns=columns
+                )
+                st.caption(f"{total_rows}行中 {(page_number - 1) * page_size + 1}〜{(page_number - 1) * page_size + len(df)}行目")
                 st.dataframe(df, use_container_width=True)
 
-                # CSVダウンロード
-                csv = df.to_csv(index=False)
+                # JSON表示（表示中のページのみ）
+                with st.expander("📄 JSON形式で表示（表示中のページ）"):
+                    st.json(df.to_dict(orient='list'))
+            except Exception as e:
+                st.error(f"❌ 結果を取得できませんでした: {str(e)}")
+
+            # ダウンロード（全行をサーバーで変換したファイルをそのまま渡す）
+            col1, col2 = st.columns(2)
+            with col1:
+                download_format = st.selectbox("ダウンロード形式", ["csv", "arrow"], key="download_format")
+            with col2:
+                st.write("")
+                if st.button("📦 ダウンロードを準備", key="prepare_download"):
+                    try:
+                        st.session_state.result_download = (
+                            scraper_id,
+                            download_format,
+                            backend_client.download_result(scraper_id, download_format, columns)
+                        )
+                    except Exception as e:
+                        st.error(f"❌ エラー: {str(e)}")
+
+            download = st.session_state.get('result_download')
+            if download and download[0] == scraper_id:
+                _, fmt, content = download
                 st.download_button(
-                    label="💾 CSVでダウンロード",
-                    data=csv,
-                    file_name=f"scraped_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
+                    label=f"💾 {fmt.upper()}でダウンロード",
+                    data=content,
+                    file_name=f"scraped_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}",
+                    mime="text/csv" if fmt == "csv" else "application/vnd.apache.arrow.stream"
                 )
 
-            # JSON表示
-            with st.expander("📄 JSON形式で表示"):
-                st.json(data)
-
         else:
             st.warning("データが取得できませんでした")
 
@@ -0,0 +1,127 @@
+"""
+一括実行CLIのテスト (出力行と各Sinkの組み合わせ、通信エラーの扱い)
+"""
+
+import asyncio
+import csv
+import json
+
+import httpx
+import pytest
+
+from backend_client import BackendError
+from batch_client.__main__ import parse_args
+from batch_client.client import AsyncBackendClient
+from batch_client.runner import BatchItem, BatchRunner, JobJournal
+from sinks import StreamingWriter, parquet_files
+
+class FakeClient:
+    """
+    get_result() だけを持つバックエンドクライアントの代わりです。
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    async def get_result(self, scraper_id):
+        return {"data": self.data}
+
+def build_rows(include_data, job, data=None):
+    runner = BatchRunner(FakeClient(data or {}), writer=None, journal=None, include_data=include_data)
+    item = BatchItem(url="https://example.com/a", extra={"category": "news"})
+    return asyncio.run(runner._build_rows(item, job))
+
+COMPLETED = {
+    "id": "job-1",
+    "status": "completed",
+    "result": {"scraperId": "s-1", "dataCount": 2, "screenshotUrl": "/api/artifacts/s-1.png"},
+    "error": None,
+}
+FAILED = {"id": "job-2", "status": "failed", "result": None, "error": "timeout"}
+
+def test_summary_rows_through_csv(tmp_path):
+    path = tmp_path / "out.csv"
+    with StreamingWriter(str(path), batch_size=1) as writer:
+        writer.add_page("https://example.com/a", build_rows(False, COMPLETED))
+        writer.add_page("https://example.com/b", build_rows(False, FAILED))
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row["data_count"] for row in rows] == ["2", ""]
+    assert rows[1]["error"] == "timeout"
+
+@pytest.mark.parametrize("include_data", [False, True])
+def test_rows_through_ndjson(tmp_path, include_data):
+    path = tmp_path / "out.ndjson"
+    data = {"title": ["A", "B"], "price": ["100"]}
+    with StreamingWriter(str(path)) as writer:
+        writer.add_page("https://example.com/a", build_rows(include_data, COMPLETED, data))
+    rows = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    if include_data:
+        assert [(row["title"], row["price"]) for row in rows] == [("A", "100"), ("B", None)]
+        assert rows[0]["category"] == "news"
+    else:
+        assert rows == build_rows(False, COMPLETED)
+
+def test_summary_rows_through_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "out.parquet"
+    with StreamingWriter(str(path), batch_size=1) as writer:
+        writer.add_page("https://example.com/a", build_rows(False, COMPLETED))
+        writer.add_page("https://example.com/b", build_rows(False, FAILED))
+    rows = [row for name in parquet_files(str(path)) for row in pq.read_table(name).to_pylist()]
+    assert [row["data_count"] for row in rows] == ["2", None]
+
+@pytest.mark.parametrize("argv", [
+    ["urls.csv", "--include-data", "--output", "out.csv"],
+    ["urls.csv", "--include-data", "--output", "out.ndjson", "--format", "parquet"],
+])
+def test_include_data_requires_ndjson(argv):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+
+def test_include_data_with_ndjson():
+    assert parse_args(["urls.csv", "--include-data", "--output", "out.jsonl"]).include_data
+
+def mock_client(handler):
+    client = AsyncBackendClient("http://backend.test")
+    client._client = httpx.AsyncClient(base_url="http://backend.test", transport=httpx.MockTransport(handler))
+    return client
+
+def test_post_read_timeout_is_not_resent():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def submit():
+        async with mock_client(handler) as client:
+            await client.submit_auto_scrape("https://example.com/a")
+
+    with pytest.raises(BackendError) as info:
+        asyncio.run(submit())
+    assert info.value.status == 0
+    assert calls == ["POST"]
+
+def test_submit_error_fails_only_that_url(tmp_path):
+    def handler(request):
+        if request.method == "POST":
+            if json.loads(request.content)["url"].endswith("/a"):
+                raise httpx.ReadTimeout("timed out", request=request)
+            return httpx.Response(202, json={"jobId": "job-b"})
+        return httpx.Response(200, json={"job": {**COMPLETED, "id": "job-b"}})
+
+    async def run_batch(writer, journal):
+        async with mock_client(handler) as client:
+            runner = BatchRunner(client, writer, journal, concurrency=1, rate=0, poll_interval=0)
+            return await runner.run([BatchItem(url="https://example.com/a"), BatchItem(url="https://example.com/b")])
+
+    path = tmp_path / "out.ndjson"
+    journal = JobJournal(str(tmp_path / "jobs.ndjson"))
+    with StreamingWriter(str(path)) as writer:
+        counts = asyncio.run(run_batch(writer, journal))
+    journal.close()
+    assert (counts["errors"], counts["completed"]) == (1, 1)
+    # 失敗したURLは出力・チェックポイントに記録せず、--resume で再試行する
+    assert writer.completed_urls == {"https://example.com/b"}
+    assert [json.loads(line)["url"] for line in path.read_text(encoding='utf-8').splitlines()] == ["https://example.com/b"]
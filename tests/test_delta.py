@@ -0,0 +1,68 @@
+"""
+差分モード (crawl_incremental) の掲載終了判定のテスト
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+import memo
+from seen_index import SeenIndex
+
+SCOPE = "https://ee-ties.com/search?page={page}"
+URLS = [SCOPE.format(page=i) for i in range(1, 5)]
+
+def listing(title):
+    return {"求人タイトル": title, "企業名": "株式会社A", "仕事内容概要": "概要"}
+
+def fake_crawl(pages):
+    """
+    URL → 行 (None は取得失敗) を返す crawl の代わりです。
+    並行取得で打ち切り時に処理中だったページと同様に、stop_event に関わらず全ページの結果を渡します。
+    """
+    async def crawl(urls, on_page, on_failed, stop_event, allow_empty, **options):
+        assert allow_empty
+        for url in urls:
+            if pages[url] is None:
+                on_failed(url)
+            else:
+                on_page(url, pages[url])
+        return []
+    return crawl
+
+def run(monkeypatch, index, pages):
+    monkeypatch.setattr(memo, "crawl", fake_crawl(pages))
+    emitted = []
+    removed = asyncio.run(memo.crawl_incremental(SCOPE, URLS, index, lambda url, rows: emitted.extend(rows), stop_after_seen=100))
+    return emitted, removed
+
+@pytest.fixture
+def index(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite3")) as index:
+        yield index
+
+FIRST = {URLS[0]: [listing("営業")], URLS[1]: [listing("事務")], URLS[2]: [listing("開発")], URLS[3]: []}
+
+def test_full_pass_reports_removed(monkeypatch, index):
+    run(monkeypatch, index, FIRST)
+    emitted, removed = run(monkeypatch, index, {**FIRST, URLS[1]: [listing("経理")]})
+    assert [row["求人タイトル"] for row in emitted] == ["経理"]
+    assert [row["求人タイトル"] for row in removed] == ["事務"]
+
+def test_failed_middle_page_reports_nothing_removed(monkeypatch, index):
+    run(monkeypatch, index, FIRST)
+    emitted, removed = run(monkeypatch, index, {**FIRST, URLS[1]: None, URLS[2]: [listing("開発"), listing("新規")]})
+    # 失敗したページの後も照合を続けるが、掲載終了は判定しない
+    assert [row["求人タイトル"] for row in emitted] == ["新規"]
+    assert removed == []
+    # 次の成功した一巡で掲載終了を判定する
+    _, removed = run(monkeypatch, index, FIRST)
+    assert [row["求人タイトル"] for row in removed] == ["新規"]
+
+def test_empty_page_ends_the_scope(monkeypatch, index):
+    run(monkeypatch, index, FIRST)
+    # 終端より後のページの失敗は一巡の判定に影響しない
+    emitted, removed = run(monkeypatch, index, {**FIRST, URLS[1]: [], URLS[2]: None})
+    assert emitted == []
+    assert sorted(row["求人タイトル"] for row in removed) == sorted(["事務", "開発"])
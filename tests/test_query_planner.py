@@ -0,0 +1,49 @@
+"""
+シャード分割 (plan_shards) とシャード間の重複除去 (ShardMerger) のテスト
+"""
+
+import pytest
+
+from query_planner import ShardMerger, plan_shards
+
+BASE = "https://ee-ties.com/search?a=1&search_element_1_2=on&search_element_1_5=on"
+
+def test_split_multi_select_prefix():
+    assert plan_shards(BASE) == [
+        ("search_element_1_2=on", "https://ee-ties.com/search?a=1&search_element_1_2=on"),
+        ("search_element_1_5=on", "https://ee-ties.com/search?a=1&search_element_1_5=on"),
+    ]
+
+def test_page_placeholder_is_kept():
+    shards = plan_shards(BASE + "&page={page}")
+    assert [url for _, url in shards] == [
+        "https://ee-ties.com/search?a=1&search_element_1_2=on&page={page}",
+        "https://ee-ties.com/search?a=1&search_element_1_5=on&page={page}",
+    ]
+
+def test_cartesian_product_of_dimensions():
+    shards = plan_shards(BASE, ["search_element_1_*", "area=tokyo,osaka"])
+    assert [name for name, _ in shards] == [
+        "search_element_1_2=on&area=tokyo",
+        "search_element_1_2=on&area=osaka",
+        "search_element_1_5=on&area=tokyo",
+        "search_element_1_5=on&area=osaka",
+    ]
+    assert shards[1][1] == "https://ee-ties.com/search?a=1&search_element_1_2=on&area=osaka"
+
+def test_url_without_dimensions_is_single_shard():
+    url = "https://ee-ties.com/search?a=1"
+    assert plan_shards(url) == [(url, url)]
+
+def test_invalid_dimension():
+    with pytest.raises(ValueError):
+        plan_shards(BASE, ["area"])
+
+def test_merger_removes_cross_shard_duplicates():
+    merger = ShardMerger()
+    first = {"求人タイトル": "営業", "企業名": "A", "仕事内容概要": "概要", "検索条件": "1_2"}
+    second = {"求人タイトル": "事務", "企業名": "A", "仕事内容概要": "概要", "検索条件": "1_2"}
+    assert merger.merge([first, second]) == [first, second]
+    # 別シャードの同じ求人は検索条件の列が違っても重複
+    assert merger.merge([{**first, "検索条件": "1_5"}]) == []
+    assert merger.duplicates == 1
@@ -0,0 +1,61 @@
+"""
+SeenIndex の新規・変更・変更なし・掲載終了の判定のテスト
+"""
+
+import pytest
+
+from seen_index import SeenIndex
+
+SCOPE = "https://ee-ties.com/search?a=1"
+
+def listing(title, company="株式会社A", summary="概要"):
+    return {"求人タイトル": title, "企業名": company, "仕事内容概要": summary, "検索条件": "x"}
+
+@pytest.fixture
+def index(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite3")) as index:
+        yield index
+
+def run(index, rows, full_pass=True, scope=SCOPE):
+    run_id = index.begin_run(scope)
+    statuses = [status for status, _ in index.apply(run_id, scope, rows)]
+    removed = index.finish_run(run_id, scope, full_pass)
+    return statuses, removed
+
+def test_new_changed_unchanged(index):
+    assert run(index, [listing("営業"), listing("事務")]) == (["new", "new"], [])
+    statuses, _ = run(index, [listing("営業"), listing("事務", summary="更新後の概要")])
+    assert statuses == ["unchanged", "changed"]
+
+def test_search_condition_columns_do_not_count_as_change(index):
+    run(index, [listing("営業")])
+    statuses, _ = run(index, [{**listing("営業"), "検索条件": "y"}])
+    assert statuses == ["unchanged"]
+
+def test_removed_only_on_full_pass(index):
+    run(index, [listing("営業"), listing("事務")])
+    assert run(index, [listing("営業")], full_pass=False) == (["unchanged"], [])
+
+    statuses, removed = run(index, [listing("営業")])
+    assert statuses == ["unchanged"]
+    assert removed == [listing("事務")]
+    # 掲載終了済みの求人は再度は報告しない
+    assert run(index, [listing("営業")])[1] == []
+
+def test_relisted_item_is_new(index):
+    run(index, [listing("営業"), listing("事務")])
+    run(index, [listing("営業")])
+    statuses, _ = run(index, [listing("営業"), listing("事務")])
+    assert statuses == ["unchanged", "new"]
+
+def test_scopes_are_independent(index):
+    run(index, [listing("営業")])
+    statuses, removed = run(index, [listing("事務")], scope="https://ee-ties.com/search?a=2")
+    assert (statuses, removed) == (["new"], [])
+
+def test_index_persists_across_connections(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    with SeenIndex(path) as index:
+        run(index, [listing("営業")])
+    with SeenIndex(path) as index:
+        assert run(index, [listing("営業")])[0] == ["unchanged"]
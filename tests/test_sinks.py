@@ -0,0 +1,136 @@
+"""
+sinks のテスト (ヘッダー・スキーマの扱いとチェックポイントからの再開)
+"""
+
+import csv
+import json
+
+import pytest
+
+from sinks import CrawlCheckpoint, CsvSink, NdjsonSink, RowSink, StreamingWriter, open_sink, parquet_files
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+def read_parquet(path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    return [row for name in parquet_files(str(path)) for row in pq.read_table(name).to_pylist()]
+
+def test_row_sink_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        RowSink(str(tmp_path / "out"))
+
+def test_open_sink_by_extension(tmp_path):
+    assert isinstance(open_sink(str(tmp_path / "out.csv")), CsvSink)
+    assert isinstance(open_sink(str(tmp_path / "out.jsonl")), NdjsonSink)
+    assert isinstance(open_sink(str(tmp_path / "out.txt"), "ndjson"), NdjsonSink)
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "out.csv"), "xml")
+
+def test_csv_header_from_first_row(tmp_path):
+    path = tmp_path / "out.csv"
+    sink = CsvSink(str(path))
+    sink.write_batch([{"title": "A", "company": "X"}])
+    sink.write_batch([{"company": "Y", "title": "B", "extra": "ignored"}])
+    sink.close()
+    assert read_csv(path) == [["title", "company"], ["A", "X"], ["B", "Y"]]
+    assert sink.rows_written == 2
+
+def test_csv_append_keeps_existing_header(tmp_path):
+    path = tmp_path / "out.csv"
+    sink = CsvSink(str(path))
+    sink.write_batch([{"title": "A", "company": "X"}])
+    sink.close()
+
+    sink = CsvSink(str(path), append=True)
+    sink.write_batch([{"company": "Y", "title": "B"}])
+    sink.close()
+    assert read_csv(path) == [["title", "company"], ["A", "X"], ["B", "Y"]]
+
+def test_ndjson_append(tmp_path):
+    path = tmp_path / "out.ndjson"
+    for append, title in [(False, "A"), (True, "日本語")]:
+        sink = NdjsonSink(str(path), append)
+        sink.write_batch([{"title": title}])
+        sink.close()
+    assert [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()] == [{"title": "A"}, {"title": "日本語"}]
+
+def test_parquet_string_schema(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "out.parquet"
+    sink = open_sink(str(path))
+    sink.write_batch([{"title": "A", "count": 1, "tags": ["x"]}])
+    sink.write_batch([{"title": None, "count": 2, "tags": []}])
+    sink.close()
+    assert parquet_files(str(path)) == [str(path), str(tmp_path / "out.part1.parquet")]
+    assert all(str(field.type) == "string" for field in pq.read_schema(path))
+    assert read_parquet(path) == [
+        {"title": "A", "count": "1", "tags": '["x"]'},
+        {"title": None, "count": "2", "tags": "[]"},
+    ]
+
+def test_parquet_resume_after_crash(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "out.parquet"
+    writer = StreamingWriter(str(path), batch_size=2)
+    writer.add_page("p1", [{"title": "A"}, {"title": "B"}])
+    writer.add_page("p2", [{"title": "C"}])
+    # close() せずに中断: フラッシュ済みのページは読み込めるファイルに書き出されている
+    assert writer.completed_urls == {"p1"}
+    assert read_parquet(path) == [{"title": "A"}, {"title": "B"}]
+
+    with StreamingWriter(str(path), batch_size=2, resume=True) as writer:
+        assert writer.completed_urls == {"p1"}
+        writer.add_page("p2", [{"title": "C", "extra": "ignored"}])
+    assert read_parquet(path) == [{"title": "A"}, {"title": "B"}, {"title": "C"}]
+
+    # 再開しない実行は以前のファイルを残さない
+    with StreamingWriter(str(path), batch_size=2) as writer:
+        writer.add_page("p1", [{"title": "Z"}])
+    assert read_parquet(path) == [{"title": "Z"}]
+
+def test_writer_flushes_by_batch_and_checkpoints_pages(tmp_path):
+    path = tmp_path / "out.csv"
+    writer = StreamingWriter(str(path), batch_size=3)
+    writer.add_page("p1", [{"title": "A"}, {"title": "B"}])
+    assert writer.completed_urls == set()
+    writer.add_page("p2", [{"title": "C"}])
+    assert writer.completed_urls == {"p1", "p2"}
+    assert writer.rows_written == 3
+    writer.add_page("p3", [])
+    writer.close()
+
+    state = json.loads((tmp_path / "out.csv.checkpoint.json").read_text(encoding='utf-8'))
+    assert state == {"completed": ["p1", "p2", "p3"], "rows": 3}
+
+def test_writer_resume_skips_completed_pages(tmp_path):
+    path = tmp_path / "out.csv"
+    with StreamingWriter(str(path), batch_size=1) as writer:
+        writer.add_page("p1", [{"title": "A"}])
+    # 未フラッシュのまま中断した2回目の実行 (p2 は記録されない)
+    writer = StreamingWriter(str(path), batch_size=10, resume=True)
+    writer.add_page("p2", [{"title": "B"}])
+
+    with StreamingWriter(str(path), batch_size=1, resume=True) as writer:
+        assert writer.completed_urls == {"p1"}
+        assert writer.rows_written == 1
+        writer.add_page("p2", [{"title": "B"}])
+    assert read_csv(path) == [["title"], ["A"], ["B"]]
+
+def test_writer_without_resume_starts_over(tmp_path):
+    path = tmp_path / "out.csv"
+    with StreamingWriter(str(path), batch_size=1) as writer:
+        writer.add_page("p1", [{"title": "A"}])
+    with StreamingWriter(str(path), batch_size=1) as writer:
+        assert writer.completed_urls == set()
+        writer.add_page("p1", [{"title": "Z"}])
+    assert read_csv(path) == [["title"], ["Z"]]
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text("{broken", encoding='utf-8')
+    checkpoint = CrawlCheckpoint(str(path))
+    checkpoint.load()
+    assert checkpoint.completed == set()
+    assert checkpoint.rows == 0
@@ -0,0 +1,69 @@
+"""
+AutoThrottle の間隔計算のテスト
+"""
+
+import pytest
+
+from throttle import AutoThrottle
+
+HOST = "example.com"
+
+def make_throttle(**kwargs):
+    options = {"start_delay_ms": 3000, "min_delay_ms": 500, "max_delay_ms": 10000, "randomize": False}
+    options.update(kwargs)
+    return AutoThrottle(**options)
+
+def test_initial_delay_is_clamped():
+    assert make_throttle().delay(HOST) == 3.0
+    assert make_throttle(start_delay_ms=100).delay(HOST) == 0.5
+    assert make_throttle(start_delay_ms=20000).delay(HOST) == 10.0
+
+def test_fast_responses_halve_towards_target():
+    throttle = make_throttle()
+    throttle.observe(HOST, 1.0)
+    assert throttle.delay(HOST) == pytest.approx(2.0)  # (3.0 + 1.0) / 2
+    throttle.observe(HOST, 1.0)
+    assert throttle.delay(HOST) == pytest.approx(1.5)
+
+def test_slow_response_jumps_to_target():
+    throttle = make_throttle()
+    throttle.observe(HOST, 6.0)
+    assert throttle.delay(HOST) == pytest.approx(6.0)
+
+def test_target_concurrency_divides_latency():
+    throttle = make_throttle(target_concurrency=4.0)
+    throttle.observe(HOST, 8.0)
+    assert throttle.delay(HOST) == pytest.approx(2.5)  # (3.0 + 8.0 / 4) / 2
+
+def test_delay_stays_within_bounds():
+    throttle = make_throttle()
+    for _ in range(20):
+        throttle.observe(HOST, 0.01)
+    assert throttle.delay(HOST) == 0.5
+    throttle.observe(HOST, 60.0)
+    assert throttle.delay(HOST) == 10.0
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_backoff_status_doubles_delay(status):
+    throttle = make_throttle()
+    throttle.observe(HOST, 0.1, status)
+    assert throttle.delay(HOST) == pytest.approx(6.0)
+    assert throttle.snapshot()[HOST]["backoffs"] == 1
+
+def test_error_response_never_shortens_delay():
+    throttle = make_throttle()
+    throttle.observe(HOST, 0.1, 404)
+    assert throttle.delay(HOST) == 3.0
+    throttle.observe(HOST, 5.0, 500)
+    assert throttle.delay(HOST) == pytest.approx(5.0)
+
+def test_hosts_are_independent():
+    throttle = make_throttle()
+    throttle.backoff("a.example.com")
+    assert throttle.delay("a.example.com") == 6.0
+    assert throttle.delay("b.example.com") == 3.0
+
+def test_randomized_delay_range():
+    throttle = make_throttle(randomize=True)
+    for _ in range(50):
+        assert 1.5 <= throttle.delay(HOST) <= 4.5
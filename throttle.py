@@ -0,0 +1,110 @@
+"""
+ホスト単位の自動スロットリング (AutoThrottle)
+観測したレスポンス時間と 429/503 の発生状況から、ホストごとのリクエスト間隔を自動調整します。
+応答の速いサイトは間隔を詰め、混雑しているサイトは自動的に間隔を広げます。
+"""
+
+import logging
+import random
+from typing import Any, Dict
+
+# 初期のリクエスト間隔 (ミリ秒)
+THROTTLE_START_DELAY_MS: int = 3000
+# リクエスト間隔の下限・上限 (ミリ秒)
+THROTTLE_MIN_DELAY_MS: int = 500
+THROTTLE_MAX_DELAY_MS: int = 60000
+# ホストあたりの目標同時リクエスト数 (間隔 = レスポンス時間 / 目標同時数)
+THROTTLE_TARGET_CONCURRENCY: float = 1.0
+# 混雑を示すステータス (間隔を BACKOFF_FACTOR 倍に広げる)
+BACKOFF_STATUSES = {429, 503}
+BACKOFF_FACTOR: float = 2.0
+
+class AutoThrottle:
+    """
+    ホストごとのリクエスト間隔を管理します。
+    成功レスポンスでは間隔を「レスポンス時間 / 目標同時数」へ平滑化して近づけ、
+    429/503 や通信エラーでは間隔を広げます。エラー応答で間隔が縮むことはありません。
+    """
+
+    def __init__(
+        self,
+        start_delay_ms: int = THROTTLE_START_DELAY_MS,
+        min_delay_ms: int = THROTTLE_MIN_DELAY_MS,
+        max_delay_ms: int = THROTTLE_MAX_DELAY_MS,
+        target_concurrency: float = THROTTLE_TARGET_CONCURRENCY,
+        randomize: bool = True,
+    ) -> None:
+        self.start_delay = start_delay_ms / 1000.0
+        self.min_delay = min_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self.target_concurrency = target_concurrency
+        self.randomize = randomize
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    def _state(self, host: str) -> Dict[str, Any]:
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "delay": self._clamp(self.start_delay),
+                "latency": None,
+                "responses": 0,
+                "backoffs": 0,
+            }
+        return self._hosts[host]
+
+    def _clamp(self, delay: float) -> float:
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def delay(self, host: str) -> float:
+        """
+        次のリクエストまでの待機時間 (秒) を返します。
+        人間らしさのため、randomize 時は 0.5〜1.5 倍のゆらぎを加えます。
+        """
+        delay = self._state(host)["delay"]
+        return delay * random.uniform(0.5, 1.5) if self.randomize else delay
+
+    def observe(self, host: str, latency: float, status: int = 200) -> None:
+        """
+        レスポンス時間 (秒) とステータスコードを記録し、間隔を調整します。
+        """
+        state = self._state(host)
+        state["responses"] += 1
+        state["latency"] = latency if state["latency"] is None else (state["latency"] + latency) / 2.0
+
+        if status in BACKOFF_STATUSES:
+            self.backoff(host, status)
+            return
+
+        old_delay = state["delay"]
+        target_delay = latency / self.target_concurrency
+        new_delay = self._clamp(max(target_delay, (old_delay + target_delay) / 2.0))
+        # エラー応答は速く返ることが多いため、間隔を縮める根拠にしない
+        if status >= 400 and new_delay <= old_delay:
+            return
+        state["delay"] = new_delay
+        logging.debug(f"AutoThrottle {host}: latency {latency:.2f}s, status {status}, delay {old_delay:.2f}s -> {new_delay:.2f}s")
+
+    def backoff(self, host: str, status: int | None = None) -> None:
+        """
+        混雑・エラー時に間隔を広げます。
+        """
+        state = self._state(host)
+        state["backoffs"] += 1
+        old_delay = state["delay"]
+        state["delay"] = self._clamp(old_delay * BACKOFF_FACTOR)
+        logging.info(f"AutoThrottle {host}: backing off ({status or 'error'}), delay {old_delay:.2f}s -> {state['delay']:.2f}s")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        ホストごとの現在の間隔・平均レスポンス時間・バックオフ回数を返します。
+        """
+        return {host: dict(state) for host, state in self._hosts.items()}
+
+class ResponseStatusError(Exception):
+    """
+    混雑を示すステータス (429/503) が返ったことを示します。リトライ対象です。
+    """
+
+    def __init__(self, status: int, url: str) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
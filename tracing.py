@@ -0,0 +1,150 @@
+"""
+フェーズ別の計測 (スパン・タイマー)
+ブラウザ起動・goto・networkidle待機・意図的な待機・人間らしい動作・抽出・出力などの
+処理時間を計測し、実行ごとのトレース (JSON Lines) とPrometheus形式のヒストグラムに出力します。
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, TextIO
+
+# トレースの保存先
+TRACE_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "traces")
+# ヒストグラムのバケット境界 (秒)
+HISTOGRAM_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+METRIC_NAME: str = "scraper_phase_duration_seconds"
+
+class Histogram:
+    """
+    Prometheus形式の累積ヒストグラムです。
+    """
+
+    def __init__(self, buckets: List[float] = HISTOGRAM_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class Tracer:
+    """
+    フェーズごとの処理時間を記録します。
+    start_run() 後のスパンは1行1スパンでトレースファイルに逐次書き出すため、
+    クロールの規模によらずメモリ上に保持するのはフェーズ別のヒストグラムのみです。
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.run_id: str | None = None
+        self.trace_path: str | None = None
+        self._trace_file: TextIO | None = None
+        self._run_started = 0.0
+
+    def start_run(self, trace_dir: str = TRACE_DIR, run_id: str | None = None) -> str:
+        """
+        実行単位のトレースファイル (`run_<日時>_<pid>.jsonl`) を開きます。
+        同じ秒に開始した実行どうしで上書きしないよう、run_id にはプロセスIDを含めます。
+        """
+        os.makedirs(trace_dir, exist_ok=True)
+        self.run_id = run_id or f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.trace_path = os.path.join(trace_dir, f"run_{self.run_id}.jsonl")
+        self._trace_file = open(self.trace_path, 'x', encoding='utf-8')
+        self._run_started = time.perf_counter()
+        return self.trace_path
+
+    @contextmanager
+    def span(self, phase: str, **attrs: Any) -> Iterator[None]:
+        """
+        with ブロックの処理時間を phase として記録します。例外が発生した場合も error 属性付きで記録します。
+        """
+        started_at = time.time()
+        started = time.perf_counter()
+        error: str | None = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(phase, time.perf_counter() - started, started_at, error=error, **attrs)
+
+    def record(self, phase: str, duration: float, started_at: float | None = None, **attrs: Any) -> None:
+        """
+        計測済みの処理時間 (秒) を記録します。
+        """
+        self.histograms.setdefault(phase, Histogram()).observe(duration)
+        if self._trace_file:
+            span = {"phase": phase, "start": started_at or time.time() - duration, "duration": round(duration, 6)}
+            span.update({k: v for k, v in attrs.items() if v is not None})
+            self._trace_file.write(json.dumps(span, ensure_ascii=False) + '\n')
+
+    def merge(self, histograms: Dict[str, Histogram]) -> None:
+        """
+        別プロセス (シャード) で記録したフェーズ別のヒストグラムを合算します。
+        """
+        for phase, other in histograms.items():
+            h = self.histograms.setdefault(phase, Histogram(other.buckets))
+            h.count += other.count
+            h.sum += other.sum
+            h.counts = [a + b for a, b in zip(h.counts, other.counts)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        フェーズごとの回数・合計・平均時間 (秒) を返します。
+        """
+        return {
+            phase: {"count": h.count, "total": round(h.sum, 3), "mean": round(h.sum / h.count, 3) if h.count else 0.0}
+            for phase, h in self.histograms.items()
+        }
+
+    def finish_run(self) -> None:
+        """
+        フェーズ別の集計をトレースの最終行に書き込み、ファイルを閉じます。
+        """
+        if not self._trace_file:
+            return
+        wall = time.perf_counter() - self._run_started
+        self._trace_file.write(json.dumps({"summary": self.summary(), "wall": round(wall, 3)}, ensure_ascii=False) + '\n')
+        self._trace_file.close()
+        self._trace_file = None
+        for phase, stats in sorted(self.summary().items(), key=lambda item: -item[1]["total"]):
+            logging.info(f"Phase {phase}: {stats['count']} spans, total {stats['total']:.2f}s, mean {stats['mean']:.3f}s")
+        logging.info(f"Trace written to {self.trace_path}")
+
+    def render_prometheus(self) -> str:
+        """
+        ヒストグラムをPrometheusのテキスト形式で返します。
+        """
+        lines = [
+            f"# HELP {METRIC_NAME} Duration of scraper phases in seconds.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for phase, h in sorted(self.histograms.items()):
+            for bound, count in zip(h.buckets, h.counts):
+                lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="+Inf"}} {h.count}')
+            lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {h.sum:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        ヒストグラムをファイルに書き出します (node_exporter の textfile collector 形式)。
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+# プロセス共通のトレーサー
+TRACER = Tracer()